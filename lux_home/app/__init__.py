@@ -4,9 +4,10 @@ from flask_migrate import Migrate
 from flask_login import LoginManager
 from flask_bcrypt import Bcrypt
 import os
+from app.sharding import PropertySession
 
 # Initialize extensions without app context
-db = SQLAlchemy()
+db = SQLAlchemy(session_options={'class_': PropertySession}) # Routes property-scoped models to their shard
 bcrypt = Bcrypt()
 login_manager = LoginManager()
 login_manager.login_view = 'login'
@@ -17,7 +18,9 @@ def create_app(config_class_name='config.DevelopmentConfig'):
     """
     Factory function to create and configure the Flask application.
     """
-    app = Flask(__name__)
+    # Templates and static files live next to the package, not inside it
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    app = Flask(__name__, template_folder=os.path.join(root, 'templates'), static_folder=os.path.join(root, 'static'))
     app.config.from_object(config_class_name) # Load config from object
 
     # Initialize extensions with app context
@@ -31,7 +34,53 @@ def create_app(config_class_name='config.DevelopmentConfig'):
     # and routes are imported after app is created and configured.
     with app.app_context():
         from . import routes  # Import routes
+        routes.views.register(app)
         from . import models  # Import models (ensure they are defined to use 'db')
+        from . import archive
+        from . import room_state
+        from . import room_grid
+        from . import reservations
+        from . import money
+        from . import schema
+        from . import ledger
+        from . import overdue
+        from . import outbox
+        from . import assets
+        from . import responses
+        from . import search
+        from . import dedup
+        from . import night_audit
+        from . import profiling
+        from . import backup
+        from . import importer
+        from . import channel_sync
+        from . import guest_stats
+        from . import audit
+
+        app.cli.add_command(archive.archive_bookings_command)
+        app.cli.add_command(money.migrate_money_command)
+        app.cli.add_command(schema.upgrade_schema_command)
+        app.cli.add_command(ledger.snapshot_balances_command)
+        app.cli.add_command(overdue.sweep_overdue_command)
+        app.cli.add_command(outbox.drain_outbox_command)
+        app.cli.add_command(assets.build_assets_command)
+        app.cli.add_command(search.reindex_search_command)
+        app.cli.add_command(dedup.dedup_guests_command)
+        app.cli.add_command(night_audit.night_audit_command)
+        app.cli.add_command(profiling.grant_admin_command)
+        app.cli.add_command(backup.backup_command)
+        app.cli.add_command(backup.restore_backup_command)
+        app.cli.add_command(importer.import_legacy_command)
+        app.cli.add_command(channel_sync.channel_sync_command)
+        app.cli.add_command(guest_stats.rebuild_guest_stats_command)
+        assets.init_assets(app)
+        responses.init_responses(app)
+        room_state.init_room_state(app)
+        room_grid.init_room_grid(app)
+        reservations.init_availability_index(app)
+        profiling.init_profiling(app)
+        backup.init_backup(app)
+        audit.init_audit(app)
 
         # User loader callback for Flask-Login
         @login_manager.user_loader
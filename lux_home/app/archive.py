@@ -0,0 +1,153 @@
+from collections import Counter
+from datetime import datetime, date, timedelta
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+from sqlalchemy import select, insert, delete
+from app import db
+from app.models import (Booking, Invoice, BookingService, Room, Guest, Payment, BalanceSnapshot, InvoiceReminder,
+                        RoomCharge, ArchivedBooking, ArchivedInvoice, ArchivedBookingService, ArchivedPayment,
+                        ArchivedRoomCharge)
+from app.responses import record_deletes
+from app.scheduler import run_per_scope
+
+
+def months_before(moment, months):
+    """Same day-of-month `months` months earlier, clamped to the end of shorter months."""
+    month_index = moment.year * 12 + (moment.month - 1) - months
+    year, month = divmod(month_index, 12)
+    month += 1
+    next_month_start = date(year + (month // 12), (month % 12) + 1, 1)
+    last_day = (next_month_start - timedelta(days=1)).day
+    return moment.replace(year=year, month=month, day=min(moment.day, last_day))
+
+
+def archive_month_of(moment):
+    """Partition key for an archived row: YYYYMM of its check-out."""
+    return moment.year * 100 + moment.month
+
+
+def _rows(model, *criteria, limit=None):
+    # Select every mapped column through the ORM so property scoping and shard routing apply
+    columns = [getattr(model, c.key) for c in model.__table__.columns]
+    stmt = select(*columns).where(*criteria).order_by(model.id).limit(limit)
+    return [dict(r._mapping) for r in db.session.execute(stmt)]
+
+
+def archive_completed_bookings(months=None, batch_size=None, now=None):
+    """
+    Moves completed bookings checked out more than `months` months ago, with their
+    invoices, payments, booking services and night-audit room charges, into the archive tables. Each batch is copied
+    and deleted in one transaction, so a crash never leaves a row in both places
+    or in neither. That holds on a sharded property too: every table touched here
+    is property-scoped, so the whole batch commits on the property's database.
+    Returns counts of archived rows per kind.
+    """
+    months = months if months is not None else current_app.config.get('ARCHIVE_AFTER_MONTHS', 18)
+    batch_size = batch_size or current_app.config.get('ARCHIVE_BATCH_SIZE', 500)
+    cutoff = months_before(now or datetime.utcnow(), months)
+    counts = {'bookings': 0, 'invoices': 0, 'payments': 0, 'booking_services': 0, 'room_charges': 0}
+
+    while True:
+        booking_rows = _rows(Booking, Booking.is_active.is_(False), Booking.is_reservation.is_(False),
+                             Booking.check_out_date < cutoff, limit=batch_size)
+        if not booking_rows:
+            break
+        ids = [r['id'] for r in booking_rows]
+        month_by_booking = {r['id']: archive_month_of(r['check_out_date']) for r in booking_rows}
+
+        invoice_rows = _rows(Invoice, Invoice.booking_id.in_(ids))
+        service_rows = _rows(BookingService, BookingService.booking_id.in_(ids))
+        charge_rows = _rows(RoomCharge, RoomCharge.booking_id.in_(ids))
+        invoice_ids = [r['id'] for r in invoice_rows]
+        month_by_invoice = {r['id']: month_by_booking[r['booking_id']] for r in invoice_rows}
+        payment_rows = _rows(Payment, Payment.invoice_id.in_(invoice_ids)) if invoice_ids else []
+        for r in payment_rows:
+            r['archive_month'] = month_by_invoice[r['invoice_id']]
+        for r in booking_rows:
+            r['archive_month'] = month_by_booking[r['id']]
+        for r in invoice_rows:
+            r['archive_month'] = month_by_booking[r['booking_id']]
+        for r in service_rows:
+            r['archive_month'] = month_by_booking[r['booking_id']]
+        for r in charge_rows:
+            r['archive_month'] = month_by_booking[r['booking_id']]
+
+        try:
+            db.session.execute(insert(ArchivedBooking), booking_rows)
+            if invoice_rows:
+                db.session.execute(insert(ArchivedInvoice), invoice_rows)
+            if service_rows:
+                db.session.execute(insert(ArchivedBookingService), service_rows)
+            if payment_rows:
+                db.session.execute(insert(ArchivedPayment), payment_rows)
+            if charge_rows:
+                db.session.execute(insert(ArchivedRoomCharge), charge_rows)
+            if invoice_ids:
+                # Bulk deletes bypass the per-row append-only guard, which only covers session edits
+                db.session.execute(delete(BalanceSnapshot).where(BalanceSnapshot.invoice_id.in_(invoice_ids)),
+                                   execution_options={'synchronize_session': False})
+                db.session.execute(delete(InvoiceReminder).where(InvoiceReminder.invoice_id.in_(invoice_ids)),
+                                   execution_options={'synchronize_session': False})
+                db.session.execute(delete(Payment).where(Payment.invoice_id.in_(invoice_ids)),
+                                   execution_options={'synchronize_session': False})
+            db.session.execute(delete(BookingService).where(BookingService.booking_id.in_(ids)),
+                               execution_options={'synchronize_session': False})
+            db.session.execute(delete(RoomCharge).where(RoomCharge.booking_id.in_(ids)),
+                               execution_options={'synchronize_session': False})
+            db.session.execute(delete(Invoice).where(Invoice.booking_id.in_(ids)),
+                               execution_options={'synchronize_session': False})
+            db.session.execute(delete(Booking).where(Booking.id.in_(ids)),
+                               execution_options={'synchronize_session': False})
+            record_deletes(Booking, Invoice) # Their ETag versions
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+        db.session.expunge_all() # Drop archived rows from the identity map
+
+        counts['bookings'] += len(booking_rows)
+        counts['invoices'] += len(invoice_rows)
+        counts['payments'] += len(payment_rows)
+        counts['booking_services'] += len(service_rows)
+        counts['room_charges'] += len(charge_rows)
+    return counts
+
+
+def archive_bookings(months=None, batch_size=None, now=None):
+    """Archives on every database; returns the counts summed over the job scopes."""
+    counts = Counter()
+
+    def archive_scope():
+        scope_counts = archive_completed_bookings(months, batch_size, now)
+        counts.update(scope_counts)
+        return scope_counts['bookings']
+
+    run_per_scope('archive-bookings', archive_scope)
+    return dict(counts)
+
+
+def load_archived_invoice(booking_id):
+    """
+    Returns (booking, invoice, guest, room) for an archived stay, or None.
+    Used by the invoice routes as a fallback when the booking is no longer hot.
+    """
+    booking = db.session.get(ArchivedBooking, booking_id)
+    if not booking:
+        return None
+    invoice = ArchivedInvoice.query.filter_by(booking_id=booking_id).first()
+    if not invoice:
+        return None
+    return booking, invoice, db.session.get(Guest, booking.guest_id), db.session.get(Room, booking.room_id)
+
+
+@click.command('archive-bookings')
+@click.option('--months', type=int, default=None, help='Archive stays checked out more than this many months ago.')
+@click.option('--batch-size', type=int, default=None, help='Bookings moved per transaction.')
+@with_appcontext
+def archive_bookings_command(months, batch_size):
+    """Move completed bookings, invoices and services into the archive tables."""
+    counts = archive_bookings(months=months, batch_size=batch_size)
+    click.echo(f"Archived {counts['bookings']} bookings, {counts['invoices']} invoices, "
+               f"{counts['payments']} payments, {counts['booking_services']} booking services, "
+               f"{counts['room_charges']} room charges.")
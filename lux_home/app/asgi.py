@@ -0,0 +1,165 @@
+import json
+import re
+from http.cookies import SimpleCookie
+from urllib.parse import parse_qs
+from asgiref.wsgi import WsgiToAsgi
+from itsdangerous import BadSignature
+from sqlalchemy import select
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import create_async_engine
+from app import read_api
+from app.models import Property, User
+
+# Async drivers used for the read endpoints, by backend of the configured sync URL
+ASYNC_DRIVERS = {'sqlite': 'sqlite+aiosqlite', 'postgresql': 'postgresql+asyncpg', 'mysql': 'mysql+aiomysql'}
+
+ROUTES = [
+    (re.compile(r'^/api/dashboard$'), 'dashboard'),
+    (re.compile(r'^/api/guests$'), 'guests'),
+    (re.compile(r'^/api/guests/top$'), 'top_guests'),
+    (re.compile(r'^/api/guests/(?P<guest_id>\d+)$'), 'guest'),
+    (re.compile(r'^/api/search$'), 'search'),
+    (re.compile(r'^/api/invoices/(?P<booking_id>\d+)$'), 'invoice'),
+]
+
+
+def async_url(url):
+    url = make_url(url)
+    return url.set(drivername=ASYNC_DRIVERS.get(url.get_backend_name(), url.drivername))
+
+
+class AsyncReadApp:
+    """
+    ASGI entry point. The read-heavy JSON endpoints of app.read_api run natively
+    on async engines, so a slow database round trip parks a coroutine instead of
+    a thread. Every other request (and any request whose Flask session does not
+    name an existing user) is handed to the Flask app through asgiref's WSGI
+    adapter.
+    """
+
+    def __init__(self, flask_app):
+        self.flask_app = flask_app
+        self.wsgi = WsgiToAsgi(flask_app)
+        config = flask_app.config
+        pool_size = config.get('ASYNC_POOL_SIZE', 10)
+        self.engines = {None: self._engine(config['SQLALCHEMY_DATABASE_URI'], pool_size)}
+        for bind_key, uri in config.get('SQLALCHEMY_BINDS', {}).items():
+            self.engines[bind_key] = self._engine(uri, pool_size)
+        self.session_serializer = flask_app.session_interface.get_signing_serializer(flask_app)
+        self._property_binds = {} # property id -> bind key (None = default database)
+
+    @staticmethod
+    def _engine(uri, pool_size):
+        url = async_url(uri)
+        if url.get_backend_name() == 'sqlite' and url.database in (None, '', ':memory:'):
+            return create_async_engine(url) # Single shared connection; pool sizing does not apply
+        return create_async_engine(url, pool_size=pool_size, max_overflow=pool_size, pool_pre_ping=True)
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            return await self.lifespan(receive, send)
+        if scope['type'] == 'http' and scope['method'] == 'GET':
+            for pattern, name in ROUTES:
+                match = pattern.match(scope['path'])
+                if match:
+                    session = self.flask_session(scope)
+                    if await self.user_exists(session.get('_user_id')):
+                        return await self.handle(name, match, scope, session, send)
+                    break # Let Flask-Login answer (remember-me cookie, redirect to login)
+        await self.wsgi(scope, receive, send)
+
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                for engine in self.engines.values():
+                    await engine.dispose()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    def flask_session(self, scope):
+        """The Flask session from the request's signed cookie, or {} when missing or tampered with."""
+        cookies = SimpleCookie()
+        for name, value in scope.get('headers', []):
+            if name == b'cookie':
+                cookies.load(value.decode('latin-1'))
+        morsel = cookies.get(self.flask_app.config.get('SESSION_COOKIE_NAME', 'session'))
+        if morsel is None or self.session_serializer is None:
+            return {}
+        try:
+            return self.session_serializer.loads(
+                morsel.value, max_age=int(self.flask_app.permanent_session_lifetime.total_seconds()))
+        except BadSignature:
+            return {}
+
+    async def user_exists(self, user_id):
+        """
+        Whether the session's user id still names a user, as Flask-Login's
+        user_loader would check: a signed cookie outlives a deleted account.
+        """
+        if not user_id or not str(user_id).isdigit():
+            return False
+        async with self.engines[None].connect() as conn:
+            return await conn.scalar(select(User.id).where(User.id == int(user_id))) is not None
+
+    async def property_engine(self, property_id):
+        if property_id is None:
+            return self.engines[None]
+        if property_id not in self._property_binds:
+            async with self.engines[None].connect() as conn:
+                bind_key = await conn.scalar(select(Property.bind_key).where(Property.id == property_id))
+            self._property_binds[property_id] = bind_key if bind_key in self.engines else None
+        return self.engines[self._property_binds[property_id]]
+
+    async def run(self, endpoint, property_id):
+        """
+        Drives a read_api endpoint generator, holding at most one connection per
+        engine (an unsharded property shares the default database's).
+        """
+        engines = {'default': self.engines[None], 'property': await self.property_engine(property_id)}
+        connections = {}
+        try:
+            database, statement = next(endpoint)
+            while True:
+                engine = engines[database]
+                if engine not in connections:
+                    connections[engine] = await engine.connect()
+                result = await connections[engine].execute(statement)
+                database, statement = endpoint.send(result.all())
+        except StopIteration as done:
+            return done.value
+        finally:
+            for conn in connections.values():
+                await conn.close()
+
+    async def handle(self, name, match, scope, session, send):
+        property_id = session.get('property_id')
+        if name == 'dashboard':
+            endpoint = read_api.dashboard(property_id)
+        elif name == 'guests':
+            query = parse_qs(scope.get('query_string', b'').decode())
+            endpoint = read_api.guest_search(query.get('q', [''])[0])
+        elif name == 'top_guests':
+            limit = parse_qs(scope.get('query_string', b'').decode()).get('limit', [''])[0]
+            endpoint = read_api.top_guests(int(limit) if limit.isdigit() else read_api.TOP_GUESTS_LIMIT)
+        elif name == 'guest':
+            endpoint = read_api.guest_profile(int(match['guest_id']))
+        elif name == 'search':
+            query = parse_qs(scope.get('query_string', b'').decode())
+            page = query.get('page', ['1'])[0]
+            endpoint = read_api.search(query.get('q', [''])[0], property_id, page=int(page) if page.isdigit() else 1)
+        else:
+            endpoint = read_api.invoice(int(match['booking_id']), property_id)
+        data = await self.run(endpoint, property_id)
+        if data is None:
+            return await send_json(send, 404, {'error': 'Not found'})
+        await send_json(send, 200, data)
+
+
+async def send_json(send, status, data):
+    body = json.dumps(data).encode()
+    await send({'type': 'http.response.start', 'status': status,
+                'headers': [(b'content-type', b'application/json'), (b'content-length', str(len(body)).encode())]})
+    await send({'type': 'http.response.body', 'body': body})
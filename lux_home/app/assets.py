@@ -0,0 +1,143 @@
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import shutil
+import click
+from flask import current_app, request, send_from_directory, url_for
+from flask.cli import with_appcontext
+from jinja2 import FileSystemBytecodeCache
+from markupsafe import Markup
+
+try:
+    import brotli
+except ImportError: # Optional; .br files are only built when it is installed
+    brotli = None
+
+BUILD_DIR = 'build' # Under the static folder: fingerprinted copies plus manifest.json
+COMPRESSIBLE = ('.css', '.js', '.svg', '.json', '.txt', '.html')
+IMMUTABLE = 'public, max-age=31536000, immutable'
+
+
+def fingerprint(data):
+    return hashlib.sha256(data).hexdigest()[:12]
+
+
+def build_assets(static_folder):
+    """
+    Copies every static file to build/<dir>/<name>.<hash><ext> and writes .gz
+    (and .br when brotli is available) siblings for text assets that shrink.
+    Returns the manifest {source path: fingerprinted path}, also saved as
+    build/manifest.json. Old builds are replaced.
+    """
+    build_root = os.path.join(static_folder, BUILD_DIR)
+    shutil.rmtree(build_root, ignore_errors=True)
+    manifest = {}
+    for root, dirs, files in os.walk(static_folder):
+        dirs[:] = sorted(d for d in dirs if os.path.join(root, d) != build_root)
+        for filename in sorted(files):
+            source = os.path.join(root, filename)
+            relative = os.path.relpath(source, static_folder).replace(os.sep, '/')
+            with open(source, 'rb') as f:
+                data = f.read()
+            stem, ext = os.path.splitext(relative)
+            built = f"{BUILD_DIR}/{stem}.{fingerprint(data)}{ext}"
+            target = os.path.join(static_folder, built)
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            with open(target, 'wb') as f:
+                f.write(data)
+            if ext in COMPRESSIBLE:
+                variants = [('.gz', gzip.compress(data, compresslevel=9, mtime=0))]
+                if brotli is not None:
+                    variants.append(('.br', brotli.compress(data, quality=11)))
+                for suffix, compressed in variants:
+                    if len(compressed) < len(data):
+                        with open(target + suffix, 'wb') as f:
+                            f.write(compressed)
+            manifest[relative] = built
+    with open(os.path.join(build_root, 'manifest.json'), 'w') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    return manifest
+
+
+def load_manifest(static_folder):
+    try:
+        with open(os.path.join(static_folder, BUILD_DIR, 'manifest.json')) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def static_url(filename):
+    """URL of a static file: its fingerprinted build when one exists, the plain file otherwise."""
+    manifest = current_app.extensions.get('asset_manifest', {})
+    return url_for('static', filename=manifest.get(filename, filename))
+
+
+def inline_asset(filename):
+    """Contents of a static text file for inlining (read once per process)."""
+    cache = current_app.extensions.setdefault('inline_assets', {})
+    if filename not in cache:
+        with open(os.path.join(current_app.static_folder, filename), encoding='utf-8') as f:
+            cache[filename] = Markup(f.read())
+    return cache[filename]
+
+
+def serve_precompressed():
+    """
+    Serves build/ assets from their .br/.gz sibling when the client accepts it,
+    with immutable caching; the content hash in the name changes on every edit.
+    """
+    if request.endpoint != 'static':
+        return None
+    filename = (request.view_args or {}).get('filename', '')
+    if not filename.startswith(BUILD_DIR + '/'):
+        return None
+    accepted = request.accept_encodings
+    for encoding, suffix in (('br', '.br'), ('gzip', '.gz')):
+        if accepted[encoding] and os.path.isfile(os.path.join(current_app.static_folder, filename + suffix)):
+            response = send_from_directory(current_app.static_folder, filename + suffix,
+                                           mimetype=mimetype_of(filename), max_age=31536000)
+            response.headers['Content-Encoding'] = encoding
+            break
+    else:
+        response = send_from_directory(current_app.static_folder, filename, max_age=31536000)
+    response.headers['Cache-Control'] = IMMUTABLE
+    response.headers['Vary'] = 'Accept-Encoding'
+    return response
+
+
+def mimetype_of(filename):
+    return mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+
+
+def precompile_templates(app):
+    """Compiles every template once so the bytecode cache is warm. Returns how many were compiled."""
+    names = app.jinja_env.list_templates(extensions=('html',))
+    for name in names:
+        app.jinja_env.get_template(name)
+    return len(names)
+
+
+def init_assets(app):
+    app.jinja_env.globals.update(static_url=static_url, inline_asset=inline_asset)
+    app.extensions['asset_manifest'] = load_manifest(app.static_folder)
+    app.before_request(serve_precompressed)
+    cache_dir = app.config.get('TEMPLATE_BYTECODE_CACHE')
+    if cache_dir:
+        os.makedirs(cache_dir, exist_ok=True)
+        app.jinja_env.bytecode_cache = FileSystemBytecodeCache(cache_dir)
+        if app.config.get('PRECOMPILE_TEMPLATES', False):
+            precompile_templates(app)
+
+
+@click.command('build-assets')
+@with_appcontext
+def build_assets_command():
+    """Fingerprint and precompress static files, and warm the template bytecode cache."""
+    manifest = build_assets(current_app.static_folder)
+    current_app.extensions['asset_manifest'] = manifest
+    click.echo(f"Fingerprinted {len(manifest)} static files{'' if brotli else ' (gzip only; brotli not installed)'}.")
+    if current_app.jinja_env.bytecode_cache is not None:
+        click.echo(f"Precompiled {precompile_templates(current_app)} templates.")
@@ -0,0 +1,352 @@
+import atexit
+import json
+import queue
+import threading
+import time
+from datetime import datetime
+from flask import Blueprint, current_app, g, has_app_context, has_request_context, jsonify, request
+from flask_login import current_user
+from sqlalchemy import event, insert, inspect, select, tuple_
+from app import db
+from app.models import Room, Booking, Invoice, Guest, BookingService, AuditEvent
+from app.profiling import admin_required
+from app.sharding import PropertySession
+
+# Write-behind audit trail. Session hooks capture who changed which Room,
+# Booking, Invoice, Guest and BookingService columns (old and new values) while
+# the request's transaction flushes; on commit the events are handed to an
+# in-process AuditWriter and the request moves on. A daemon thread writes them
+# in batches - one multi-row INSERT into audit_event, or JSON lines appended to
+# a log file - so no request pays for audit inserts inside its own transaction.
+# A rolled-back transaction leaves no events.
+#
+# The queue is bounded (AUDIT_QUEUE_SIZE). When the writer falls behind,
+# AUDIT_OVERFLOW decides: 'block' waits up to AUDIT_BLOCK_TIMEOUT for room and
+# then drops, 'drop' drops at once, 'sync' writes the backlog in the committing
+# request (slow, but nothing is lost). Dropped events are counted in status().
+# Events still queued at interpreter exit are written by an atexit hook; a
+# killed process loses at most one queue's worth.
+#
+# Bulk statements (group check-out, status sweeps) are captured per statement:
+# an UPDATE by primary key gives one event per row with the new values, other
+# UPDATE/DELETEs one event with the statement and its parameters, bulk INSERTs
+# one event with the row count. Core statements on a raw connection (importer,
+# archive moves) are not seen.
+
+ENTITIES = {Room: 'room', Booking: 'booking', Invoice: 'invoice', Guest: 'guest', BookingService: 'booking_service'}
+OVERFLOW_POLICIES = ('block', 'drop', 'sync')
+QUERY_LIMIT = 100
+QUERY_MAX = 1000
+WRITE_RETRIES = 3
+
+bp = Blueprint('audit', __name__, url_prefix='/admin/audit')
+
+
+def _json_default(value):
+    return value.isoformat() if hasattr(value, 'isoformat') else str(value)
+
+
+class AuditWriter:
+    """
+    Bounded queue of audit events drained by a daemon writer thread in batches
+    of up to `batch_size`, every `interval` seconds or as soon as a full batch
+    is waiting. `sink(events)` does the writing; calls to it are serialized.
+    """
+
+    def __init__(self, sink, capacity=10000, batch_size=500, interval=1.0, overflow='block', block_timeout=0.05,
+                 background=True, logger=None):
+        if overflow not in OVERFLOW_POLICIES:
+            raise ValueError(f"Unknown audit overflow policy {overflow!r}; use one of {', '.join(OVERFLOW_POLICIES)}.")
+        self.sink = sink
+        self.batch_size = batch_size
+        self.interval = interval
+        self.overflow = overflow
+        self.block_timeout = block_timeout
+        self.background = background # False: nothing is written until flush() (tests, one-off scripts)
+        self.logger = logger
+        self.written = self.dropped = self.failed = self.batches = self.sync_writes = 0
+        self._queue = queue.Queue(capacity)
+        self._write_lock = threading.Lock()
+        self._start_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def submit(self, events):
+        for audit_event in events:
+            try:
+                self._queue.put_nowait(audit_event)
+            except queue.Full:
+                self._overflow(audit_event)
+        if self.background and not self.running:
+            self._start() # Lazily, so each forked worker starts its own thread
+
+    def _overflow(self, audit_event):
+        if self.overflow == 'block':
+            try:
+                self._queue.put(audit_event, timeout=self.block_timeout)
+            except queue.Full:
+                self.dropped += 1
+        elif self.overflow == 'sync':
+            self.sync_writes += 1
+            self.flush([audit_event])
+        else:
+            self.dropped += 1
+
+    def _start(self):
+        with self._start_lock:
+            if self.running:
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name='lux-audit-writer', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while not self._stop.is_set():
+            # Lets events gather for up to `interval`, so a burst of commits becomes one INSERT
+            if self._queue.qsize() < self.batch_size:
+                self._stop.wait(self.interval)
+            events = self._take(self.batch_size)
+            if events:
+                self._write(events)
+
+    def _take(self, limit):
+        events = []
+        while len(events) < limit:
+            try:
+                events.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return events
+
+    def _write(self, events):
+        for attempt in range(WRITE_RETRIES):
+            try:
+                with self._write_lock:
+                    self.sink(events)
+                    self.written += len(events)
+                    self.batches += 1
+                return
+            except Exception as e:
+                if self.logger is not None:
+                    self.logger.error(f"Writing {len(events)} audit events failed (attempt {attempt + 1}): {e}")
+                if attempt + 1 < WRITE_RETRIES:
+                    time.sleep(self.interval)
+        self.failed += len(events)
+
+    def flush(self, extra=()):
+        """Writes everything queued (plus `extra`) in the calling thread."""
+        events = list(extra) + self._take(self._queue.qsize() + 1)
+        while events:
+            batch, events = events[:self.batch_size], events[self.batch_size:]
+            self._write(batch)
+            events += self._take(self._queue.qsize())
+
+    def close(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.flush()
+
+    def status(self):
+        return {'running': self.running, 'queued': self._queue.qsize(), 'capacity': self._queue.maxsize,
+                'overflow': self.overflow, 'written': self.written, 'batches': self.batches,
+                'dropped': self.dropped, 'failed': self.failed, 'sync_writes': self.sync_writes}
+
+
+def table_sink(engine):
+    """Appends events to audit_event with one multi-row INSERT per batch, outside any request's transaction."""
+    def write(events):
+        rows = [{**e, 'changes': json.dumps(e['changes'], default=_json_default)} for e in events]
+        with engine.begin() as connection:
+            connection.execute(insert(AuditEvent.__table__), rows)
+    return write
+
+
+def file_sink(path):
+    """Appends events to `path` as JSON lines."""
+    def write(events):
+        with open(path, 'a', encoding='utf-8') as f:
+            f.writelines(json.dumps(e, default=_json_default) + '\n' for e in events)
+    return write
+
+
+def get_audit_writer():
+    """The app's AuditWriter, or None when AUDIT_ENABLED is off."""
+    return current_app.extensions.get('audit') if has_app_context() else None
+
+
+def init_audit(app):
+    # The query endpoints and user hook are always there; only capture depends on AUDIT_ENABLED
+    app.register_blueprint(bp)
+    app.before_request(remember_audit_user)
+    config = app.config
+    if not config.get('AUDIT_ENABLED', False):
+        return
+    if config.get('AUDIT_SINK', 'table') == 'file':
+        sink = file_sink(config['AUDIT_LOG_PATH'])
+    else:
+        sink = table_sink(db.engine)
+    writer = AuditWriter(sink, capacity=config.get('AUDIT_QUEUE_SIZE', 10000),
+                         batch_size=config.get('AUDIT_BATCH_SIZE', 500),
+                         interval=config.get('AUDIT_FLUSH_INTERVAL', 1.0),
+                         overflow=config.get('AUDIT_OVERFLOW', 'block'),
+                         block_timeout=config.get('AUDIT_BLOCK_TIMEOUT', 0.05), logger=app.logger)
+    app.extensions['audit'] = writer
+    atexit.register(writer.close)
+
+
+# --- Capture ---
+
+def remember_audit_user():
+    # Resolved before the view runs, so the flush hooks never load a user mid-flush
+    if get_audit_writer() is not None:
+        g.audit_user = (current_user.id, current_user.username) if current_user.is_authenticated else (None, None)
+
+
+def _event(session, entity, entity_id, action, changes, property_id=None):
+    user_id, username = (g.get('audit_user') if has_request_context() else None) or (None, None)
+    return {'entity': entity, 'entity_id': entity_id, 'action': action, 'user_id': user_id, 'username': username,
+            'property_id': property_id if property_id is not None else session.info.get('property_id'),
+            'changes': changes}
+
+
+def row_changes(obj, action):
+    """
+    {column: [old, new]} of an object being flushed, from attribute history.
+    Nothing is loaded: an old value that was never loaded (the column was set
+    on an expired object) is None.
+    """
+    state = inspect(obj)
+    changes = {}
+    for attr in state.mapper.column_attrs:
+        key = attr.key
+        if action == 'update':
+            history = state.attrs[key].history
+            if history.has_changes():
+                changes[key] = [history.deleted[0] if history.deleted else None,
+                                history.added[0] if history.added else None]
+        elif key in state.dict:
+            value = state.dict[key]
+            if value is not None:
+                changes[key] = [None, value] if action == 'insert' else [value, None]
+    return changes
+
+
+@event.listens_for(PropertySession, 'after_flush')
+def _capture_flushed_changes(session, flush_context):
+    if get_audit_writer() is None:
+        return
+    events = []
+    for action, objects in (('insert', session.new), ('update', session.dirty), ('delete', session.deleted)):
+        for obj in objects:
+            entity = ENTITIES.get(type(obj))
+            if entity is None:
+                continue
+            changes = row_changes(obj, action)
+            if changes:
+                events.append(_event(session, entity, obj.id, action, changes, getattr(obj, 'property_id', None)))
+    if events:
+        session.info.setdefault('audit_events', []).extend(events)
+
+
+@event.listens_for(PropertySession, 'do_orm_execute')
+def _capture_bulk_changes(state):
+    if not (state.is_update or state.is_delete or state.is_insert) or get_audit_writer() is None:
+        return
+    mapper = state.bind_mapper
+    entity = ENTITIES.get(mapper.class_) if mapper is not None else None
+    if entity is None:
+        return
+    session = state.session
+    action = 'update' if state.is_update else 'delete' if state.is_delete else 'insert'
+    params = state.parameters
+    if isinstance(params, list) and state.is_update: # UPDATE by primary key, one parameter set per row
+        events = [_event(session, entity, p.get('id'), action,
+                         {key: [None, value] for key, value in p.items() if key != 'id'}) for p in params]
+    elif isinstance(params, list) and state.is_insert:
+        events = [_event(session, entity, None, action, {'rows': len(params)})]
+    else:
+        compiled = state.statement.compile(bind=session.get_bind(mapper=mapper))
+        events = [_event(session, entity, None, action, {'statement': str(compiled), 'params': compiled.params})]
+    session.info.setdefault('audit_events', []).extend(events)
+
+
+@event.listens_for(PropertySession, 'after_commit')
+def _publish_audit_events(session):
+    events = session.info.pop('audit_events', None)
+    if events:
+        writer = get_audit_writer()
+        if writer is not None:
+            now = datetime.utcnow()
+            for audit_event in events:
+                audit_event['occurred_at'] = now
+            writer.submit(events)
+
+
+@event.listens_for(PropertySession, 'after_soft_rollback')
+def _discard_audit_events(session, previous_transaction):
+    session.info.pop('audit_events', None)
+
+
+# --- Query ---
+
+def audit_events(entity=None, entity_id=None, user_id=None, since=None, until=None, before=None, limit=None):
+    """
+    Audit events, newest first, off the (entity, entity_id, occurred_at) or
+    (user_id, occurred_at) index. `before` is the (occurred_at, id) of the last
+    event of the previous page.
+    """
+    query = select(AuditEvent)
+    if entity is not None:
+        query = query.where(AuditEvent.entity == entity)
+    if entity_id is not None:
+        query = query.where(AuditEvent.entity_id == entity_id)
+    if user_id is not None:
+        query = query.where(AuditEvent.user_id == user_id)
+    if since is not None:
+        query = query.where(AuditEvent.occurred_at >= since)
+    if until is not None:
+        query = query.where(AuditEvent.occurred_at < until)
+    if before is not None:
+        query = query.where(tuple_(AuditEvent.occurred_at, AuditEvent.id) < tuple_(*before))
+    limit = min(max(limit or QUERY_LIMIT, 1), QUERY_MAX)
+    rows = db.session.scalars(query.order_by(AuditEvent.occurred_at.desc(), AuditEvent.id.desc()).limit(limit)).all()
+    return [{'id': e.id, 'occurred_at': e.occurred_at.isoformat(), 'entity': e.entity, 'entity_id': e.entity_id,
+             'action': e.action, 'user_id': e.user_id, 'username': e.username, 'property_id': e.property_id,
+             'changes': json.loads(e.changes)} for e in rows]
+
+
+def _parse_time(value):
+    try:
+        return datetime.fromisoformat(value) if value else None
+    except ValueError:
+        return None
+
+
+@bp.route('/')
+@admin_required
+def audit_trail():
+    before = None
+    cursor = request.args.get('before', '')
+    if ',' in cursor:
+        at, _, event_id = cursor.rpartition(',')
+        if _parse_time(at) and event_id.isdigit():
+            before = (_parse_time(at), int(event_id))
+    events = audit_events(entity=request.args.get('entity') or None,
+                          entity_id=request.args.get('entity_id', type=int),
+                          user_id=request.args.get('user_id', type=int),
+                          since=_parse_time(request.args.get('since')), until=_parse_time(request.args.get('until')),
+                          before=before, limit=request.args.get('limit', type=int))
+    following = f"{events[-1]['occurred_at']},{events[-1]['id']}" if events else None
+    return jsonify(events=events, next=following)
+
+
+@bp.route('/status')
+@admin_required
+def audit_status():
+    writer = get_audit_writer()
+    return jsonify(writer.status() if writer is not None else {'enabled': False})
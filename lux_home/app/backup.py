@@ -0,0 +1,306 @@
+import gzip
+import hashlib
+import os
+import shutil
+import sqlite3
+import subprocess
+import tempfile
+import time
+from datetime import datetime
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+from sqlalchemy import event
+from app import db
+from app.scheduler import timed_run
+
+# Online backups of every configured database (the default one and each shard
+# bind). SQLite files are copied with the online backup API a few pages per
+# step, sleeping between steps. The files run in WAL mode (SQLITE_WAL), so the
+# backup can hold a read transaction for the whole copy: it reads one
+# consistent snapshot while check-ins and check-outs keep committing to the
+# WAL, and the copy never has to restart because of their writes. PostgreSQL databases are dumped with pg_dump (an MVCC snapshot, which
+# never blocks writers). Snapshots are written as
+# BACKUP_DIR/<database>-<UTC timestamp>.db.gz (or .pgdump) with a .sha256
+# sidecar, and the newest BACKUP_KEEP per database are kept.
+
+CHUNK_SIZE = 1024 * 1024
+STAMP_FORMAT = '%Y%m%dT%H%M%SZ'
+
+
+class BackupError(Exception):
+    pass
+
+
+class _Restarted(Exception):
+    """Raised from the backup progress callback to abandon a copy that keeps restarting."""
+
+
+def backup_targets():
+    """[(name, bind key, engine)] for the default database and every shard bind."""
+    return [(key or 'default', key, engine) for key, engine in db.engines.items()]
+
+
+def sqlite_path(engine):
+    path = engine.url.database
+    if engine.dialect.name != 'sqlite' or not path or path == ':memory:' or path.startswith('file:'):
+        return None
+    return path
+
+
+def copy_sqlite(source_path, dest_path, pages=None, step_sleep=None, max_restarts=None):
+    """
+    Copies a live SQLite database with the online backup API, `pages` pages per
+    step with `step_sleep` seconds between steps. In WAL mode the copy reads a
+    snapshot pinned by a read transaction. In rollback-journal mode a write by
+    another connection makes SQLite restart the copy; after `max_restarts`
+    restarts the rest is copied in one step instead, which holds off writers
+    for that step but always finishes. Returns (pages copied, restarts).
+    """
+    config = current_app.config
+    pages = pages or config.get('BACKUP_PAGES_PER_STEP', 256)
+    step_sleep = step_sleep if step_sleep is not None else config.get('BACKUP_STEP_SLEEP', 0.01)
+    max_restarts = max_restarts if max_restarts is not None else config.get('BACKUP_MAX_RESTARTS', 5)
+    restarts, last_remaining = 0, None
+
+    def throttle(status, remaining, total):
+        nonlocal restarts, last_remaining
+        if last_remaining is not None and remaining > last_remaining:
+            restarts += 1
+            if restarts > max_restarts:
+                raise _Restarted()
+        last_remaining = remaining
+        if remaining:
+            time.sleep(step_sleep) # No lock is held between steps
+
+    source = sqlite3.connect(source_path, timeout=30, isolation_level=None)
+    try:
+        if source.execute('PRAGMA journal_mode').fetchone()[0] == 'wal':
+            source.execute('BEGIN')
+            source.execute('SELECT count(*) FROM sqlite_master').fetchone() # Starts the read, pinning the snapshot
+        dest = sqlite3.connect(dest_path)
+        try:
+            try:
+                source.backup(dest, pages=pages, progress=throttle)
+            except _Restarted:
+                source.backup(dest, pages=-1)
+            total_pages = dest.execute('PRAGMA page_count').fetchone()[0]
+        finally:
+            dest.close()
+    finally:
+        source.close()
+    return total_pages, restarts
+
+
+def use_wal(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    cursor.execute('PRAGMA journal_mode=WAL') # Persistent in the file; readers and the backup no longer block writers
+    cursor.close()
+
+
+def init_backup(app):
+    if app.config.get('SQLITE_WAL', False):
+        for engine in db.engines.values():
+            if sqlite_path(engine):
+                event.listen(engine, 'connect', use_wal)
+
+
+def check_sqlite(path):
+    result = sqlite3.connect(path)
+    try:
+        problems = [row[0] for row in result.execute('PRAGMA integrity_check')]
+    finally:
+        result.close()
+    if problems != ['ok']:
+        raise BackupError(f"{path} failed the integrity check: {'; '.join(problems[:5])}")
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def write_checksum(path):
+    with open(f"{path}.sha256", 'w') as f:
+        f.write(f"{file_sha256(path)}  {os.path.basename(path)}\n") # sha256sum -c format
+
+
+def verify_checksum(path):
+    try:
+        with open(f"{path}.sha256") as f:
+            expected = f.read().split()[0]
+    except (OSError, IndexError):
+        raise BackupError(f"No checksum found for {path}.")
+    if file_sha256(path) != expected:
+        raise BackupError(f"{path} does not match its checksum.")
+
+
+def postgres_command(engine, *args):
+    """(argv, env) running a PostgreSQL client tool against the engine's database; the password goes via PGPASSWORD."""
+    url = engine.url.set(drivername='postgresql')
+    env = dict(os.environ)
+    if url.password:
+        env['PGPASSWORD'] = url.password
+    return [*args, '--dbname', url.set(password=None).render_as_string(hide_password=False)], env
+
+
+def backup_database(name, engine, directory, now=None):
+    """Writes one verified, compressed snapshot of the database; returns (path, pages copied or bytes dumped)."""
+    stamp = (now or datetime.utcnow()).strftime(STAMP_FORMAT)
+    os.makedirs(directory, exist_ok=True)
+    source_path = sqlite_path(engine)
+    if engine.dialect.name == 'postgresql':
+        path = os.path.join(directory, f"{name}-{stamp}.pgdump")
+        argv, env = postgres_command(engine, 'pg_dump', '--format=custom', '--compress=6', '--file', f"{path}.tmp")
+        subprocess.run(argv, env=env, check=True, capture_output=True)
+        os.replace(f"{path}.tmp", path)
+        size = os.path.getsize(path)
+    elif source_path:
+        path = os.path.join(directory, f"{name}-{stamp}.db.gz")
+        with tempfile.TemporaryDirectory(dir=directory) as tmp:
+            copy = os.path.join(tmp, 'snapshot.db')
+            size, _ = copy_sqlite(source_path, copy)
+            check_sqlite(copy)
+            with open(copy, 'rb') as src, gzip.open(f"{path}.tmp", 'wb', compresslevel=6) as dst:
+                shutil.copyfileobj(src, dst, CHUNK_SIZE)
+        os.replace(f"{path}.tmp", path) # Only complete snapshots ever carry the final name
+    else:
+        raise BackupError(f"Database {name} ({engine.url.render_as_string()}) cannot be backed up.")
+    write_checksum(path)
+    rotate_backups(directory, name)
+    return path, size
+
+
+def snapshot_time(filename, name):
+    """UTC time of a snapshot file of database `name`, or None for any other file."""
+    stamp, _, extension = filename[len(name) + 1:].partition('.')
+    if not filename.startswith(f"{name}-") or extension not in ('db.gz', 'pgdump'):
+        return None
+    try:
+        return datetime.strptime(stamp, STAMP_FORMAT)
+    except ValueError:
+        return None
+
+
+def list_backups(directory, name):
+    """Snapshots of one database, oldest first."""
+    if not os.path.isdir(directory):
+        return []
+    snapshots = [(snapshot_time(f, name), f) for f in os.listdir(directory)]
+    return [os.path.join(directory, f) for _, f in sorted(s for s in snapshots if s[0])]
+
+
+def rotate_backups(directory, name, keep=None):
+    keep = keep or current_app.config.get('BACKUP_KEEP', 14)
+    removed = list_backups(directory, name)[:-keep]
+    for path in removed:
+        os.remove(path)
+        if os.path.exists(f"{path}.sha256"):
+            os.remove(f"{path}.sha256")
+    return removed
+
+
+def run_backups(directory=None):
+    """Backs up every database in turn, recording a JobRun each; returns the snapshot paths."""
+    directory = directory or current_app.config.get('BACKUP_DIR')
+    paths = []
+    for name, _, engine in backup_targets():
+        if engine.dialect.name == 'sqlite' and not sqlite_path(engine):
+            continue # In-memory databases (tests) have nothing to back up
+        with timed_run('backup') as run:
+            path, run['rows'] = backup_database(name, engine, directory)
+        paths.append(path)
+    return paths
+
+
+def backup_job():
+    return len(run_backups())
+
+
+def verify_backup(path):
+    """Checks a snapshot's checksum and contents; returns the decompressed SQLite copy's path, or None for a dump."""
+    verify_checksum(path)
+    if path.endswith('.pgdump'):
+        result = subprocess.run(['pg_restore', '--list', path], capture_output=True)
+        if result.returncode:
+            raise BackupError(f"{path} is not a readable pg_dump archive.")
+        return None
+    fd, copy = tempfile.mkstemp(suffix='.db', dir=os.path.dirname(path) or '.')
+    try:
+        with os.fdopen(fd, 'wb') as dst, gzip.open(path, 'rb') as src:
+            shutil.copyfileobj(src, dst, CHUNK_SIZE)
+        check_sqlite(copy)
+    except Exception:
+        os.remove(copy)
+        raise
+    return copy
+
+
+def restore_backup(path, bind_key=None):
+    """
+    Verifies a snapshot, then restores it over the live database of `bind_key`.
+    SQLite is written through the backup API, so other connections wait for the
+    restore instead of reading a half-copied file. Pooled connections are
+    dropped afterwards.
+    """
+    engine = db.engines.get(bind_key)
+    if engine is None:
+        raise BackupError(f"No database is bound to {bind_key!r}.")
+    if path.endswith('.pgdump') != (engine.dialect.name == 'postgresql'):
+        raise BackupError(f"{os.path.basename(path)} is not a backup of a {engine.dialect.name} database.")
+    copy = verify_backup(path)
+    db.session.remove()
+    if copy is None:
+        argv, env = postgres_command(engine, 'pg_restore', '--clean', '--if-exists', '--single-transaction',
+                                     '--no-owner', path)
+        subprocess.run(argv, env=env, check=True, capture_output=True)
+    else:
+        target = sqlite_path(engine)
+        if target is None:
+            os.remove(copy)
+            raise BackupError(f"Database {bind_key or 'default'} is not a SQLite file.")
+        try:
+            snapshot, live = sqlite3.connect(copy), sqlite3.connect(target, timeout=30)
+            try:
+                snapshot.backup(live)
+            finally:
+                live.close()
+                snapshot.close()
+        finally:
+            os.remove(copy)
+    engine.dispose()
+
+
+@click.command('backup')
+@click.option('--dir', 'directory', default=None, help='Where to write snapshots (default BACKUP_DIR).')
+@with_appcontext
+def backup_command(directory):
+    """Take an online snapshot of every database."""
+    for path in run_backups(directory):
+        click.echo(f"Wrote {path} ({os.path.getsize(path) / 1024:.0f} KiB).")
+
+
+@click.command('restore-backup')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--bind', 'bind_key', default=None, help='Shard bind key to restore into (default: the default database).')
+@click.option('--check', is_flag=True, help='Only verify the snapshot.')
+@click.option('--yes', is_flag=True, help='Do not ask for confirmation.')
+@with_appcontext
+def restore_backup_command(path, bind_key, check, yes):
+    """Verify a snapshot and restore it over the live database."""
+    try:
+        if check:
+            copy = verify_backup(path)
+            if copy:
+                os.remove(copy)
+            click.echo(f"{path} is intact.")
+            return
+        if not yes:
+            click.confirm(f"Replace database {bind_key or 'default'} with {os.path.basename(path)}?", abort=True)
+        restore_backup(path, bind_key)
+    except BackupError as e:
+        raise click.ClickException(str(e))
+    click.echo(f"Restored {bind_key or 'default'} from {path}.")
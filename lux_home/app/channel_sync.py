@@ -0,0 +1,479 @@
+import http.client
+import json
+import threading
+import time
+from contextlib import nullcontext
+from datetime import datetime, date, timedelta
+from urllib.parse import urlsplit
+import click
+from flask import current_app, has_app_context
+from flask.cli import with_appcontext
+from sqlalchemy import select, insert, update, delete, event, inspect
+from app import db
+from app.models import Booking, Room, Property, ChannelSyncMark, ChannelAvailability, ChannelPush
+from app.reservations import blocks_room
+from app.scheduler import job_scopes
+from app.sharding import PropertySession, property_scope
+
+# Availability push to the channel manager (the OTAs' rate-and-availability
+# hub). Every change that can move availability - bookings and reservations
+# created, checked in, checked out or moved, rooms added or taken out of
+# service - writes a ChannelSyncMark with the affected dates in the same
+# transaction. The worker's channel-sync job picks the marks up once the oldest
+# is CHANNEL_SYNC_WINDOW seconds old, so a burst (a group check-out, a busy
+# morning) goes out as one push. It recomputes availability per room type and
+# date for the marked dates only, compares it with what was last pushed
+# (ChannelAvailability) and sends just the cells that differ, as date ranges:
+#
+#   POST CHANNEL_SYNC_URL
+#   {"property": "MAIN", "updates": [{"room_type": "Suite", "from": "2024-05-01", "to": "2024-05-03", "available": 2}]}
+#
+# ("to" is inclusive), at most CHANNEL_SYNC_BATCH_SIZE ranges per request,
+# over keep-alive connections. Each request is recorded as a ChannelPush with
+# its latency and payload size. Nothing is marked or pushed unless
+# CHANNEL_SYNC_URL is set.
+
+MARK_BATCH_SIZE = 10000
+STALE_CONNECTION_ERRORS = (ConnectionResetError, BrokenPipeError) # http.client.RemoteDisconnected included
+
+
+class ChannelSyncError(Exception):
+    pass
+
+
+class ChannelClient:
+    """
+    Keeps up to `size` idle keep-alive HTTP(S) connections to the channel
+    manager and posts JSON over them, so a push of many batches opens one
+    connection instead of one per request. A reused connection that the server
+    closed in the meantime is dropped and the request sent once more on a new
+    one; a push sets absolute values, so repeating it is harmless.
+    """
+
+    def __init__(self, url, token=None, timeout=10, size=2):
+        parts = urlsplit(url)
+        self.connection_class = http.client.HTTPSConnection if parts.scheme == 'https' else http.client.HTTPConnection
+        self.host = parts.hostname
+        self.port = parts.port
+        self.path = (parts.path or '/') + (f"?{parts.query}" if parts.query else '')
+        self.token = token
+        self.timeout = timeout
+        self.size = size
+        self._idle = []
+        self._lock = threading.Lock()
+        self.opened = 0 # Connections opened over the client's lifetime
+
+    def _checkout(self):
+        """(connection, reused)"""
+        with self._lock:
+            if self._idle:
+                return self._idle.pop(), True
+        self.opened += 1
+        return self.connection_class(self.host, self.port, timeout=self.timeout), False
+
+    def _release(self, conn):
+        with self._lock:
+            if len(self._idle) < self.size:
+                self._idle.append(conn)
+                return
+        conn.close()
+
+    def post_json(self, payload):
+        """Posts one JSON document; returns (HTTP status, response body, latency in ms, request bytes)."""
+        body = json.dumps(payload, separators=(',', ':')).encode()
+        headers = {'Content-Type': 'application/json'}
+        if self.token:
+            headers['Authorization'] = f"Bearer {self.token}"
+        while True:
+            conn, reused = self._checkout()
+            started = time.perf_counter()
+            try:
+                conn.request('POST', self.path, body, headers)
+                response = conn.getresponse()
+                data = response.read()
+            except STALE_CONNECTION_ERRORS:
+                conn.close()
+                if reused:
+                    continue
+                raise
+            except BaseException:
+                conn.close()
+                raise
+            latency_ms = (time.perf_counter() - started) * 1000
+            if response.will_close:
+                conn.close()
+            else:
+                self._release(conn)
+            return response.status, data, latency_ms, len(body)
+
+    def close_all(self):
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for conn in idle:
+            conn.close()
+
+
+def get_channel_client():
+    """The app's ChannelClient, created from the CHANNEL_SYNC_* settings on first use."""
+    client = current_app.extensions.get('channel_client')
+    if client is None:
+        config = current_app.config
+        client = current_app.extensions.setdefault('channel_client', ChannelClient(
+            config['CHANNEL_SYNC_URL'], token=config.get('CHANNEL_SYNC_TOKEN'),
+            timeout=config.get('CHANNEL_SYNC_TIMEOUT', 10), size=config.get('CHANNEL_SYNC_POOL_SIZE', 2),
+        ))
+    return client
+
+
+def sync_enabled():
+    return has_app_context() and bool(current_app.config.get('CHANNEL_SYNC_URL'))
+
+
+def _as_date(value):
+    return value.date() if isinstance(value, datetime) else value
+
+
+def stay_dates(check_in, check_out):
+    """[first night, day after the last night) a stay holds; an open-ended stay holds on to the horizon (end None)."""
+    start = _as_date(check_in)
+    if check_out is None:
+        return start, None
+    return start, max(_as_date(check_out), start + timedelta(days=1))
+
+
+# --- Change capture ---
+
+BOOKING_FIELDS = ('room_id', 'check_in_date', 'check_out_date', 'is_active', 'is_reservation')
+
+
+def _before_flush_value(obj, name):
+    history = inspect(obj).attrs[name].history
+    return history.deleted[0] if history.deleted else getattr(obj, name)
+
+
+def _pending_value(obj, name):
+    """The attribute's value, or the column default it will be inserted with (e.g. a new booking's is_active)."""
+    value = getattr(obj, name)
+    default = obj.__table__.c[name].default
+    if value is None and default is not None and default.is_scalar:
+        return default.arg
+    return value
+
+
+def _booking_marks(obj, property_id, is_new, is_deleted):
+    """Marks for the dates a booking held before this flush and holds after it, if anything relevant changed."""
+    now = {name: _pending_value(obj, name) for name in BOOKING_FIELDS}
+    before = now if is_new else {name: _before_flush_value(obj, name) for name in BOOKING_FIELDS}
+    if not (is_new or is_deleted) and before == now:
+        return []
+    states = ([] if is_new else [before]) + ([] if is_deleted else [now])
+    return [(property_id, state['room_id'], None, *stay_dates(state['check_in_date'], state['check_out_date']))
+            for state in states if state['is_active'] or state['is_reservation']]
+
+
+def _room_marks(obj, property_id, is_new, is_deleted, today):
+    """A room added, removed, retyped or moved in or out of maintenance changes its type's inventory from today."""
+    if is_new or is_deleted:
+        return [(property_id, None, obj.room_type, today, None)]
+    old_type, old_status = _before_flush_value(obj, 'room_type'), _before_flush_value(obj, 'status')
+    if old_type == obj.room_type and (old_status == 'maintenance') == (obj.status == 'maintenance'):
+        return []
+    return [(property_id, None, room_type, today, None) for room_type in {old_type, obj.room_type}]
+
+
+@event.listens_for(PropertySession, 'before_flush')
+def _mark_availability_changes(session, flush_context, instances):
+    if not sync_enabled():
+        return
+    today = datetime.utcnow().date()
+    marks = []
+    for objects, is_new, is_deleted in ((session.new, True, False), (session.dirty, False, False),
+                                        (session.deleted, False, True)):
+        for obj in objects:
+            if isinstance(obj, (Booking, Room)):
+                property_id = obj.property_id if obj.property_id is not None else session.info.get('property_id')
+                if isinstance(obj, Booking):
+                    marks += _booking_marks(obj, property_id, is_new, is_deleted)
+                else:
+                    marks += _room_marks(obj, property_id, is_new, is_deleted, today)
+    for property_id, room_id, room_type, start, end in set(marks):
+        session.add(ChannelSyncMark(property_id=property_id, room_id=room_id, room_type=room_type,
+                                    start_date=start, end_date=end))
+
+
+def mark_changed(marks):
+    """
+    Records [(property_id, room_id, room_type, start date, end date or None)]
+    in the current transaction, for bulk statements that bypass the session hooks.
+    """
+    if not marks or not sync_enabled():
+        return
+    now = datetime.utcnow()
+    db.session.execute(insert(ChannelSyncMark), [
+        {'property_id': property_id, 'room_id': room_id, 'room_type': room_type, 'start_date': start,
+         'end_date': end, 'created_at': now} for property_id, room_id, room_type, start, end in set(marks)])
+
+
+# --- Availability ---
+
+def _same_property(column, property_id):
+    return column.is_(None) if property_id is None else column == property_id
+
+
+def room_type_availability(property_id, room_type, start, end):
+    """Rooms of the type free on each date of [start, end): sellable rooms minus the stays holding them."""
+    rooms = (Room.room_type == room_type, Room.status != 'maintenance', _same_property(Room.property_id, property_id))
+    sellable = db.session.scalar(select(db.func.count(Room.id)).where(*rooms))
+    stays = db.session.execute(
+        select(Booking.check_in_date, Booking.check_out_date).join(Room, Room.id == Booking.room_id)
+        .where(*rooms, blocks_room(), Booking.check_in_date < datetime.combine(end, datetime.min.time()),
+               (Booking.check_out_date.is_(None)) | (Booking.check_out_date > datetime.combine(start, datetime.min.time())))
+    ).all()
+    days = (end - start).days
+    held = [0] * (days + 1) # Difference array: +1 where a stay starts holding, -1 where it lets go
+    for check_in, check_out in stays:
+        first, last = stay_dates(check_in, check_out)
+        first, last = max(first, start), min(last or end, end)
+        if first < last:
+            held[(first - start).days] += 1
+            held[(last - start).days] -= 1
+    available, running = {}, 0
+    for offset in range(days):
+        running += held[offset]
+        available[start + timedelta(days=offset)] = max(sellable - running, 0)
+    return available
+
+
+def coalesce(marks, room_types, today, horizon):
+    """Marked dates as merged [start, end) spans per (property_id, room type), clipped to [today, horizon)."""
+    spans = {}
+    for property_id, room_id, room_type, start, end in marks:
+        room_type = room_type or room_types.get(room_id)
+        start, end = max(start, today), min(end or horizon, horizon)
+        if room_type is not None and start < end:
+            spans.setdefault((property_id, room_type), []).append((start, end))
+    merged = {}
+    for key, ranges in spans.items():
+        ranges.sort()
+        out = [list(ranges[0])]
+        for start, end in ranges[1:]:
+            if start <= out[-1][1]:
+                out[-1][1] = max(out[-1][1], end)
+            else:
+                out.append([start, end])
+        merged[key] = [tuple(span) for span in out]
+    return merged
+
+
+def changed_cells(spans):
+    """{(property_id, room type): {date: (availability, ChannelAvailability id or None)}} for cells that differ from the last push."""
+    changed = {}
+    for (property_id, room_type), ranges in spans.items():
+        start, end = ranges[0][0], ranges[-1][1]
+        current = room_type_availability(property_id, room_type, start, end)
+        pushed = {row.date: (row.id, row.available) for row in db.session.execute(
+            select(ChannelAvailability.id, ChannelAvailability.date, ChannelAvailability.available)
+            .where(_same_property(ChannelAvailability.property_id, property_id),
+                   ChannelAvailability.room_type == room_type,
+                   ChannelAvailability.date >= start, ChannelAvailability.date < end))}
+        cells = {}
+        for span_start, span_end in ranges:
+            for offset in range((span_end - span_start).days):
+                day = span_start + timedelta(days=offset)
+                row_id, last = pushed.get(day, (None, None))
+                if current[day] != last:
+                    cells[day] = (current[day], row_id)
+        if cells:
+            changed[(property_id, room_type)] = cells
+    return changed
+
+
+def date_ranges(room_type, cells):
+    """Consecutive dates with the same availability folded into one {"from", "to"} update."""
+    updates = []
+    for day in sorted(cells):
+        available = cells[day][0]
+        last = updates[-1] if updates else None
+        if last and last['room_type'] == room_type and last['available'] == available \
+                and date.fromisoformat(last['to']) + timedelta(days=1) == day:
+            last['to'] = day.isoformat()
+            last['_days'].append(day)
+        else:
+            updates.append({'room_type': room_type, 'from': day.isoformat(), 'to': day.isoformat(),
+                            'available': available, '_days': [day]})
+    return updates
+
+
+# --- Pushing ---
+
+def push_updates(property_id, changed, now):
+    """
+    Sends one property's changed cells in batches and records what each batch
+    pushed as soon as it is acknowledged. Raises ChannelSyncError on a failed
+    request (after recording it). Returns the cells pushed.
+    """
+    batch_size = current_app.config.get('CHANNEL_SYNC_BATCH_SIZE', 200)
+    updates = [update for room_type, cells in sorted(changed.items()) for update in date_ranges(room_type, cells)]
+    prop = db.session.get(Property, property_id) if property_id is not None else None
+    client = get_channel_client()
+    pushed = 0
+    for offset in range(0, len(updates), batch_size):
+        batch = updates[offset:offset + batch_size]
+        payload = {'property': prop.code if prop else None,
+                   'updates': [{k: v for k, v in u.items() if k != '_days'} for u in batch]}
+        cells = sum(len(u['_days']) for u in batch)
+        record = ChannelPush(property_id=property_id, pushed_at=now, updates=len(batch), cells=cells)
+        db.session.add(record)
+        try:
+            record.status, body, record.latency_ms, record.payload_bytes = client.post_json(payload)
+        except (OSError, http.client.HTTPException) as e:
+            error = ChannelSyncError(f"Push to the channel manager failed: {e!r}")
+        else:
+            error = None if 200 <= record.status < 300 else ChannelSyncError(
+                f"Channel manager answered {record.status}: {body[:200].decode(errors='replace')}")
+        if error is not None:
+            record.error = str(error)
+            db.session.commit()
+            raise error
+        known, new = [], []
+        for u in batch:
+            for day in u['_days']:
+                available, row_id = changed[u['room_type']][day]
+                if row_id is None:
+                    new.append({'property_id': property_id, 'room_type': u['room_type'], 'date': day,
+                                'available': available, 'pushed_at': now})
+                else:
+                    known.append({'id': row_id, 'available': available, 'pushed_at': now})
+        if known:
+            db.session.execute(update(ChannelAvailability), known)
+        if new:
+            db.session.execute(insert(ChannelAvailability), new)
+        db.session.commit() # Per batch: a later failure must not forget what already went out
+        pushed += cells
+    return pushed
+
+
+def sync_availability(now=None, force=False):
+    """
+    Pushes the availability that changed in the active scope. Does nothing
+    until the oldest pending mark is CHANNEL_SYNC_WINDOW seconds old (unless
+    forced), so the marks of a burst are coalesced into one push. Marks are
+    deleted once their cells went out. Returns the cells pushed.
+    """
+    config = current_app.config
+    now = now or datetime.utcnow()
+    marks = db.session.execute(
+        select(ChannelSyncMark.id, ChannelSyncMark.property_id, ChannelSyncMark.room_id, ChannelSyncMark.room_type,
+               ChannelSyncMark.start_date, ChannelSyncMark.end_date, ChannelSyncMark.created_at)
+        .order_by(ChannelSyncMark.id).limit(MARK_BATCH_SIZE)).all()
+    if not marks:
+        return 0
+    if not force and min(m.created_at for m in marks) > now - timedelta(seconds=config.get('CHANNEL_SYNC_WINDOW', 5)):
+        return 0
+    today = now.date()
+    horizon = today + timedelta(days=config.get('CHANNEL_SYNC_HORIZON_DAYS', 365))
+    room_ids = {m.room_id for m in marks if m.room_id is not None}
+    room_types = dict(db.session.execute(select(Room.id, Room.room_type).where(Room.id.in_(room_ids))).all()) \
+        if room_ids else {}
+    spans = coalesce([tuple(m)[1:6] for m in marks], room_types, today, horizon)
+    by_property = {}
+    for (property_id, room_type), cells in changed_cells(spans).items():
+        by_property.setdefault(property_id, {})[room_type] = cells
+    pushed = 0
+    for property_id, changed in by_property.items():
+        pushed += push_updates(property_id, changed, now)
+    # Only the marks read above: ids are not committed in order, so a lower one may have appeared since
+    consumed = delete(ChannelSyncMark).where(ChannelSyncMark.id.in_([m.id for m in marks]))
+    expired = delete(ChannelAvailability).where(ChannelAvailability.date < today)
+    property_id = db.session.info.get('property_id')
+    if property_id is not None:
+        expired = expired.where(ChannelAvailability.property_id == property_id)
+    db.session.execute(consumed, execution_options={'synchronize_session': False})
+    db.session.execute(expired, execution_options={'synchronize_session': False})
+    db.session.commit()
+    return pushed
+
+
+def mark_all(horizon_start=None):
+    """Marks every room type of the active scope over the whole horizon and forgets what was pushed (full resync)."""
+    today = horizon_start or datetime.utcnow().date()
+    forget = delete(ChannelAvailability)
+    property_id = db.session.info.get('property_id')
+    if property_id is not None:
+        forget = forget.where(ChannelAvailability.property_id == property_id)
+    db.session.execute(forget, execution_options={'synchronize_session': False})
+    types = db.session.execute(select(Room.property_id, Room.room_type).distinct()).all()
+    mark_changed([(prop_id, None, room_type, today, None) for prop_id, room_type in types])
+    db.session.commit()
+    return len(types)
+
+
+def retry_delay(failures):
+    """Backoff for a scope whose push failed: the job interval doubled per consecutive failure, capped."""
+    config = current_app.config
+    return min(config.get('CHANNEL_SYNC_INTERVAL', 2) * 2 ** failures, config.get('CHANNEL_SYNC_RETRY_MAX', 300))
+
+
+def channel_sync_job(now=None):
+    """
+    Scheduler job: syncs every scope. A scope whose push failed is skipped, with
+    backoff, until its retry time; its marks stay queued meanwhile.
+    """
+    backoff = current_app.extensions.setdefault('channel_sync_backoff', {}) # scope -> (failures, retry at)
+    pushed = 0
+    for scope in job_scopes():
+        failures, retry_at = backoff.get(scope, (0, 0.0))
+        if time.monotonic() < retry_at:
+            continue
+        with property_scope(scope) if scope is not None else nullcontext():
+            try:
+                pushed += sync_availability(now)
+            except ChannelSyncError as e:
+                db.session.rollback()
+                backoff[scope] = (failures + 1, time.monotonic() + retry_delay(failures))
+                current_app.logger.warning(f"Channel sync for {scope or 'the default database'} failed: {e}")
+            else:
+                backoff.pop(scope, None)
+    return pushed
+
+
+def percentile(values, fraction):
+    return values[min(len(values) - 1, int(len(values) * fraction))] if values else None
+
+
+def channel_sync_stats(since=None, limit=1000):
+    """Push count, failures, latency percentiles (ms) and payload sizes (bytes) of the last `limit` pushes."""
+    query = select(ChannelPush.latency_ms, ChannelPush.payload_bytes, ChannelPush.cells, ChannelPush.error)
+    if since is not None:
+        query = query.where(ChannelPush.pushed_at >= since)
+    rows = db.session.execute(query.order_by(ChannelPush.id.desc()).limit(limit)).all()
+    ok = [row for row in rows if row.error is None]
+    latencies = sorted(row.latency_ms for row in ok)
+    sizes = [row.payload_bytes for row in ok]
+    return {
+        'pushes': len(rows), 'failures': len(rows) - len(ok), 'cells': sum(row.cells for row in ok),
+        'latency_ms': {'p50': percentile(latencies, 0.5), 'p95': percentile(latencies, 0.95),
+                       'max': latencies[-1] if latencies else None},
+        'payload_bytes': {'avg': round(sum(sizes) / len(sizes)) if sizes else None,
+                          'max': max(sizes) if sizes else None, 'total': sum(sizes)},
+        'pending_marks': db.session.scalar(select(db.func.count(ChannelSyncMark.id))),
+    }
+
+
+@click.command('channel-sync')
+@click.option('--full', is_flag=True, help='Push the whole horizon again, not just what changed.')
+@with_appcontext
+def channel_sync_command(full):
+    """Push changed room availability to the channel manager now."""
+    if not current_app.config.get('CHANNEL_SYNC_URL'):
+        raise click.ClickException('CHANNEL_SYNC_URL is not set.')
+    pushed = 0
+    try:
+        for scope in job_scopes():
+            with property_scope(scope) if scope is not None else nullcontext():
+                if full:
+                    mark_all()
+                pushed += sync_availability(force=True)
+    except ChannelSyncError as e:
+        raise click.ClickException(str(e))
+    click.echo(f"Pushed {pushed} room type/date cells.")
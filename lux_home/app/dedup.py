@@ -0,0 +1,235 @@
+import re
+from collections import defaultdict
+from difflib import SequenceMatcher
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+from sqlalchemy import select, update, delete, case
+from app import db
+from app.models import Guest, Booking, ArchivedBooking, Invoice, ArchivedInvoice
+from app.guest_stats import merge_stats
+from app.scheduler import timed_run, run_per_scope
+from app.search import search_index, doc_id, guest_documents, stay_documents, write_documents
+
+# Guest deduplication. Guests are bucketed by blocking keys (normalized email,
+# phone digits, name soundex) and only guests sharing a bucket are compared,
+# so the work grows with the bucket sizes instead of n^2. Pairs scoring above
+# DEDUP_MATCH_THRESHOLD are clustered and each cluster is merged into its oldest
+# guest: bookings (live and archived, on every shard) are repointed with bulk
+# UPDATEs and the duplicates deleted.
+
+MAX_BLOCK_SIZE = 50 # Larger buckets (common names) are too vague to compare exhaustively
+MERGE_BATCH_SIZE = 1000
+SOUNDEX_CODES = {**dict.fromkeys('bfpv', '1'), **dict.fromkeys('cgjkqsxz', '2'), **dict.fromkeys('dt', '3'),
+                 'l': '4', **dict.fromkeys('mn', '5'), 'r': '6'}
+
+
+def normalize_email(email):
+    """Lowercased, without a +tag in the local part: 'Ann.Lee+spa@X.com' -> 'ann.lee@x.com'."""
+    local, _, domain = (email or '').strip().lower().partition('@')
+    return f"{local.split('+', 1)[0]}@{domain}" if domain else local or None
+
+
+def phone_key(phone):
+    """Last nine digits, which drops country codes and formatting; None for numbers too short to trust."""
+    digits = re.sub(r'\D', '', phone or '')
+    return digits[-9:] if len(digits) >= 7 else None
+
+
+def normalize_name(name):
+    return ' '.join(re.findall(r'[a-z]+', (name or '').lower()))
+
+
+def soundex(word):
+    word = re.sub(r'[^a-z]', '', word.lower())
+    if not word:
+        return ''
+    code, last = word[0].upper(), SOUNDEX_CODES.get(word[0])
+    for char in word[1:]:
+        digit = SOUNDEX_CODES.get(char)
+        if digit and digit != last:
+            code += digit
+            if len(code) == 4:
+                break
+        if char not in 'hw': # h and w do not separate equal codes
+            last = digit
+    return code.ljust(4, '0')
+
+
+def blocking_keys(name, email, phone):
+    keys = []
+    if email:
+        keys.append(('email', email))
+    if phone:
+        keys.append(('phone', phone))
+    words = name.split()
+    if words:
+        keys.append(('name', soundex(words[-1]), words[0][0])) # Surname sound plus first initial
+    return keys
+
+
+def is_typo(a, b):
+    """
+    True when two strings differ only in one spot of at most two characters: a
+    wrong, missing, extra or swapped letter. Cheaper than an edit distance and
+    enough for email addresses typed at a desk.
+    """
+    if abs(len(a) - len(b)) > 2:
+        return False
+    shortest = min(len(a), len(b))
+    prefix = 0
+    while prefix < shortest and a[prefix] == b[prefix]:
+        prefix += 1
+    suffix = 0
+    while suffix < shortest - prefix and a[-1 - suffix] == b[-1 - suffix]:
+        suffix += 1
+    return max(len(a), len(b)) - prefix - suffix <= 2
+
+
+def match_score(a, b):
+    """
+    0..1+ likelihood that two normalized guest records (name, email, phone) are
+    the same person. Contact details carry the weight: without a matching or
+    near-matching email or phone the score is 0, since a name alone is never
+    enough, and the (costlier) name comparison is skipped.
+    """
+    score = 0.0
+    if a[1] and a[1] == b[1]:
+        score += 0.6
+    elif a[1] and b[1] and is_typo(a[1], b[1]):
+        score += 0.4
+    if a[2] and a[2] == b[2]:
+        score += 0.45 # Shared by households, so it also needs a close name
+    if not score:
+        return 0.0
+    return score + 0.4 * SequenceMatcher(None, a[0], b[0]).ratio()
+
+
+def find_duplicates(threshold=None, batch_size=10000):
+    """
+    Returns [(survivor_id, [duplicate ids])], one entry per cluster of guests
+    matching each other (transitively) at or above the threshold.
+    """
+    threshold = threshold if threshold is not None else current_app.config.get('DEDUP_MATCH_THRESHOLD', 0.8)
+    records, blocks = {}, defaultdict(list)
+    rows = db.session.execute(select(Guest.id, Guest.name, Guest.email, Guest.phone)
+                              .execution_options(yield_per=batch_size))
+    for guest_id, name, email, phone in rows:
+        record = (normalize_name(name), normalize_email(email), phone_key(phone))
+        records[guest_id] = record
+        for key in blocking_keys(*record):
+            blocks[key].append(guest_id)
+
+    parent = {}
+
+    def root(guest_id):
+        while parent.get(guest_id, guest_id) != guest_id:
+            parent[guest_id] = guest_id = parent.get(parent[guest_id], parent[guest_id])
+        return guest_id
+
+    compared = set()
+    for ids in blocks.values():
+        if len(ids) < 2 or len(ids) > MAX_BLOCK_SIZE:
+            continue
+        for i, a in enumerate(ids):
+            for b in ids[i + 1:]:
+                if (a, b) in compared:
+                    continue
+                compared.add((a, b))
+                if match_score(records[a], records[b]) >= threshold:
+                    ra, rb = root(a), root(b)
+                    if ra != rb:
+                        parent[max(ra, rb)] = min(ra, rb) # The oldest guest survives
+
+    clusters = defaultdict(list)
+    for guest_id in parent:
+        survivor = root(guest_id)
+        if survivor != guest_id:
+            clusters[survivor].append(guest_id)
+    return sorted((survivor, sorted(duplicates)) for survivor, duplicates in clusters.items())
+
+
+def _repoint(model, survivor_by_guest):
+    """Bulk-repoints model.guest_id in batches with one CASE per UPDATE; returns the rows changed."""
+    changed = 0
+    duplicate_ids = list(survivor_by_guest)
+    for start in range(0, len(duplicate_ids), MERGE_BATCH_SIZE):
+        batch = {guest_id: survivor_by_guest[guest_id] for guest_id in duplicate_ids[start:start + MERGE_BATCH_SIZE]}
+        result = db.session.execute(update(model).where(model.guest_id.in_(batch))
+                                    .values(guest_id=case(batch, value=model.guest_id)),
+                                    execution_options={'synchronize_session': False})
+        changed += result.rowcount
+    return changed
+
+
+def repoint_bookings(survivor_by_guest):
+    """Moves the active scope's live and archived stays to the surviving guests and reindexes them."""
+    changed = _repoint(Booking, survivor_by_guest) + _repoint(ArchivedBooking, survivor_by_guest)
+    survivors = list(set(survivor_by_guest.values()))
+    for booking_model, invoice_model in ((Booking, Invoice), (ArchivedBooking, ArchivedInvoice)):
+        for start in range(0, len(survivors), MERGE_BATCH_SIZE):
+            documents = stay_documents(db.session, booking_model, invoice_model,
+                                       booking_model.guest_id.in_(survivors[start:start + MERGE_BATCH_SIZE]))
+            write_documents(db.session.connection(bind_arguments={'mapper': Booking.__mapper__}),
+                            [document['rowid'] for document in documents], documents)
+    db.session.commit()
+    return changed
+
+
+def delete_merged_guests(clusters):
+    """
+    Fills survivors' missing phone numbers and adds their duplicates' lifetime
+    stats to theirs, then deletes the duplicates.
+    """
+    ids = [guest_id for survivor, duplicates in clusters for guest_id in [survivor] + duplicates]
+    phones = dict(db.session.execute(select(Guest.id, Guest.phone).where(Guest.id.in_(ids))).all())
+    for survivor, duplicates in clusters:
+        if not phones.get(survivor):
+            phone = next((phones[d] for d in duplicates if phones.get(d)), None)
+            if phone:
+                db.session.execute(update(Guest).where(Guest.id == survivor).values(phone=phone),
+                                   execution_options={'synchronize_session': False})
+    merge_stats(clusters)
+    duplicate_ids = [guest_id for _, duplicates in clusters for guest_id in duplicates]
+    for start in range(0, len(duplicate_ids), MERGE_BATCH_SIZE):
+        batch = duplicate_ids[start:start + MERGE_BATCH_SIZE]
+        db.session.execute(delete(Guest).where(Guest.id.in_(batch)), execution_options={'synchronize_session': False})
+        db.session.execute(delete(search_index).where(search_index.c.rowid.in_([doc_id('guest', g) for g in batch])))
+    survivors = [survivor for survivor, _ in clusters]
+    documents = guest_documents(db.session, survivors)
+    write_documents(db.session.connection(), [doc_id('guest', s) for s in survivors], documents)
+    db.session.commit()
+    db.session.expunge_all() # Merged guests may still be in the identity map
+    return len(duplicate_ids)
+
+
+def dedup_guests(threshold=None, dry_run=False):
+    """
+    Finds and merges duplicate guests. Stays are repointed on every database
+    before the duplicates are deleted, so an interrupted run leaves duplicates
+    without stays, which the next run finds and removes again.
+    """
+    with timed_run('dedup-guests') as run:
+        clusters = find_duplicates(threshold)
+        stats = {'clusters': len(clusters), 'merged': sum(len(duplicates) for _, duplicates in clusters),
+                 'bookings': 0}
+        if dry_run or not clusters:
+            return stats, clusters
+        survivor_by_guest = {guest_id: survivor for survivor, duplicates in clusters for guest_id in duplicates}
+        stats['bookings'] = run_per_scope('dedup-guests-repoint', lambda: repoint_bookings(survivor_by_guest))
+        run['rows'] = delete_merged_guests(clusters)
+    return stats, clusters
+
+
+@click.command('dedup-guests')
+@click.option('--threshold', type=float, default=None, help='Minimum pair score to merge (default DEDUP_MATCH_THRESHOLD).')
+@click.option('--dry-run', is_flag=True, help='Only report the clusters that would be merged.')
+@with_appcontext
+def dedup_guests_command(threshold, dry_run):
+    """Merge duplicate guests and repoint their stays."""
+    stats, clusters = dedup_guests(threshold, dry_run)
+    if dry_run:
+        for survivor, duplicates in clusters[:50]:
+            click.echo(f"Guest {survivor} <- {', '.join(map(str, duplicates))}")
+    click.echo(f"{'Would merge' if dry_run else 'Merged'} {stats['merged']} guests into {stats['clusters']}; "
+               f"{stats['bookings']} stays repointed.")
@@ -0,0 +1,263 @@
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+from array import array
+from collections import Counter
+from datetime import datetime, date
+from itertools import accumulate
+from operator import add, sub
+from flask import current_app
+from sqlalchemy import select, func
+from app import db
+from app.models import Booking, ArchivedBooking, Room
+from app.money import from_cents
+from app.responses import data_version
+
+# Occupancy, ADR and RevPAR forecasts for revenue management. Every stay (live
+# and archived) is loaded once into typed columns - arrival and departure day
+# numbers, booking day, nightly rate - and every daily series is built from
+# them with difference arrays: +1 (or the nightly rate) on the arrival day, -1
+# on the departure day, then one running sum, so the cost is O(stays + days)
+# instead of stays x days. The columns are cached on disk, one binary file per
+# column, under a key derived from the data version; a request after the first
+# only reads the files.
+#
+# The forecast for a date blends two estimates, weighted by how much of a
+# night's business is usually on the books that far ahead (the pickup curve):
+# on-the-books rooms scaled up by the pickup curve, and the seasonal baseline,
+# the average of the same weekday 52, 104, ... weeks earlier.
+
+COLUMNS = {'arrive': 'i', 'depart': 'i', 'booked': 'i', 'rate': 'q'} # Day numbers are date.toordinal(), rates in cents
+OPEN_ENDED = 0 # `depart` of an in-house stay without a check-out date
+UNKNOWN = -1 # `booked` of a stay whose booking date was not recorded
+SEASON = 364 # 52 weeks: the same weekday a year earlier
+MIN_PICKUP = 0.05 # Below this share on the books, on-the-books rooms say too little to scale up
+MAX_HORIZON = 365 # Days ahead the daily series reach
+
+
+def stay_columns():
+    """
+    Every stay of the active scope (live and archived) as typed columns. The
+    nightly rate is the stay's total over its nights, or the room's rate when
+    there is no total yet.
+    """
+    rows = []
+    for model in (Booking, ArchivedBooking):
+        rows += db.session.execute(
+            select(model.check_in_date, model.check_out_date, model.created_at, model.total_amount_cents,
+                   Room.rate_per_night_cents)
+            .join(Room, Room.id == model.room_id)
+            .where(model.is_active.is_(True) | model.is_reservation.is_(True) | model.check_out_date.isnot(None))).all()
+    columns = {name: array(typecode) for name, typecode in COLUMNS.items()}
+    if not rows:
+        return columns
+    check_ins, check_outs, created, totals, rates = zip(*rows)
+    arrive = array('i', map(datetime.toordinal, check_ins))
+    depart = array('i', (max(out.toordinal(), a + 1) if out else OPEN_ENDED for out, a in zip(check_outs, arrive)))
+    columns['arrive'], columns['depart'] = arrive, depart
+    columns['booked'] = array('i', (min(c.toordinal(), a) if c else UNKNOWN for c, a in zip(created, arrive)))
+    columns['rate'] = array('q', (round(total / (d - a)) if total and d else rate
+                                  for total, rate, a, d in zip(totals, rates, arrive, depart)))
+    return columns
+
+
+# --- Columnar cache ---
+
+def cache_key():
+    """Digest of what the stay columns are built from: live and archived bookings and room rates."""
+    archived = db.session.execute(select(func.count(), func.max(ArchivedBooking.archived_at))).one()
+    version = [data_version(Booking, Room), (archived[0], archived[1].isoformat() if archived[1] else None),
+               db.session.info.get('property_id')]
+    return hashlib.sha1(json.dumps(version, default=str).encode()).hexdigest()[:16]
+
+
+def write_columns(directory, key, columns):
+    """Writes the columns into `directory`/<key>/ atomically (built aside, then renamed) and drops older keys."""
+    os.makedirs(directory, exist_ok=True)
+    scratch = tempfile.mkdtemp(dir=directory, prefix='.tmp-')
+    for name, values in columns.items():
+        with open(os.path.join(scratch, f"{name}.{values.typecode}"), 'wb') as f:
+            values.tofile(f)
+    with open(os.path.join(scratch, 'manifest.json'), 'w') as f:
+        json.dump({'rows': len(columns['arrive']), 'columns': COLUMNS}, f)
+    target = os.path.join(directory, key)
+    try:
+        os.rename(scratch, target)
+    except OSError: # Another worker wrote the same key first
+        shutil.rmtree(scratch, ignore_errors=True)
+    prefix = key.split('-')[0]
+    for entry in os.listdir(directory):
+        if entry != key and entry.startswith(f"{prefix}-"):
+            shutil.rmtree(os.path.join(directory, entry), ignore_errors=True)
+
+
+def read_columns(directory, key):
+    """The cached columns for `key`, or None."""
+    path = os.path.join(directory, key)
+    try:
+        with open(os.path.join(path, 'manifest.json')) as f:
+            manifest = json.load(f)
+        columns = {}
+        for name, typecode in manifest['columns'].items():
+            values = array(typecode)
+            with open(os.path.join(path, f"{name}.{typecode}"), 'rb') as f:
+                values.fromfile(f, manifest['rows'])
+            columns[name] = values
+        return columns
+    except (OSError, ValueError, EOFError, KeyError):
+        return None
+
+
+def load_stay_columns():
+    """(cache key, stay columns) for the active scope, from the on-disk cache when the data version hasn't moved."""
+    directory = current_app.config.get('FORECAST_CACHE_DIR')
+    key = f"{db.session.info.get('property_id') or 'default'}-{cache_key()}"
+    memo = current_app.extensions.setdefault('forecast_columns', {})
+    if key in memo:
+        return key, memo[key]
+    columns = read_columns(directory, key) if directory else None
+    if columns is None:
+        columns = stay_columns()
+        if directory:
+            write_columns(directory, key, columns)
+    memo.clear() # One version per process is enough
+    memo[key] = columns
+    return key, columns
+
+
+# --- Series ---
+
+def scatter_add(size, offsets, weights=None):
+    """A length-`size` array with weights[i] (or 1) added at offsets[i]."""
+    if weights is None:
+        counts = Counter(offsets)
+        return [counts.get(i, 0) for i in range(size)]
+    out = [0.0] * size
+    for offset, weight in zip(offsets, weights):
+        out[offset] += weight
+    return out
+
+
+def offsets(days_, start, days):
+    """Day numbers as offsets into [start, start + days], clipped to its ends."""
+    return [min(max(day - start, 0), days) for day in days_]
+
+
+def nightly(first, last, days, weights=None):
+    """
+    Per-night totals over `days` nights: each stay adds its weight (or 1) to
+    the nights [first, last) it covers (offsets, see offsets()).
+    """
+    diff = list(map(sub, scatter_add(days + 1, first, weights), scatter_add(days + 1, last, weights)))
+    return list(accumulate(diff))[:days]
+
+
+def pickup_curve(arrive, depart, booked, since, until, lead_days):
+    """
+    Share of room-nights in [since, until) that were on the books at least L
+    days ahead, for L = 0..lead_days. None when no booking dates are known.
+    """
+    exact = [0] * (lead_days + 1) # Difference array over lead times
+    total = 0
+    for a, d, b in zip(arrive, depart, booked):
+        first, last = max(a, since), min(d, until)
+        if b == UNKNOWN or first >= last:
+            continue
+        total += last - first
+        low, high = first - b, last - 1 - b # Lead times of the first and last night covered
+        if low < lead_days:
+            exact[low] += 1
+            exact[min(high, lead_days - 1) + 1] -= 1
+    if not total:
+        return None
+    booked_lt = [0, *accumulate(accumulate(exact[:lead_days]))] # Nights booked less than L days ahead
+    return [(total - n) / total for n in booked_lt]
+
+
+def daily_series(columns, today, lead_days, window):
+    """
+    Rooms sold and room revenue (cents) per night from the first stay to
+    MAX_HORIZON days past today, and the pickup curve. Returns
+    (offset of today, rooms, revenue, curve).
+    """
+    arrive = columns['arrive']
+    depart = [d if d != OPEN_ENDED else max(today + 1, a + 1) for a, d in zip(arrive, columns['depart'])]
+    start = min(min(arrive, default=today), today)
+    span = today + MAX_HORIZON - start
+    first, last = offsets(arrive, start, span), offsets(depart, start, span)
+    rooms = nightly(first, last, span)
+    revenue = nightly(first, last, span, columns['rate'])
+    curve = pickup_curve(arrive, depart, columns['booked'], today - window, today, lead_days)
+    return today - start, rooms, revenue, curve
+
+
+def forecast(days=None, today=None):
+    """
+    Daily forecast for the next `days` days (at most MAX_HORIZON) of the
+    active scope: on-the-books rooms, forecast rooms, occupancy, ADR and
+    RevPAR, plus the pickup curve.
+    """
+    config = current_app.config
+    days = min(days or config.get('FORECAST_HORIZON_DAYS', 90), MAX_HORIZON)
+    today = (today or datetime.utcnow().date()).toordinal()
+    lead_days = config.get('FORECAST_PICKUP_LEAD_DAYS', 120)
+    window = config.get('FORECAST_PICKUP_WINDOW_DAYS', 365)
+    capacity = db.session.scalar(select(func.count(Room.id)).where(Room.status != 'maintenance')) or 0
+    key, columns = load_stay_columns()
+    # The series only change with the data version and the date; later requests of the day reuse them
+    memo = current_app.extensions.setdefault('forecast_series', {})
+    series_key = (key, today, lead_days, window)
+    if series_key not in memo:
+        memo.clear()
+        memo[series_key] = daily_series(columns, today, lead_days, window)
+    ahead, rooms, revenue_by_night, curve = memo[series_key]
+
+    otb_rooms, otb_revenue = rooms[ahead:], revenue_by_night[ahead:]
+    # Same weekday in earlier years, summed column-wise over every year with history
+    years = [ahead - SEASON * k for k in range(1, ahead // SEASON + 1)]
+    baseline_rooms = baseline_revenue = None
+    if years:
+        baseline_rooms = [n / len(years) for n in
+                          accumulate_columns(rooms[offset:offset + days] for offset in years)]
+        baseline_revenue = [r / len(years) for r in
+                            accumulate_columns(revenue_by_night[offset:offset + days] for offset in years)]
+
+    result = []
+    for i in range(days):
+        on_books = otb_rooms[i]
+        share = curve[min(i, lead_days)] if curve else 0.0
+        estimates = []
+        if share >= MIN_PICKUP:
+            estimates.append((share, on_books / share))
+        if baseline_rooms is not None:
+            estimates.append((1.0 - share if estimates else 1.0, baseline_rooms[i]))
+        expected = sum(w * v for w, v in estimates) / sum(w for w, _ in estimates) if estimates else on_books
+        expected = min(max(expected, on_books), capacity) if capacity else expected
+        if on_books:
+            adr = otb_revenue[i] / on_books
+        elif baseline_rooms and baseline_rooms[i]:
+            adr = baseline_revenue[i] / baseline_rooms[i]
+        else:
+            adr = None
+        result.append({
+            'date': date.fromordinal(today + i).isoformat(),
+            'on_the_books': on_books,
+            'rooms': round(expected, 1),
+            'occupancy': round(expected / capacity, 4) if capacity else None,
+            'adr': from_cents(round(adr)) if adr is not None else None,
+            'revpar': from_cents(round(expected * adr / capacity)) if adr is not None and capacity else None,
+        })
+    return {'capacity': capacity, 'stays': len(columns['arrive']),
+            'pickup': {str(lead): round(curve[lead], 4) for lead in (0, 7, 14, 30, 60, 90) if lead <= lead_days}
+            if curve else None,
+            'days': result}
+
+
+def accumulate_columns(rows):
+    """Element-wise sum of equally long sequences."""
+    total = None
+    for row in rows:
+        total = list(row) if total is None else list(map(add, total, row))
+    return total or []
@@ -1,5 +1,5 @@
 from flask_wtf import FlaskForm
-from wtforms import StringField, DateField, SelectField, SubmitField, PasswordField, BooleanField
+from wtforms import StringField, DateField, SelectField, SubmitField, PasswordField, BooleanField, DecimalField
 from wtforms.validators import DataRequired, Email, Optional, Length, EqualTo, ValidationError
 from app.models import User # To check for existing username
 
@@ -19,6 +19,23 @@ class CheckInForm(FlaskForm):
     check_out_date = DateField('Check-out Date', validators=[Optional()], format='%Y-%m-%d')
     submit = SubmitField('Check-in')
 
+class ReservationForm(FlaskForm):
+    guest_id = SelectField('Guest', coerce=int, validators=[DataRequired()])
+    room_id = SelectField('Room', coerce=int, validators=[DataRequired()])
+    check_in_date = DateField('Arrival Date', validators=[DataRequired()], format='%Y-%m-%d')
+    check_out_date = DateField('Departure Date', validators=[DataRequired()], format='%Y-%m-%d')
+    submit = SubmitField('Reserve')
+
+    def validate_check_out_date(self, check_out_date):
+        if self.check_in_date.data and check_out_date.data and check_out_date.data <= self.check_in_date.data:
+            raise ValidationError('Departure must be after arrival.')
+
+class PaymentForm(FlaskForm):
+    amount = DecimalField('Amount', places=2, validators=[DataRequired()])
+    method = SelectField('Method', choices=[('cash', 'Cash'), ('card', 'Card'), ('transfer', 'Bank Transfer')])
+    reference = StringField('Reference', validators=[Optional(), Length(max=100)])
+    submit = SubmitField('Post Payment')
+
 class LoginForm(FlaskForm):
     username = StringField('Username', validators=[DataRequired(), Length(min=4, max=80)])
     password = PasswordField('Password', validators=[DataRequired()])
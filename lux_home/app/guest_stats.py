@@ -0,0 +1,176 @@
+from contextlib import nullcontext
+from datetime import datetime
+import click
+from flask.cli import with_appcontext
+from sqlalchemy import select, update, insert, delete, case
+from app import db
+from app.models import Guest, GuestStats, Booking, ArchivedBooking
+from app.scheduler import job_scopes, timed_run
+from app.services import stay_nights
+from app.sharding import property_scope
+
+# Denormalized lifetime stats per guest: completed stays, nights, revenue and
+# first/last stay, so guest profiles and "top guests" are single indexed reads
+# of guest_stats instead of aggregates over every booking and invoice. Check-out
+# (single and group) adds each stay in the same transaction with one upsert
+# per batch; `flask rebuild-guest-stats` recomputes everything from the live
+# and archived stays of every database.
+#
+# guest_stats lives with guest on the default database, so for a property on
+# its own shard the stats upsert and the check-out are two transactions
+# committed one after the other, not atomically: a crash between the commits
+# leaves one stay counted or missing until the next rebuild. We accept that
+# for derived totals rather than running two-phase commit on every check-out.
+# The rebuild itself locks guest_stats before it reads any stay (see
+# _lock_for_rebuild), so check-outs wait for it instead of having their
+# upserts wiped by its delete and rewrite.
+
+REBUILD_BATCH_SIZE = 5000
+_stats = GuestStats.__table__
+
+
+def _connection():
+    return db.session.connection(bind_arguments={'mapper': GuestStats.__mapper__})
+
+
+def _dialect_insert(connection):
+    """The dialect's INSERT with ON CONFLICT support, or None."""
+    if connection.dialect.name == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert as dialect_insert
+    elif connection.dialect.name == 'sqlite':
+        from sqlalchemy.dialects.sqlite import insert as dialect_insert
+    else:
+        return None
+    return dialect_insert
+
+
+def add_to_stats(totals):
+    """
+    Adds {guest_id: {'stays', 'nights', 'revenue_cents', 'first_stay_at',
+    'last_stay_at'}} to the guests' stats, creating missing rows, in the
+    current transaction.
+    """
+    if not totals:
+        return
+    now = datetime.utcnow()
+    rows = [{'guest_id': guest_id, 'updated_at': now, **values} for guest_id, values in totals.items()]
+    connection = _connection()
+    dialect_insert = _dialect_insert(connection)
+    if dialect_insert is not None:
+        stmt = dialect_insert(_stats)
+        new = stmt.excluded
+        connection.execute(stmt.on_conflict_do_update(index_elements=[_stats.c.guest_id], set_={
+            'stays': _stats.c.stays + new.stays,
+            'nights': _stats.c.nights + new.nights,
+            'revenue_cents': _stats.c.revenue_cents + new.revenue_cents,
+            'first_stay_at': case((_stats.c.first_stay_at.is_(None) | (new.first_stay_at < _stats.c.first_stay_at),
+                                   new.first_stay_at), else_=_stats.c.first_stay_at),
+            'last_stay_at': case((_stats.c.last_stay_at.is_(None) | (new.last_stay_at > _stats.c.last_stay_at),
+                                  new.last_stay_at), else_=_stats.c.last_stay_at),
+            'updated_at': new.updated_at,
+        }), rows)
+        return
+    existing = set(connection.execute(select(_stats.c.guest_id).where(_stats.c.guest_id.in_(list(totals)))).scalars())
+    for row in rows:
+        if row['guest_id'] not in existing:
+            connection.execute(insert(_stats), row)
+            continue
+        current = connection.execute(select(_stats.c.first_stay_at, _stats.c.last_stay_at)
+                                     .where(_stats.c.guest_id == row['guest_id'])).one()
+        connection.execute(update(_stats).where(_stats.c.guest_id == row['guest_id']).values(
+            stays=_stats.c.stays + row['stays'], nights=_stats.c.nights + row['nights'],
+            revenue_cents=_stats.c.revenue_cents + row['revenue_cents'],
+            first_stay_at=min(filter(None, (current.first_stay_at, row['first_stay_at'])), default=None),
+            last_stay_at=max(filter(None, (current.last_stay_at, row['last_stay_at'])), default=None),
+            updated_at=now))
+
+
+def totals_by_guest(stays, totals=None):
+    """Folds (guest_id, check_in, check_out, total cents or None) stays into per-guest totals."""
+    totals = {} if totals is None else totals
+    for guest_id, check_in, check_out, total_cents in stays:
+        entry = totals.get(guest_id)
+        if entry is None:
+            entry = totals[guest_id] = {'stays': 0, 'nights': 0, 'revenue_cents': 0,
+                                        'first_stay_at': check_in, 'last_stay_at': check_out}
+        entry['stays'] += 1
+        entry['nights'] += stay_nights(check_in, check_out)
+        entry['revenue_cents'] += total_cents or 0
+        entry['first_stay_at'] = min(entry['first_stay_at'], check_in)
+        entry['last_stay_at'] = max(entry['last_stay_at'], check_out)
+    return totals
+
+
+def record_stays(stays):
+    """Adds just-completed (guest_id, check_in, check_out, total cents) stays to their guests' stats."""
+    add_to_stats(totals_by_guest(stays))
+
+
+def merge_stats(clusters):
+    """Folds duplicates' stats into their survivor's (guest dedup) and deletes the duplicates' rows."""
+    survivor_by_guest = {guest_id: survivor for survivor, duplicates in clusters for guest_id in duplicates}
+    if not survivor_by_guest:
+        return
+    connection = _connection()
+    rows = connection.execute(select(_stats).where(_stats.c.guest_id.in_(list(survivor_by_guest)))).all()
+    totals = {}
+    for row in rows:
+        survivor = survivor_by_guest[row.guest_id]
+        entry = totals.setdefault(survivor, {'stays': 0, 'nights': 0, 'revenue_cents': 0,
+                                             'first_stay_at': row.first_stay_at, 'last_stay_at': row.last_stay_at})
+        entry['stays'] += row.stays
+        entry['nights'] += row.nights
+        entry['revenue_cents'] += row.revenue_cents
+        entry['first_stay_at'] = min(filter(None, (entry['first_stay_at'], row.first_stay_at)), default=None)
+        entry['last_stay_at'] = max(filter(None, (entry['last_stay_at'], row.last_stay_at)), default=None)
+    connection.execute(delete(_stats).where(_stats.c.guest_id.in_(list(survivor_by_guest))))
+    add_to_stats(totals)
+
+
+def completed_stays(model):
+    """(guest_id, check_in, check_out, total cents) of every completed stay of the active scope, streamed."""
+    return db.session.execute(
+        select(model.guest_id, model.check_in_date, model.check_out_date, model.total_amount_cents)
+        .where(model.is_active.is_(False), model.is_reservation.is_(False), model.check_out_date.isnot(None))
+        .execution_options(yield_per=REBUILD_BATCH_SIZE))
+
+
+def _lock_for_rebuild(connection):
+    """
+    Empties guest_stats for the rebuild and keeps check-outs' upserts waiting
+    until it commits: PostgreSQL takes a table lock that conflicts with their
+    inserts and updates, and on SQLite the DELETE holds the database write lock.
+    """
+    if connection.dialect.name == 'postgresql':
+        connection.exec_driver_sql(f"LOCK TABLE {_stats.name} IN SHARE ROW EXCLUSIVE MODE")
+    connection.execute(delete(_stats))
+
+
+def rebuild_guest_stats():
+    """Recomputes every guest's stats from the live and archived stays of all databases; returns guests with stats."""
+    with timed_run('rebuild-guest-stats') as run:
+        connection = _connection()
+        _lock_for_rebuild(connection) # Before reading: a check-out committed after the reads would be lost
+        totals = {}
+        for scope in job_scopes():
+            with property_scope(scope) if scope is not None else nullcontext():
+                for model in (Booking, ArchivedBooking):
+                    totals_by_guest(completed_stays(model), totals)
+        known = set(db.session.scalars(select(Guest.id)))
+        now = datetime.utcnow()
+        rows = [{'guest_id': guest_id, 'updated_at': now, **values}
+                for guest_id, values in totals.items() if guest_id in known]
+        for start in range(0, len(rows), REBUILD_BATCH_SIZE):
+            connection.execute(insert(_stats), rows[start:start + REBUILD_BATCH_SIZE])
+        db.session.commit()
+        run['rows'] = len(rows)
+    return len(rows)
+
+
+@click.command('rebuild-guest-stats')
+@with_appcontext
+def rebuild_guest_stats_command():
+    """Recompute per-guest lifetime stats from all stays."""
+    started = datetime.utcnow()
+    guests = rebuild_guest_stats()
+    click.echo(f"Rebuilt stats for {guests} guests in {(datetime.utcnow() - started).total_seconds():.1f} s.")
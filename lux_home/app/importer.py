@@ -0,0 +1,577 @@
+import csv
+import io
+import itertools
+import json
+import os
+import time
+from collections import Counter
+from contextlib import nullcontext
+from datetime import datetime, timezone
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+from sqlalchemy import select, insert, func, text
+from app import db
+from app.models import (Property, Guest, Room, Booking, Invoice, Payment, ArchivedBooking, ArchivedInvoice,
+                        ArchivedPayment, floor_of)
+from app.channel_sync import mark_changed, stay_dates
+from app.guest_stats import add_to_stats, totals_by_guest
+from app.money import to_cents
+from app.reservations import get_availability_index
+from app.room_state import get_room_state
+from app.scheduler import timed_run
+from app.search import REINDEX_BATCH_SIZE, guest_documents, stay_documents, write_documents
+from app.sharding import property_scope
+
+# Bulk import of a property's history from another system's exports:
+# guests, rooms, bookings and invoices, each a .csv, .jsonl/.ndjson or .json
+# file named after the table. Files are read in chunks of IMPORT_CHUNK_SIZE
+# rows and parsed column by column; legacy ids and natural keys (guest email,
+# room number, room + check-in) are resolved through in-memory maps, so no row
+# costs a lookup query. Rows are written with executemany INSERTs (COPY on
+# PostgreSQL) on the connection of the database that owns the table. A target
+# table that is still empty has its secondary indexes dropped for the load and
+# rebuilt at the end; one that already holds rows keeps them (see prepare()).
+# Everything runs in one transaction per database: a failed import leaves
+# nothing behind, and re-running a finished one matches the rows it already
+# loaded instead of duplicating them. Other processes' room state and
+# availability indexes pick up imported rooms and stays when they restart.
+
+TABLES = ('guests', 'rooms', 'bookings', 'invoices')
+EXTENSIONS = ('.csv', '.jsonl', '.ndjson', '.json')
+ROOM_STATUSES = ('available', 'occupied', 'maintenance')
+PAYMENT_STATUSES = ('pending', 'paid', 'overdue')
+TRUE_VALUES = {'1', 'true', 't', 'yes', 'y'}
+FALSE_VALUES = {'0', 'false', 'f', 'no', 'n'}
+PARSE_ERRORS = (ValueError, TypeError, ArithmeticError) # ArithmeticError covers decimal.InvalidOperation
+
+
+class LegacyImportError(Exception):
+    pass
+
+
+# --- Reading ---
+
+def find_export(directory, table):
+    """The export file of `table` in `directory`, or None."""
+    for extension in EXTENSIONS:
+        path = os.path.join(directory, f"{table}{extension}")
+        if os.path.exists(path):
+            return path
+    return None
+
+
+def read_rows(path):
+    """Yields the rows of an export as dicts. CSV and JSON lines are streamed; a JSON array is parsed whole."""
+    if path.endswith('.csv'):
+        with open(path, newline='', encoding='utf-8-sig') as f:
+            yield from csv.DictReader(f)
+        return
+    with open(path, encoding='utf-8') as f:
+        if path.endswith('.json'):
+            rows = json.load(f)
+        else:
+            rows = (json.loads(line) for line in f if line.strip())
+        for number, row in enumerate(rows, 1):
+            if not isinstance(row, dict):
+                raise LegacyImportError(f"{path}: record {number} is not an object.")
+            yield row
+
+
+def read_chunks(path, chunk_size):
+    rows = read_rows(path)
+    while chunk := list(itertools.islice(rows, chunk_size)):
+        yield chunk
+
+
+# --- Parsing; every parser maps a blank value to None ---
+
+def _blank(value):
+    return value is None or (isinstance(value, str) and not value.strip())
+
+
+def text_column(max_length):
+    def parse(value):
+        if _blank(value):
+            return None
+        value = str(value).strip()
+        if len(value) > max_length:
+            raise ValueError(f"longer than {max_length} characters")
+        return value
+    return parse
+
+
+def choice_column(choices):
+    def parse(value):
+        if _blank(value):
+            return None
+        value = str(value).strip().lower()
+        if value not in choices:
+            raise ValueError(f"not one of {', '.join(choices)}")
+        return value
+    return parse
+
+
+def parse_email(value):
+    if _blank(value):
+        return None
+    value = str(value).strip().lower()
+    if len(value) > 120 or '@' not in value[1:-1]:
+        raise ValueError('not an email address')
+    return value
+
+
+def parse_int(value):
+    if _blank(value):
+        return None
+    if isinstance(value, float) and not value.is_integer():
+        raise ValueError('not a whole number')
+    return int(value)
+
+
+def parse_bool(value):
+    if _blank(value):
+        return None
+    if isinstance(value, (bool, int)):
+        return bool(value)
+    value = str(value).strip().lower()
+    if value in TRUE_VALUES:
+        return True
+    if value in FALSE_VALUES:
+        return False
+    raise ValueError('not a yes/no value')
+
+
+def parse_datetime(value):
+    """ISO 8601 date or date-time; aware values are stored as naive UTC like the rest of the app."""
+    if _blank(value):
+        return None
+    parsed = datetime.fromisoformat(str(value).strip())
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
+
+def parse_money(value):
+    return None if _blank(value) else to_cents(value)
+
+
+# (column, parser, required) per export
+COLUMNS = {
+    'guests': [('id', parse_int, False), ('name', text_column(100), True), ('email', parse_email, True),
+               ('phone', text_column(20), False)],
+    'rooms': [('id', parse_int, False), ('room_number', text_column(50), True), ('room_type', text_column(100), True),
+              ('rate_per_night', parse_money, True), ('status', choice_column(ROOM_STATUSES), False),
+              ('floor', parse_int, False)],
+    'bookings': [('id', parse_int, False), ('guest_id', parse_int, False), ('guest_email', parse_email, False),
+                 ('room_id', parse_int, False), ('room_number', text_column(50), False),
+                 ('check_in_date', parse_datetime, True), ('check_out_date', parse_datetime, False),
+                 ('total_amount', parse_money, False), ('is_active', parse_bool, False),
+                 ('is_reservation', parse_bool, False), ('created_at', parse_datetime, False)],
+    'invoices': [('id', parse_int, False), ('booking_id', parse_int, True), ('issue_date', parse_datetime, False),
+                 ('due_date', parse_datetime, False), ('amount_paid', parse_money, False),
+                 ('payment_status', choice_column(PAYMENT_STATUSES), False)],
+}
+
+
+def parse_columns(chunk, columns):
+    """
+    Parses a chunk column by column: each column is converted with one map()
+    over all its values, and only a column that fails is walked row by row to
+    find the bad values. Returns ({column: values}, {row index: first problem}).
+    """
+    parsed, errors = {}, {}
+    for name, parse, required in columns:
+        raw = [row.get(name) for row in chunk]
+        try:
+            values = list(map(parse, raw))
+        except PARSE_ERRORS:
+            values = []
+            for index, value in enumerate(raw):
+                try:
+                    values.append(parse(value))
+                except PARSE_ERRORS as e:
+                    values.append(None)
+                    errors.setdefault(index, f"{name} {value!r}: {e}")
+        if required:
+            for index in itertools.compress(range(len(values)), map(lambda v: v is None, values)):
+                errors.setdefault(index, f"{name} is missing")
+        parsed[name] = values
+    return parsed, errors
+
+
+# --- Writing ---
+
+def copy_rows(connection, table, rows):
+    """Loads rows into a PostgreSQL table with COPY through the raw psycopg (3) or psycopg2 connection."""
+    preparer = connection.dialect.identifier_preparer
+    names = list(rows[0])
+    statement = f"COPY {preparer.format_table(table)} ({', '.join(preparer.quote(n) for n in names)}) FROM STDIN"
+    cursor = connection.connection.driver_connection.cursor()
+    try:
+        if hasattr(cursor, 'copy'):
+            with cursor.copy(statement) as copy:
+                for row in rows:
+                    copy.write_row([row[name] for name in names])
+        else:
+            buffer = io.StringIO()
+            csv.writer(buffer).writerows([row[name] for name in names] for row in rows) # None -> unquoted empty -> NULL
+            buffer.seek(0)
+            cursor.copy_expert(f"{statement} WITH (FORMAT csv)", buffer)
+    finally:
+        cursor.close()
+
+
+def write_rows(connection, table, rows):
+    if not rows:
+        return
+    if connection.dialect.name == 'postgresql':
+        copy_rows(connection, table, rows)
+    else:
+        connection.execute(insert(table), rows) # One executemany
+
+
+def secondary_indexes(table):
+    """Non-unique indexes: only slow the load down, unlike the unique ones that guard it."""
+    return sorted((index for index in table.indexes if not index.unique), key=lambda index: index.name)
+
+
+class LegacyImport:
+    """
+    One import run in the active property scope. Parents are loaded before
+    children (guests, rooms, bookings, invoices), and each table's legacy ids are
+    remembered so that children can refer to them.
+    """
+
+    def __init__(self, chunk_size=None, rejects_path=None, rebuild_indexes=True):
+        self.chunk_size = chunk_size or current_app.config.get('IMPORT_CHUNK_SIZE', 5000)
+        self.rejects_path = rejects_path
+        self.rebuild_indexes = rebuild_indexes
+        self.session = db.session()
+        self.property_id = self.session.info.get('property_id')
+        self.now = datetime.utcnow()
+        self.stats = {table: Counter() for table in TABLES}
+        self.elapsed = dict.fromkeys(TABLES, 0.0)
+        self.new_ids = {'guests': [], 'bookings': [], 'blocking_bookings': [], 'rooms': []}
+        self.dropped_indexes = []
+        self.channel_marks = [] # Availability the channel manager has to hear about (app.channel_sync)
+        self.guest_totals = {} # Completed stays per guest, for their lifetime stats (app.guest_stats)
+        self._rejects = self._rejects_file = None
+        # Legacy id -> id, and natural key -> id for rows that are already here
+        self.guest_ids, self.room_ids, self.booking_ids = {}, {}, {}
+        self.booking_totals = {} # Of the imported bookings, to settle their invoices' status
+        self.guest_emails = {email.lower(): guest_id for email, guest_id in
+                             self.session.execute(select(Guest.email, Guest.id))}
+        self.room_numbers = dict(self.session.execute(select(Room.room_number, Room.id)).all())
+        self.booking_keys = {}
+        for model in (Booking, ArchivedBooking):
+            self.booking_keys.update(((room_id, check_in), booking_id) for booking_id, room_id, check_in in
+                                     self.session.execute(select(model.id, model.room_id, model.check_in_date)))
+        self.invoices = {}
+        for model in (Invoice, ArchivedInvoice):
+            self.invoices.update(self.session.execute(select(model.booking_id, model.id)).all())
+
+    def connection(self, model):
+        """The connection of the database that holds `model`'s table, inside the session's transaction."""
+        return self.session.connection(bind_arguments={'mapper': model.__mapper__})
+
+    def prepare(self):
+        """
+        Drops the secondary indexes of the target tables that are still empty, so
+        a first load does not maintain them row by row. Tables that already hold
+        rows keep theirs: they are shared with the properties already live, and
+        dropping an index inside the import's transaction would lock the table
+        and leave every other query on it without the index until commit.
+        """
+        if not self.rebuild_indexes:
+            return
+        for model in (Guest, Room, Booking, Invoice, Payment):
+            connection = self.connection(model)
+            if connection.execute(select(model.__table__.c.id).limit(1)).first() is not None:
+                continue
+            for index in secondary_indexes(model.__table__):
+                index.drop(connection)
+                self.dropped_indexes.append((model, index))
+
+    def finish(self):
+        """Recreates the dropped indexes and indexes the new guests and stays for search."""
+        for model, index in self.dropped_indexes:
+            index.create(self.connection(model))
+        self.dropped_indexes = []
+        mark_changed(self.channel_marks)
+        add_to_stats(self.guest_totals)
+        guest_ids = self.new_ids['guests']
+        for start in range(0, len(guest_ids), REINDEX_BATCH_SIZE):
+            write_documents(self.connection(Guest), [],
+                            guest_documents(self.session, guest_ids[start:start + REINDEX_BATCH_SIZE]))
+        booking_ids = self.new_ids['bookings']
+        for start in range(0, len(booking_ids), REINDEX_BATCH_SIZE):
+            batch = booking_ids[start:start + REINDEX_BATCH_SIZE]
+            write_documents(self.connection(Booking), [], # New ids, so there are no old documents to replace
+                            stay_documents(self.session, Booking, Invoice, Booking.id.in_(batch)))
+
+    def allocate_ids(self, model, count, archived_model=None):
+        """
+        `count` new primary keys for `model`. PostgreSQL hands them out from the
+        table's sequence; elsewhere they continue after the highest id ever used
+        (archived rows and the SQLite AUTOINCREMENT counter included); SQLite
+        fails the import's transaction, rather than reusing an id, if another
+        writer commits between that read and the import's writes.
+        """
+        if not count:
+            return []
+        connection = self.connection(model)
+        table = model.__table__
+        if connection.dialect.name == 'postgresql':
+            return connection.execute(text("SELECT nextval(pg_get_serial_sequence(:table, 'id')) "
+                                           "FROM generate_series(1, :count)"),
+                                      {'table': table.name, 'count': count}).scalars().all()
+        highest = connection.execute(select(func.max(table.c.id))).scalar() or 0
+        if archived_model is not None:
+            highest = max(highest, connection.execute(select(func.max(archived_model.__table__.c.id))).scalar() or 0)
+        if connection.dialect.name == 'sqlite' and table.kwargs.get('sqlite_autoincrement'):
+            sequence = connection.execute(text('SELECT seq FROM sqlite_sequence WHERE name = :table'),
+                                          {'table': table.name}).scalar()
+            highest = max(highest, sequence or 0)
+        return list(range(highest + 1, highest + 1 + count))
+
+    def reject(self, table, number, row, reason):
+        self.stats[table]['rejected'] += 1
+        if self.rejects_path is None:
+            return
+        if self._rejects is None:
+            self._rejects_file = open(self.rejects_path, 'w', newline='', encoding='utf-8')
+            self._rejects = csv.writer(self._rejects_file)
+            self._rejects.writerow(['table', 'row', 'reason', 'data'])
+        self._rejects.writerow([table, number, reason, json.dumps(row, default=str)])
+
+    def close(self):
+        if self._rejects_file is not None:
+            self._rejects_file.close()
+
+    def load(self, table, path):
+        """Streams one export into its table."""
+        started = time.perf_counter()
+        number = 0
+        for chunk in read_chunks(path, self.chunk_size):
+            columns, errors = parse_columns(chunk, COLUMNS[table])
+            inserted = getattr(self, f"_load_{table}")(columns, errors)
+            for index in sorted(errors):
+                self.reject(table, number + index + 1, chunk[index], errors[index])
+            self.stats[table]['read'] += len(chunk)
+            self.stats[table]['inserted'] += inserted
+            self.stats[table]['matched'] += len(chunk) - len(errors) - inserted
+            number += len(chunk)
+        self.elapsed[table] += time.perf_counter() - started
+
+    def check_legacy_ids(self, known, legacy_ids, errors):
+        seen = set()
+        for index, legacy_id in enumerate(legacy_ids):
+            if legacy_id is not None and index not in errors:
+                if legacy_id in known or legacy_id in seen:
+                    errors[index] = f"id {legacy_id} appears twice"
+                seen.add(legacy_id)
+
+    def assign_ids(self, model, keys, known, errors, archived_model=None):
+        """
+        Maps each valid row to an id by natural key: keys already in `known` keep
+        their row, the first row of each new key gets a newly allocated id, and
+        later rows with the same key map to that one. Returns (id per row, or
+        None for rejected rows; indexes of the rows to insert).
+        """
+        first = {}
+        for index, key in enumerate(keys):
+            if index not in errors and key not in known and key not in first:
+                first[key] = index
+        new = list(first.values())
+        allocated = dict(zip(new, self.allocate_ids(model, len(new), archived_model)))
+        for key, index in first.items():
+            known[key] = allocated[index]
+        return [None if index in errors else known[key] for index, key in enumerate(keys)], new
+
+    def map_legacy_ids(self, legacy_map, legacy_ids, ids):
+        for legacy_id, new_id in zip(legacy_ids, ids):
+            if legacy_id is not None and new_id is not None:
+                legacy_map[legacy_id] = new_id
+
+    # Each _load_<table> resolves a parsed chunk's keys, records rejects in
+    # `errors`, writes the new rows and returns how many it wrote.
+
+    def _load_guests(self, columns, errors):
+        self.check_legacy_ids(self.guest_ids, columns['id'], errors)
+        ids, new = self.assign_ids(Guest, columns['email'], self.guest_emails, errors)
+        self.map_legacy_ids(self.guest_ids, columns['id'], ids)
+        write_rows(self.connection(Guest), Guest.__table__, [
+            {'id': ids[i], 'name': columns['name'][i], 'email': columns['email'][i], 'phone': columns['phone'][i]}
+            for i in new])
+        self.new_ids['guests'].extend(ids[i] for i in new)
+        return len(new)
+
+    def _load_rooms(self, columns, errors):
+        self.check_legacy_ids(self.room_ids, columns['id'], errors)
+        ids, new = self.assign_ids(Room, columns['room_number'], self.room_numbers, errors)
+        self.map_legacy_ids(self.room_ids, columns['id'], ids)
+        write_rows(self.connection(Room), Room.__table__, [
+            {'id': ids[i], 'property_id': self.property_id, 'room_number': columns['room_number'][i],
+             'floor': columns['floor'][i] if columns['floor'][i] is not None else floor_of(columns['room_number'][i]),
+             'room_type': columns['room_type'][i], 'rate_per_night_cents': columns['rate_per_night'][i],
+             'status': columns['status'][i] or 'available', 'updated_at': self.now}
+            for i in new])
+        self.new_ids['rooms'].extend(ids[i] for i in new)
+        self.channel_marks.extend((self.property_id, None, columns['room_type'][i], self.now.date(), None) for i in new)
+        return len(new)
+
+    def _load_bookings(self, columns, errors):
+        # Legacy ids first, the export's natural keys (email, room number) otherwise
+        guest_ids = [self.guest_ids.get(legacy_id) if legacy_id is not None else self.guest_emails.get(email)
+                     for legacy_id, email in zip(columns['guest_id'], columns['guest_email'])]
+        room_ids = [self.room_ids.get(legacy_id) if legacy_id is not None else self.room_numbers.get(number)
+                    for legacy_id, number in zip(columns['room_id'], columns['room_number'])]
+        check_ins, check_outs = columns['check_in_date'], columns['check_out_date']
+        for index, guest_id, room_id, check_in, check_out in zip(itertools.count(), guest_ids, room_ids,
+                                                                   check_ins, check_outs):
+            if index in errors:
+                continue
+            if guest_id is None:
+                errors[index] = 'unknown guest'
+            elif room_id is None:
+                errors[index] = 'unknown room'
+            elif check_out is not None and check_out < check_in:
+                errors[index] = 'check_out_date is before check_in_date'
+        self.check_legacy_ids(self.booking_ids, columns['id'], errors)
+        ids, new = self.assign_ids(Booking, list(zip(room_ids, check_ins)), self.booking_keys, errors, ArchivedBooking)
+        self.map_legacy_ids(self.booking_ids, columns['id'], ids)
+        rows, completed = [], []
+        for i in new:
+            is_reservation = bool(columns['is_reservation'][i])
+            is_active = columns['is_active'][i]
+            if is_active is None:
+                is_active = check_outs[i] is None and not is_reservation # No check-out yet: still in house
+            if is_active or is_reservation:
+                self.new_ids['blocking_bookings'].append(ids[i])
+                self.channel_marks.append((self.property_id, room_ids[i], None,
+                                           *stay_dates(check_ins[i], check_outs[i])))
+            elif check_outs[i] is not None:
+                completed.append((guest_ids[i], check_ins[i], check_outs[i], columns['total_amount'][i]))
+            self.booking_totals[ids[i]] = columns['total_amount'][i]
+            rows.append({'id': ids[i], 'property_id': self.property_id, 'guest_id': guest_ids[i],
+                         'room_id': room_ids[i], 'check_in_date': check_ins[i], 'check_out_date': check_outs[i],
+                         'total_amount_cents': columns['total_amount'][i], 'is_active': is_active,
+                         'is_reservation': is_reservation, 'created_at': columns['created_at'][i],
+                         'updated_at': self.now})
+        write_rows(self.connection(Booking), Booking.__table__, rows)
+        totals_by_guest(completed, self.guest_totals)
+        self.new_ids['bookings'].extend(ids[i] for i in new)
+        return len(new)
+
+    def _load_invoices(self, columns, errors):
+        booking_ids = [self.booking_ids.get(legacy_id) for legacy_id in columns['booking_id']]
+        for index, legacy_id, booking_id in zip(itertools.count(), columns['booking_id'], booking_ids):
+            if index not in errors and booking_id is None:
+                errors[index] = f"booking {legacy_id} was not imported"
+        ids, new = self.assign_ids(Invoice, booking_ids, self.invoices, errors, ArchivedInvoice)
+        invoices, payments = [], []
+        for i in new:
+            paid = columns['amount_paid'][i] or 0
+            status = columns['payment_status'][i]
+            if status is None:
+                status = 'paid' if paid and paid >= (self.booking_totals.get(booking_ids[i]) or 0) else 'pending'
+            issued = columns['issue_date'][i] or self.now
+            invoices.append({'id': ids[i], 'property_id': self.property_id, 'booking_id': booking_ids[i],
+                             'issue_date': issued, 'due_date': columns['due_date'][i], 'amount_paid_cents': paid,
+                             'payment_status': status, 'updated_at': self.now})
+            if paid:
+                # amount_paid is what the ledger adds up to, so the legacy balance becomes one opening payment
+                payments.append({'invoice_id': ids[i], 'property_id': self.property_id, 'amount_cents': paid,
+                                 'method': 'legacy', 'reference': 'import', 'posted_at': issued, 'posted_by': None})
+        for payment, payment_id in zip(payments, self.allocate_ids(Payment, len(payments), ArchivedPayment)):
+            payment['id'] = payment_id
+        write_rows(self.connection(Invoice), Invoice.__table__, invoices)
+        write_rows(self.connection(Payment), Payment.__table__, payments)
+        self.stats['invoices']['payments'] += len(payments)
+        return len(new)
+
+
+def import_legacy(directory, chunk_size=None, rejects_path=None, rebuild_indexes=True, dry_run=False):
+    """
+    Imports the exports found in `directory` into the active property scope and
+    returns the run's LegacyImport (per-table stats and timings). A dry run
+    validates and resolves everything, then rolls back.
+    """
+    paths = {table: find_export(directory, table) for table in TABLES}
+    if not any(paths.values()):
+        raise LegacyImportError(f"No {', '.join(TABLES)} export ({'/'.join(EXTENSIONS)}) found in {directory}.")
+    run = LegacyImport(chunk_size, rejects_path, rebuild_indexes)
+    try:
+        run.prepare()
+        for table in TABLES:
+            if paths[table]:
+                run.load(table, paths[table])
+        run.finish()
+        if dry_run:
+            db.session.rollback()
+            return run
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    finally:
+        run.close()
+    _refresh_caches(run)
+    return run
+
+
+def _refresh_caches(run):
+    """Brings this process's in-memory room state and availability index up to date."""
+    room_state = get_room_state()
+    if room_state is not None and run.new_ids['rooms']:
+        room_state.rooms_changed()
+    index = get_availability_index()
+    if index is not None and run.new_ids['blocking_bookings']:
+        index.bookings_changed(run.new_ids['blocking_bookings'])
+
+
+@click.command('import-legacy')
+@click.argument('directory', type=click.Path(exists=True, file_okay=False))
+@click.option('--property', 'property_code', default=None, help='Code of the property to import into.')
+@click.option('--chunk-size', type=int, default=None, help='Rows per chunk (default IMPORT_CHUNK_SIZE).')
+@click.option('--rejects', 'rejects_path', default=None,
+              help='Where to write rejected rows and reasons (default DIRECTORY/rejects.csv).')
+@click.option('--keep-indexes', is_flag=True,
+              help='Load with the secondary indexes in place even into empty tables (small imports).')
+@click.option('--dry-run', is_flag=True, help='Validate and resolve everything, then roll back.')
+@with_appcontext
+def import_legacy_command(directory, property_code, chunk_size, rejects_path, keep_indexes, dry_run):
+    """Bulk-load guests, rooms, bookings and invoices exported from another system."""
+    rejects_path = rejects_path or os.path.join(directory, 'rejects.csv')
+    prop = None
+    if property_code:
+        prop = Property.query.filter_by(code=property_code).first()
+        if prop is None:
+            raise click.ClickException(f"No property with code {property_code!r}.")
+    started = time.perf_counter()
+    try:
+        with property_scope(prop.id) if prop else nullcontext(), \
+                timed_run('import-legacy', prop.id if prop else None) as job:
+            run = import_legacy(directory, chunk_size, rejects_path, not keep_indexes, dry_run)
+            job['rows'] = 0 if dry_run else sum(stats['inserted'] for stats in run.stats.values())
+    except LegacyImportError as e:
+        raise click.ClickException(str(e))
+    elapsed = time.perf_counter() - started
+    for table in TABLES:
+        stats, seconds = run.stats[table], run.elapsed[table]
+        if not stats['read']:
+            continue
+        rate = stats['read'] / seconds if seconds else 0
+        extra = f", {stats['payments']} opening payments" if table == 'invoices' else ''
+        click.echo(f"{table:<9} {stats['read']:>9,} read  {stats['inserted']:>9,} inserted  "
+                   f"{stats['matched']:>7,} matched  {stats['rejected']:>7,} rejected  "
+                   f"{seconds:7.2f} s  {rate:>9,.0f} rows/s{extra}")
+    read = sum(stats['read'] for stats in run.stats.values())
+    rejected = sum(stats['rejected'] for stats in run.stats.values())
+    click.echo(f"{'Checked' if dry_run else 'Imported'} {read:,} rows in {elapsed:.2f} s "
+               f"({read / elapsed if elapsed else 0:,.0f} rows/s, indexes and search included)"
+               f"{' and rolled back' if dry_run else ''}.")
+    if rejected:
+        click.echo(f"{rejected:,} rows rejected; see {rejects_path}.")
+
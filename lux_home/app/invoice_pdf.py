@@ -0,0 +1,379 @@
+import hashlib
+import io
+from abc import ABC, abstractmethod
+import unicodedata
+import zlib
+from functools import lru_cache
+from flask import current_app, render_template
+
+# Invoice PDF rendering behind one interface, selected by INVOICE_PDF_BACKEND:
+#   'weasyprint' lays out INVOICE_PDF_TEMPLATE (HTML/CSS), so custom templates work;
+#   'native' draws the fixed one-page invoice straight to PDF from the same data.
+# The native backend keeps everything that does not depend on the invoice (the
+# static part of the page, fonts and their embedded subsets) cached per process,
+# so a render is a few hundred text operators plus one zlib call.
+
+PAGE_WIDTH, PAGE_HEIGHT = 595, 842 # A4 in points
+LEFT, RIGHT = 50, 545
+
+# Advance widths (1/1000 em) of the standard PDF fonts for printable ASCII, from their AFM metrics
+HELVETICA_WIDTHS = [
+    278, 278, 355, 556, 556, 889, 667, 191, 333, 333, 389, 584, 278, 333, 278, 278,
+    556, 556, 556, 556, 556, 556, 556, 556, 556, 556, 278, 278, 584, 584, 584, 556,
+    1015, 667, 667, 722, 722, 667, 611, 778, 722, 278, 500, 667, 556, 833, 722, 778,
+    667, 778, 722, 667, 611, 722, 667, 944, 667, 667, 611, 278, 278, 278, 469, 556,
+    333, 556, 556, 500, 556, 556, 278, 556, 556, 222, 222, 500, 222, 833, 556, 556,
+    556, 556, 333, 500, 278, 556, 500, 722, 500, 500, 500, 334, 260, 334, 584]
+HELVETICA_BOLD_WIDTHS = [
+    278, 333, 474, 556, 556, 889, 722, 238, 333, 333, 389, 584, 278, 333, 278, 278,
+    556, 556, 556, 556, 556, 556, 556, 556, 556, 556, 333, 333, 584, 584, 584, 611,
+    975, 722, 722, 722, 722, 667, 611, 778, 722, 278, 556, 722, 611, 833, 722, 778,
+    667, 778, 722, 667, 611, 722, 667, 944, 667, 667, 611, 333, 278, 333, 584, 556,
+    333, 556, 611, 556, 611, 556, 333, 611, 611, 278, 278, 556, 278, 889, 611, 611,
+    611, 611, 389, 556, 333, 611, 556, 778, 556, 556, 500, 389, 280, 389, 584]
+
+# Characters every embedded subset carries, so most invoices share one cached subset:
+# Latin-1, Latin Extended-A/B, Vietnamese (Latin Extended Additional), punctuation, currency
+BASE_CHARSET = frozenset(
+    [*range(0x20, 0x7f), *range(0xa0, 0x250), *range(0x1ea0, 0x1f00), *range(0x2010, 0x2027), *range(0x20a0, 0x20c0)])
+
+
+class InvoiceRenderer(ABC):
+    """Turns the invoice context (booking, invoice, guest, room, duration_days, balance_due) into PDF bytes."""
+    name = None
+
+    @abstractmethod
+    def render(self, context):
+        ...
+
+
+class WeasyPrintRenderer(InvoiceRenderer):
+    name = 'weasyprint'
+
+    def __init__(self, template='invoice_template.html'):
+        self.template = template
+
+    def render(self, context):
+        from weasyprint import HTML # Imported on first use; the native backend never loads it
+        html_out = render_template(self.template, is_pdf_render=True, **context)
+        return HTML(string=html_out).write_pdf()
+
+
+class StandardFont:
+    """One of the 14 standard PDF fonts: nothing embedded, WinAnsi text, ASCII metrics from the AFM."""
+
+    def __init__(self, base_font, widths):
+        self.base_font = base_font
+        self.widths = widths
+
+    def encode(self, text):
+        return b'(' + _escape(text.encode('cp1252', errors='replace')) + b')'
+
+    def width(self, text, size):
+        total = 0
+        for char in text:
+            code = ord(unicodedata.normalize('NFKD', char)[0]) # Accented letters measure as their base letter
+            total += self.widths[code - 32] if 32 <= code < 127 else 556
+        return total * size / 1000
+
+    def objects(self, number, text):
+        return {number: f"<< /Type /Font /Subtype /Type1 /BaseFont /{self.base_font} /Encoding /WinAnsiEncoding >>".encode()}
+
+
+class EmbeddedFont:
+    """
+    A TrueType font embedded as a subset (Type0 / Identity-H). The file is parsed
+    once per process and subsets are cached by character set, so invoices whose
+    text stays within BASE_CHARSET all reuse the same font objects.
+    """
+
+    def __init__(self, path):
+        from fontTools.ttLib import TTFont
+        font = TTFont(path, lazy=True)
+        self.path = path
+        scale = 1000 / font['head'].unitsPerEm
+        glyph_ids = font.getReverseGlyphMap()
+        self.gids = {code: glyph_ids[name] for code, name in font.getBestCmap().items()}
+        hmtx = font['hmtx']
+        order = font.getGlyphOrder()
+        self.advances = {gid: round(hmtx[order[gid]][0] * scale) for gid in set(self.gids.values()) | {0}}
+        head, hhea = font['head'], font['hhea']
+        os2 = font['OS/2'] if 'OS/2' in font else None
+        self.bbox = [round(v * scale) for v in (head.xMin, head.yMin, head.xMax, head.yMax)]
+        self.ascent = round(hhea.ascent * scale)
+        self.descent = round(hhea.descent * scale)
+        self.cap_height = round(getattr(os2, 'sCapHeight', 0) * scale) or self.ascent
+        self.italic_angle = font['post'].italicAngle if 'post' in font else 0
+        name = font['name'].getDebugName(6) or 'Embedded'
+        self.postscript_name = ''.join(c for c in name if c.isalnum() or c == '-')
+        font.close()
+        self._objects = lru_cache(maxsize=32)(self._build_objects)
+
+    def encode(self, text):
+        return b'<' + ''.join(f"{self.gids.get(ord(char), 0):04X}" for char in text).encode() + b'>'
+
+    def width(self, text, size):
+        return sum(self.advances[self.gids.get(ord(char), 0)] for char in text) * size / 1000
+
+    def objects(self, number, text):
+        extra = frozenset(ord(char) for char in text if ord(char) not in BASE_CHARSET and ord(char) in self.gids)
+        return self._objects(number, extra)
+
+    def subset(self, codes):
+        from fontTools import subset
+        from fontTools.ttLib import TTFont
+        options = subset.Options()
+        options.retain_gids = True # Glyph ids stay valid, so CIDToGIDMap is /Identity
+        options.layout_features = []
+        options.name_IDs = []
+        options.notdef_outline = True
+        font = TTFont(self.path)
+        subsetter = subset.Subsetter(options)
+        subsetter.populate(unicodes=codes)
+        subsetter.subset(font)
+        out = io.BytesIO()
+        font.save(out)
+        return out.getvalue()
+
+    def _build_objects(self, number, extra):
+        codes = sorted(code for code in BASE_CHARSET | extra if code in self.gids)
+        data = self.subset(codes)
+        tag = ''.join(chr(65 + b % 26) for b in hashlib.sha1(repr(codes).encode()).digest()[:6])
+        name = f"{tag}+{self.postscript_name}"
+        by_gid = {}
+        for code in codes:
+            by_gid.setdefault(self.gids[code], code)
+        widths = ' '.join(f"{gid} [{self.advances[gid]}]" for gid in sorted(by_gid))
+        cmap = '\n'.join(
+            f"{len(chunk)} beginbfchar\n" + '\n'.join(f"<{gid:04X}> <{_utf16_hex(code)}>" for gid, code in chunk)
+            + "\nendbfchar" for chunk in _chunks(sorted(by_gid.items()), 100))
+        to_unicode = ("/CIDInit /ProcSet findresource begin\n12 dict begin\nbegincmap\n"
+                      "/CIDSystemInfo << /Registry (Adobe) /Ordering (UCS) /Supplement 0 >> def\n"
+                      "/CMapName /Adobe-Identity-UCS def\n/CMapType 2 def\n"
+                      "1 begincodespacerange\n<0000> <FFFF>\nendcodespacerange\n"
+                      f"{cmap}\nendcmap\nCMapName currentdict /CIDInit defineresource pop\nend\nend")
+        return {
+            number: (f"<< /Type /Font /Subtype /Type0 /BaseFont /{name} /Encoding /Identity-H "
+                     f"/DescendantFonts [{number + 1} 0 R] /ToUnicode {number + 4} 0 R >>").encode(),
+            number + 1: (f"<< /Type /Font /Subtype /CIDFontType2 /BaseFont /{name} "
+                         f"/CIDSystemInfo << /Registry (Adobe) /Ordering (Identity) /Supplement 0 >> "
+                         f"/FontDescriptor {number + 2} 0 R /DW 1000 /W [{widths}] /CIDToGIDMap /Identity >>").encode(),
+            number + 2: (f"<< /Type /FontDescriptor /FontName /{name} /Flags 32 /FontBBox [{' '.join(map(str, self.bbox))}] "
+                         f"/ItalicAngle {self.italic_angle} /Ascent {self.ascent} /Descent {self.descent} "
+                         f"/CapHeight {self.cap_height} /StemV 80 /FontFile2 {number + 3} 0 R >>").encode(),
+            number + 3: _stream(data, f"/Length1 {len(data)}"),
+            number + 4: _stream(to_unicode.encode()),
+        }
+
+
+def _escape(data):
+    return data.replace(b'\\', b'\\\\').replace(b'(', b'\\(').replace(b')', b'\\)')
+
+
+def _utf16_hex(code):
+    return chr(code).encode('utf-16-be').hex().upper()
+
+
+def _chunks(items, size):
+    return [items[i:i + size] for i in range(0, len(items), size)]
+
+
+def _stream(data, extra=''):
+    compressed = zlib.compress(data, 6)
+    return (f"<< /Length {len(compressed)} /Filter /FlateDecode {extra}>>\nstream\n".encode()
+            + compressed + b"\nendstream")
+
+
+def _money(amount):
+    return f"${amount or 0:,.2f}"
+
+
+def _date(value, fmt='%Y-%m-%d'):
+    return value.strftime(fmt) if value else 'N/A'
+
+
+class Page:
+    """Content stream builder with the two fonts of the invoice (F1 regular, F2 bold)."""
+
+    def __init__(self, regular, bold, fake_bold):
+        self.fonts = {'F1': regular, 'F2': bold}
+        self.fake_bold = fake_bold
+        self.ops = []
+        self.text = []
+
+    def write(self, x, y, text, size=10, bold=False, align='left'):
+        text = str(text)
+        key = 'F2' if bold else 'F1'
+        font = self.fonts[key]
+        if align == 'right':
+            x -= font.width(text, size)
+        render = b' 2 Tr 0.35 w' if bold and self.fake_bold else b''
+        self.ops.append(b'BT /%s %g Tf%s %.2f %.2f Td %s Tj ET' % (key.encode(), size, render, x, y, font.encode(text))
+                        + (b' 0 Tr' if render else b''))
+        self.text.append((key, text))
+
+    def rule(self, x1, y, x2, width=0.5):
+        self.ops.append(b'%.2f w %d %.2f m %d %.2f l S' % (width, x1, y, x2, y))
+
+    def band(self, x, y, w, h, gray=0.93):
+        self.ops.append(b'%.2f g %d %.2f %d %d re f 0 g' % (gray, x, y, w, h))
+
+    def content(self):
+        return b'\n'.join(self.ops)
+
+
+class NativePdfRenderer(InvoiceRenderer):
+    """Draws the invoice of invoice_template.html directly as one PDF page."""
+    name = 'native'
+    MAX_PAYMENT_ROWS = 14 # What fits above the footer; more are summarised in one line
+
+    def __init__(self, font_path=None, bold_font_path=None):
+        if font_path:
+            self.regular = _embedded_font(font_path)
+            self.bold = _embedded_font(bold_font_path) if bold_font_path else self.regular
+            self.fake_bold = not bold_font_path
+        else:
+            self.regular = StandardFont('Helvetica', HELVETICA_WIDTHS)
+            self.bold = StandardFont('Helvetica-Bold', HELVETICA_BOLD_WIDTHS)
+            self.fake_bold = False
+        self._static = None
+
+    def page(self):
+        return Page(self.regular, self.bold, self.fake_bold)
+
+    def static_page(self):
+        """The parts of the page that never change: title, company block, labels, rules. Built once."""
+        if self._static is None:
+            page = self.page()
+            page.write(LEFT, 770, 'INVOICE', size=24, bold=True)
+            page.write(RIGHT, 786, 'Lux Home', size=11, bold=True, align='right')
+            for i, line in enumerate(['123 Dream Lane, Paradise City', 'Phone: (123) 456-7890',
+                                      'Email: contact@luxhome.xyz']):
+                page.write(RIGHT, 772 - i * 12, line, size=9, align='right')
+            page.rule(LEFT, 735, RIGHT, width=1)
+            for i, label in enumerate(['Invoice Number:', 'Issue Date:', 'Due Date:']):
+                page.write(LEFT, 712 - i * 15, label, bold=True)
+            page.write(320, 712, 'Billed To:', bold=True)
+            page.write(LEFT, 650, 'Booking Details', size=11, bold=True)
+            for i, label in enumerate(['Room Number:', 'Room Type:', 'Check-in Date:', 'Check-out Date:']):
+                page.write(LEFT, 632 - i * 15, label, bold=True)
+            page.write(LEFT, 552, 'Charges', size=11, bold=True)
+            page.band(LEFT, 528, RIGHT - LEFT, 18)
+            page.write(LEFT + 6, 533, 'Description', bold=True)
+            page.write(RIGHT - 6, 533, 'Amount', bold=True, align='right')
+            page.rule(LEFT, 485, RIGHT)
+            for i, label in enumerate(['Total Amount Due:', 'Amount Paid:', 'Balance Due:']):
+                page.write(440, 468 - i * 16, label, bold=True, align='right')
+            page.write(LEFT, 70, 'Thank you for choosing Lux Home!', size=9)
+            page.write(LEFT, 58, 'Please contact us if you have any questions regarding this invoice.', size=9)
+            self._static = (page.content(), ''.join(text for _, text in page.text))
+        return self._static
+
+    def render(self, context):
+        booking, invoice, guest, room = context['booking'], context['invoice'], context['guest'], context['room']
+        total = booking.total_amount
+        balance = context.get('balance_due')
+        page = self.page()
+        page.write(150, 712, f"#{invoice.id}")
+        page.write(150, 697, _date(invoice.issue_date))
+        page.write(150, 682, _date(invoice.due_date))
+        for i, line in enumerate(filter(None, [guest.name, guest.email, guest.phone])):
+            page.write(385, 712 - i * 15, line)
+        page.write(150, 632, room.room_number)
+        page.write(150, 617, room.room_type)
+        page.write(150, 602, _date(booking.check_in_date, '%Y-%m-%d %H:%M'))
+        page.write(150, 587, _date(booking.check_out_date, '%Y-%m-%d %H:%M'))
+        page.write(LEFT + 6, 512, f"Room Charge: {room.room_type} ({room.room_number})")
+        page.write(LEFT + 6, 498, f"{context.get('duration_days', 1)} night(s) at {_money(room.rate_per_night)}/night", size=9)
+        page.write(RIGHT - 6, 512, _money(total), align='right')
+        page.write(RIGHT - 6, 468, _money(total), bold=True, align='right')
+        page.write(RIGHT - 6, 452, _money(invoice.amount_paid), align='right')
+        page.write(RIGHT - 6, 436, _money(balance if balance is not None else (total or 0) - invoice.amount_paid),
+                   bold=True, align='right')
+
+        y = 400
+        payments = list(getattr(invoice, 'payments', None) or [])
+        if payments:
+            page.write(LEFT, y, 'Payments', size=11, bold=True)
+            page.band(LEFT, y - 24, RIGHT - LEFT, 18)
+            page.write(LEFT + 6, y - 19, 'Date', bold=True)
+            page.write(LEFT + 130, y - 19, 'Method', bold=True)
+            page.write(RIGHT - 6, y - 19, 'Amount', bold=True, align='right')
+            y -= 40
+            shown = payments if len(payments) <= self.MAX_PAYMENT_ROWS else payments[:self.MAX_PAYMENT_ROWS - 1]
+            for payment in shown:
+                method = f"{payment.method} ({payment.reference})" if payment.reference else payment.method
+                page.write(LEFT + 6, y, _date(payment.posted_at, '%Y-%m-%d %H:%M'), size=9)
+                page.write(LEFT + 130, y, method, size=9)
+                page.write(RIGHT - 6, y, _money(payment.amount), size=9, align='right')
+                y -= 15
+            if len(shown) < len(payments):
+                rest = payments[len(shown):]
+                page.write(LEFT + 6, y, f"... and {len(rest)} more payment(s)", size=9)
+                page.write(RIGHT - 6, y, _money(sum(p.amount for p in rest)), size=9, align='right')
+                y -= 15
+            y -= 10
+        page.write(LEFT, y - 10, f"Payment Status: {invoice.payment_status}", size=11, bold=True)
+
+        static_content, static_text = self.static_page()
+        return build_pdf(static_content + b'\n' + page.content(), self.regular, self.bold,
+                         static_text + ''.join(text for _, text in page.text))
+
+
+@lru_cache(maxsize=8)
+def _embedded_font(path):
+    return EmbeddedFont(path)
+
+
+def build_pdf(content, regular, bold, text):
+    """Serializes a one-page PDF: catalog, page tree, page, content stream and the font objects."""
+    objects = {
+        1: b"<< /Type /Catalog /Pages 2 0 R >>",
+        2: b"<< /Type /Pages /Kids [3 0 R] /Count 1 >>",
+        3: (f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 {PAGE_WIDTH} {PAGE_HEIGHT}] "
+            f"/Resources << /Font << /F1 5 0 R /F2 {'5' if bold is regular else '10'} 0 R >> >> /Contents 4 0 R >>").encode(),
+        4: _stream(content),
+    }
+    objects.update(regular.objects(5, text))
+    if bold is not regular:
+        objects.update(bold.objects(10, text))
+    out = bytearray(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+    offsets = {}
+    for number in sorted(objects):
+        offsets[number] = len(out)
+        out += b"%d 0 obj\n" % number + objects[number] + b"\nendobj\n"
+    size = max(objects) + 1
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % size
+    for number in range(1, size):
+        out += b"%010d 00000 n \n" % offsets[number] if number in offsets else b"0000000000 65535 f \n"
+    out += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (size, xref)
+    return bytes(out)
+
+
+RENDERERS = {
+    'weasyprint': WeasyPrintRenderer,
+    'native': NativePdfRenderer,
+}
+
+
+def make_renderer(config):
+    # The native backend only covers every script with an embedded font; Helvetica is cp1252
+    backend = config.get('INVOICE_PDF_BACKEND') or ('native' if config.get('INVOICE_PDF_FONT') else 'weasyprint')
+    if backend == 'native':
+        return NativePdfRenderer(config.get('INVOICE_PDF_FONT'), config.get('INVOICE_PDF_FONT_BOLD'))
+    if backend == 'weasyprint':
+        return WeasyPrintRenderer(config.get('INVOICE_PDF_TEMPLATE', 'invoice_template.html'))
+    raise ValueError(f"Unknown INVOICE_PDF_BACKEND {backend!r}; expected one of {', '.join(RENDERERS)}.")
+
+
+def get_invoice_renderer():
+    """The configured renderer, created once per app (it holds the process-wide font and layout caches)."""
+    renderer = current_app.extensions.get('invoice_renderer')
+    if renderer is None:
+        renderer = current_app.extensions['invoice_renderer'] = make_renderer(current_app.config)
+    return renderer
+
+
+def render_invoice_pdf(**context):
+    return get_invoice_renderer().render(context)
@@ -0,0 +1,144 @@
+from datetime import datetime, timedelta
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+from sqlalchemy import select, update, insert, func, case, or_
+from app import db
+from app.models import Invoice, Booking, Payment, BalanceSnapshot
+from app.money import to_cents
+
+AGING_BUCKETS = ('current', '1-30', '31-60', '61-90', '90+')
+
+
+def post_payment(invoice_id, amount, method='cash', reference=None, posted_by=None):
+    """
+    Appends a payment (negative amount = refund) to the ledger. The invoice's
+    amount_paid/payment_status are bumped with one atomic UPDATE in the same
+    transaction, so concurrent card and cash postings never overwrite each other.
+    """
+    amount_cents = to_cents(amount)
+    if not amount_cents:
+        raise ValueError("Payment amount must be non-zero.")
+    invoice = db.session.get(Invoice, invoice_id)
+    if not invoice:
+        raise ValueError(f"Invoice {invoice_id} not found.")
+
+    payment = Payment(invoice_id=invoice.id, property_id=invoice.property_id, amount_cents=amount_cents,
+                      method=method, reference=reference, posted_by=posted_by)
+    db.session.add(payment)
+    total_cents = select(Booking.total_amount_cents).where(Booking.id == Invoice.booking_id).scalar_subquery()
+    new_paid = Invoice.amount_paid_cents + amount_cents
+    db.session.execute(
+        update(Invoice).where(Invoice.id == invoice.id).values(
+            amount_paid_cents=new_paid,
+            payment_status=case((total_cents.is_(None), Invoice.payment_status), # Nothing billed yet to settle
+                                (new_paid >= total_cents, 'paid'),
+                                (Invoice.payment_status == 'paid', 'pending'), # A refund reopened it
+                                else_=Invoice.payment_status),
+        ),
+        execution_options={'synchronize_session': False},
+    )
+    db.session.commit()
+    db.session.refresh(invoice)
+    return payment
+
+
+def paid_to_date_cents(invoice_id):
+    """Latest snapshot plus the ledger tail after it (an index range on (invoice_id, id))."""
+    snapshot = BalanceSnapshot.query.filter_by(invoice_id=invoice_id).first()
+    base, last_id = (snapshot.paid_cents, snapshot.last_payment_id) if snapshot else (0, 0)
+    tail = db.session.scalar(
+        select(func.coalesce(func.sum(Payment.amount_cents), 0))
+        .where(Payment.invoice_id == invoice_id, Payment.id > last_id)
+    )
+    return base + int(tail)
+
+
+def outstanding_balance_cents(invoice_id):
+    invoice = db.session.get(Invoice, invoice_id)
+    if not invoice:
+        return None
+    return (invoice.booking.total_amount_cents or 0) - paid_to_date_cents(invoice_id)
+
+
+def take_balance_snapshots(now=None, lag=None):
+    """
+    Rolls every invoice's snapshot forward over payments posted since its last
+    snapshot, using one grouped query over the ledger tail. Returns the number of
+    invoices whose snapshot moved.
+
+    Ids are handed out at flush but only become visible at commit, so a payment
+    still committing can have a lower id than one already visible, and the tail
+    (ids above last_payment_id) would never count it. Snapshots therefore stop
+    below the first payment posted within the last `lag` seconds
+    (BALANCE_SNAPSHOT_LAG); only a transaction left open longer than that can
+    still be passed over.
+    """
+    now = now or datetime.utcnow()
+    lag = lag if lag is not None else current_app.config.get('BALANCE_SNAPSHOT_LAG', 300)
+    first_recent = (select(func.min(Payment.id)).where(Payment.posted_at >= now - timedelta(seconds=lag))
+                    .scalar_subquery())
+    tail = db.session.execute(
+        select(Payment.invoice_id, Payment.property_id, func.sum(Payment.amount_cents), func.max(Payment.id))
+        .outerjoin(BalanceSnapshot, BalanceSnapshot.invoice_id == Payment.invoice_id)
+        .where(Payment.id > func.coalesce(BalanceSnapshot.last_payment_id, 0),
+               or_(first_recent.is_(None), Payment.id < first_recent))
+        .group_by(Payment.invoice_id, Payment.property_id)
+    ).all()
+    if not tail:
+        return 0
+
+    existing = {s.invoice_id: s for s in BalanceSnapshot.query.filter(
+        BalanceSnapshot.invoice_id.in_([row[0] for row in tail])).all()}
+    new_rows = []
+    for invoice_id, property_id, paid_cents, last_payment_id in tail:
+        snapshot = existing.get(invoice_id)
+        if snapshot:
+            snapshot.paid_cents += int(paid_cents)
+            snapshot.last_payment_id = last_payment_id
+            snapshot.taken_at = now
+        else:
+            new_rows.append({'invoice_id': invoice_id, 'property_id': property_id, 'paid_cents': int(paid_cents),
+                             'last_payment_id': last_payment_id, 'taken_at': now})
+    if new_rows:
+        db.session.execute(insert(BalanceSnapshot), new_rows)
+    db.session.commit()
+    return len(tail)
+
+
+def receivables_aging(as_of=None):
+    """
+    Outstanding receivables grouped into aging buckets by days past due date,
+    computed in one grouped query over invoices and the payment ledger.
+    Returns {bucket: {'invoices': n, 'outstanding': amount}} for every bucket.
+    """
+    as_of = as_of or datetime.utcnow()
+    paid = (select(Payment.invoice_id, func.sum(Payment.amount_cents).label('paid_cents'))
+            .group_by(Payment.invoice_id).subquery())
+    outstanding = func.coalesce(Booking.total_amount_cents, 0) - func.coalesce(paid.c.paid_cents, 0)
+    bucket = case(
+        (Invoice.due_date.is_(None), 'current'),
+        (Invoice.due_date >= as_of, 'current'),
+        (Invoice.due_date >= as_of - timedelta(days=30), '1-30'),
+        (Invoice.due_date >= as_of - timedelta(days=60), '31-60'),
+        (Invoice.due_date >= as_of - timedelta(days=90), '61-90'),
+        else_='90+',
+    ).label('bucket')
+    rows = db.session.execute(
+        select(bucket, func.count(Invoice.id), func.sum(outstanding))
+        .join(Booking, Booking.id == Invoice.booking_id)
+        .outerjoin(paid, paid.c.invoice_id == Invoice.id)
+        .where(outstanding > 0)
+        .group_by(bucket)
+    ).all()
+    report = {name: {'invoices': 0, 'outstanding': 0.0} for name in AGING_BUCKETS}
+    for name, count, cents in rows:
+        report[name] = {'invoices': count, 'outstanding': int(cents) / 100}
+    return report
+
+
+@click.command('snapshot-balances')
+@with_appcontext
+def snapshot_balances_command():
+    """Roll invoice balance snapshots forward over newly posted payments."""
+    click.echo(f"Updated balance snapshots for {take_balance_snapshots()} invoices.")
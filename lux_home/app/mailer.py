@@ -0,0 +1,123 @@
+import smtplib
+import threading
+from contextlib import contextmanager
+from email.message import EmailMessage
+from flask import current_app
+
+
+class SMTPPool:
+    """
+    Keeps up to `size` idle SMTP connections open and hands them out one at a
+    time, so a worker draining the outbox logs in once instead of per message.
+    An idle connection is checked with NOOP before reuse; one that failed with a
+    connection error is closed instead of being returned.
+    """
+
+    def __init__(self, host, port, username=None, password=None, use_tls=False, timeout=10, size=2):
+        self.host = host
+        self.port = port
+        self.username = username
+        self.password = password
+        self.use_tls = use_tls
+        self.timeout = timeout
+        self.size = size
+        self._idle = []
+        self._lock = threading.Lock()
+        self.opened = 0 # Connections opened over the pool's lifetime
+
+    def _connect(self):
+        conn = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+        if self.use_tls:
+            conn.starttls()
+        if self.username:
+            conn.login(self.username, self.password)
+        self.opened += 1
+        return conn
+
+    @staticmethod
+    def _close(conn):
+        try:
+            conn.quit()
+        except OSError: # smtplib errors are OSErrors too
+            conn.close()
+
+    def _checkout(self):
+        while True:
+            with self._lock:
+                conn = self._idle.pop() if self._idle else None
+            if conn is None:
+                return self._connect()
+            try:
+                if conn.noop()[0] == 250:
+                    return conn
+            except OSError: # smtplib errors are OSErrors too
+                pass
+            conn.close()
+
+    @contextmanager
+    def connection(self):
+        conn = self._checkout()
+        try:
+            yield conn
+        except smtplib.SMTPServerDisconnected:
+            conn.close()
+            raise
+        except smtplib.SMTPException:
+            # The server rejected this message; reset the transaction and keep the connection
+            try:
+                conn.rset()
+            except OSError:
+                conn.close()
+                raise
+            self._release(conn)
+            raise
+        except OSError: # Socket errors: the connection is gone
+            conn.close()
+            raise
+        except BaseException:
+            self._release(conn)
+            raise
+        else:
+            self._release(conn)
+
+    def _release(self, conn):
+        with self._lock:
+            if len(self._idle) < self.size:
+                self._idle.append(conn)
+                return
+        self._close(conn)
+
+    def close_all(self):
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for conn in idle:
+            self._close(conn)
+
+
+def get_smtp_pool():
+    """The app's SMTPPool, created from the MAIL_* settings on first use."""
+    pool = current_app.extensions.get('smtp_pool')
+    if pool is None:
+        config = current_app.config
+        pool = current_app.extensions.setdefault('smtp_pool', SMTPPool(
+            config.get('MAIL_SERVER', 'localhost'), config.get('MAIL_PORT', 25),
+            username=config.get('MAIL_USERNAME'), password=config.get('MAIL_PASSWORD'),
+            use_tls=config.get('MAIL_USE_TLS', False), timeout=config.get('MAIL_TIMEOUT', 10),
+            size=config.get('MAIL_POOL_SIZE', 2),
+        ))
+    return pool
+
+
+def build_message(recipient, subject, text, html=None, attachments=()):
+    """EmailMessage from the default sender. attachments: (filename, bytes, mime type) tuples."""
+    message = EmailMessage()
+    message['From'] = current_app.config.get('MAIL_DEFAULT_SENDER', 'billing@luxhome.xyz')
+    message['To'] = recipient
+    message['Subject'] = subject
+    message.set_content(text)
+    if html:
+        message.add_alternative(html, subtype='html')
+    for filename, data, mime_type in attachments:
+        maintype, subtype = mime_type.split('/')
+        message.add_attachment(data, maintype=maintype, subtype=subtype, filename=filename)
+    return message
@@ -1,11 +1,14 @@
 from datetime import datetime
 from app import db, bcrypt # Import bcrypt
 from flask_login import UserMixin # Import UserMixin
+from app.money import money_property
+from sqlalchemy import event
 
 class User(db.Model, UserMixin):
     id = db.Column(db.Integer, primary_key=True)
     username = db.Column(db.String(80), unique=True, nullable=False)
     password_hash = db.Column(db.String(128), nullable=False)
+    is_admin = db.Column(db.Boolean, nullable=False, default=False) # Admin-only pages (profiling, audit trail); `flask grant-admin`
 
     def set_password(self, password):
         self.password_hash = bcrypt.generate_password_hash(password).decode('utf-8')
@@ -16,18 +19,53 @@ class User(db.Model, UserMixin):
     def __repr__(self):
         return f"User('{self.username}')"
 
+class Property(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    code = db.Column(db.String(20), unique=True, nullable=False)
+    name = db.Column(db.String(100), nullable=False)
+    # Key into SQLALCHEMY_BINDS; None keeps the property's rooms/bookings/invoices in the default db
+    bind_key = db.Column(db.String(50), nullable=True)
+
+    def __repr__(self):
+        return f"Property('{self.code}', '{self.name}')"
+
+def floor_of(room_number):
+    """Floor encoded in a room number: the digits before the last two ('101' -> 1, '1205' -> 12, '12' -> 0)."""
+    digits = ''
+    for char in room_number or '':
+        if not char.isdigit():
+            break
+        digits += char
+    return int(digits[:-2] or 0) if digits else None
+
+def _default_floor(context):
+    return floor_of(context.get_current_parameters().get('room_number'))
+
 class Room(db.Model):
+    __property_scoped__ = True # Routed per property by app.sharding.PropertySession
+    __table_args__ = (db.UniqueConstraint('property_id', 'room_number', name='uq_room_property_number'),
+                      # NULLs never collide in the constraint above, so rooms outside any property need their own
+                      db.Index('uq_room_number_unscoped', 'room_number', unique=True,
+                               sqlite_where=db.text('property_id IS NULL'),
+                               postgresql_where=db.text('property_id IS NULL')),
+                      db.Index('ix_room_property_floor', 'property_id', 'floor', 'room_number')) # Dashboard grid order
     id = db.Column(db.Integer, primary_key=True)
-    room_number = db.Column(db.String(50), unique=True, nullable=False)
+    property_id = db.Column(db.Integer, db.ForeignKey('property.id'), nullable=True, index=True)
+    room_number = db.Column(db.String(50), nullable=False)
+    floor = db.Column(db.Integer, nullable=True, default=_default_floor) # None when the room number doesn't say
     room_type = db.Column(db.String(100), nullable=False)
-    rate_per_night = db.Column(db.Float, nullable=False)
+    rate_per_night_cents = db.Column(db.Integer, nullable=False)
+    rate_per_night = money_property('rate_per_night_cents')
     status = db.Column(db.String(50), nullable=False, default='available')
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow, index=True) # Data version for ETags
     bookings = db.relationship('Booking', backref='room', lazy=True)
 
     def __repr__(self):
         return f"Room('{self.room_number}', '{self.room_type}', '{self.status}')"
 
 class Guest(db.Model):
+    # Check-in's duplicate check compares lower(email); the unique constraint on email does not serve it
+    __table_args__ = (db.Index('ix_guest_email_lower', db.func.lower(db.text('email'))),)
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(100), nullable=False)
     email = db.Column(db.String(120), unique=True, nullable=False)
@@ -37,14 +75,42 @@ class Guest(db.Model):
     def __repr__(self):
         return f"Guest('{self.name}', '{self.email}')"
 
+class GuestStats(db.Model):
+    """Lifetime totals of a guest's completed stays, kept current at check-out (app.guest_stats)."""
+    __tablename__ = 'guest_stats' # Lives with guest on the default db, whichever shard the stays are on
+    __table_args__ = (db.Index('ix_guest_stats_revenue', 'revenue_cents', 'guest_id'), # Top guests off the index end
+                      db.Index('ix_guest_stats_last_stay', 'last_stay_at'))
+    guest_id = db.Column(db.Integer, db.ForeignKey('guest.id'), primary_key=True)
+    stays = db.Column(db.Integer, nullable=False, default=0)
+    nights = db.Column(db.Integer, nullable=False, default=0)
+    revenue_cents = db.Column(db.Integer, nullable=False, default=0)
+    revenue = money_property('revenue_cents')
+    first_stay_at = db.Column(db.DateTime, nullable=True) # Check-in of the first completed stay
+    last_stay_at = db.Column(db.DateTime, nullable=True) # Check-out of the latest
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f"GuestStats('{self.guest_id}', '{self.stays}', '{self.revenue_cents}')"
+
 class Booking(db.Model):
+    __property_scoped__ = True
+    # Archived ids must never be reused, and the dashboard reads recent check-outs by (is_active, check_out_date)
+    __table_args__ = (db.Index('ix_booking_active_checkout', 'is_active', 'check_out_date'),
+                      db.Index('ix_booking_room_dates', 'room_id', 'check_in_date', 'check_out_date'), # Overlap checks
+                      {'sqlite_autoincrement': True})
     id = db.Column(db.Integer, primary_key=True)
-    guest_id = db.Column(db.Integer, db.ForeignKey('guest.id'), nullable=False)
+    property_id = db.Column(db.Integer, db.ForeignKey('property.id'), nullable=True, index=True)
+    guest_id = db.Column(db.Integer, db.ForeignKey('guest.id'), nullable=False, index=True) # Search refresh, dedup, guest stats
     room_id = db.Column(db.Integer, db.ForeignKey('room.id'), nullable=False)
     check_in_date = db.Column(db.DateTime, nullable=False)
     check_out_date = db.Column(db.DateTime, nullable=True)
-    total_amount = db.Column(db.Float, nullable=True)
+    total_amount_cents = db.Column(db.Integer, nullable=True)
+    total_amount = money_property('total_amount_cents')
     is_active = db.Column(db.Boolean, nullable=False, default=True)
+    # Advance reservation not yet checked in (is_active stays False until arrival)
+    is_reservation = db.Column(db.Boolean, nullable=False, default=False)
+    created_at = db.Column(db.DateTime, nullable=True, default=datetime.utcnow) # Booking lead times (app.forecast); None when unknown
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow, index=True) # Data version for ETags
     invoice = db.relationship('Invoice', backref=db.backref('booking', uselist=False), lazy=True)
     booking_services = db.relationship('BookingService', backref='booking', lazy=True)
 
@@ -52,12 +118,18 @@ class Booking(db.Model):
         return f"Booking('{self.guest_id}', '{self.room_id}', '{self.check_in_date}')"
 
 class Invoice(db.Model):
+    __property_scoped__ = True
+    # Serves the overdue sweep (status = 'pending' AND due_date < now) as an index range scan
+    __table_args__ = (db.Index('ix_invoice_status_due', 'payment_status', 'due_date'), {'sqlite_autoincrement': True})
     id = db.Column(db.Integer, primary_key=True)
+    property_id = db.Column(db.Integer, db.ForeignKey('property.id'), nullable=True, index=True)
     booking_id = db.Column(db.Integer, db.ForeignKey('booking.id'), nullable=False, unique=True)
     issue_date = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
     due_date = db.Column(db.DateTime, nullable=True)
-    amount_paid = db.Column(db.Float, nullable=False, default=0.0)
+    amount_paid_cents = db.Column(db.Integer, nullable=False, default=0)
+    amount_paid = money_property('amount_paid_cents')
     payment_status = db.Column(db.String(50), nullable=False, default='pending')
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow, index=True) # Data version for ETags
 
     def __repr__(self):
         return f"Invoice('{self.booking_id}', '{self.issue_date}', '{self.payment_status}')"
@@ -65,17 +137,336 @@ class Invoice(db.Model):
 class Service(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(100), nullable=False, unique=True)
-    price = db.Column(db.Float, nullable=False)
+    price_cents = db.Column(db.Integer, nullable=False)
+    price = money_property('price_cents')
     booking_services = db.relationship('BookingService', backref='service', lazy=True)
 
     def __repr__(self):
         return f"Service('{self.name}', '{self.price}')"
 
 class BookingService(db.Model):
+    __property_scoped__ = True # Lives with its booking; the Service catalog stays on the default db
+    __table_args__ = {'sqlite_autoincrement': True}
     id = db.Column(db.Integer, primary_key=True)
+    property_id = db.Column(db.Integer, db.ForeignKey('property.id'), nullable=True, index=True)
     booking_id = db.Column(db.Integer, db.ForeignKey('booking.id'), nullable=False)
     service_id = db.Column(db.Integer, db.ForeignKey('service.id'), nullable=False)
     quantity = db.Column(db.Integer, nullable=False, default=1)
 
     def __repr__(self):
         return f"BookingService('{self.booking_id}', '{self.service_id}', '{self.quantity}')"
+
+class IdempotencyKey(db.Model):
+    """Remembers the result of a retried operation (e.g. group checkout) so replays are no-ops."""
+    __property_scoped__ = True # Committed in the same shard transaction as the work it guards
+    # Keys are per property: properties sharing a database may pick the same one
+    __table_args__ = (db.UniqueConstraint('property_id', 'scope', 'key', name='uq_idempotency_property_scope_key'),
+                      db.Index('uq_idempotency_scope_key_unscoped', 'scope', 'key', unique=True,
+                               sqlite_where=db.text('property_id IS NULL'),
+                               postgresql_where=db.text('property_id IS NULL')))
+    id = db.Column(db.Integer, primary_key=True)
+    property_id = db.Column(db.Integer, nullable=True)
+    scope = db.Column(db.String(50), nullable=False)
+    key = db.Column(db.String(100), nullable=False)
+    response = db.Column(db.Text, nullable=False) # JSON result returned to every replay
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f"IdempotencyKey('{self.scope}', '{self.key}')"
+
+class Payment(db.Model):
+    """One posting against an invoice (refunds are negative). Rows are never updated or deleted."""
+    __property_scoped__ = True
+    __table_args__ = (db.Index('ix_payment_invoice_id_id', 'invoice_id', 'id'), {'sqlite_autoincrement': True})
+    id = db.Column(db.Integer, primary_key=True)
+    property_id = db.Column(db.Integer, db.ForeignKey('property.id'), nullable=True, index=True)
+    invoice_id = db.Column(db.Integer, db.ForeignKey('invoice.id'), nullable=False)
+    amount_cents = db.Column(db.Integer, nullable=False)
+    amount = money_property('amount_cents')
+    method = db.Column(db.String(20), nullable=False, default='cash')
+    reference = db.Column(db.String(100), nullable=True)
+    posted_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, index=True) # Snapshot watermark
+    posted_by = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=True)
+    invoice = db.relationship('Invoice', backref=db.backref('payments', lazy=True, order_by='Payment.id'))
+
+    def __repr__(self):
+        return f"Payment('{self.invoice_id}', '{self.amount_cents}', '{self.method}')"
+
+class BalanceSnapshot(db.Model):
+    """Paid-to-date per invoice up to last_payment_id; balances read this plus the ledger tail."""
+    __property_scoped__ = True
+    id = db.Column(db.Integer, primary_key=True)
+    property_id = db.Column(db.Integer, nullable=True)
+    invoice_id = db.Column(db.Integer, db.ForeignKey('invoice.id'), nullable=False, unique=True)
+    paid_cents = db.Column(db.Integer, nullable=False, default=0)
+    last_payment_id = db.Column(db.Integer, nullable=False, default=0)
+    taken_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f"BalanceSnapshot('{self.invoice_id}', '{self.paid_cents}', '{self.last_payment_id}')"
+
+class RoomCharge(db.Model):
+    """One night of room rate posted to an in-house stay by the night audit (app.night_audit)."""
+    __property_scoped__ = True
+    # One charge per stay and business date, so re-running an audit can never post twice
+    __table_args__ = (db.UniqueConstraint('booking_id', 'business_date', name='uq_room_charge_booking_date'),
+                      {'sqlite_autoincrement': True})
+    id = db.Column(db.Integer, primary_key=True)
+    property_id = db.Column(db.Integer, nullable=True)
+    booking_id = db.Column(db.Integer, db.ForeignKey('booking.id'), nullable=False)
+    business_date = db.Column(db.Date, nullable=False, index=True)
+    amount_cents = db.Column(db.Integer, nullable=False)
+    amount = money_property('amount_cents')
+    posted_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f"RoomCharge('{self.booking_id}', '{self.business_date}', '{self.amount_cents}')"
+
+class NightAudit(db.Model):
+    """Summary of one closed business date; the open business date is the day after the latest one."""
+    __property_scoped__ = True
+    __table_args__ = (db.UniqueConstraint('property_id', 'business_date', name='uq_night_audit_property_date'),)
+    id = db.Column(db.Integer, primary_key=True)
+    property_id = db.Column(db.Integer, nullable=True)
+    business_date = db.Column(db.Date, nullable=False, index=True)
+    in_house = db.Column(db.Integer, nullable=False, default=0)
+    rooms = db.Column(db.Integer, nullable=False, default=0)
+    arrivals = db.Column(db.Integer, nullable=False, default=0)
+    departures = db.Column(db.Integer, nullable=False, default=0)
+    charges_posted = db.Column(db.Integer, nullable=False, default=0) # By the latest run for this date
+    room_revenue_cents = db.Column(db.Integer, nullable=False, default=0)
+    room_revenue = money_property('room_revenue_cents')
+    closed_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f"NightAudit('{self.business_date}', '{self.in_house}', '{self.room_revenue_cents}')"
+
+class InvoiceReminder(db.Model):
+    """Payment reminder queued when the sweeper flips an invoice to overdue; rendered later by the worker."""
+    __property_scoped__ = True
+    __table_args__ = (db.Index('ix_invoice_reminder_status_id', 'status', 'id'),)
+    id = db.Column(db.Integer, primary_key=True)
+    property_id = db.Column(db.Integer, nullable=True)
+    invoice_id = db.Column(db.Integer, db.ForeignKey('invoice.id'), nullable=False, index=True)
+    status = db.Column(db.String(20), nullable=False, default='queued') # queued -> rendered
+    queued_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    rendered_at = db.Column(db.DateTime, nullable=True)
+    subject = db.Column(db.String(200), nullable=True)
+    body = db.Column(db.Text, nullable=True)
+    invoice = db.relationship('Invoice', backref=db.backref('reminders', lazy=True))
+
+    def __repr__(self):
+        return f"InvoiceReminder('{self.invoice_id}', '{self.status}')"
+
+class OutboxMessage(db.Model):
+    """
+    Email waiting for delivery, written in the same transaction as the change that
+    triggers it and drained by the outbox worker (app.outbox).
+    """
+    __property_scoped__ = True
+    __table_args__ = (db.Index('ix_outbox_status_next_attempt', 'status', 'next_attempt_at'),)
+    id = db.Column(db.Integer, primary_key=True)
+    property_id = db.Column(db.Integer, nullable=True)
+    kind = db.Column(db.String(30), nullable=False) # 'invoice' or 'reminder'
+    recipient = db.Column(db.String(120), nullable=False)
+    payload = db.Column(db.Text, nullable=False) # JSON, e.g. {"booking_id": 7}
+    status = db.Column(db.String(20), nullable=False, default='pending') # pending -> sent | failed
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    next_attempt_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    last_error = db.Column(db.Text, nullable=True)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    sent_at = db.Column(db.DateTime, nullable=True)
+
+    def __repr__(self):
+        return f"OutboxMessage('{self.kind}', '{self.recipient}', '{self.status}')"
+
+class ChannelSyncMark(db.Model):
+    """
+    Dates whose availability may have changed for one room (or, for room-level
+    changes, one room type), written in the same transaction as the change and
+    consumed by the channel sync (app.channel_sync).
+    """
+    __property_scoped__ = True
+    id = db.Column(db.Integer, primary_key=True)
+    property_id = db.Column(db.Integer, nullable=True)
+    room_id = db.Column(db.Integer, nullable=True)
+    room_type = db.Column(db.String(100), nullable=True) # When the room's own type changed
+    start_date = db.Column(db.Date, nullable=False)
+    end_date = db.Column(db.Date, nullable=True) # Exclusive; None = to the end of the sync horizon
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f"ChannelSyncMark('{self.room_id or self.room_type}', '{self.start_date}', '{self.end_date}')"
+
+class ChannelAvailability(db.Model):
+    """Availability last pushed to the channel manager, per room type and date."""
+    __property_scoped__ = True
+    __table_args__ = (db.Index('ix_channel_availability_type_date', 'property_id', 'room_type', 'date'),)
+    id = db.Column(db.Integer, primary_key=True)
+    property_id = db.Column(db.Integer, nullable=True)
+    room_type = db.Column(db.String(100), nullable=False)
+    date = db.Column(db.Date, nullable=False)
+    available = db.Column(db.Integer, nullable=False)
+    pushed_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f"ChannelAvailability('{self.room_type}', '{self.date}', {self.available})"
+
+class ChannelPush(db.Model):
+    """One request to the channel manager, kept as push metrics (latency, payload size)."""
+    __table_args__ = (db.Index('ix_channel_push_pushed_at', 'pushed_at'),)
+    id = db.Column(db.Integer, primary_key=True)
+    property_id = db.Column(db.Integer, nullable=True)
+    pushed_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    updates = db.Column(db.Integer, nullable=False, default=0) # Date ranges in the payload
+    cells = db.Column(db.Integer, nullable=False, default=0) # Room type x date values they cover
+    payload_bytes = db.Column(db.Integer, nullable=False, default=0)
+    latency_ms = db.Column(db.Float, nullable=False, default=0)
+    status = db.Column(db.Integer, nullable=True) # HTTP status; None when the request never completed
+    error = db.Column(db.Text, nullable=True)
+
+    def __repr__(self):
+        return f"ChannelPush('{self.pushed_at}', {self.cells}, {self.status})"
+
+class TableVersion(db.Model):
+    """
+    Rows bulk-deleted so far (archiving) per table and property. ETags
+    (app.responses.data_version) read it next to max(updated_at), which a
+    delete leaves unchanged, instead of counting the table on every request.
+    """
+    __property_scoped__ = True
+    id = db.Column(db.Integer, primary_key=True)
+    property_id = db.Column(db.Integer, nullable=True)
+    table_name = db.Column(db.String(64), nullable=False, index=True)
+    deletes = db.Column(db.Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return f"TableVersion('{self.table_name}', '{self.property_id}', {self.deletes})"
+
+class JobRun(db.Model):
+    """One run of a scheduled background job: duration and rows touched, kept as metrics."""
+    __table_args__ = (db.Index('ix_job_run_job_started', 'job', 'started_at'),)
+    id = db.Column(db.Integer, primary_key=True)
+    job = db.Column(db.String(64), nullable=False)
+    property_id = db.Column(db.Integer, nullable=True)
+    started_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    duration_ms = db.Column(db.Integer, nullable=False, default=0)
+    rows = db.Column(db.Integer, nullable=False, default=0)
+    error = db.Column(db.Text, nullable=True)
+
+    def __repr__(self):
+        return f"JobRun('{self.job}', '{self.started_at}', '{self.rows}')"
+
+class AuditEvent(db.Model):
+    """One captured change of an audited row (app.audit): who, when, and the changed columns as JSON."""
+    __tablename__ = 'audit_event' # On the default db for every property, so one query spans them all
+    __table_args__ = (db.Index('ix_audit_event_entity', 'entity', 'entity_id', 'occurred_at'),
+                      db.Index('ix_audit_event_occurred', 'occurred_at'),
+                      db.Index('ix_audit_event_user', 'user_id', 'occurred_at'))
+    id = db.Column(db.Integer, primary_key=True)
+    occurred_at = db.Column(db.DateTime, nullable=False) # Commit time, not write time
+    entity = db.Column(db.String(32), nullable=False) # 'room', 'booking', 'invoice', 'guest', 'booking_service'
+    entity_id = db.Column(db.Integer, nullable=True) # None for a statement that changed many rows at once
+    action = db.Column(db.String(16), nullable=False) # 'insert', 'update' or 'delete'
+    user_id = db.Column(db.Integer, nullable=True) # No foreign key: the trail outlives deleted users
+    username = db.Column(db.String(80), nullable=True)
+    property_id = db.Column(db.Integer, nullable=True)
+    changes = db.Column(db.Text, nullable=False) # JSON {column: [old, new]}
+
+    def __repr__(self):
+        return f"AuditEvent('{self.entity}', {self.entity_id}, '{self.action}', '{self.occurred_at}')"
+
+@event.listens_for(Payment, 'before_update')
+@event.listens_for(Payment, 'before_delete')
+def _payments_are_append_only(mapper, connection, target):
+    raise ValueError("Payments are append-only; post a refund instead of editing or deleting a payment.")
+
+@event.listens_for(AuditEvent, 'before_update')
+@event.listens_for(AuditEvent, 'before_delete')
+def _audit_events_are_append_only(mapper, connection, target):
+    raise ValueError("The audit trail is append-only.")
+
+# --- Cold storage ---
+# Completed stays are moved here by app.archive. Rows keep their original ids and
+# carry archive_month (YYYYMM of check-out) as the partition key.
+
+class ArchivedBooking(db.Model):
+    __tablename__ = 'booking_archive'
+    __property_scoped__ = True
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    property_id = db.Column(db.Integer, nullable=True, index=True)
+    guest_id = db.Column(db.Integer, nullable=False, index=True)
+    room_id = db.Column(db.Integer, nullable=False)
+    check_in_date = db.Column(db.DateTime, nullable=False)
+    check_out_date = db.Column(db.DateTime, nullable=True)
+    total_amount_cents = db.Column(db.Integer, nullable=True)
+    total_amount = money_property('total_amount_cents')
+    is_active = db.Column(db.Boolean, nullable=False, default=False)
+    is_reservation = db.Column(db.Boolean, nullable=False, default=False)
+    created_at = db.Column(db.DateTime, nullable=True)
+    updated_at = db.Column(db.DateTime, nullable=True)
+    archive_month = db.Column(db.Integer, nullable=False, index=True)
+    archived_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f"ArchivedBooking('{self.id}', '{self.archive_month}')"
+
+class ArchivedInvoice(db.Model):
+    __tablename__ = 'invoice_archive'
+    __property_scoped__ = True
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    property_id = db.Column(db.Integer, nullable=True, index=True)
+    booking_id = db.Column(db.Integer, nullable=False, unique=True)
+    issue_date = db.Column(db.DateTime, nullable=False)
+    due_date = db.Column(db.DateTime, nullable=True)
+    amount_paid_cents = db.Column(db.Integer, nullable=False, default=0)
+    amount_paid = money_property('amount_paid_cents')
+    payment_status = db.Column(db.String(50), nullable=False)
+    updated_at = db.Column(db.DateTime, nullable=True)
+    archive_month = db.Column(db.Integer, nullable=False, index=True)
+
+    def __repr__(self):
+        return f"ArchivedInvoice('{self.booking_id}', '{self.archive_month}')"
+
+class ArchivedBookingService(db.Model):
+    __tablename__ = 'booking_service_archive'
+    __property_scoped__ = True
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    property_id = db.Column(db.Integer, nullable=True)
+    booking_id = db.Column(db.Integer, nullable=False, index=True)
+    service_id = db.Column(db.Integer, nullable=False)
+    quantity = db.Column(db.Integer, nullable=False, default=1)
+    archive_month = db.Column(db.Integer, nullable=False, index=True)
+
+    def __repr__(self):
+        return f"ArchivedBookingService('{self.booking_id}', '{self.service_id}')"
+
+class ArchivedPayment(db.Model):
+    __tablename__ = 'payment_archive'
+    __property_scoped__ = True
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    property_id = db.Column(db.Integer, nullable=True)
+    invoice_id = db.Column(db.Integer, nullable=False, index=True)
+    amount_cents = db.Column(db.Integer, nullable=False)
+    method = db.Column(db.String(20), nullable=False)
+    reference = db.Column(db.String(100), nullable=True)
+    posted_at = db.Column(db.DateTime, nullable=False)
+    posted_by = db.Column(db.Integer, nullable=True)
+    archive_month = db.Column(db.Integer, nullable=False, index=True)
+
+    def __repr__(self):
+        return f"ArchivedPayment('{self.invoice_id}', '{self.amount_cents}')"
+
+class ArchivedRoomCharge(db.Model):
+    __tablename__ = 'room_charge_archive'
+    __property_scoped__ = True
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    property_id = db.Column(db.Integer, nullable=True)
+    booking_id = db.Column(db.Integer, nullable=False, index=True)
+    business_date = db.Column(db.Date, nullable=False)
+    amount_cents = db.Column(db.Integer, nullable=False)
+    posted_at = db.Column(db.DateTime, nullable=False)
+    archive_month = db.Column(db.Integer, nullable=False, index=True)
+
+    def __repr__(self):
+        return f"ArchivedRoomCharge('{self.booking_id}', '{self.business_date}')"
@@ -0,0 +1,81 @@
+from decimal import Decimal, ROUND_HALF_UP
+import click
+from flask.cli import with_appcontext
+from sqlalchemy import inspect, text
+from sqlalchemy.ext.hybrid import hybrid_property
+
+# Money is stored as integer cents. Floats only appear at the edges (forms,
+# templates, flash messages) through the money_property() accessors below.
+
+def to_cents(amount):
+    """Converts a float/Decimal/str amount to integer cents, rounding half up."""
+    if amount is None:
+        return None
+    return int((Decimal(str(amount)) * 100).quantize(Decimal('1'), rounding=ROUND_HALF_UP))
+
+
+def from_cents(cents):
+    return None if cents is None else cents / 100
+
+
+def money_property(cents_attr):
+    """
+    Exposes an integer-cents column as an amount in currency units. Reads return
+    a float, writes accept any number, and in queries it compiles to cents / 100.
+    """
+    def fget(self):
+        return from_cents(getattr(self, cents_attr))
+
+    def fset(self, value):
+        setattr(self, cents_attr, to_cents(value))
+
+    def expr(cls):
+        return getattr(cls, cents_attr) / 100.0
+
+    return hybrid_property(fget, fset, expr=expr)
+
+
+# (table, old float column, new cents column, not null)
+MONEY_COLUMNS = [
+    ('room', 'rate_per_night', 'rate_per_night_cents', True),
+    ('booking', 'total_amount', 'total_amount_cents', False),
+    ('invoice', 'amount_paid', 'amount_paid_cents', True),
+    ('service', 'price', 'price_cents', True),
+    ('booking_archive', 'total_amount', 'total_amount_cents', False),
+    ('invoice_archive', 'amount_paid', 'amount_paid_cents', True),
+]
+
+
+def migrate_money_columns(engine):
+    """
+    Converts a database created before money moved to cents: adds each *_cents
+    column, backfills it with ROUND(amount * 100) and drops the float column.
+    Tables that are missing or already converted are skipped, so it is safe to
+    re-run. Returns the list of converted "table.column" names.
+    """
+    converted = []
+    with engine.begin() as conn:
+        inspector = inspect(conn)
+        tables = set(inspector.get_table_names())
+        for table, old, new, not_null in MONEY_COLUMNS:
+            if table not in tables:
+                continue
+            columns = {c['name'] for c in inspector.get_columns(table)}
+            if old not in columns or new in columns:
+                continue
+            constraint = ' NOT NULL DEFAULT 0' if not_null else ''
+            conn.execute(text(f'ALTER TABLE {table} ADD COLUMN {new} INTEGER{constraint}'))
+            conn.execute(text(f'UPDATE {table} SET {new} = CAST(ROUND({old} * 100) AS INTEGER) WHERE {old} IS NOT NULL'))
+            conn.execute(text(f'ALTER TABLE {table} DROP COLUMN {old}'))
+            converted.append(f'{table}.{old}')
+    return converted
+
+
+@click.command('migrate-money-to-cents')
+@with_appcontext
+def migrate_money_command():
+    """Convert float money columns to integer cents on every configured database."""
+    from app import db
+    for bind_key, engine in db.engines.items():
+        converted = migrate_money_columns(engine)
+        click.echo(f"{bind_key or 'default'}: converted {', '.join(converted) if converted else 'nothing'}")
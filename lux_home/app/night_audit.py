@@ -0,0 +1,148 @@
+from datetime import datetime, time, timedelta
+import click
+from flask.cli import with_appcontext
+from sqlalchemy import select, insert, func, literal, exists
+from app import db
+from app.models import Booking, Room, Invoice, RoomCharge, NightAudit
+from app.money import from_cents, to_cents
+from app.services import calculate_booking_total, posted_room_charges, service_charges_cents
+from app.scheduler import run_per_scope
+
+
+def current_business_date(today=None):
+    """The open business date: the day after the latest audited one, or today before the first audit."""
+    last = db.session.scalar(select(func.max(NightAudit.business_date)))
+    return last + timedelta(days=1) if last else (today or datetime.utcnow().date())
+
+
+def _scoped(query, model):
+    property_id = db.session.info.get('property_id')
+    return query.where(model.property_id == property_id) if property_id is not None else query
+
+
+def run_night_audit(business_date=None, now=None):
+    """
+    Closes a business date in one transaction: posts a night of room rate for
+    every in-house stay with a single INSERT ... SELECT over active bookings and
+    their rooms, then records the date's NightAudit summary, which rolls the
+    business date forward. Stays already charged for the date are skipped (and
+    the unique (booking_id, business_date) constraint backs that up), so
+    re-running an audit for the same date posts nothing twice.
+    Returns the NightAudit row.
+    """
+    now = now or datetime.utcnow()
+    business_date = business_date or current_business_date(now.date())
+    if business_date > now.date():
+        raise ValueError(f"Business date {business_date} has not started yet.")
+    day_start = datetime.combine(business_date, time.min)
+    day_end = day_start + timedelta(days=1)
+
+    in_house = _scoped(select(Booking.property_id, Booking.id, Room.rate_per_night_cents)
+                       .join(Room, Room.id == Booking.room_id)
+                       .where(Booking.is_active.is_(True), Booking.is_reservation.is_(False),
+                              Booking.check_in_date < day_end), Booking)
+    already_charged = exists().where(RoomCharge.booking_id == Booking.id, RoomCharge.business_date == business_date)
+    posted = db.session.execute(
+        insert(RoomCharge).from_select(
+            ['property_id', 'booking_id', 'amount_cents', 'business_date', 'posted_at'],
+            in_house.add_columns(literal(business_date, db.Date), literal(now, db.DateTime))
+            .where(~already_charged)),
+        execution_options={'synchronize_session': False},
+    ).rowcount
+
+    stays, revenue_cents = db.session.execute(_scoped(
+        select(func.count(RoomCharge.id), func.coalesce(func.sum(RoomCharge.amount_cents), 0))
+        .where(RoomCharge.business_date == business_date), RoomCharge)).one()
+    arrivals = db.session.scalar(_scoped(
+        select(func.count(Booking.id)).where(Booking.is_reservation.is_(False), Booking.check_in_date >= day_start,
+                                             Booking.check_in_date < day_end), Booking))
+    departures = db.session.scalar(_scoped(
+        select(func.count(Booking.id)).where(Booking.is_active.is_(False), Booking.check_out_date >= day_start,
+                                             Booking.check_out_date < day_end), Booking))
+    rooms = db.session.scalar(_scoped(select(func.count(Room.id)), Room))
+
+    property_id = db.session.info.get('property_id')
+    audit = NightAudit.query.filter_by(property_id=property_id, business_date=business_date).first()
+    if audit is None:
+        audit = NightAudit(property_id=property_id, business_date=business_date)
+        db.session.add(audit)
+    audit.in_house, audit.rooms, audit.arrivals, audit.departures = stays, rooms, arrivals, departures
+    audit.charges_posted = posted
+    audit.room_revenue_cents = int(revenue_cents)
+    audit.closed_at = now
+    db.session.commit()
+    return audit
+
+
+def audit_summary(audit):
+    """Occupancy, ADR and RevPAR of a closed business date, as a plain dict."""
+    revenue_cents = audit.room_revenue_cents
+    return {
+        'business_date': audit.business_date.isoformat(),
+        'property_id': audit.property_id,
+        'in_house': audit.in_house,
+        'rooms': audit.rooms,
+        'arrivals': audit.arrivals,
+        'departures': audit.departures,
+        'charges_posted': audit.charges_posted,
+        'room_revenue': from_cents(revenue_cents),
+        'occupancy': round(audit.in_house / audit.rooms, 4) if audit.rooms else 0.0,
+        'adr': from_cents(revenue_cents // audit.in_house) if audit.in_house else 0.0,
+        'revpar': from_cents(revenue_cents // audit.rooms) if audit.rooms else 0.0,
+    }
+
+
+def in_house_balance(booking_id):
+    """
+    A stay's running folio: the room charges the night audit has posted, the
+    booked services and what was paid, plus what checking out now would bill
+    (the posted nights and any the audit has not reached). None if unknown.
+    """
+    booking = db.session.get(Booking, booking_id)
+    if booking is None:
+        return None
+    nights, room_cents = posted_room_charges([booking.id]).get(booking.id, (0, 0))
+    services_cents = service_charges_cents([booking.id]).get(booking.id, 0)
+    paid_cents = db.session.scalar(select(Invoice.amount_paid_cents).where(Invoice.booking_id == booking.id)) or 0
+    total_cents = to_cents(calculate_booking_total(booking.id)) or 0
+    return {
+        'booking_id': booking.id,
+        'in_house': bool(booking.is_active),
+        'nights_posted': nights,
+        'room_charges': from_cents(room_cents),
+        'services': from_cents(services_cents),
+        'paid': from_cents(paid_cents),
+        'balance': from_cents(room_cents + services_cents - paid_cents),
+        'due_at_check_out': from_cents(total_cents - paid_cents),
+    }
+
+
+def night_audit(business_date=None):
+    """Runs the audit on every database; returns one summary per job scope."""
+    summaries = []
+
+    def audit_scope():
+        audit = run_night_audit(business_date)
+        summaries.append(audit_summary(audit))
+        return audit.charges_posted
+
+    run_per_scope('night-audit', audit_scope)
+    return summaries
+
+
+@click.command('night-audit')
+@click.option('--date', 'business_date', type=click.DateTime(['%Y-%m-%d']), default=None,
+              help='Business date to close or re-run (default: the open business date).')
+@with_appcontext
+def night_audit_command(business_date):
+    """Post nightly room charges for in-house stays and roll the business date."""
+    try:
+        summaries = night_audit(business_date.date() if business_date else None)
+    except ValueError as e:
+        raise click.ClickException(str(e))
+    for s in summaries:
+        scope = f"property {s['property_id']}" if s['property_id'] is not None else 'default database'
+        click.echo(f"{s['business_date']} ({scope}): posted {s['charges_posted']} room charges; "
+                   f"{s['in_house']}/{s['rooms']} rooms occupied ({s['occupancy']:.1%}), "
+                   f"{s['arrivals']} arrivals, {s['departures']} departures, "
+                   f"room revenue ${s['room_revenue']:,.2f}, ADR ${s['adr']:,.2f}, RevPAR ${s['revpar']:,.2f}")
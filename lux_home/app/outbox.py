@@ -0,0 +1,133 @@
+import json
+from datetime import datetime, timedelta
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+from sqlalchemy import select, update
+from app import db
+from app.models import OutboxMessage, Booking, Invoice, InvoiceReminder
+from app.mailer import get_smtp_pool, build_message
+from app.invoice_pdf import render_invoice_pdf
+from app.money import from_cents
+from app.scheduler import run_per_scope
+from app.services import stay_nights
+
+
+def outbox_row(kind, recipient, property_id=None, **payload):
+    """Column values of one outbox message, for bulk inserts alongside other bulk writes."""
+    return {'kind': kind, 'recipient': recipient, 'property_id': property_id, 'payload': json.dumps(payload),
+            'status': 'pending', 'attempts': 0, 'next_attempt_at': datetime.utcnow()}
+
+
+def enqueue_email(kind, recipient, property_id=None, **payload):
+    """
+    Adds an outbox message to the current session without committing, so it is
+    written in the same transaction as the change that triggered it.
+    """
+    message = OutboxMessage(**outbox_row(kind, recipient, property_id, **payload))
+    db.session.add(message)
+    return message
+
+
+def retry_delay(attempts):
+    """Exponential backoff: OUTBOX_RETRY_BASE seconds doubled per failed attempt, capped."""
+    base = current_app.config.get('OUTBOX_RETRY_BASE', 30)
+    return timedelta(seconds=min(base * 2 ** (attempts - 1), current_app.config.get('OUTBOX_RETRY_MAX', 3600)))
+
+
+def claim_batch(batch_size, now):
+    """
+    Claims up to batch_size due messages with one UPDATE: the attempt is counted
+    and next_attempt_at is pushed out by the claim lease, so another worker skips
+    them and a worker that dies mid-batch has them picked up again after the lease.
+    """
+    lease = timedelta(seconds=current_app.config.get('OUTBOX_CLAIM_LEASE', 300))
+    due = (OutboxMessage.status == 'pending', OutboxMessage.next_attempt_at <= now)
+    property_id = db.session.info.get('property_id')
+    if property_id is not None:
+        due += (OutboxMessage.property_id == property_id,)
+    candidates = select(OutboxMessage.id).where(*due).order_by(OutboxMessage.id).limit(batch_size)
+    claimed = db.session.scalars(
+        update(OutboxMessage).where(OutboxMessage.id.in_(candidates), *due)
+        .values(attempts=OutboxMessage.attempts + 1, next_attempt_at=now + lease)
+        .returning(OutboxMessage.id),
+        execution_options={'synchronize_session': False},
+    ).all()
+    db.session.commit()
+    if not claimed:
+        return []
+    return (OutboxMessage.query.filter(OutboxMessage.id.in_(claimed)).order_by(OutboxMessage.id)
+            .populate_existing().all())
+
+
+def render_invoice_email(recipient, booking_id):
+    booking = db.session.get(Booking, booking_id)
+    invoice = Invoice.query.filter_by(booking_id=booking_id).first() if booking else None
+    if invoice is None:
+        raise LookupError(f"No invoice for booking {booking_id}.")
+    pdf = render_invoice_pdf(booking=booking, invoice=invoice, guest=booking.guest, room=booking.room,
+                             duration_days=stay_nights(booking.check_in_date, booking.check_out_date or invoice.issue_date),
+                             balance_due=from_cents((booking.total_amount_cents or 0) - invoice.amount_paid_cents))
+    text = (f"Dear {booking.guest.name},\n\nThank you for staying with Lux Home. "
+            f"Your invoice #{invoice.id} is attached.\n\nLux Home")
+    return build_message(recipient, f"Your Lux Home invoice #{invoice.id}", text,
+                         attachments=[(f"invoice_{booking_id}.pdf", pdf, 'application/pdf')])
+
+
+def render_reminder_email(recipient, reminder_id):
+    reminder = db.session.get(InvoiceReminder, reminder_id)
+    if reminder is None or reminder.body is None:
+        raise LookupError(f"Reminder {reminder_id} is not rendered.")
+    text = f"{reminder.subject}. Please contact us at contact@luxhome.xyz to settle the balance."
+    return build_message(recipient, reminder.subject, text, html=reminder.body)
+
+
+RENDERERS = {
+    'invoice': render_invoice_email,
+    'reminder': render_reminder_email,
+}
+
+
+def drain_outbox(batch_size=None, now=None):
+    """
+    Delivers one batch of due outbox messages through the pooled SMTP connection.
+    A failed message is retried with exponential backoff until OUTBOX_MAX_ATTEMPTS,
+    then marked failed. Returns {'sent', 'retried', 'failed'} counts.
+    """
+    batch_size = batch_size or current_app.config.get('OUTBOX_BATCH_SIZE', 50)
+    max_attempts = current_app.config.get('OUTBOX_MAX_ATTEMPTS', 6)
+    now = now or datetime.utcnow()
+    pool = get_smtp_pool()
+    counts = {'sent': 0, 'retried': 0, 'failed': 0}
+    for message in claim_batch(batch_size, now):
+        try:
+            email = RENDERERS[message.kind](message.recipient, **json.loads(message.payload))
+            with pool.connection() as conn:
+                conn.send_message(email)
+        except Exception as e:
+            db.session.rollback()
+            message.last_error = repr(e)
+            if message.attempts >= max_attempts:
+                message.status = 'failed'
+                counts['failed'] += 1
+            else:
+                message.next_attempt_at = now + retry_delay(message.attempts)
+                counts['retried'] += 1
+        else:
+            message.status = 'sent'
+            message.sent_at = datetime.utcnow()
+            message.last_error = None
+            counts['sent'] += 1
+        db.session.commit() # Per message, so a crash never re-sends what already went out
+    return counts
+
+
+def outbox_job():
+    return run_per_scope('outbox', lambda: sum(drain_outbox().values()))
+
+
+@click.command('drain-outbox')
+@with_appcontext
+def drain_outbox_command():
+    """Deliver one batch of queued emails per database."""
+    click.echo(f"Processed {outbox_job()} outbox messages.")
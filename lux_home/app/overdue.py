@@ -0,0 +1,83 @@
+from datetime import datetime
+import click
+from flask import current_app, render_template
+from flask.cli import with_appcontext
+from sqlalchemy import update, insert, select
+from sqlalchemy.orm import joinedload
+from app import db
+from app.models import Invoice, InvoiceReminder, Booking, Guest
+from app.money import from_cents
+from app.scheduler import run_per_scope
+from app.outbox import enqueue_email
+
+
+def sweep_overdue_invoices(now=None):
+    """
+    Flips pending invoices whose due date has passed to 'overdue' with one bulk
+    UPDATE (an index range on (payment_status, due_date)) and queues a reminder
+    for each, in the same transaction. The status predicate makes the flip
+    happen once per invoice, so concurrent sweeps never queue a reminder twice.
+    Returns the number of invoices flipped.
+    """
+    now = now or datetime.utcnow()
+    query = update(Invoice).where(Invoice.payment_status == 'pending', Invoice.due_date < now)
+    property_id = db.session.info.get('property_id')
+    if property_id is not None:
+        query = query.where(Invoice.property_id == property_id)
+    flipped = db.session.execute(
+        query.values(payment_status='overdue').returning(Invoice.id, Invoice.property_id),
+        execution_options={'synchronize_session': False},
+    ).all()
+    if flipped:
+        db.session.execute(insert(InvoiceReminder), [
+            {'invoice_id': invoice_id, 'property_id': invoice_property_id, 'status': 'queued', 'queued_at': now}
+            for invoice_id, invoice_property_id in flipped
+        ])
+    db.session.commit()
+    return len(flipped)
+
+
+def render_queued_reminders(batch_size=None, now=None):
+    """
+    Renders up to batch_size queued reminders (oldest first) and queues each for
+    email delivery in the same commit. Returns how many were rendered.
+    Reminders, invoices, bookings and rooms load from the property's database;
+    guests live on the default one, so they are fetched with a second query.
+    """
+    batch_size = batch_size or current_app.config.get('REMINDER_BATCH_SIZE', 100)
+    now = now or datetime.utcnow()
+    reminders = (InvoiceReminder.query.filter_by(status='queued').order_by(InvoiceReminder.id)
+                 .options(joinedload(InvoiceReminder.invoice).joinedload(Invoice.booking).joinedload(Booking.room))
+                 .limit(batch_size).all())
+    guest_ids = {reminder.invoice.booking.guest_id for reminder in reminders}
+    guests = {guest.id: guest for guest in
+              db.session.execute(select(Guest).where(Guest.id.in_(guest_ids))).scalars()} if guest_ids else {}
+    for reminder in reminders:
+        invoice = reminder.invoice
+        booking = invoice.booking
+        guest = guests[booking.guest_id]
+        reminder.subject = f"Payment reminder: invoice #{invoice.id} is overdue"
+        reminder.body = render_template('invoice_reminder.html', subject=reminder.subject,
+                                        invoice=invoice, booking=booking, guest=guest,
+                                        balance_due=from_cents((booking.total_amount_cents or 0) - invoice.amount_paid_cents))
+        reminder.status = 'rendered'
+        reminder.rendered_at = now
+        enqueue_email('reminder', guest.email, reminder.property_id, reminder_id=reminder.id)
+    db.session.commit()
+    return len(reminders)
+
+
+def sweep_overdue_job():
+    return run_per_scope('overdue-sweep', sweep_overdue_invoices)
+
+
+def render_reminders_job():
+    return run_per_scope('render-reminders', render_queued_reminders)
+
+
+@click.command('sweep-overdue')
+@with_appcontext
+def sweep_overdue_command():
+    """Run the overdue invoice sweep and reminder rendering once."""
+    click.echo(f"Marked {sweep_overdue_job()} invoices overdue.")
+    click.echo(f"Rendered {render_reminders_job()} payment reminders.")
@@ -0,0 +1,285 @@
+import cProfile
+import io
+import itertools
+import marshal
+import os
+import pstats
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter, deque
+from datetime import datetime
+from functools import wraps
+import click
+from flask import Blueprint, current_app, request, g, jsonify, abort, make_response
+from flask.cli import with_appcontext
+from flask_login import current_user, login_required
+from app import db
+
+# On-demand profiling for production workers, registered by init_profiling only
+# when PROFILING_ENABLED is set; otherwise nothing is hooked into the request
+# path. Everything is per process: under gunicorn each worker has its own
+# sampler, request profiles and tracemalloc state, and the endpoints report on
+# the worker that serves them.
+
+bp = Blueprint('profiling', __name__, url_prefix='/admin/profiling')
+
+
+def admin_required(view):
+    @wraps(view)
+    @login_required
+    def wrapper(*args, **kwargs):
+        if not current_user.is_admin:
+            abort(403)
+        return view(*args, **kwargs)
+    return wrapper
+
+
+class SamplingProfiler:
+    """
+    Statistical profiler: a daemon thread snapshots the stack of every other
+    thread every `interval` seconds and counts identical stacks. The request
+    threads run untouched (no tracing hooks), so the cost is one stack walk per
+    thread per sample. Output is in the folded format ("a;b;c count") read by
+    flamegraph.pl, speedscope and similar tools.
+    """
+
+    def __init__(self, interval=0.005, max_seconds=300):
+        self.interval = interval
+        self.max_seconds = max_seconds
+        self.stacks = Counter()
+        self.samples = 0
+        self.started_at = None
+        self._stop = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        if self.running:
+            return False
+        self.stacks, self.samples = Counter(), 0
+        self.started_at = datetime.utcnow()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='lux-sampler', daemon=True)
+        self._thread.start()
+        return True
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        return self.folded()
+
+    def _run(self):
+        own = threading.get_ident()
+        deadline = time.monotonic() + self.max_seconds # A forgotten profiler stops by itself
+        while not self._stop.wait(self.interval) and time.monotonic() < deadline:
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            sampled = []
+            for ident, frame in sys._current_frames().items():
+                if ident != own:
+                    sampled.append(f"{names.get(ident, ident)};{fold(frame)}")
+            with self._lock:
+                self.stacks.update(sampled)
+                self.samples += 1
+
+    def folded(self):
+        with self._lock:
+            return ''.join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+    def status(self):
+        return {'running': self.running, 'samples': self.samples, 'interval': self.interval,
+                'started_at': self.started_at.isoformat() if self.started_at else None}
+
+
+def fold(frame):
+    """Root-first 'function (file:line)' frames of one stack, joined with ';'."""
+    frames = []
+    while frame is not None:
+        code = frame.f_code
+        frames.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+        frame = frame.f_back
+    return ';'.join(reversed(frames))
+
+
+class RequestProfiles:
+    """The last few cProfile results of requests sent with the profiling header, by id."""
+
+    def __init__(self, keep=20):
+        self.profiles = deque(maxlen=keep)
+        self._ids = itertools.count(1)
+
+    def add(self, profiler, method, path, duration_ms):
+        entry = {'id': next(self._ids), 'method': method, 'path': path, 'duration_ms': round(duration_ms, 1),
+                 'at': datetime.utcnow().isoformat(), 'profile': profiler}
+        self.profiles.append(entry)
+        return entry['id']
+
+    def get(self, profile_id):
+        return next((entry for entry in self.profiles if entry['id'] == profile_id), None)
+
+
+def start_request_profile():
+    """before_request: profiles this request when an admin sends the profiling header."""
+    if not request.headers.get(current_app.config.get('PROFILING_HEADER', 'X-Profile')):
+        return
+    if not (current_user.is_authenticated and current_user.is_admin):
+        return
+    profiler = cProfile.Profile()
+    try:
+        profiler.enable()
+    except ValueError: # Another profiler already owns the interpreter hook (Python 3.12+)
+        return
+    g.request_profile = (profiler, time.perf_counter())
+
+
+def finish_request_profile(response):
+    started = g.pop('request_profile', None)
+    if started is None:
+        return response
+    profiler, start = started
+    profiler.disable()
+    profiles = current_app.extensions['request_profiles']
+    profile_id = profiles.add(profiler, request.method, request.full_path.rstrip('?'),
+                              (time.perf_counter() - start) * 1000)
+    response.headers['X-Profile-Id'] = str(profile_id)
+    return response
+
+
+@bp.route('/')
+@admin_required
+def status():
+    profiles = current_app.extensions['request_profiles'].profiles
+    return jsonify(pid=os.getpid(), sampler=current_app.extensions['sampling_profiler'].status(),
+                   tracemalloc=tracemalloc.is_tracing(),
+                   requests=[{k: v for k, v in entry.items() if k != 'profile'} for entry in profiles])
+
+
+@bp.route('/sampler/start', methods=['POST'])
+@admin_required
+def sampler_start():
+    sampler = current_app.extensions['sampling_profiler']
+    if not sampler.start():
+        return jsonify(error='The sampler is already running.', **sampler.status()), 409
+    return jsonify(sampler.status())
+
+
+@bp.route('/sampler/stop', methods=['POST'])
+@admin_required
+def sampler_stop():
+    return folded_response(current_app.extensions['sampling_profiler'].stop())
+
+
+@bp.route('/sampler/stacks')
+@admin_required
+def sampler_stacks():
+    """The stacks sampled so far, without stopping the sampler."""
+    return folded_response(current_app.extensions['sampling_profiler'].folded())
+
+
+def folded_response(text):
+    response = make_response(text)
+    response.mimetype = 'text/plain'
+    response.headers['Content-Disposition'] = f'attachment; filename=stacks-{os.getpid()}.folded'
+    return response
+
+
+@bp.route('/requests/<int:profile_id>')
+@admin_required
+def request_profile(profile_id):
+    """pstats report of one profiled request, by cumulative time; ?format=pstats downloads the raw dump."""
+    entry = current_app.extensions['request_profiles'].get(profile_id)
+    if entry is None:
+        abort(404)
+    if request.args.get('format') == 'pstats':
+        response = make_response(marshal.dumps(pstats.Stats(entry['profile']).stats)) # What pstats/snakeviz load
+        response.mimetype = 'application/octet-stream'
+        response.headers['Content-Disposition'] = f'attachment; filename=request-{profile_id}.pstats'
+        return response
+    sort = request.args.get('sort', 'cumulative')
+    if sort not in pstats.Stats.sort_arg_dict_default:
+        abort(400)
+    out = io.StringIO()
+    stats = pstats.Stats(entry['profile'], stream=out)
+    stats.sort_stats(sort).print_stats(request.args.get('limit', 50, type=int))
+    response = make_response(f"{entry['method']} {entry['path']} {entry['duration_ms']} ms\n{out.getvalue()}")
+    response.mimetype = 'text/plain'
+    return response
+
+
+@bp.route('/tracemalloc/start', methods=['POST'])
+@admin_required
+def tracemalloc_start():
+    if not tracemalloc.is_tracing():
+        tracemalloc.start(request.args.get('frames', 1, type=int))
+        current_app.extensions['tracemalloc_snapshot'] = None
+    return jsonify(tracing=True, frames=tracemalloc.get_traceback_limit())
+
+
+@bp.route('/tracemalloc/stop', methods=['POST'])
+@admin_required
+def tracemalloc_stop():
+    tracemalloc.stop()
+    current_app.extensions['tracemalloc_snapshot'] = None
+    return jsonify(tracing=False)
+
+
+@bp.route('/tracemalloc/snapshot')
+@admin_required
+def tracemalloc_snapshot():
+    """
+    Top allocation sites by live size; ?diff=1 compares against the previous
+    snapshot instead, which shows what grew in between (a leak shows up as a
+    site that keeps growing across snapshots).
+    """
+    if not tracemalloc.is_tracing():
+        return jsonify(error='tracemalloc is not running; POST tracemalloc/start first.'), 409
+    key = request.args.get('key', 'lineno')
+    if key not in ('lineno', 'filename', 'traceback'):
+        abort(400)
+    limit = request.args.get('limit', 25, type=int)
+    snapshot = tracemalloc.take_snapshot().filter_traces([
+        tracemalloc.Filter(False, tracemalloc.__file__), tracemalloc.Filter(False, '<frozen importlib._bootstrap>')])
+    previous = current_app.extensions.get('tracemalloc_snapshot')
+    current_app.extensions['tracemalloc_snapshot'] = snapshot
+    current, peak = tracemalloc.get_traced_memory()
+    if request.args.get('diff') and previous is not None:
+        stats = snapshot.compare_to(previous, key)[:limit]
+        top = [{'site': [str(frame) for frame in stat.traceback], 'size': stat.size, 'size_diff': stat.size_diff,
+                'count': stat.count, 'count_diff': stat.count_diff} for stat in stats]
+    else:
+        top = [{'site': [str(frame) for frame in stat.traceback], 'size': stat.size, 'count': stat.count}
+               for stat in snapshot.statistics(key)[:limit]]
+    return jsonify(pid=os.getpid(), traced=current, peak=peak, top=top)
+
+
+def init_profiling(app):
+    if not app.config.get('PROFILING_ENABLED', False):
+        return
+    app.extensions['sampling_profiler'] = SamplingProfiler(app.config.get('PROFILING_SAMPLE_INTERVAL', 0.005),
+                                                           app.config.get('PROFILING_MAX_SECONDS', 300))
+    app.extensions['request_profiles'] = RequestProfiles(app.config.get('PROFILING_KEEP_REQUESTS', 20))
+    app.register_blueprint(bp)
+    # Outermost, so the profile also covers the other request hooks (after_request hooks run in reverse)
+    app.before_request_funcs.setdefault(None, []).insert(0, start_request_profile)
+    app.after_request_funcs.setdefault(None, []).insert(0, finish_request_profile)
+
+
+@click.command('grant-admin')
+@click.argument('username')
+@click.option('--revoke', is_flag=True, help='Remove admin rights instead.')
+@with_appcontext
+def grant_admin_command(username, revoke):
+    """Give a user access to the admin-only pages (profiling, audit trail)."""
+    from app.models import User
+    user = User.query.filter_by(username=username).first()
+    if user is None:
+        raise click.ClickException(f"No user named {username!r}.")
+    user.is_admin = not revoke
+    db.session.commit()
+    click.echo(f"{username} is {'no longer' if revoke else 'now'} an admin.")
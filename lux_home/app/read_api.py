@@ -0,0 +1,169 @@
+from sqlalchemy import select, or_, true
+from app.models import Room, Booking, Guest, GuestStats, Invoice, Payment, ArchivedBooking, ArchivedInvoice, ArchivedPayment
+from app.money import from_cents
+from app.search import search_index, search_match, search_rank, search_terms
+
+# Read-only JSON endpoints shared by the sync Flask routes and the ASGI app.
+# Each endpoint is a generator that yields (database, statement) pairs and is
+# sent back the result rows, so the same code runs on a Session (run_sync) or an
+# AsyncSession (app.asgi). database is 'default' (users, guests) or 'property'
+# (the active property's shard).
+
+GUEST_SEARCH_LIMIT = 20
+TOP_GUESTS_LIMIT = 20
+TOP_GUESTS_MAX = 100
+SEARCH_PAGE_SIZE = 20
+SEARCH_MAX_PAGE = 50
+
+
+def _scope(model, property_id):
+    return model.property_id == property_id if property_id is not None else true()
+
+
+def _iso(value):
+    return value.isoformat() if value else None
+
+
+def dashboard(property_id=None):
+    rooms = yield 'property', (select(Room.id, Room.room_number, Room.room_type, Room.rate_per_night_cents, Room.status)
+                               .where(_scope(Room, property_id)).order_by(Room.room_number))
+    stays = (Booking.id, Booking.room_id, Booking.guest_id, Booking.check_in_date, Booking.check_out_date,
+             Booking.total_amount_cents)
+    active = yield 'property', select(Booking.id, Booking.room_id).where(Booking.is_active.is_(True), _scope(Booking, property_id))
+    completed = yield 'property', (select(*stays).where(Booking.is_active.is_(False), Booking.is_reservation.is_(False),
+                                                        _scope(Booking, property_id))
+                                   .order_by(Booking.check_out_date.desc()).limit(10))
+    upcoming = yield 'property', (select(*stays).where(Booking.is_reservation.is_(True), _scope(Booking, property_id))
+                                  .order_by(Booking.check_in_date).limit(20))
+    guest_ids = sorted({row.guest_id for row in completed + upcoming})
+    names = dict((yield 'default', select(Guest.id, Guest.name).where(Guest.id.in_(guest_ids)))) if guest_ids else {}
+    room_numbers = {room.id: room.room_number for room in rooms}
+
+    def stay(row):
+        return {'booking_id': row.id, 'room_number': room_numbers.get(row.room_id), 'guest': names.get(row.guest_id),
+                'check_in_date': _iso(row.check_in_date), 'check_out_date': _iso(row.check_out_date),
+                'total_amount': from_cents(row.total_amount_cents)}
+
+    return {
+        'rooms': [{'id': r.id, 'room_number': r.room_number, 'room_type': r.room_type,
+                   'rate_per_night': from_cents(r.rate_per_night_cents), 'status': r.status} for r in rooms],
+        'active_bookings': {str(room_id): booking_id for booking_id, room_id in active},
+        'completed_bookings': [stay(row) for row in completed],
+        'upcoming_reservations': [stay(row) for row in upcoming],
+    }
+
+
+def guest_search(query, limit=GUEST_SEARCH_LIMIT):
+    pattern = f"%{query.strip()}%"
+    rows = yield 'default', (select(Guest.id, Guest.name, Guest.email, Guest.phone)
+                             .where(or_(Guest.name.ilike(pattern), Guest.email.ilike(pattern)))
+                             .order_by(Guest.name).limit(limit))
+    return {'guests': [dict(row._mapping) for row in rows]}
+
+
+def _guest_stats(row):
+    return {'id': row.id, 'name': row.name, 'email': row.email, 'stays': row.stays or 0, 'nights': row.nights or 0,
+            'revenue': from_cents(row.revenue_cents or 0), 'first_stay_at': _iso(row.first_stay_at),
+            'last_stay_at': _iso(row.last_stay_at)}
+
+
+_GUEST_STATS_COLUMNS = (Guest.id, Guest.name, Guest.email, GuestStats.stays, GuestStats.nights,
+                        GuestStats.revenue_cents, GuestStats.first_stay_at, GuestStats.last_stay_at)
+
+
+def top_guests(limit=TOP_GUESTS_LIMIT):
+    """Guests by lifetime revenue, read off the end of ix_guest_stats_revenue."""
+    limit = min(max(limit, 1), TOP_GUESTS_MAX)
+    rows = yield 'default', (select(*_GUEST_STATS_COLUMNS).join(Guest, Guest.id == GuestStats.guest_id)
+                             .order_by(GuestStats.revenue_cents.desc(), GuestStats.guest_id.desc()).limit(limit))
+    return {'guests': [_guest_stats(row) for row in rows]}
+
+
+def guest_profile(guest_id):
+    """A guest with their lifetime stats (zero before a first completed stay)."""
+    rows = yield 'default', (select(*_GUEST_STATS_COLUMNS, Guest.phone)
+                             .outerjoin(GuestStats, GuestStats.guest_id == Guest.id).where(Guest.id == guest_id))
+    if not rows:
+        return None
+    return {**_guest_stats(rows[0]), 'phone': rows[0].phone}
+
+
+def search(query, property_id=None, page=1, per_page=SEARCH_PAGE_SIZE):
+    """
+    Ranked full-text search over guests (default database) and stays (the
+    property's database). Each side returns at most the rows needed up to the
+    requested page, best first off the index, and the two are merged by rank.
+    """
+    terms = search_terms(query)
+    page = min(max(page, 1), SEARCH_MAX_PAGE)
+    if not terms:
+        return {'query': query, 'page': page, 'results': [], 'has_more': False}
+    window = page * per_page + 1 # One extra row tells whether there is a next page
+
+    def matches(kind, *criteria):
+        rank = search_rank(terms).label('rank')
+        return (select(search_index.c.kind, search_index.c.ref_id, search_index.c.label, rank)
+                .where(search_match(terms), search_index.c.kind == kind, *criteria)
+                .order_by(rank).limit(window))
+
+    guests = yield 'default', matches('guest')
+    stays = yield 'property', matches('stay', *([search_index.c.property_id == property_id]
+                                                if property_id is not None else []))
+    ranked = sorted(guests + stays, key=lambda row: row.rank)
+    return {
+        'query': query, 'page': page,
+        'results': [{'kind': row.kind, 'id': row.ref_id, 'label': row.label}
+                    for row in ranked[(page - 1) * per_page:page * per_page]],
+        'has_more': len(ranked) > page * per_page,
+    }
+
+
+def invoice(booking_id, property_id=None):
+    """Invoice with its payments and balance; falls back to the archive like the invoice routes."""
+    for booking_model, invoice_model, payment_model in ((Booking, Invoice, Payment),
+                                                       (ArchivedBooking, ArchivedInvoice, ArchivedPayment)):
+        rows = yield 'property', (select(booking_model.guest_id, booking_model.room_id, booking_model.check_in_date,
+                                         booking_model.check_out_date, booking_model.total_amount_cents,
+                                         invoice_model.id, invoice_model.issue_date, invoice_model.due_date,
+                                         invoice_model.amount_paid_cents, invoice_model.payment_status)
+                                  .join(invoice_model, invoice_model.booking_id == booking_model.id)
+                                  .where(booking_model.id == booking_id, _scope(booking_model, property_id)))
+        if rows:
+            break
+    else:
+        return None
+    (guest_id, room_id, check_in, check_out, total_cents,
+     invoice_id, issue_date, due_date, paid_cents, status) = rows[0]
+    payments = yield 'property', (select(payment_model.amount_cents, payment_model.method, payment_model.reference,
+                                         payment_model.posted_at)
+                                  .where(payment_model.invoice_id == invoice_id).order_by(payment_model.id))
+    guest = yield 'default', select(Guest.name, Guest.email).where(Guest.id == guest_id)
+    room = yield 'property', select(Room.room_number, Room.room_type).where(Room.id == room_id)
+    return {
+        'invoice_id': invoice_id, 'booking_id': booking_id, 'payment_status': status,
+        'issue_date': _iso(issue_date), 'due_date': _iso(due_date),
+        'check_in_date': _iso(check_in), 'check_out_date': _iso(check_out),
+        'guest': dict(guest[0]._mapping) if guest else None,
+        'room': dict(room[0]._mapping) if room else None,
+        'total_amount': from_cents(total_cents), 'amount_paid': from_cents(paid_cents),
+        'balance_due': from_cents((total_cents or 0) - paid_cents),
+        'payments': [{'amount': from_cents(p.amount_cents), 'method': p.method, 'reference': p.reference,
+                      'posted_at': _iso(p.posted_at)} for p in payments],
+    }
+
+
+def run_sync(endpoint):
+    """
+    Drives an endpoint generator on db.session. ORM statements route to their
+    shard themselves; Core statements on 'property' (search_index) are pointed
+    at the active property's database through the Booking mapper.
+    """
+    from app import db
+    property_bind = {'mapper': Booking.__mapper__}
+    try:
+        database, statement = next(endpoint)
+        while True:
+            bind_arguments = property_bind if database == 'property' else None
+            database, statement = endpoint.send(db.session.execute(statement, bind_arguments=bind_arguments).all())
+    except StopIteration as done:
+        return done.value
@@ -0,0 +1,270 @@
+import threading
+from bisect import bisect_left, bisect_right
+from datetime import datetime, date, timedelta
+from flask import current_app, has_app_context
+from sqlalchemy import event, select, and_, or_, text
+from app import db
+from app.models import Booking, Room
+from app.sharding import PropertySession
+
+OPEN_END = datetime.max # An in-house stay without a check-out date blocks the room until checked out
+
+
+class ReservationConflict(Exception):
+    """Raised when a stay overlaps another booking of the same room."""
+
+    def __init__(self, room_id, booking_ids):
+        super().__init__(f"Room {room_id} is already booked for these dates (bookings {', '.join(map(str, booking_ids))}).")
+        self.room_id = room_id
+        self.booking_ids = booking_ids
+
+
+def as_datetime(value):
+    if isinstance(value, date) and not isinstance(value, datetime):
+        return datetime.combine(value, datetime.min.time())
+    return value
+
+
+def stay_window(check_in, check_out):
+    """[start, end) of a new stay; an open-ended new stay is checked as one night."""
+    start = as_datetime(check_in)
+    end = as_datetime(check_out) if check_out else start + timedelta(days=1)
+    return start, end
+
+
+def blocks_room():
+    """SQL criterion for bookings that hold their room: in-house stays and reservations."""
+    return or_(Booking.is_active.is_(True), Booking.is_reservation.is_(True))
+
+
+def overlaps_window(start, end):
+    """SQL criterion for bookings that hold their room at some point of [start, end)."""
+    return and_(blocks_room(), Booking.check_in_date < end,
+                or_(Booking.check_out_date.is_(None), Booking.check_out_date > start))
+
+
+def find_conflicts(room_id, check_in, check_out, exclude_booking_id=None):
+    """
+    Ids of bookings of `room_id` overlapping [check_in, check_out). This is the
+    authoritative check used on every write; it is a range query served by the
+    (room_id, check_in_date, check_out_date) index.
+    """
+    start, end = stay_window(check_in, check_out)
+    query = select(Booking.id).where(Booking.room_id == room_id, overlaps_window(start, end))
+    if exclude_booking_id is not None:
+        query = query.where(Booking.id != exclude_booking_id)
+    return list(db.session.scalars(query.order_by(Booking.check_in_date)))
+
+
+def booked_room_ids(check_in, check_out):
+    """Ids of the rooms held by some booking during [check_in, check_out), from one query."""
+    start, end = stay_window(check_in, check_out)
+    return set(db.session.scalars(select(Booking.room_id).where(overlaps_window(start, end)).distinct()))
+
+
+def lock_room(room_id):
+    """
+    The room, locked for the rest of the transaction, so that two requests
+    booking it run their conflict check and insert one after the other instead
+    of both passing the check. SELECT ... FOR UPDATE where the database has row
+    locks; SQLite has none (and pysqlite runs reads outside a transaction), so
+    there a no-op UPDATE takes the database's write lock first.
+    """
+    connection = db.session.connection(bind_arguments={'mapper': Room.__mapper__})
+    if connection.dialect.name == 'sqlite':
+        connection.execute(text(f"UPDATE {Room.__tablename__} SET id = id WHERE id = :id"), {'id': room_id})
+        return db.session.get(Room, room_id)
+    return db.session.scalars(select(Room).where(Room.id == room_id).with_for_update()).first()
+
+
+def create_reservation(guest_id, room_id, check_in, check_out):
+    """Books a room for future dates. Raises ReservationConflict on overlap."""
+    start, end = as_datetime(check_in), as_datetime(check_out)
+    if end <= start:
+        raise ValueError("Departure must be after arrival.")
+    room = lock_room(room_id)
+    if not room:
+        raise ValueError(f"Room {room_id} not found.")
+    conflicts = find_conflicts(room_id, start, end)
+    if conflicts:
+        db.session.rollback() # Releases the room lock
+        raise ReservationConflict(room_id, conflicts)
+    booking = Booking(guest_id=guest_id, room_id=room_id, property_id=room.property_id,
+                      check_in_date=start, check_out_date=end,
+                      is_active=False, is_reservation=True)
+    db.session.add(booking)
+    db.session.commit()
+    return booking
+
+
+class IntervalIndex:
+    """
+    Stays of one room as intervals sorted by start, with a running maximum of the
+    end times. A window [start, end) overlaps something iff, among the intervals
+    starting before `end`, the largest end is after `start`: one bisect plus one
+    lookup, so the check costs O(log n) however many stays the room has.
+    """
+    __slots__ = ('starts', 'ends', 'booking_ids', 'max_ends')
+
+    def __init__(self, intervals=()):
+        items = sorted(intervals)
+        self.starts = [i[0] for i in items]
+        self.ends = [i[1] for i in items]
+        self.booking_ids = [i[2] for i in items]
+        self.max_ends = []
+        self._rebuild_from(0)
+
+    def __len__(self):
+        return len(self.starts)
+
+    def _rebuild_from(self, position):
+        del self.max_ends[position:]
+        running = self.max_ends[-1] if self.max_ends else None
+        for end in self.ends[position:]:
+            running = end if running is None or end > running else running
+            self.max_ends.append(running)
+
+    def add(self, start, end, booking_id):
+        position = bisect_right(self.starts, start)
+        self.starts.insert(position, start)
+        self.ends.insert(position, end)
+        self.booking_ids.insert(position, booking_id)
+        self._rebuild_from(position)
+
+    def remove(self, booking_id):
+        if booking_id not in self.booking_ids:
+            return
+        position = self.booking_ids.index(booking_id)
+        del self.starts[position], self.ends[position], self.booking_ids[position]
+        self._rebuild_from(position)
+
+    def overlaps(self, start, end):
+        position = bisect_left(self.starts, end)
+        return position > 0 and self.max_ends[position - 1] > start
+
+
+class AvailabilityIndex:
+    """
+    Process-local IntervalIndex per room for the availability search path. Loaded
+    once per property scope with a single query over in-house stays and
+    reservations, then kept current by committed Booking changes. Other
+    processes' commits are not seen, so it is only used when one process serves
+    everything; writes always re-check with find_conflicts under lock_room.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._rooms = {}          # (property_id, room_id) -> IntervalIndex
+        self._booking_rooms = {}  # booking id -> (property_id, room_id) it is indexed under
+        self._loaded = set()      # property scopes loaded so far (None = unscoped)
+
+    def _ensure_loaded(self):
+        scope = db.session.info.get('property_id')
+        if scope in self._loaded:
+            return
+        rows = db.session.execute(
+            select(Booking.id, Booking.property_id, Booking.room_id, Booking.check_in_date, Booking.check_out_date)
+            .where(blocks_room())
+        ).all()
+        grouped = {}
+        for booking_id, property_id, room_id, check_in, check_out in rows:
+            grouped.setdefault((property_id, room_id), []).append((as_datetime(check_in), as_datetime(check_out) or OPEN_END, booking_id))
+        with self._lock:
+            for key, intervals in grouped.items():
+                self._rooms[key] = IntervalIndex(intervals)
+                for interval in intervals:
+                    self._booking_rooms[interval[2]] = key
+            self._loaded.add(scope)
+
+    def is_free(self, room_id, check_in, check_out, property_id=None):
+        self._ensure_loaded()
+        start, end = stay_window(check_in, check_out)
+        index = self._rooms.get((property_id, room_id))
+        return index is None or not index.overlaps(start, end)
+
+    def available_rooms(self, rooms, check_in, check_out):
+        """Filters room objects/records down to those free for the whole window."""
+        self._ensure_loaded()
+        start, end = stay_window(check_in, check_out)
+        free = []
+        for room in rooms:
+            index = self._rooms.get((room.property_id, room.id))
+            if index is None or not index.overlaps(start, end):
+                free.append(room)
+        return free
+
+    def apply(self, changes):
+        with self._lock:
+            for op, values in changes:
+                previous = self._booking_rooms.pop(values['id'], None)
+                if previous in self._rooms:
+                    self._rooms[previous].remove(values['id'])
+                if op != 'delete' and values['blocks']:
+                    key = (values['property_id'], values['room_id'])
+                    start = as_datetime(values['check_in_date'])
+                    end = as_datetime(values['check_out_date']) or OPEN_END
+                    self._rooms.setdefault(key, IntervalIndex()).add(start, end, values['id'])
+                    self._booking_rooms[values['id']] = key
+
+    def bookings_changed(self, booking_ids):
+        """Re-reads bookings changed by bulk statements that bypass the session hooks."""
+        rows = db.session.execute(
+            select(Booking.id, Booking.property_id, Booking.room_id, Booking.check_in_date,
+                   Booking.check_out_date, Booking.is_active, Booking.is_reservation)
+            .where(Booking.id.in_(list(booking_ids)))
+        ).all()
+        self.apply([('update', {'id': r.id, 'property_id': r.property_id, 'room_id': r.room_id,
+                                'check_in_date': r.check_in_date, 'check_out_date': r.check_out_date,
+                                'blocks': bool(r.is_active or r.is_reservation)}) for r in rows])
+
+
+def get_availability_index():
+    """The app's AvailabilityIndex, or None when AVAILABILITY_INDEX is disabled."""
+    return current_app.extensions.get('availability_index')
+
+
+def init_availability_index(app):
+    if app.config.get('AVAILABILITY_INDEX', False):
+        app.extensions['availability_index'] = AvailabilityIndex()
+
+
+def available_rooms(check_in, check_out, room_type=None):
+    """Rooms free for [check_in, check_out), via the in-memory indexes when enabled."""
+    from app.room_state import get_room_state
+    room_state = get_room_state()
+    if room_state:
+        rooms = room_state.rooms()
+    else:
+        rooms = Room.query.order_by(Room.room_number).all()
+    rooms = [room for room in rooms
+             if room.status != 'maintenance' and (not room_type or room.room_type == room_type)]
+    index = get_availability_index()
+    if index is not None:
+        return index.available_rooms(rooms, check_in, check_out)
+    booked = booked_room_ids(check_in, check_out)
+    return [room for room in rooms if room.id not in booked]
+
+
+@event.listens_for(PropertySession, 'after_flush')
+def _capture_booking_changes(session, flush_context):
+    changes = [(op, {'id': obj.id, 'property_id': obj.property_id, 'room_id': obj.room_id,
+                     'check_in_date': obj.check_in_date, 'check_out_date': obj.check_out_date,
+                     'blocks': bool(obj.is_active or obj.is_reservation)})
+               for op, objects in (('insert', session.new), ('update', session.dirty), ('delete', session.deleted))
+               for obj in objects if isinstance(obj, Booking)]
+    if changes:
+        session.info.setdefault('availability_changes', []).extend(changes)
+
+
+@event.listens_for(PropertySession, 'after_commit')
+def _publish_booking_changes(session):
+    changes = session.info.pop('availability_changes', None)
+    if changes and has_app_context():
+        index = current_app.extensions.get('availability_index')
+        if index is not None:
+            index.apply(changes)
+
+
+@event.listens_for(PropertySession, 'after_soft_rollback')
+def _discard_booking_changes(session, previous_transaction):
+    session.info.pop('availability_changes', None)
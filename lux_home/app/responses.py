@@ -0,0 +1,128 @@
+import gzip
+import hashlib
+import json
+from datetime import date
+from functools import wraps
+from flask import current_app, request, session, make_response
+from flask_login import current_user
+from sqlalchemy import select, update, func
+from app import db
+from app.models import TableVersion
+
+try:
+    import brotli
+except ImportError: # Optional; responses fall back to gzip
+    brotli = None
+
+COMPRESSIBLE_MIMETYPES = {'text/html', 'application/json', 'text/css', 'text/plain', 'application/javascript'}
+
+
+def data_version(*models):
+    """
+    (deletes, latest updated_at) per model for the active property. The max is
+    read off the updated_at index; the delete counters (record_deletes) catch
+    archiving, which leaves the latest updated_at unchanged. One small query
+    for the counters plus one index lookup per model, however big the tables.
+    """
+    names = [model.__tablename__ for model in models]
+    deletes = dict(db.session.execute(
+        select(TableVersion.table_name, func.sum(TableVersion.deletes))
+        .where(TableVersion.table_name.in_(names)).group_by(TableVersion.table_name)).all())
+    version = []
+    for model in models:
+        latest = db.session.scalar(select(func.max(model.updated_at)))
+        version.append((model.__tablename__, int(deletes.get(model.__tablename__) or 0),
+                        latest.isoformat() if latest else None))
+    return version
+
+
+def record_deletes(*models):
+    """
+    Bumps the delete counters of the models' tables for the active property, in
+    the caller's transaction. Bulk deletes of rows that pages are built from call
+    this so their ETags change.
+    """
+    property_id = db.session.info.get('property_id')
+    for model in models:
+        bumped = db.session.execute(
+            update(TableVersion)
+            .where(TableVersion.table_name == model.__tablename__, TableVersion.property_id == property_id)
+            .values(deletes=TableVersion.deletes + 1),
+            execution_options={'synchronize_session': False}).rowcount
+        if not bumped:
+            db.session.add(TableVersion(table_name=model.__tablename__, property_id=property_id, deletes=1))
+
+
+def weak_etag(version):
+    """
+    Weak ETag for a page built from `version`. It also covers what else changes
+    the output: the user, the selected property, today's date, the request URL
+    and the deployed templates and assets.
+    """
+    user_id = current_user.get_id() if current_user.is_authenticated else None
+    key = json.dumps([version, user_id, session.get('property_id'), date.today().isoformat(),
+                      request.full_path, current_app.extensions.get('template_version')], default=str)
+    return hashlib.sha1(key.encode()).hexdigest()
+
+
+def conditional(version_fn):
+    """
+    Decorator for GET views: computes version_fn(**view_args) before the view
+    runs and answers 304 Not Modified when the client's If-None-Match matches,
+    without running the view's queries or template. Pages carrying one-off flash
+    messages are never cached.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            if request.method != 'GET' or session.get('_flashes'):
+                return view(*args, **kwargs)
+            etag = weak_etag(version_fn(**kwargs))
+            if request.if_none_match.contains_weak(etag):
+                response = current_app.response_class(status=304)
+            else:
+                response = make_response(view(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+            response.set_etag(etag, weak=True)
+            response.headers['Cache-Control'] = 'private, no-cache' # Always revalidate; the 304 is cheap
+            return response
+        return wrapper
+    return decorator
+
+
+def compress_response(response):
+    """Compresses HTML/JSON bodies with brotli or gzip, whichever the client prefers and we support."""
+    if (response.status_code != 200 or response.direct_passthrough or 'Content-Encoding' in response.headers
+            or response.mimetype not in COMPRESSIBLE_MIMETYPES):
+        return response
+    data = response.get_data()
+    if len(data) < current_app.config.get('COMPRESS_MIN_SIZE', 500):
+        return response
+    accepted = request.accept_encodings
+    if brotli is not None and accepted['br'] and accepted['br'] >= accepted['gzip']:
+        encoding, compressed = 'br', brotli.compress(data, quality=current_app.config.get('COMPRESS_BROTLI_QUALITY', 4))
+    elif accepted['gzip']:
+        encoding, compressed = 'gzip', gzip.compress(data, compresslevel=current_app.config.get('COMPRESS_GZIP_LEVEL', 6))
+    else:
+        return response
+    response.set_data(compressed)
+    response.headers['Content-Encoding'] = encoding
+    response.vary.add('Accept-Encoding')
+    return response
+
+
+def template_version(app):
+    """Fingerprint of the template sources and asset manifest, computed once at startup."""
+    digest = hashlib.sha1()
+    for name in sorted(app.jinja_env.list_templates()):
+        digest.update(name.encode())
+        digest.update(app.jinja_env.loader.get_source(app.jinja_env, name)[0].encode())
+    digest.update(json.dumps(app.extensions.get('asset_manifest', {}), sort_keys=True).encode())
+    return digest.hexdigest()
+
+
+def init_responses(app):
+    app.extensions['template_version'] = template_version(app)
+    if app.config.get('COMPRESS_RESPONSES', False):
+        app.after_request(compress_response)
@@ -0,0 +1,158 @@
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+from flask import current_app, render_template, request
+from markupsafe import Markup
+from sqlalchemy import select, func
+from app import db
+from app.models import Room, Booking
+from app.room_state import RoomRecord
+
+# The dashboard's room grid. Filtering (floor, type, status) and pagination
+# run in SQL over the (property_id, floor, room_number) index, and one grouped
+# query returns the rooms per floor/type/status that the filter options and
+# status counts are built from, so a page costs the same for 60 rooms or
+# 6,000. Each floor of a page is rendered from its own template fragment,
+# cached under a digest of exactly what it shows; a check-in re-renders one
+# floor, not the grid. /rooms/floor/<n> serves a single floor with its own ETag.
+
+_RECORD_COLUMNS = [getattr(Room, name) for name in RoomRecord.__slots__]
+
+
+class FragmentCache:
+    """Process-local LRU of rendered HTML fragments."""
+
+    def __init__(self, size):
+        self.size = size
+        self._fragments = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = self.misses = 0
+
+    def get_or_render(self, key, render):
+        with self._lock:
+            html = self._fragments.get(key)
+            if html is not None:
+                self._fragments.move_to_end(key)
+                self.hits += 1
+                return html
+            self.misses += 1
+        html = render()
+        with self._lock:
+            self._fragments[key] = html
+            while len(self._fragments) > self.size:
+                self._fragments.popitem(last=False)
+        return html
+
+
+def get_fragment_cache():
+    """The app's FragmentCache, or None when ROOM_GRID_FRAGMENT_CACHE is 0."""
+    return current_app.extensions.get('room_fragments')
+
+
+def init_room_grid(app):
+    size = app.config.get('ROOM_GRID_FRAGMENT_CACHE', 0)
+    if size:
+        app.extensions['room_fragments'] = FragmentCache(size)
+
+
+def grid_filters(args):
+    """Floor, room type, status and page from the query string; bad values are ignored."""
+    floor = args.get('floor', type=int)
+    page = args.get('page', 1, type=int)
+    return {'floor': floor, 'room_type': args.get('room_type') or None, 'status': args.get('status') or None,
+            'page': max(page, 1)}
+
+
+def _criteria(floor=None, room_type=None, status=None):
+    criteria = []
+    if floor is not None:
+        criteria.append(Room.floor == floor)
+    if room_type is not None:
+        criteria.append(Room.room_type == room_type)
+    if status is not None:
+        criteria.append(Room.status == status)
+    return criteria
+
+
+def room_facets(floor=None, room_type=None):
+    """
+    Filter options and counts from one grouped query: the floors and room types
+    of the property, and rooms per status among those matching floor/room_type.
+    """
+    rows = db.session.execute(
+        select(Room.floor, Room.room_type, Room.status, func.count(Room.id))
+        .group_by(Room.floor, Room.room_type, Room.status)).all()
+    status_counts = {}
+    for row_floor, row_type, row_status, count in rows:
+        if (floor is None or row_floor == floor) and (room_type is None or row_type == room_type):
+            status_counts[row_status] = status_counts.get(row_status, 0) + count
+    return {'floors': sorted({row[0] for row in rows if row[0] is not None}),
+            'room_types': sorted({row[1] for row in rows}),
+            'status_counts': dict(sorted(status_counts.items()))}
+
+
+def active_bookings_for(room_ids):
+    """{room id: active booking id} for the given rooms only."""
+    if not room_ids:
+        return {}
+    return dict(db.session.execute(
+        select(Booking.room_id, Booking.id).where(Booking.is_active.is_(True), Booking.room_id.in_(room_ids))).all())
+
+
+def room_grid(floor=None, room_type=None, status=None, page=1, per_page=None):
+    """
+    One page of the grid: {'floors': [(floor, [RoomRecord])], 'active_bookings_map',
+    'facets', 'total', 'page', 'pages'}. Rooms are ordered by floor (rooms
+    without one last), then room number.
+    """
+    per_page = per_page or current_app.config.get('ROOM_GRID_PAGE_SIZE', 120)
+    facets = room_facets(floor, room_type)
+    counts = facets['status_counts']
+    total = counts.get(status, 0) if status is not None else sum(counts.values())
+    pages = max(1, -(-total // per_page))
+    page = min(max(page, 1), pages)
+    rows = db.session.execute(
+        select(Room.floor, *_RECORD_COLUMNS).where(*_criteria(floor, room_type, status))
+        .order_by(Room.floor.asc().nulls_last(), Room.room_number)
+        .limit(per_page).offset((page - 1) * per_page)).all()
+    floors = []
+    for row in rows:
+        if not floors or floors[-1][0] != row[0]:
+            floors.append((row[0], []))
+        floors[-1][1].append(RoomRecord(*row[1:]))
+    return {'floors': floors, 'active_bookings_map': active_bookings_for([row.id for row in rows]),
+            'facets': facets, 'total': total, 'page': page, 'pages': pages}
+
+
+def floor_rooms(floor, room_type=None, status=None):
+    """Every room of one floor matching the filters, for the single-floor fragment."""
+    rows = db.session.execute(
+        select(*_RECORD_COLUMNS).where(*_criteria(floor, room_type, status)).order_by(Room.room_number)).all()
+    return [RoomRecord(*row) for row in rows]
+
+
+def floor_fragment(floor, rooms, active_bookings_map):
+    """
+    The floor's rendered cards. Cached under a digest of every value the cards
+    show (plus the script root and the deployed templates), so a changed room
+    or booking simply misses and nothing has to be invalidated.
+    """
+    active = {room.id: active_bookings_map.get(room.id) for room in rooms}
+    render = lambda: Markup(render_template('_room_floor.html', floor=floor, rooms=rooms, active_bookings_map=active))
+    cache = get_fragment_cache()
+    if cache is None:
+        return render()
+    content = [floor, [(r.id, r.room_number, r.room_type, r.rate_per_night_cents, r.status, active[r.id]) for r in rooms],
+               request.script_root, current_app.extensions.get('template_version')]
+    key = hashlib.sha1(json.dumps(content).encode()).hexdigest()
+    return cache.get_or_render(key, render)
+
+
+def floor_version(floor):
+    """Version of one floor for its fragment's ETag: its rooms and their in-house stays, like data_version."""
+    rooms = db.session.execute(select(func.count(), func.max(Room.updated_at)).where(Room.floor == floor)).one()
+    stays = db.session.execute(
+        select(func.count(), func.max(Booking.updated_at)).join(Room, Room.id == Booking.room_id)
+        .where(Room.floor == floor, Booking.is_active.is_(True))).one()
+    return [(count, latest.isoformat() if latest else None) for count, latest in (rooms, stays)]
@@ -0,0 +1,133 @@
+import threading
+from flask import current_app, has_app_context
+from sqlalchemy import event, select
+from app import db
+from app.models import Room
+from app.money import from_cents
+from app.sharding import PropertySession
+
+
+class RoomRecord:
+    """Plain, slotted copy of the Room columns the dashboard and check-in form need."""
+    __slots__ = ('id', 'property_id', 'room_number', 'room_type', 'rate_per_night_cents', 'status')
+
+    def __init__(self, id, property_id, room_number, room_type, rate_per_night_cents, status):
+        self.id = id
+        self.property_id = property_id
+        self.room_number = room_number
+        self.room_type = room_type
+        self.rate_per_night_cents = rate_per_night_cents
+        self.status = status
+
+    @property
+    def rate_per_night(self):
+        return from_cents(self.rate_per_night_cents)
+
+    def __repr__(self):
+        return f"RoomRecord('{self.room_number}', '{self.room_type}', '{self.status}')"
+
+
+_COLUMNS = RoomRecord.__slots__
+
+
+class RoomStateStore:
+    """
+    Process-local room state. Each property's rooms are loaded once with a single
+    column query (no ORM identity map or instrumentation) and then kept current by
+    the Room change events committed through db.session. Writers that bypass the
+    ORM unit of work (bulk UPDATE statements) must call rooms_changed().
+
+    Nothing tells the store about commits made by other processes, so it is only
+    correct when one process serves every request (ROOM_STATE_STORE is off by
+    default).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._records = {}     # (property_id, room id) -> RoomRecord
+        self._partitions = {}  # active property id (None = unscoped) -> list of record keys
+
+    def _load(self, scope):
+        rows = db.session.execute(select(*[getattr(Room, c) for c in _COLUMNS]).order_by(Room.room_number)).all()
+        keys = []
+        with self._lock:
+            for row in rows:
+                record = RoomRecord(*row)
+                key = (record.property_id, record.id)
+                self._records[key] = record
+                keys.append(key)
+            self._partitions[scope] = keys
+        return keys
+
+    def rooms(self, status=None):
+        """Rooms of the active property ordered by room number, optionally filtered by status."""
+        scope = db.session.info.get('property_id')
+        keys = self._partitions.get(scope)
+        if keys is None:
+            keys = self._load(scope)
+        records = [self._records[k] for k in keys if k in self._records]
+        if status is not None:
+            records = [r for r in records if r.status == status]
+        return records
+
+    def apply(self, changes):
+        """Applies committed (op, values) Room changes captured by the session hooks."""
+        with self._lock:
+            for op, values in changes:
+                key = (values['property_id'], values['id'])
+                if op == 'delete':
+                    self._records.pop(key, None)
+                    continue
+                record = self._records.get(key)
+                if record is None:
+                    self._records[key] = RoomRecord(**values)
+                    for scope in {None, values['property_id']}:
+                        if scope in self._partitions:
+                            self._partitions[scope].append(key)
+                            self._partitions[scope].sort(key=lambda k: self._records[k].room_number if k in self._records else '')
+                else:
+                    for name, value in values.items():
+                        setattr(record, name, value)
+
+    def rooms_changed(self, room_ids=None):
+        """Re-reads the given rooms (or drops every partition when no ids are given)."""
+        if room_ids is None:
+            with self._lock:
+                self._records.clear()
+                self._partitions.clear()
+            return
+        rows = db.session.execute(select(*[getattr(Room, c) for c in _COLUMNS]).where(Room.id.in_(list(room_ids)))).all()
+        self.apply([('update', dict(zip(_COLUMNS, row))) for row in rows])
+
+
+def get_room_state():
+    """The app's RoomStateStore, or None when ROOM_STATE_STORE is disabled."""
+    return current_app.extensions.get('room_state')
+
+
+def init_room_state(app):
+    if app.config.get('ROOM_STATE_STORE', False):
+        app.extensions['room_state'] = RoomStateStore()
+
+
+@event.listens_for(PropertySession, 'after_flush')
+def _capture_room_changes(session, flush_context):
+    changes = [(op, {c: getattr(obj, c) for c in _COLUMNS})
+               for op, objects in (('insert', session.new), ('update', session.dirty), ('delete', session.deleted))
+               for obj in objects if isinstance(obj, Room)]
+    if changes:
+        session.info.setdefault('room_state_changes', []).extend(changes)
+
+
+@event.listens_for(PropertySession, 'after_commit')
+def _publish_room_changes(session):
+    changes = session.info.pop('room_state_changes', None)
+    if changes:
+        store = current_app.extensions.get('room_state') if has_app_context() else None
+        if store is not None:
+            store.apply(changes)
+
+
+@event.listens_for(PropertySession, 'after_soft_rollback')
+def _discard_room_changes(session, previous_transaction):
+    session.info.pop('room_state_changes', None)
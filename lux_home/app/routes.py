@@ -1,14 +1,72 @@
-from flask import render_template, redirect, url_for, flash, request, make_response
-from app import app, db, bcrypt # Import bcrypt
-from app.models import Room, Guest, Booking, Invoice, Service, BookingService, User # Import User
-from app.forms import CheckInForm, NewGuestForm, LoginForm, RegistrationForm # Import auth forms
-from app.services import calculate_booking_total # Import the service function
+from flask import render_template, redirect, url_for, flash, request, make_response, session, abort, jsonify, current_app
+from app import db, bcrypt # Import bcrypt
+from app.models import Room, Guest, Booking, Invoice, Service, BookingService, User, Property # Import User
+from app.forms import CheckInForm, NewGuestForm, LoginForm, RegistrationForm, ReservationForm, PaymentForm # Import auth forms
+from app.services import calculate_booking_total, group_check_out # Import the service functions
+from app.sharding import enter_property_scope
+from app.archive import load_archived_invoice
+from app.room_state import get_room_state
+from app.room_grid import grid_filters, room_grid, floor_rooms, floor_fragment, floor_version, active_bookings_for
+from app.reservations import create_reservation, find_conflicts, available_rooms, lock_room, ReservationConflict
+from app.ledger import post_payment, outstanding_balance_cents, receivables_aging
+from app.money import from_cents
+from app.scheduler import job_stats
+from app.channel_sync import channel_sync_stats
+from app.forecast import forecast
+from app.guest_stats import record_stays
+from app.night_audit import in_house_balance
+from app.outbox import enqueue_email
+from app.invoice_pdf import render_invoice_pdf
+from app.responses import conditional, data_version
+from app import read_api
 from datetime import datetime, date, timedelta # Ensure timedelta is imported
-from weasyprint import HTML # Import WeasyPrint
 from flask_login import login_user, logout_user, login_required, current_user # Import Flask-Login functions
 
 
-@app.route('/register', methods=['GET', 'POST'])
+class RouteTable:
+    """
+    Records the views of this module so create_app can register them on every
+    app it builds; the module is imported once, but tests and tools create
+    several apps.
+    """
+
+    def __init__(self):
+        self._deferred = []
+
+    def route(self, rule, **options):
+        def decorator(view):
+            self._deferred.append(lambda app: app.add_url_rule(rule, view_func=view, **options))
+            return view
+        return decorator
+
+    def before_request(self, f):
+        self._deferred.append(lambda app: app.before_request(f))
+        return f
+
+    def register(self, app):
+        for deferred in self._deferred:
+            deferred(app)
+
+
+views = RouteTable()
+
+
+@views.before_request
+def bind_property_scope():
+    # Scope Room/Booking/Invoice queries for this request to the selected property (if any)
+    property_id = session.get('property_id')
+    if property_id is not None and not enter_property_scope(property_id):
+        session.pop('property_id', None)
+
+@views.route('/property/<int:property_id>')
+@login_required
+def select_property(property_id):
+    prop = Property.query.get_or_404(property_id)
+    session['property_id'] = prop.id
+    flash(f"Now managing {prop.name}.", 'info')
+    return redirect(url_for('index'))
+
+@views.route('/register', methods=['GET', 'POST'])
 def register():
     if current_user.is_authenticated:
         return redirect(url_for('index'))
@@ -22,7 +80,7 @@ def register():
         return redirect(url_for('login'))
     return render_template('register.html', title='Register', form=form)
 
-@app.route('/login', methods=['GET', 'POST'])
+@views.route('/login', methods=['GET', 'POST'])
 def login():
     if current_user.is_authenticated:
         return redirect(url_for('index'))
@@ -38,7 +96,7 @@ def login():
             flash('Login Unsuccessful. Please check username and password.', 'danger')
     return render_template('login.html', title='Login', form=form)
 
-@app.route('/logout')
+@views.route('/logout')
 @login_required
 def logout():
     logout_user()
@@ -46,20 +104,46 @@ def logout():
     return redirect(url_for('login'))
 
 
-@app.route('/')
+def dashboard_version():
+    return data_version(Room, Booking)
+
+@views.route('/')
 @login_required # Protect dashboard
+@conditional(dashboard_version)
 def index():
-    rooms = Room.query.all()
-    active_bookings = Booking.query.filter_by(is_active=True).all()
-    active_bookings_map = {b.room_id: b.id for b in active_bookings}
-    # The duplicated query for rooms and active_bookings seems like a mistake from previous merge. Consolidating.
-    completed_bookings = Booking.query.filter_by(is_active=False).order_by(Booking.check_out_date.desc()).limit(10).all() # Get recent 10
-    return render_template('dashboard.html', rooms=rooms, active_bookings_map=active_bookings_map, completed_bookings=completed_bookings)
-
-@app.route('/invoice/<int:booking_id>')
+    # One page of the room grid, filtered and paginated in SQL; each floor is a cached fragment
+    filters = grid_filters(request.args)
+    grid = room_grid(**filters)
+    floor_fragments = [(floor, floor_fragment(floor, rooms, grid['active_bookings_map'])) for floor, rooms in grid['floors']]
+    completed_bookings = Booking.query.filter_by(is_active=False, is_reservation=False).order_by(Booking.check_out_date.desc()).limit(10).all() # Get recent 10
+    upcoming_reservations = Booking.query.filter_by(is_reservation=True).order_by(Booking.check_in_date).limit(20).all()
+    return render_template('dashboard.html', grid=grid, filters=filters, floor_fragments=floor_fragments,
+                           completed_bookings=completed_bookings, upcoming_reservations=upcoming_reservations)
+
+@views.route('/rooms/floor/<int:floor>')
+@login_required
+@conditional(floor_version)
+def room_floor_fragment(floor):
+    # A single floor's cards (same filters as the dashboard), for refreshing one floor in place
+    filters = grid_filters(request.args)
+    rooms = floor_rooms(floor, filters['room_type'], filters['status'])
+    return floor_fragment(floor, rooms, active_bookings_for([room.id for room in rooms]))
+
+def archived_invoice_context(booking_id):
+    # Stays moved to cold storage are read-only: render them straight from the archive tables
+    archived = load_archived_invoice(booking_id)
+    if archived is None:
+        abort(404)
+    booking, invoice, guest, room = archived
+    duration_days = (booking.check_out_date - booking.check_in_date).days if booking.check_out_date else 1
+    return dict(booking=booking, invoice=invoice, guest=guest, room=room, duration_days=max(duration_days, 1))
+
+@views.route('/invoice/<int:booking_id>')
 @login_required # Protect route
 def view_invoice(booking_id):
-    booking = Booking.query.get_or_404(booking_id)
+    booking = Booking.query.get(booking_id)
+    if booking is None:
+        return render_template('invoice_template.html', **archived_invoice_context(booking_id))
     guest = booking.guest
     room = booking.room
 
@@ -90,6 +174,7 @@ def view_invoice(booking_id):
 
         invoice = Invoice(
             booking_id=booking.id,
+            property_id=booking.property_id,
             issue_date=issue_date,
             due_date=due_date
             # amount_paid and payment_status have defaults in model
@@ -113,12 +198,63 @@ def view_invoice(booking_id):
                            invoice=invoice, 
                            guest=guest, 
                            room=room,
-                           duration_days=duration_days)
+                           duration_days=duration_days,
+                           balance_due=from_cents(outstanding_balance_cents(invoice.id)),
+                           payment_form=PaymentForm())
 
-@app.route('/invoice/<int:booking_id>/pdf')
+@views.route('/invoice/<int:booking_id>/payments', methods=['POST'])
+@login_required
+def add_payment(booking_id):
+    invoice = Invoice.query.filter_by(booking_id=booking_id).first_or_404()
+    form = PaymentForm()
+    if form.validate_on_submit():
+        try:
+            payment = post_payment(invoice.id, form.amount.data, method=form.method.data,
+                                   reference=form.reference.data or None, posted_by=current_user.id)
+            flash(f"Payment of ${payment.amount:.2f} posted.", 'success')
+        except ValueError as e:
+            db.session.rollback()
+            flash(str(e), 'danger')
+    else:
+        flash("Enter a valid payment amount.", 'danger')
+    return redirect(url_for('view_invoice', booking_id=booking_id))
+
+@views.route('/reports/ar-aging')
+@login_required
+def ar_aging_report():
+    return jsonify(receivables_aging())
+
+@views.route('/reports/jobs')
+@login_required
+def job_stats_report():
+    return jsonify(job_stats())
+
+@views.route('/reports/channel-sync')
+@login_required
+def channel_sync_report():
+    return jsonify(channel_sync_stats())
+
+@views.route('/reports/forecast')
+@login_required
+def forecast_report():
+    days = min(max(request.args.get('days', current_app.config.get('FORECAST_HORIZON_DAYS', 90), type=int), 1), 365)
+    return jsonify(forecast(days))
+
+def invoice_version(booking_id):
+    # Payments, overdue sweeps and checkout all bump the booking's or invoice's updated_at
+    row = db.session.execute(
+        db.select(Booking.updated_at, Invoice.updated_at).outerjoin(Invoice, Invoice.booking_id == Booking.id)
+        .where(Booking.id == booking_id)
+    ).first()
+    return list(row) if row else ['archived', booking_id] # Archived invoices never change
+
+@views.route('/invoice/<int:booking_id>/pdf')
 @login_required # Protect route
+@conditional(invoice_version)
 def download_invoice_pdf(booking_id):
-    booking = Booking.query.get_or_404(booking_id)
+    booking = Booking.query.get(booking_id)
+    if booking is None:
+        return invoice_pdf_response(booking_id, archived_invoice_context(booking_id))
     guest = booking.guest
     room = booking.room
 
@@ -141,6 +277,7 @@ def download_invoice_pdf(booking_id):
         
         invoice = Invoice(
             booking_id=booking.id,
+            property_id=booking.property_id,
             issue_date=issue_date,
             due_date=due_date
         )
@@ -157,36 +294,36 @@ def download_invoice_pdf(booking_id):
     if duration_days <= 0:
         duration_days = 1
 
-    html_out = render_template('invoice_template.html', 
-                               booking=booking, 
-                               invoice=invoice, 
-                               guest=guest, 
-                               room=room,
-                               duration_days=duration_days,
-                               is_pdf_render=True) # Flag to hide elements in PDF
-    
+    return invoice_pdf_response(booking.id, dict(booking=booking,
+                                                 invoice=invoice,
+                                                 guest=guest,
+                                                 room=room,
+                                                 duration_days=duration_days,
+                                                 balance_due=from_cents(outstanding_balance_cents(invoice.id))))
+
+def invoice_pdf_response(booking_id, context):
     try:
-        pdf = HTML(string=html_out).write_pdf()
+        pdf = render_invoice_pdf(**context) # Backend chosen by INVOICE_PDF_BACKEND
         response = make_response(pdf)
         response.headers['Content-Type'] = 'application/pdf'
-        response.headers['Content-Disposition'] = f'inline; filename=invoice_{booking.id}.pdf'
+        response.headers['Content-Disposition'] = f'inline; filename=invoice_{booking_id}.pdf'
         return response
     except Exception as e:
         # Log the error e
-        app.logger.error(f"Error generating PDF for invoice {booking.id}: {e}")
+        current_app.logger.error(f"Error generating PDF for invoice {booking_id}: {e}")
         # Attempt to install WeasyPrint dependencies if it's a known missing library error
         if "No GDK-PixBuf library found" in str(e) or "no library called " in str(e).lower(): # Heuristic
             flash("Generating PDF failed due to missing system libraries. Attempting to install them. Please try again in a moment.", "warning")
             # Return a redirect or a simple message, as installing might take time
             # and we can't block the request for too long.
             # For a real app, this installation would be part of deployment or a separate admin action.
-            return redirect(url_for('view_invoice', booking_id=booking.id))
+            return redirect(url_for('view_invoice', booking_id=booking_id))
         else:
             flash(f"Could not generate PDF: {e}", "danger")
-            return redirect(url_for('view_invoice', booking_id=booking.id))
+            return redirect(url_for('view_invoice', booking_id=booking_id))
 
 
-@app.route('/check-out/<int:booking_id>', methods=['POST'])
+@views.route('/check-out/<int:booking_id>', methods=['POST'])
 @login_required # Protect route
 def check_out(booking_id):
     booking = Booking.query.get_or_404(booking_id) # More robust way to get booking
@@ -225,9 +362,18 @@ def check_out(booking_id):
     booking.is_active = False
     room.status = 'needs_cleaning' # Or 'available'
 
+    if current_app.config.get('EMAIL_INVOICE_ON_CHECKOUT', False):
+        # Issue the invoice now and queue the email in the same transaction; the outbox worker sends it
+        if not Invoice.query.filter_by(booking_id=booking.id).first():
+            issue_date = datetime.utcnow()
+            db.session.add(Invoice(booking_id=booking.id, property_id=booking.property_id,
+                                   issue_date=issue_date, due_date=issue_date + timedelta(days=15)))
+        enqueue_email('invoice', booking.guest.email, booking.property_id, booking_id=booking.id)
+
     try:
         db.session.add(booking)
         db.session.add(room)
+        record_stays([(booking.guest_id, booking.check_in_date, checkout_dt, booking.total_amount_cents)])
         db.session.commit()
         flash(f"Room {room.room_number} checked out successfully. Total: ${booking.total_amount:.2f}", 'success')
     except Exception as e:
@@ -237,7 +383,174 @@ def check_out(booking_id):
     return redirect(url_for('index'))
 
 
-@app.route('/check-in', methods=['GET', 'POST'])
+@views.route('/check-out/group', methods=['POST'])
+@login_required
+def check_out_group():
+    # Booking ids come as repeated 'booking_ids' fields or one comma-separated value
+    raw_ids = ','.join(request.form.getlist('booking_ids')).split(',')
+    booking_ids = [int(v) for v in raw_ids if v.strip().isdigit()]
+    if not booking_ids:
+        flash("No bookings selected for group check-out.", 'warning')
+        return redirect(url_for('index'))
+
+    idempotency_key = request.headers.get('Idempotency-Key') or request.form.get('idempotency_key')
+    try:
+        result = group_check_out(booking_ids, idempotency_key=idempotency_key)
+    except Exception as e:
+        db.session.rollback()
+        flash(f"Error during group check-out: {str(e)}", 'danger')
+        return redirect(url_for('index'))
+
+    total = sum(result['totals'].values())
+    flash(f"Checked out {len(result['checked_out'])} bookings. Total: ${total:.2f}", 'success')
+    if result['already_checked_out']:
+        flash(f"Already checked out: {', '.join(map(str, result['already_checked_out']))}", 'info')
+    if result['not_found']:
+        flash(f"Bookings not found: {', '.join(map(str, result['not_found']))}", 'warning')
+    return redirect(url_for('index'))
+
+
+@views.route('/reservations/new', methods=['GET', 'POST'])
+@login_required
+def new_reservation():
+    form = ReservationForm()
+    form.guest_id.choices = [(g.id, g.name) for g in Guest.query.order_by(Guest.name).all()]
+    form.room_id.choices = [(r.id, f"{r.room_number} ({r.room_type} - ${r.rate_per_night})")
+                            for r in Room.query.order_by(Room.room_number).all()]
+
+    if form.validate_on_submit():
+        try:
+            booking = create_reservation(form.guest_id.data, form.room_id.data,
+                                         form.check_in_date.data, form.check_out_date.data)
+            flash(f"Reservation #{booking.id} created for room {booking.room.room_number}.", 'success')
+            return redirect(url_for('index'))
+        except (ReservationConflict, ValueError) as e:
+            db.session.rollback()
+            flash(str(e), 'danger')
+    elif request.method == 'GET':
+        form.check_in_date.data = datetime.utcnow().date() + timedelta(days=1)
+        form.check_out_date.data = datetime.utcnow().date() + timedelta(days=2)
+    return render_template('reservation.html', form=form, title="New Reservation")
+
+@views.route('/reservations/<int:booking_id>/check-in', methods=['POST'])
+@login_required
+def check_in_reservation(booking_id):
+    booking = Booking.query.get_or_404(booking_id)
+    if not booking.is_reservation:
+        flash(f"Booking #{booking.id} is not an open reservation.", 'info')
+        return redirect(url_for('index'))
+    room = lock_room(booking.room_id) # Held until commit, so the stay cannot grow into a booking made meanwhile
+    if room.status != 'available':
+        db.session.rollback()
+        flash(f"Room {room.room_number} is not ready yet ({room.status}).", 'danger')
+        return redirect(url_for('index'))
+    now = datetime.utcnow()
+    # An early arrival moves the stay's start to now: the nights added must be free too
+    conflicts = find_conflicts(room.id, now, booking.check_out_date, exclude_booking_id=booking.id)
+    if conflicts:
+        db.session.rollback()
+        flash(str(ReservationConflict(room.id, conflicts)), 'danger')
+        return redirect(url_for('index'))
+
+    booking.is_reservation = False
+    booking.is_active = True
+    booking.check_in_date = now
+    room.status = 'occupied'
+    try:
+        db.session.add(booking)
+        db.session.add(room)
+        db.session.commit()
+        flash(f"Check-in successful for room {room.room_number}.", 'success')
+    except Exception as e:
+        db.session.rollback()
+        flash(f"An error occurred during check-in: {str(e)}", 'danger')
+    return redirect(url_for('index'))
+
+@views.route('/availability')
+@login_required
+def availability():
+    try:
+        check_in_date = datetime.strptime(request.args['check_in'], '%Y-%m-%d')
+        check_out_date = datetime.strptime(request.args['check_out'], '%Y-%m-%d')
+    except (KeyError, ValueError):
+        return jsonify(error="check_in and check_out are required as YYYY-MM-DD"), 400
+    rooms = available_rooms(check_in_date, check_out_date, room_type=request.args.get('room_type'))
+    return jsonify(rooms=[{'id': r.id, 'room_number': r.room_number, 'room_type': r.room_type,
+                           'rate_per_night': r.rate_per_night} for r in rooms])
+
+
+@views.route('/api/dashboard')
+@login_required
+def api_dashboard():
+    return jsonify(read_api.run_sync(read_api.dashboard(db.session.info.get('property_id'))))
+
+
+@views.route('/api/guests')
+@login_required
+def api_guest_search():
+    return jsonify(read_api.run_sync(read_api.guest_search(request.args.get('q', ''))))
+
+
+@views.route('/api/guests/top')
+@login_required
+def api_top_guests():
+    limit = request.args.get('limit', read_api.TOP_GUESTS_LIMIT, type=int)
+    return jsonify(read_api.run_sync(read_api.top_guests(limit)))
+
+
+@views.route('/api/guests/<int:guest_id>')
+@login_required
+def api_guest_profile(guest_id):
+    data = read_api.run_sync(read_api.guest_profile(guest_id))
+    if data is None:
+        abort(404)
+    return jsonify(data)
+
+
+@views.route('/api/search')
+@login_required
+def api_search():
+    return jsonify(read_api.run_sync(read_api.search(request.args.get('q', ''), db.session.info.get('property_id'),
+                                                     page=request.args.get('page', 1, type=int))))
+
+
+@views.route('/api/invoices/<int:booking_id>')
+@login_required
+def api_invoice(booking_id):
+    data = read_api.run_sync(read_api.invoice(booking_id, db.session.info.get('property_id')))
+    if data is None:
+        abort(404)
+    return jsonify(data)
+
+
+@views.route('/api/stays/<int:booking_id>/balance')
+@login_required
+def api_stay_balance(booking_id):
+    data = in_house_balance(booking_id)
+    if data is None:
+        abort(404)
+    return jsonify(data)
+
+
+@views.route('/rooms/<int:room_id>/clean', methods=['POST'])
+@login_required
+def mark_room_clean(room_id):
+    room = Room.query.get_or_404(room_id)
+    if room.status != 'needs_cleaning':
+        flash(f"Room {room.room_number} does not need cleaning.", 'info')
+        return redirect(url_for('index'))
+    room.status = 'available'
+    try:
+        db.session.add(room)
+        db.session.commit()
+        flash(f"Room {room.room_number} is clean and available.", 'success')
+    except Exception as e:
+        db.session.rollback()
+        flash(f"Error updating room {room.room_number}: {str(e)}", 'danger')
+    return redirect(url_for('index'))
+
+
+@views.route('/check-in', methods=['GET', 'POST'])
 @login_required # Protect route
 def check_in():
     form = CheckInForm()
@@ -246,12 +559,17 @@ def check_in():
     form.guest_id.choices = [(0, '--- New Guest ---')] + [(g.id, g.name) for g in guests]
 
     # Populate room choices
-    available_rooms = Room.query.filter_by(status='available').order_by(Room.room_number).all()
+    room_state = get_room_state()
+    if room_state:
+        available_rooms = room_state.rooms(status='available')
+    else:
+        available_rooms = Room.query.filter_by(status='available').order_by(Room.room_number).all()
     form.room_id.choices = [(r.id, f"{r.room_number} ({r.room_type} - ${r.rate_per_night})") for r in available_rooms]
 
     if form.validate_on_submit():
-        room = Room.query.get(form.room_id.data)
+        room = lock_room(form.room_id.data) # Held until commit, so concurrent check-ins see each other
         if not room or room.status != 'available':
+            db.session.rollback()
             flash('Selected room is not available.', 'danger')
             return redirect(url_for('check_in'))
 
@@ -265,7 +583,7 @@ def check_in():
                 # flash('Name and Email are required for a new guest.', 'danger')
                 # return render_template('check_in.html', form=form, title="Check-In Guest")
             else:
-                existing_guest_check = Guest.query.filter_by(email=form.new_guest_email.data).first()
+                existing_guest_check = Guest.query.filter(db.func.lower(Guest.email) == form.new_guest_email.data.strip().lower()).first() # Case-insensitive; `flask dedup-guests` catches the rest
                 if existing_guest_check:
                     form.new_guest_email.errors.append(f"Guest with email {form.new_guest_email.data} already exists. Please select from existing guests or use a different email.")
                     # flash(f"Guest with email {form.new_guest_email.data} already exists. Please select from existing guests or use a different email.", 'danger')
@@ -288,11 +606,17 @@ def check_in():
                  return redirect(url_for('check_in'))
 
 
+        if guest_id_to_use and not form.errors and find_conflicts(room.id, form.check_in_date.data, form.check_out_date.data):
+            db.session.rollback() # Discard a new guest flushed above
+            flash(f"Room {room.room_number} is reserved for part of this stay. Choose another room or dates.", 'danger')
+            return redirect(url_for('check_in'))
+
         if guest_id_to_use and not form.errors: # Proceed if guest is set and no new errors
             try:
                 booking = Booking(
                     guest_id=guest_id_to_use,
                     room_id=room.id,
+                    property_id=room.property_id,
                     check_in_date=form.check_in_date.data,
                     check_out_date=form.check_out_date.data if form.check_out_date.data else None,
                     is_active=True
@@ -311,7 +635,7 @@ def check_in():
             # we re-render the form with those errors.
              if not guest_id_to_use and form.guest_id.data == 0 and (not form.new_guest_name.data or not form.new_guest_email.data):
                 pass # Errors already added
-             elif not guest_id_to_use and form.guest_id.data == 0 and Guest.query.filter_by(email=form.new_guest_email.data).first():
+             elif not guest_id_to_use and form.guest_id.data == 0 and Guest.query.filter(db.func.lower(Guest.email) == form.new_guest_email.data.strip().lower()).first():
                 pass # Error already added
 
     elif request.method == 'GET':
@@ -0,0 +1,150 @@
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from flask import current_app
+from sqlalchemy import select, func
+from app import db
+from app.models import JobRun, Property
+from app.sharding import property_scope
+
+
+@contextmanager
+def timed_run(job, property_id=None):
+    """
+    Records one JobRun for the block. The block reports how many rows it touched
+    by setting run['rows']; a failure is rolled back, recorded and re-raised.
+    """
+    run = {'rows': 0}
+    started_at = datetime.utcnow()
+    started = time.perf_counter()
+    error = None
+    try:
+        yield run
+    except Exception as e:
+        db.session.rollback()
+        error = repr(e)
+        raise
+    finally:
+        db.session.add(JobRun(job=job, property_id=property_id, started_at=started_at,
+                              duration_ms=int((time.perf_counter() - started) * 1000),
+                              rows=run['rows'], error=error))
+        db.session.commit()
+
+
+def job_scopes():
+    """
+    Where a maintenance job has to run: once on the default database (which holds
+    every property without a shard) plus once per property on its own configured bind.
+    """
+    binds = current_app.config.get('SQLALCHEMY_BINDS', {})
+    return [None] + [p.id for p in Property.query.order_by(Property.id).all() if p.bind_key in binds]
+
+
+def run_per_scope(job, fn):
+    """Runs fn() in every job scope, recording a JobRun each time. fn returns the rows it touched."""
+    total = 0
+    for property_id in job_scopes():
+        if property_id is None:
+            with timed_run(job) as run:
+                run['rows'] = fn()
+        else:
+            with property_scope(property_id), timed_run(job, property_id) as run:
+                run['rows'] = fn()
+        total += run['rows']
+    return total
+
+
+def job_stats(since=None):
+    """Per-job run count, failures, average/max duration (ms) and rows touched, from one grouped query."""
+    query = select(JobRun.job, func.count(JobRun.id), func.count(JobRun.error), func.avg(JobRun.duration_ms),
+                   func.max(JobRun.duration_ms), func.sum(JobRun.rows), func.max(JobRun.started_at))
+    if since is not None:
+        query = query.where(JobRun.started_at >= since)
+    rows = db.session.execute(query.group_by(JobRun.job).order_by(JobRun.job)).all()
+    return {job: {'runs': runs, 'failures': failures, 'avg_ms': round(avg_ms or 0, 1), 'max_ms': max_ms,
+                  'rows': int(total_rows or 0), 'last_run': last_run.isoformat() if last_run else None}
+            for job, runs, failures, avg_ms, max_ms, total_rows, last_run in rows}
+
+
+class Scheduler:
+    """
+    Runs registered jobs every `interval` seconds, each call inside a fresh app
+    context so it gets its own db.session. Used by worker.py as a separate
+    process, or started as a daemon thread inside the web process when
+    SCHEDULER_IN_PROCESS is set. Jobs run one after another, except those added
+    with own_thread=True: long ones (backups) run beside the loop so they never
+    hold up the short, frequent jobs, and are skipped while still running.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self.jobs = [] # [name, fn, interval, next due (monotonic), own_thread]
+        self._stop = threading.Event()
+        self._thread = None
+        self._running = {} # name -> thread of an own-thread job
+
+    def add_job(self, name, fn, interval, own_thread=False):
+        self.jobs.append([name, fn, interval, 0.0, own_thread])
+
+    def run_pending(self):
+        """Runs every job that is due. A failing job is logged and retried at its next interval."""
+        now = time.monotonic()
+        for job in self.jobs:
+            name, fn, interval, due, own_thread = job
+            if now < due:
+                continue
+            if not own_thread:
+                job[3] = now + interval
+                self._run(name, fn)
+            elif not self.is_running(name):
+                job[3] = now + interval
+                thread = threading.Thread(target=self._run, args=(name, fn), name=f'lux-job-{name}', daemon=True)
+                self._running[name] = thread
+                thread.start()
+
+    def is_running(self, name):
+        thread = self._running.get(name)
+        return thread is not None and thread.is_alive()
+
+    def _run(self, name, fn):
+        with self.app.app_context():
+            try:
+                fn()
+            except Exception as e:
+                self.app.logger.error(f"Scheduled job {name} failed: {e}")
+            finally:
+                db.session.remove()
+
+    def run_forever(self, tick=1.0):
+        while not self._stop.is_set():
+            self.run_pending()
+            self._stop.wait(tick)
+
+    def start(self):
+        self._thread = threading.Thread(target=self.run_forever, name='lux-scheduler', daemon=True)
+        self._thread.start()
+        return self._thread
+
+    def stop(self, timeout=None):
+        self._stop.set()
+        for thread in [self._thread, *self._running.values()]:
+            if thread is not None:
+                thread.join(timeout)
+
+
+def build_scheduler(app):
+    """The app's background jobs, with intervals taken from the config."""
+    from app.overdue import sweep_overdue_job, render_reminders_job
+    from app.outbox import outbox_job
+    from app.backup import backup_job
+    from app.channel_sync import channel_sync_job
+    scheduler = Scheduler(app)
+    scheduler.add_job('overdue-sweep', sweep_overdue_job, app.config.get('OVERDUE_SWEEP_INTERVAL', 300))
+    scheduler.add_job('render-reminders', render_reminders_job, app.config.get('REMINDER_RENDER_INTERVAL', 60))
+    scheduler.add_job('outbox', outbox_job, app.config.get('OUTBOX_INTERVAL', 10))
+    if app.config.get('BACKUP_INTERVAL'):
+        scheduler.add_job('backup', backup_job, app.config['BACKUP_INTERVAL'], own_thread=True) # Can take minutes
+    if app.config.get('CHANNEL_SYNC_URL'):
+        scheduler.add_job('channel-sync', channel_sync_job, app.config.get('CHANNEL_SYNC_INTERVAL', 2))
+    return scheduler
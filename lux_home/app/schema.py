@@ -0,0 +1,118 @@
+from datetime import datetime
+import click
+from flask.cli import with_appcontext
+from sqlalchemy import inspect, literal, select, update, DateTime, UniqueConstraint
+from app.models import floor_of
+from app.money import migrate_money_columns
+
+# Brings a database created by an earlier version of the app up to the current
+# models without losing rows: money columns are converted to cents, missing
+# tables are created, and tables that exist get their missing columns, indexes
+# and named unique constraints. Each step checks the live schema first, so the
+# upgrade is safe to re-run.
+#
+# Not covered: constraints that only got looser. On SQLite the original inline
+# UNIQUE(room.room_number) stays until the table is rebuilt, so two properties
+# sharing a database cannot reuse a room number there.
+
+
+def _default_sql(conn, column, now):
+    """DEFAULT clause value for a NOT NULL column added to a table that already has rows."""
+    default = column.default
+    if default is not None and default.is_scalar:
+        value = default.arg
+    elif isinstance(column.type, DateTime):
+        value = now # SQLite refuses a non-constant default such as CURRENT_TIMESTAMP in ADD COLUMN
+    else:
+        raise ValueError(f"No safe default for new NOT NULL column {column.table.name}.{column.name}")
+    return str(literal(value, column.type).compile(dialect=conn.dialect, compile_kwargs={'literal_binds': True}))
+
+
+def _add_column(conn, column, now):
+    preparer = conn.dialect.identifier_preparer
+    ddl = (f"ALTER TABLE {preparer.format_table(column.table)} ADD COLUMN {preparer.format_column(column)} "
+           f"{column.type.compile(dialect=conn.dialect)}")
+    if not column.nullable:
+        ddl += f" NOT NULL DEFAULT {_default_sql(conn, column, now)}"
+    foreign_keys = list(column.foreign_keys)
+    if len(foreign_keys) == 1 and foreign_keys[0].column.table.name in inspect(conn).get_table_names():
+        target = foreign_keys[0].column
+        ddl += f" REFERENCES {preparer.format_table(target.table)} ({preparer.format_column(target)})"
+    conn.exec_driver_sql(ddl)
+
+
+def _index_names(conn, inspector, table_name):
+    """Names of the table's indexes and unique constraints, including expression indexes."""
+    names = {c['name'] for c in inspector.get_unique_constraints(table_name) if c['name']}
+    if conn.dialect.name == 'sqlite': # The inspector skips expression indexes such as lower(email) there
+        return names | set(conn.exec_driver_sql("SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = ?",
+                                                (table_name,)).scalars())
+    return names | {i['name'] for i in inspector.get_indexes(table_name)}
+
+
+def _backfill_room_floors(conn, table):
+    """Room.floor defaults from the room number on insert; existing rooms get the same value."""
+    rows = conn.execute(select(table.c.id, table.c.room_number).where(table.c.floor.is_(None))).all()
+    for room_id, room_number in rows:
+        floor = floor_of(room_number)
+        if floor is not None:
+            conn.execute(update(table).where(table.c.id == room_id).values(floor=floor))
+
+
+# (table, column) -> fn(conn, table) run once after the column is added
+BACKFILLS = {('room', 'floor'): _backfill_room_floors}
+
+
+def upgrade_schema(engine, metadata, now=None):
+    """
+    Adds what `metadata` defines but the database behind `engine` lacks. Returns
+    the changes made as "table.column", "table: index" and "table (created)" strings.
+    """
+    now = now or datetime.utcnow()
+    changes = [f"{name} (money to cents)" for name in migrate_money_columns(engine)]
+    with engine.begin() as conn:
+        existing = set(inspect(conn).get_table_names())
+        missing = [table for table in metadata.sorted_tables if table.name not in existing]
+        metadata.create_all(conn, tables=missing)
+        changes += [f"{table.name} (created)" for table in missing]
+
+        for table in metadata.sorted_tables:
+            if table.name not in existing:
+                continue
+            inspector = inspect(conn)
+            columns = {c['name'] for c in inspector.get_columns(table.name)}
+            added = [column for column in table.columns if column.name not in columns]
+            for column in added:
+                _add_column(conn, column, now)
+                changes.append(f"{table.name}.{column.name}")
+            for column in added: # Once the whole table is current, so the backfill can use any column
+                if (table.name, column.name) in BACKFILLS:
+                    BACKFILLS[(table.name, column.name)](conn, table)
+
+            indexes = _index_names(conn, inspector, table.name)
+            for index in sorted(table.indexes, key=lambda i: i.name):
+                if index.name not in indexes:
+                    index.create(conn)
+                    changes.append(f"{table.name}: {index.name}")
+            for constraint in table.constraints:
+                if isinstance(constraint, UniqueConstraint) and constraint.name and constraint.name not in indexes:
+                    # A unique index enforces the same rule; SQLite cannot add a constraint to an existing table
+                    conn.exec_driver_sql(f"CREATE UNIQUE INDEX {constraint.name} ON {table.name} "
+                                         f"({', '.join(c.name for c in constraint.columns)})")
+                    changes.append(f"{table.name}: {constraint.name}")
+    return changes
+
+
+@click.command('upgrade-schema')
+@with_appcontext
+def upgrade_schema_command():
+    """Add the tables, columns and indexes of the current models to every configured database."""
+    from app import db
+    from app.sharding import shard_metadata, create_property_schema
+    for bind_key, engine in db.engines.items():
+        metadata = db.metadata if bind_key is None else shard_metadata()
+        changes = upgrade_schema(engine, metadata)
+        if bind_key is not None:
+            create_property_schema(bind_key) # Its after_create hooks (the search index)
+        click.echo(f"{bind_key or 'default'}: {', '.join(changes) if changes else 'up to date'}")
+    click.echo("Run `flask reindex-search` to index rows that predate the search index.")
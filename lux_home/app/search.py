@@ -0,0 +1,307 @@
+import re
+import click
+from flask.cli import with_appcontext
+from sqlalchemy import MetaData, Table, Column, Integer, BigInteger, String, Text, Float
+from sqlalchemy import select, insert, delete, event, inspect, and_, or_, literal
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.orm import object_session
+from sqlalchemy.sql.functions import FunctionElement
+from app import db
+from app.models import Guest, Room, Booking, Invoice, ArchivedBooking, ArchivedInvoice
+from app.scheduler import run_per_scope
+from app.sharding import PropertySession
+
+# Full-text index over guests and stays. Each database holds a search_index
+# table next to the rows it describes: guest documents on the default database,
+# stay documents (guest name/email/phone, room number, invoice number) with
+# their booking on the property's shard. On SQLite it is an FTS5 table, on
+# Postgres a table with a generated tsvector column under a GIN index; other
+# backends fall back to LIKE. ORM hooks rewrite the affected documents in the
+# same transaction as the change; `flask reindex-search` rebuilds everything.
+
+# Not in db.metadata: the DDL is backend specific (see create_search_index)
+search_metadata = MetaData()
+search_index = Table(
+    'search_index', search_metadata,
+    Column('rowid', BigInteger, primary_key=True, autoincrement=False), # doc_id() below
+    Column('kind', String(10), nullable=False), # 'guest' or 'stay'
+    Column('ref_id', Integer, nullable=False), # Guest.id or Booking.id
+    Column('property_id', Integer, nullable=True),
+    Column('label', Text, nullable=False),
+    Column('body', Text, nullable=False),
+)
+
+DOC_KINDS = {'guest': 0, 'stay': 1}
+GUEST_FIELDS = ('name', 'email', 'phone')
+STAY_FIELDS = ('guest_id', 'room_id', 'check_in_date', 'check_out_date')
+REINDEX_BATCH_SIZE = 1000
+
+
+def doc_id(kind, ref_id):
+    """Stable rowid per document, so a rewrite is a delete plus insert by primary key."""
+    return ref_id * len(DOC_KINDS) + DOC_KINDS[kind]
+
+
+def search_terms(query):
+    """Lowercased word tokens of a user query; punctuation and FTS operators are dropped."""
+    return re.findall(r'\w+', (query or '').lower())[:8]
+
+
+def document_text(*values):
+    """
+    Searchable text: each value as typed plus its words split on punctuation.
+    Phone numbers also get their digits joined, with and without the country
+    code (the last seven digits), so '5550101' finds '+1 555-0101'.
+    """
+    parts = []
+    for value in values:
+        if not value:
+            continue
+        value = str(value).lower()
+        parts += [value, re.sub(r'\W+', ' ', value)]
+        digits = re.sub(r'\D', '', value)
+        if len(digits) >= 5:
+            parts += [digits, digits[-7:]]
+    return ' '.join(dict.fromkeys(parts))
+
+
+class search_match(FunctionElement):
+    """WHERE clause matching every term as a prefix, in the backend's full-text syntax."""
+    inherit_cache = False # The query text is bound at compile time
+
+    def __init__(self, terms):
+        self.terms = list(terms)
+        super().__init__()
+
+
+class search_rank(FunctionElement):
+    """Relevance for ORDER BY, ascending (best first) on every backend."""
+    type = Float()
+    inherit_cache = False
+
+    def __init__(self, terms):
+        self.terms = list(terms)
+        super().__init__()
+
+
+@compiles(search_match, 'sqlite')
+def _fts5_match(element, compiler, **kw):
+    query = ' '.join(f'"{term}"*' for term in element.terms) # Implicit AND of prefix terms
+    return f"search_index MATCH {compiler.process(literal(query), **kw)}"
+
+
+@compiles(search_rank, 'sqlite')
+def _fts5_rank(element, compiler, **kw):
+    return 'search_index.rank' # bm25(); more negative is more relevant
+
+
+def _tsquery(element, compiler, **kw):
+    return f"to_tsquery('simple', {compiler.process(literal(' & '.join(f'{term}:*' for term in element.terms)), **kw)})"
+
+
+@compiles(search_match, 'postgresql')
+def _tsvector_match(element, compiler, **kw):
+    return f"search_index.tsv @@ {_tsquery(element, compiler, **kw)}"
+
+
+@compiles(search_rank, 'postgresql')
+def _tsvector_rank(element, compiler, **kw):
+    return f"-ts_rank(search_index.tsv, {_tsquery(element, compiler, **kw)})"
+
+
+@compiles(search_match)
+def _like_match(element, compiler, **kw):
+    return compiler.process(and_(*[search_index.c.body.like(f'%{term}%') for term in element.terms]), **kw)
+
+
+@compiles(search_rank)
+def _no_rank(element, compiler, **kw):
+    return '0'
+
+
+def create_search_index(connection):
+    dialect = connection.dialect.name
+    if dialect == 'sqlite':
+        connection.exec_driver_sql(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS search_index USING fts5("
+            "kind UNINDEXED, ref_id UNINDEXED, property_id UNINDEXED, label UNINDEXED, body, "
+            "tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3')") # Prefix indexes serve 2-3 letter prefixes
+        return
+    search_metadata.create_all(connection)
+    if dialect == 'postgresql':
+        connection.exec_driver_sql("ALTER TABLE search_index ADD COLUMN IF NOT EXISTS tsv tsvector "
+                                   "GENERATED ALWAYS AS (to_tsvector('simple', body)) STORED")
+        connection.exec_driver_sql("CREATE INDEX IF NOT EXISTS ix_search_index_tsv ON search_index USING gin (tsv)")
+
+
+@event.listens_for(db.metadata, 'after_create')
+def _create_search_index(target, connection, **kw):
+    create_search_index(connection)
+
+
+@event.listens_for(db.metadata, 'before_drop')
+def _drop_search_index(target, connection, **kw):
+    connection.exec_driver_sql('DROP TABLE IF EXISTS search_index')
+
+
+def guest_documents(session, guest_ids):
+    rows = session.execute(select(Guest.id, Guest.name, Guest.email, Guest.phone).where(Guest.id.in_(guest_ids))).all()
+    return [{'rowid': doc_id('guest', row.id), 'kind': 'guest', 'ref_id': row.id, 'property_id': None,
+             'label': f"{row.name} <{row.email}>", 'body': document_text(row.name, row.email, row.phone)}
+            for row in rows]
+
+
+def stay_documents(session, booking_model, invoice_model, where):
+    """Documents for the stays of booking_model matching `where`, with their room and invoice numbers."""
+    rows = session.execute(select(booking_model.id, booking_model.property_id, booking_model.guest_id,
+                                  booking_model.check_in_date, booking_model.check_out_date,
+                                  Room.room_number, invoice_model.id.label('invoice_id'))
+                           .join(Room, Room.id == booking_model.room_id)
+                           .outerjoin(invoice_model, invoice_model.booking_id == booking_model.id)
+                           .where(where)).all()
+    guest_ids = {row.guest_id for row in rows}
+    guests = {row.id: row for row in session.execute(
+        select(Guest.id, Guest.name, Guest.email, Guest.phone).where(Guest.id.in_(guest_ids)))} if guest_ids else {}
+    documents = []
+    for row in rows:
+        guest = guests.get(row.guest_id)
+        name = guest.name if guest else f'Guest {row.guest_id}'
+        label = [name, f"Room {row.room_number}", row.check_in_date.strftime('%Y-%m-%d')]
+        if row.invoice_id:
+            label.append(f"Invoice #{row.invoice_id}")
+        documents.append({
+            'rowid': doc_id('stay', row.id), 'kind': 'stay', 'ref_id': row.id, 'property_id': row.property_id,
+            'label': ' · '.join(label),
+            'body': document_text(name, guest and guest.email, guest and guest.phone, row.room_number,
+                                  row.invoice_id and f"inv {row.invoice_id}"),
+        })
+    return documents
+
+
+def write_documents(connection, rowids, documents):
+    if rowids:
+        connection.execute(delete(search_index).where(search_index.c.rowid.in_(rowids)))
+    if documents:
+        connection.execute(insert(search_index), documents)
+
+
+def _property_connection(session):
+    """The connection to the active property's database, inside the session's transaction."""
+    return session.connection(bind_arguments={'mapper': inspect(Booking)})
+
+
+def _changed(target, fields):
+    state = inspect(target)
+    return any(state.attrs[field].history.has_changes() for field in fields)
+
+
+def _mark(target, kind, key):
+    session = object_session(target)
+    if session is not None and key is not None:
+        session.info.setdefault('search_pending', set()).add((kind, key))
+
+
+@event.listens_for(Guest, 'after_insert')
+@event.listens_for(Guest, 'after_delete')
+def _guest_written(mapper, connection, target):
+    _mark(target, 'guest', target.id)
+
+
+@event.listens_for(Guest, 'after_update')
+def _guest_updated(mapper, connection, target):
+    if _changed(target, GUEST_FIELDS):
+        _mark(target, 'guest', target.id)
+        _mark(target, 'guest_stays', target.id)
+
+
+@event.listens_for(Booking, 'after_insert')
+@event.listens_for(Booking, 'after_delete')
+def _booking_written(mapper, connection, target):
+    _mark(target, 'stay', target.id)
+
+
+@event.listens_for(Booking, 'after_update')
+def _booking_updated(mapper, connection, target):
+    if _changed(target, STAY_FIELDS):
+        _mark(target, 'stay', target.id)
+
+
+@event.listens_for(Invoice, 'after_insert')
+@event.listens_for(Invoice, 'after_delete')
+def _invoice_written(mapper, connection, target):
+    _mark(target, 'stay', target.booking_id)
+
+
+@event.listens_for(Room, 'after_update')
+def _room_updated(mapper, connection, target):
+    if _changed(target, ('room_number',)):
+        _mark(target, 'room', target.id)
+
+
+@event.listens_for(PropertySession, 'after_flush_postexec')
+def _refresh_documents(session, flush_context):
+    """
+    Rewrites the documents touched by this flush, in its transaction. A guest
+    edit also refreshes that guest's stays on the active property's database;
+    stays on other shards catch up on the next `flask reindex-search`.
+    """
+    pending = session.info.pop('search_pending', None)
+    if not pending:
+        return
+    keys = {kind: {key for k, key in pending if k == kind} for kind in ('guest', 'guest_stays', 'stay', 'room')}
+    with session.no_autoflush:
+        stay_ids = keys['stay']
+        if keys['guest_stays'] or keys['room']:
+            stay_ids |= set(session.scalars(select(Booking.id).where(
+                or_(Booking.guest_id.in_(keys['guest_stays']), Booking.room_id.in_(keys['room'])))))
+        if keys['guest']:
+            write_documents(session.connection(), [doc_id('guest', key) for key in keys['guest']],
+                            guest_documents(session, keys['guest']))
+        if stay_ids:
+            write_documents(_property_connection(session), [doc_id('stay', key) for key in stay_ids],
+                            stay_documents(session, Booking, Invoice, Booking.id.in_(stay_ids)))
+
+
+def rebuild_search_index(batch_size=REINDEX_BATCH_SIZE):
+    """
+    Rebuilds the documents of the active scope: guests when on the default
+    database, and every live and archived stay. Returns the documents written.
+    """
+    session = db.session()
+    property_id = session.info.get('property_id')
+    written = 0
+    if property_id is None:
+        session.execute(delete(search_index))
+        last_id = 0
+        while True:
+            ids = session.scalars(select(Guest.id).where(Guest.id > last_id).order_by(Guest.id).limit(batch_size)).all()
+            if not ids:
+                break
+            documents = guest_documents(session, ids)
+            write_documents(session.connection(), [], documents)
+            written += len(documents)
+            last_id = ids[-1]
+    else:
+        _property_connection(session).execute(delete(search_index).where(search_index.c.kind == 'stay',
+                                                                          search_index.c.property_id == property_id))
+    for booking_model, invoice_model in ((Booking, Invoice), (ArchivedBooking, ArchivedInvoice)):
+        last_id = 0
+        while True:
+            ids = session.scalars(select(booking_model.id).where(booking_model.id > last_id)
+                                  .order_by(booking_model.id).limit(batch_size)).all()
+            if not ids:
+                break
+            documents = stay_documents(session, booking_model, invoice_model,
+                                       and_(booking_model.id >= ids[0], booking_model.id <= ids[-1]))
+            write_documents(_property_connection(session), [], documents)
+            written += len(documents)
+            last_id = ids[-1]
+    session.commit()
+    return written
+
+
+@click.command('reindex-search')
+@with_appcontext
+def reindex_search_command():
+    """Rebuild the full-text search index on every database."""
+    click.echo(f"Indexed {run_per_scope('reindex-search', rebuild_search_index)} documents.")
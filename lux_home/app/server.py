@@ -0,0 +1,105 @@
+import os
+
+# Helpers for the production runner (serve.py): worker sizing, per-fork cleanup
+# and a memory report read from /proc.
+
+# Caches that live in one process and never see other processes' commits
+PROCESS_LOCAL_CACHES = ('ROOM_STATE_STORE', 'AVAILABILITY_INDEX')
+
+
+def default_workers(cores=None):
+    """gunicorn's usual rule of thumb: two workers per core plus one."""
+    return (cores or os.cpu_count() or 1) * 2 + 1
+
+
+def default_threads(cores=None):
+    """Threads per worker, so requests blocked on the database or WeasyPrint do not idle a core."""
+    return 4 if (cores or os.cpu_count() or 1) <= 2 else 2
+
+
+def gunicorn_options(config):
+    """
+    gunicorn settings from the app config (SERVER_*), with sizing derived from the
+    core count. Refuses more than one worker while a process-local cache is on,
+    since each worker's copy would go stale on its siblings' writes.
+    """
+    workers = config.get('SERVER_WORKERS') or default_workers()
+    enabled = [name for name in PROCESS_LOCAL_CACHES if config.get(name)]
+    if workers > 1 and enabled:
+        raise ValueError(f"{', '.join(enabled)} only work with one process; "
+                         f"set SERVER_WORKERS=1 or turn them off (got {workers} workers).")
+    threads = config.get('SERVER_THREADS') or default_threads()
+    return {
+        'bind': config.get('SERVER_BIND', '0.0.0.0:8000'),
+        'workers': workers,
+        'threads': threads,
+        'worker_class': 'gthread' if threads > 1 else 'sync',
+        'preload_app': True,
+        'max_requests': config.get('SERVER_MAX_REQUESTS', 1000),
+        'max_requests_jitter': config.get('SERVER_MAX_REQUESTS_JITTER', 100),
+        'timeout': config.get('SERVER_TIMEOUT', 60),
+        'graceful_timeout': config.get('SERVER_GRACEFUL_TIMEOUT', 30),
+        'keepalive': config.get('SERVER_KEEPALIVE', 5),
+    }
+
+
+def dispose_engines(app):
+    """
+    Drops the connection pools inherited from the master after a fork without
+    closing them, so each worker opens its own connections and never shares a
+    socket (or SQLite handle) with its parent or siblings.
+    """
+    from app import db
+    with app.app_context():
+        for engine in db.engines.values():
+            engine.dispose(close=False)
+
+
+def process_memory(pid):
+    """
+    {'rss', 'pss', 'shared', 'private'} in KiB for a process. PSS splits shared
+    copy-on-write pages between the processes sharing them, so summing PSS over
+    master and workers gives the real footprint.
+    """
+    fields = {}
+    try:
+        with open(f'/proc/{pid}/smaps_rollup') as f:
+            for line in f:
+                parts = line.split()
+                if len(parts) >= 2 and parts[0].endswith(':') and parts[1].isdigit():
+                    fields[parts[0][:-1]] = int(parts[1])
+    except OSError:
+        return None
+    return {
+        'rss': fields.get('Rss', 0),
+        'pss': fields.get('Pss', 0),
+        'shared': fields.get('Shared_Clean', 0) + fields.get('Shared_Dirty', 0),
+        'private': fields.get('Private_Clean', 0) + fields.get('Private_Dirty', 0),
+    }
+
+
+def child_pids(pid):
+    children = []
+    try:
+        for task in os.listdir(f'/proc/{pid}/task'):
+            with open(f'/proc/{pid}/task/{task}/children') as f:
+                children.extend(int(child) for child in f.read().split())
+    except OSError:
+        pass
+    return sorted(children)
+
+
+def memory_report(master_pid):
+    """[(role, pid, memory)] for the master and each of its workers."""
+    rows = [('master', master_pid, process_memory(master_pid))]
+    rows += [('worker', pid, process_memory(pid)) for pid in child_pids(master_pid)]
+    return [row for row in rows if row[2] is not None]
+
+
+def format_memory_report(rows):
+    lines = [f"{'role':<8} {'pid':>8} {'rss MiB':>9} {'pss MiB':>9} {'shared MiB':>11} {'private MiB':>12}"]
+    for role, pid, memory in rows:
+        lines.append(f"{role:<8} {pid:>8} {memory['rss'] / 1024:>9.1f} {memory['pss'] / 1024:>9.1f} "
+                     f"{memory['shared'] / 1024:>11.1f} {memory['private'] / 1024:>12.1f}")
+    lines.append(f"total PSS {sum(memory['pss'] for _, _, memory in rows) / 1024:.1f} MiB")
+    return '\n'.join(lines)
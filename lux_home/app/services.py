@@ -1,6 +1,72 @@
+import json
 from datetime import datetime, date, timedelta
-from app.models import Booking, Room # Assuming models are in app.models
+from sqlalchemy import select, update, insert, func
+from sqlalchemy.exc import IntegrityError
+from flask import current_app
+from app.models import Booking, Room, Guest, Invoice, IdempotencyKey, Service, BookingService, OutboxMessage, RoomCharge # Assuming models are in app.models
 from app import db # For potential db operations, if needed
+from app.money import from_cents
+
+def stay_nights(check_in_dt, checkout_dt):
+    """
+    Number of nights charged for a stay; at least one night is always charged.
+    """
+    # Convert date objects to datetime objects for consistent subtraction
+    if isinstance(check_in_dt, date) and not isinstance(check_in_dt, datetime):
+        check_in_dt = datetime.combine(check_in_dt, datetime.min.time())
+    if isinstance(checkout_dt, date) and not isinstance(checkout_dt, datetime):
+        checkout_dt = datetime.combine(checkout_dt, datetime.min.time())
+
+    duration_days = (checkout_dt - check_in_dt).days
+    if duration_days <= 0:
+        duration_days = 1
+    return duration_days
+
+def service_charges_cents(booking_ids):
+    """
+    {booking_id: cents} of booked services. Booked services live with their
+    bookings and the Service catalog on the default database, so quantities are
+    summed per (booking, service) with one grouped query and priced from a second.
+    Bookings without services are absent from the result.
+    """
+    if not booking_ids:
+        return {}
+    quantities = db.session.execute(
+        select(BookingService.booking_id, BookingService.service_id, func.sum(BookingService.quantity))
+        .where(BookingService.booking_id.in_(list(booking_ids)))
+        .group_by(BookingService.booking_id, BookingService.service_id)
+    ).all()
+    if not quantities:
+        return {}
+    prices = dict(db.session.execute(
+        select(Service.id, Service.price_cents).where(Service.id.in_({row[1] for row in quantities}))).all())
+    totals = {}
+    for booking_id, service_id, quantity in quantities:
+        totals[booking_id] = totals.get(booking_id, 0) + prices[service_id] * int(quantity)
+    return totals
+
+def posted_room_charges(booking_ids):
+    """
+    {booking_id: (nights, cents)} of room rate the night audit has posted, from
+    one grouped query. Bookings the audit never charged are absent.
+    """
+    if not booking_ids:
+        return {}
+    rows = db.session.execute(
+        select(RoomCharge.booking_id, func.count(RoomCharge.id), func.sum(RoomCharge.amount_cents))
+        .where(RoomCharge.booking_id.in_(list(booking_ids)))
+        .group_by(RoomCharge.booking_id)
+    ).all()
+    return {booking_id: (nights, int(cents)) for booking_id, nights, cents in rows}
+
+def room_charges_cents(nights, rate_per_night_cents, posted=None):
+    """
+    Room rate owed for a stay of `nights` nights: the charges the night audit
+    posted, plus the current rate for the nights it has not posted yet (the
+    final night, or every night when no audit has run during the stay).
+    """
+    posted_nights, posted_cents = posted or (0, 0)
+    return posted_cents + max(nights - posted_nights, 0) * rate_per_night_cents
 
 def calculate_booking_total(booking_id):
     """
@@ -13,35 +79,22 @@ def calculate_booking_total(booking_id):
         return None  # Or raise an error
 
     # If total_amount is already calculated and stored (e.g., during check-out)
-    if booking.total_amount is not None and booking.total_amount > 0:
+    if booking.total_amount_cents is not None and booking.total_amount_cents > 0:
         return booking.total_amount
 
     room = booking.room
     if not room:
         return None  # Or raise an error
 
-    check_in_dt = booking.check_in_date
     checkout_dt = booking.check_out_date if booking.check_out_date else datetime.utcnow()
-
-    # Convert date objects to datetime objects for consistent subtraction
-    if isinstance(check_in_dt, date) and not isinstance(check_in_dt, datetime):
-        check_in_dt = datetime.combine(check_in_dt, datetime.min.time())
-    if isinstance(checkout_dt, date) and not isinstance(checkout_dt, datetime):
-        checkout_dt = datetime.combine(checkout_dt, datetime.min.time())
-
-    duration_days = (checkout_dt - check_in_dt).days
-    if duration_days <= 0:
-        duration_days = 1
-    
-    room_charge = duration_days * room.rate_per_night
+    duration_days = stay_nights(booking.check_in_date, checkout_dt)
     
-    # Placeholder for service charges (to be expanded later)
-    total_services_charge = 0.0 
-    # Example:
-    # for bs in booking.booking_services:
-    #     total_services_charge += bs.service.price * bs.quantity
+    # All arithmetic is in integer cents; only the returned amount is converted
+    room_charge_cents = room_charges_cents(duration_days, room.rate_per_night_cents,
+                                           posted_room_charges([booking.id]).get(booking.id))
+    total_services_cents = service_charges_cents([booking.id]).get(booking.id, 0)
     
-    total_amount = room_charge + total_services_charge
+    total_amount = from_cents(room_charge_cents + total_services_cents)
     
     # The problem description implies the calling route (check-out or invoice generation)
     # will be responsible for saving this to booking.total_amount.
@@ -51,3 +104,119 @@ def calculate_booking_total(booking_id):
     # db.session.commit()
 
     return total_amount
+
+
+def _stored_result(scope, key):
+    record = IdempotencyKey.query.filter_by(property_id=db.session.info.get('property_id'), scope=scope, key=key).first()
+    return json.loads(record.response) if record else None
+
+def invoice_emails(stays, booking_ids):
+    """
+    Outbox rows emailing the invoice of each checked-out booking, when
+    EMAIL_INVOICE_ON_CHECKOUT is on. Guests live on the default database, so
+    their addresses are looked up with one separate query.
+    """
+    if not booking_ids or not current_app.config.get('EMAIL_INVOICE_ON_CHECKOUT', False):
+        return []
+    from app.outbox import outbox_row
+    closing = set(booking_ids)
+    stays = [stay for stay in stays if stay.id in closing]
+    addresses = dict(db.session.execute(
+        select(Guest.id, Guest.email).where(Guest.id.in_({stay.guest_id for stay in stays}))).all())
+    return [outbox_row('invoice', addresses[stay.guest_id], stay.property_id, booking_id=stay.id)
+            for stay in stays if addresses.get(stay.guest_id)]
+
+def group_check_out(booking_ids, idempotency_key=None, now=None):
+    """
+    Checks out many bookings at once (tour group departures) in one transaction:
+    one query loads every stay with its room rate, bookings and rooms are updated
+    with bulk statements and the missing invoices are inserted in bulk.
+
+    Returns a dict with 'checked_out', 'already_checked_out', 'not_found' (booking
+    id lists) and 'totals' ({booking_id: total}). When an idempotency key is given,
+    a retry with the same key returns the first result without touching anything.
+    """
+    scope = 'group_check_out'
+    if idempotency_key:
+        replay = _stored_result(scope, idempotency_key)
+        if replay is not None:
+            return replay
+
+    now = now or datetime.utcnow()
+    requested = sorted(set(booking_ids))
+    stays = db.session.execute(
+        select(Booking.id, Booking.room_id, Booking.property_id, Booking.guest_id, Booking.check_in_date,
+               Booking.check_out_date, Booking.total_amount_cents, Booking.is_active, Room.rate_per_night_cents)
+        .join(Room, Room.id == Booking.room_id)
+        .where(Booking.id.in_(requested))
+    ).all()
+
+    result = {'checked_out': [], 'already_checked_out': [], 'not_found': [], 'totals': {}}
+    found = {stay.id for stay in stays}
+    result['not_found'] = [booking_id for booking_id in requested if booking_id not in found]
+
+    services_cents = service_charges_cents([stay.id for stay in stays if stay.is_active])
+    posted = posted_room_charges([stay.id for stay in stays if stay.is_active])
+    booking_updates, room_ids, completed = [], set(), []
+    for stay in stays:
+        if not stay.is_active:
+            result['already_checked_out'].append(stay.id)
+            continue
+        checkout_dt = stay.check_out_date or now
+        # Same rule as calculate_booking_total: a preset positive total wins
+        if stay.total_amount_cents is not None and stay.total_amount_cents > 0:
+            total_cents = stay.total_amount_cents
+        else:
+            total_cents = (room_charges_cents(stay_nights(stay.check_in_date, checkout_dt), stay.rate_per_night_cents,
+                                              posted.get(stay.id))
+                           + services_cents.get(stay.id, 0))
+        booking_updates.append({'id': stay.id, 'check_out_date': checkout_dt, 'total_amount_cents': total_cents, 'is_active': False})
+        room_ids.add(stay.room_id)
+        completed.append((stay.guest_id, stay.check_in_date, checkout_dt, total_cents))
+        result['checked_out'].append(stay.id)
+        result['totals'][str(stay.id)] = from_cents(total_cents) # String keys survive the JSON round trip unchanged
+
+    closing = [u['id'] for u in booking_updates]
+    invoiced = set(db.session.scalars(select(Invoice.booking_id).where(Invoice.booking_id.in_(closing)))) if closing else set()
+    property_by_booking = {stay.id: stay.property_id for stay in stays}
+    invoices = [{'booking_id': booking_id, 'property_id': property_by_booking[booking_id],
+                 'issue_date': now, 'due_date': now + timedelta(days=15)}
+                for booking_id in closing if booking_id not in invoiced]
+    emails = invoice_emails(stays, closing)
+
+    try:
+        if booking_updates:
+            db.session.execute(update(Booking), booking_updates)
+            db.session.execute(update(Room).where(Room.id.in_(room_ids)).values(status='needs_cleaning'),
+                               execution_options={'synchronize_session': False})
+            from app.channel_sync import mark_changed, stay_dates
+            mark_changed([(stay.property_id, stay.room_id, None, *stay_dates(stay.check_in_date, stay.check_out_date))
+                          for stay in stays if stay.is_active]) # The nights the departing stays held until now
+            from app.guest_stats import record_stays
+            record_stays(completed)
+        if invoices:
+            db.session.execute(insert(Invoice), invoices)
+        if emails:
+            db.session.execute(insert(OutboxMessage), emails)
+        if idempotency_key:
+            db.session.add(IdempotencyKey(scope=scope, key=idempotency_key, response=json.dumps(result),
+                                          property_id=db.session.info.get('property_id')))
+        db.session.commit()
+    except IntegrityError:
+        db.session.rollback()
+        # A concurrent retry with the same key won the race; hand back its result
+        replay = _stored_result(scope, idempotency_key) if idempotency_key else None
+        if replay is None:
+            raise
+        return replay
+
+    # Bulk UPDATEs bypassed the session change hooks of the in-process caches
+    from app.room_state import get_room_state
+    from app.reservations import get_availability_index
+    room_state = get_room_state()
+    if room_state and room_ids:
+        room_state.rooms_changed(room_ids)
+    availability_index = get_availability_index()
+    if availability_index and closing:
+        availability_index.bookings_changed(closing)
+    return result
@@ -0,0 +1,191 @@
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from collections import Counter
+
+from flask import current_app
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event, MetaData
+from sqlalchemy.orm import Mapper, with_loader_criteria
+
+
+class PropertySession(Session):
+    """
+    Session that routes property-scoped models (Room, Booking, Invoice) to the
+    engine bound to the active property. Everything else (users, guests,
+    the service catalog, the property table itself) stays on the default database.
+    """
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        bind_key = self.info.get('property_bind_key')
+        if bind is None and bind_key and mapper is not None:
+            cls = getattr(mapper, 'class_', mapper)
+            if getattr(cls, '__property_scoped__', False):
+                return self._db.engines[bind_key]
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+_scoped_models = None # Property-scoped model classes, collected once per mapper configuration
+_criteria_options = {} # property id -> the loader criteria options that restrict a SELECT to it
+
+
+@event.listens_for(Mapper, 'after_configured')
+def _forget_property_scoped_models():
+    global _scoped_models
+    _scoped_models = None
+    _criteria_options.clear()
+
+
+def _property_scoped_models():
+    global _scoped_models
+    if _scoped_models is None:
+        from app import db
+        _scoped_models = tuple(m.class_ for m in db.Model.registry.mappers
+                               if getattr(m.class_, '__property_scoped__', False))
+    return _scoped_models
+
+
+def _property_criteria(property_id):
+    options = _criteria_options.get(property_id)
+    if options is None:
+        options = _criteria_options[property_id] = tuple(
+            with_loader_criteria(model, lambda cls: cls.property_id == property_id, include_aliases=True)
+            for model in _property_scoped_models())
+    return options
+
+
+@event.listens_for(PropertySession, 'do_orm_execute')
+def _add_property_criteria(execute_state):
+    """Restrict every ORM SELECT to the active property, including lazy loads."""
+    property_id = execute_state.session.info.get('property_id')
+    if property_id is None or not execute_state.is_select:
+        return
+    execute_state.statement = execute_state.statement.options(*_property_criteria(property_id))
+
+
+@event.listens_for(PropertySession, 'before_flush')
+def _stamp_property_id(session, flush_context, instances):
+    """New rows created inside a property scope inherit the property id."""
+    property_id = session.info.get('property_id')
+    if property_id is None:
+        return
+    scoped = _property_scoped_models()
+    for obj in session.new:
+        if isinstance(obj, scoped) and obj.property_id is None:
+            obj.property_id = property_id
+
+
+def enter_property_scope(property_id, session=None):
+    """
+    Scopes the given session (the request's db.session by default) to one property.
+    Call this before the first query of a unit of work; objects already loaded
+    from another shard are not moved.
+    """
+    from app import db
+    from app.models import Property
+
+    if session is None:
+        session = db.session()
+    prop = session.get(Property, property_id)
+    if not prop:
+        return None
+    session.info['property_id'] = prop.id
+    # Only route to a bind that is actually configured, otherwise stay on the default db
+    if prop.bind_key and prop.bind_key in current_app.config.get('SQLALCHEMY_BINDS', {}):
+        session.info['property_bind_key'] = prop.bind_key
+    else:
+        session.info.pop('property_bind_key', None)
+    return prop
+
+
+def leave_property_scope(session=None):
+    from app import db
+    if session is None:
+        session = db.session()
+    session.info.pop('property_id', None)
+    session.info.pop('property_bind_key', None)
+
+
+@contextmanager
+def property_scope(property_id):
+    """Context manager form of enter/leave_property_scope for jobs and reports."""
+    prop = enter_property_scope(property_id)
+    try:
+        yield prop
+    finally:
+        leave_property_scope()
+
+
+def shard_metadata():
+    """
+    Copies of the property-scoped tables for a shard database. Foreign keys to
+    tables that stay on the default database (property, guest, user, ...) are
+    left out, since no database can enforce them across engines; the ones
+    between property-scoped tables are kept.
+    """
+    metadata = MetaData()
+    tables = [model.__table__ for model in _property_scoped_models()]
+    names = {table.name for table in tables}
+    for table in tables:
+        copy = table.to_metadata(metadata)
+        for constraint in list(copy.foreign_key_constraints):
+            if constraint.elements[0].target_fullname.split('.')[0] in names: # 'table.column', unresolved here
+                continue
+            copy.constraints.discard(constraint)
+            for fk in constraint.elements:
+                fk.parent.foreign_keys.discard(fk)
+                copy.foreign_keys.discard(fk)
+    return metadata
+
+
+def create_property_schema(bind_key):
+    """
+    Creates the property-scoped tables on a shard database, then runs the
+    after_create hooks of db.metadata (the search index) as its create_all would.
+    """
+    from app import db
+    metadata = shard_metadata()
+    with db.engines[bind_key].begin() as connection:
+        metadata.create_all(connection)
+        db.metadata.dispatch.after_create(db.metadata, connection, tables=list(metadata.tables.values()),
+                                          checkfirst=True)
+
+
+def fan_out(report_fn, property_ids=None, max_workers=None):
+    """
+    Runs report_fn(property_id) once per property in parallel, each in its own
+    app context and property scope, and returns {property_id: result}.
+    """
+    from app.models import Property
+
+    if property_ids is None:
+        property_ids = [p.id for p in Property.query.order_by(Property.id).all()]
+    if not property_ids:
+        return {}
+
+    app = current_app._get_current_object()
+
+    def run(property_id):
+        with app.app_context():
+            with property_scope(property_id):
+                return property_id, report_fn(property_id)
+
+    workers = max_workers or min(len(property_ids), current_app.config.get('PROPERTY_REPORT_WORKERS', 8))
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        return dict(pool.map(run, property_ids))
+
+
+def room_status_counts(property_id=None):
+    """Room counts by status for the active property (one grouped query)."""
+    from app import db
+    from app.models import Room
+    rows = db.session.query(Room.status, db.func.count(Room.id)).group_by(Room.status).all()
+    return dict(rows)
+
+
+def cross_property_room_status_report(property_ids=None, max_workers=None):
+    """Room status counts per property plus the merged chain-wide totals."""
+    by_property = fan_out(room_status_counts, property_ids=property_ids, max_workers=max_workers)
+    total = Counter()
+    for counts in by_property.values():
+        total.update(counts)
+    return {'by_property': by_property, 'total': dict(total)}
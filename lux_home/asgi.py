@@ -0,0 +1,9 @@
+from app import create_app
+from app.asgi import AsyncReadApp
+import os
+
+# ASGI deployment: read-heavy JSON endpoints run on async SQLAlchemy, the rest of
+# the Flask app is served through a WSGI adapter. Run with e.g.
+#   uvicorn asgi:application --workers 2
+config_name = os.getenv('FLASK_CONFIG', 'config.DevelopmentConfig')
+application = AsyncReadApp(create_app(config_name))
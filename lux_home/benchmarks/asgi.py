@@ -0,0 +1,137 @@
+"""
+Throughput of the read endpoints (/api/dashboard, /api/invoices/<id>) under a
+fixed number of concurrent clients: the sync Flask app on a threaded WSGI
+server versus the ASGI app (asgi.py) on one uvicorn worker. Both servers run
+in their own process against the same seeded SQLite file.
+
+    python -m benchmarks.asgi --concurrency 1 16 64 256 --requests 2000
+"""
+import argparse
+import asyncio
+import logging
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from config import Config
+
+ENDPOINTS = ['/api/dashboard', '/api/invoices/1']
+
+
+class BenchConfig(Config):
+    SQLALCHEMY_DATABASE_URI = None # Set from --db
+    SECRET_KEY = 'benchmark'
+    PRECOMPILE_TEMPLATES = False
+    COMPRESS_RESPONSES = False
+
+
+def seed(rooms):
+    from app import create_app, db
+    from app.models import User, Guest, Room, Booking, Invoice
+    app = create_app(BenchConfig)
+    with app.app_context():
+        db.create_all()
+        db.session.add(User(username='bench', password_hash='x'))
+        guests = [Guest(name=f'Guest {i}', email=f'guest{i}@example.com') for i in range(rooms)]
+        db.session.add_all(guests)
+        db.session.add_all([Room(room_number=f'{1000 + i}', room_type='Standard', rate_per_night=100.0) for i in range(rooms)])
+        db.session.commit()
+        now = datetime.utcnow()
+        db.session.add_all([Booking(guest_id=i + 1, room_id=i + 1, check_in_date=now - timedelta(days=3),
+                                    check_out_date=now - timedelta(days=1), total_amount=200.0, is_active=False)
+                            for i in range(rooms)])
+        db.session.commit()
+        db.session.add(Invoice(booking_id=1, issue_date=now))
+        db.session.commit()
+        return app.session_interface.get_signing_serializer(app).dumps({'_user_id': '1'})
+
+
+def serve(kind, port):
+    from app import create_app
+    app = create_app(BenchConfig)
+    if kind == 'sync':
+        from werkzeug.serving import make_server
+        logging.getLogger('werkzeug').setLevel(logging.WARNING)
+        make_server('127.0.0.1', port, app, threaded=True).serve_forever()
+    else:
+        import uvicorn
+        from app.asgi import AsyncReadApp
+        uvicorn.run(AsyncReadApp(app), host='127.0.0.1', port=port, log_level='warning')
+
+
+async def fetch(port, path, cookie):
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    writer.write(f"GET {path} HTTP/1.1\r\nHost: localhost\r\nCookie: session={cookie}\r\nConnection: close\r\n\r\n".encode())
+    await writer.drain()
+    response = await reader.read()
+    writer.close()
+    if not response.startswith(b'HTTP/1.1 200'):
+        raise RuntimeError(response[:200])
+
+
+async def load(port, cookie, concurrency, total):
+    latencies = []
+    remaining = iter(range(total))
+
+    async def client():
+        for i in remaining:
+            start = time.perf_counter()
+            await fetch(port, ENDPOINTS[i % len(ENDPOINTS)], cookie)
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+    return total / elapsed, latencies[len(latencies) // 2] * 1000, latencies[int(len(latencies) * 0.95)] * 1000
+
+
+def wait_for(port, timeout=15):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            asyncio.run(asyncio.wait_for(asyncio.open_connection('127.0.0.1', port), 1))
+            return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError(f"Server on port {port} did not start")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 16, 64, 256])
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--rooms', type=int, default=200)
+    parser.add_argument('--serve', choices=['sync', 'async'], help=argparse.SUPPRESS)
+    parser.add_argument('--port', type=int, default=8701)
+    parser.add_argument('--db', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        BenchConfig.SQLALCHEMY_DATABASE_URI = args.db
+        return serve(args.serve, args.port)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        BenchConfig.SQLALCHEMY_DATABASE_URI = f"sqlite:///{os.path.join(tmp, 'bench.db')}"
+        cookie = seed(args.rooms)
+        print(f"{args.rooms} rooms, {args.requests} requests per run over {', '.join(ENDPOINTS)}")
+        print(f"{'deployment':>10} {'clients':>8} {'req/s':>9} {'p50 ms':>8} {'p95 ms':>8}")
+        for offset, kind in enumerate(['sync', 'async']):
+            port = args.port + offset
+            server = subprocess.Popen([sys.executable, '-m', 'benchmarks.asgi', '--serve', kind, '--port', str(port),
+                                       '--db', BenchConfig.SQLALCHEMY_DATABASE_URI])
+            try:
+                wait_for(port)
+                for concurrency in args.concurrency:
+                    rate, p50, p95 = asyncio.run(load(port, cookie, concurrency, args.requests))
+                    print(f"{kind:>10} {concurrency:>8} {rate:>9.1f} {p50:>8.2f} {p95:>8.2f}")
+            finally:
+                server.terminate()
+                server.wait()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,58 @@
+"""
+Commit latency of a small state change (a room's status and rate) with the
+audit trail off, written behind by the writer thread, and written inside
+each commit (a queue of one with the 'sync' overflow policy, i.e. what
+synchronous audit inserts in the routes would cost), on a SQLite file.
+
+    python -m benchmarks.audit --commits 2000
+"""
+import argparse
+import os
+import tempfile
+import time
+
+from app import create_app, db
+from app.audit import AuditWriter, table_sink
+from app.models import Room, AuditEvent
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--commits', type=int, default=2000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        class BenchConfig:
+            SQLALCHEMY_DATABASE_URI = f"sqlite:///{os.path.join(tmp, 'bench.db')}"
+            SECRET_KEY = 'bench'
+            PRECOMPILE_TEMPLATES = False
+        app = create_app(BenchConfig)
+        with app.app_context():
+            db.create_all()
+            rooms = [Room(room_number=str(100 + i), room_type='Standard', rate_per_night=100.0) for i in range(50)]
+            db.session.add_all(rooms)
+            db.session.commit()
+            room_ids = [room.id for room in rooms]
+
+            def commits():
+                start = time.perf_counter()
+                for i in range(args.commits):
+                    room = db.session.get(Room, room_ids[i % len(room_ids)])
+                    room.status = ('available', 'occupied', 'needs_cleaning')[i % 3]
+                    room.rate_per_night = 100.0 + i % 7
+                    db.session.commit()
+                return (time.perf_counter() - start) / args.commits * 1000
+
+            print(f"{args.commits} commits, ms per commit")
+            print(f"  audit off                 {commits():7.3f}")
+            for label, writer in (('write-behind (thread)', AuditWriter(table_sink(db.engine), interval=0.05)),
+                                  ('inside each commit', AuditWriter(table_sink(db.engine), capacity=1,
+                                                                     overflow='sync', background=False))):
+                app.extensions['audit'] = writer
+                print(f"  {label:<25} {commits():7.3f}   {writer.status()}")
+                writer.close()
+            print(f"  audit events written: {db.session.query(AuditEvent).count()}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,57 @@
+"""
+Conflict-check latency as stays per room grow: the per-room IntervalIndex used
+on the availability search path versus a linear scan over the room's stays.
+
+    python -m benchmarks.availability --sizes 100 1000 10000 100000
+"""
+import argparse
+import random
+import time
+from datetime import datetime, timedelta
+
+from app.reservations import IntervalIndex
+
+
+def stays(count):
+    # Back-to-back stays of 1-4 nights, like a busy room's history and future book
+    start, result = datetime(2020, 1, 1), []
+    for booking_id in range(count):
+        end = start + timedelta(days=random.randint(1, 4))
+        result.append((start, end, booking_id))
+        start = end
+    return result
+
+
+def linear_overlaps(intervals, start, end):
+    return any(s < end and e > start for s, e, _ in intervals)
+
+
+def per_check_us(fn, windows):
+    begin = time.perf_counter()
+    for start, end in windows:
+        fn(start, end)
+    return (time.perf_counter() - begin) / len(windows) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[100, 1000, 10000, 100000])
+    parser.add_argument('--checks', type=int, default=2000)
+    args = parser.parse_args()
+
+    print(f"{'stays/room':>10} {'interval index':>16} {'linear scan':>14}")
+    for size in args.sizes:
+        intervals = stays(size)
+        index = IntervalIndex(intervals)
+        horizon = intervals[-1][1]
+        windows = []
+        for _ in range(args.checks):
+            start = datetime(2020, 1, 1) + (horizon - datetime(2020, 1, 1)) * random.random()
+            windows.append((start, start + timedelta(days=random.randint(1, 7))))
+        indexed = per_check_us(index.overlaps, windows)
+        linear = per_check_us(lambda s, e: linear_overlaps(intervals, s, e), windows[:200])
+        print(f"{size:>10} {indexed:>13.2f} us {linear:>11.2f} us")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,112 @@
+"""
+Channel manager push cost: a burst of booking changes (new reservations and a
+group check-out) against a hotel with several room types, pushed once as the
+coalesced delta by `sync_availability` and once as a full-horizon resync
+(`mark_all`), which is also what pushing the whole inventory on every event
+would send per event. A local keep-alive HTTP server stands in for the
+channel manager. Reports requests, payload bytes, new connections and latency.
+
+    python -m benchmarks.channel_sync --rooms 300 --changes 200
+"""
+import argparse
+import random
+import threading
+import time
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from config import Config
+
+
+class BenchConfig(Config):
+    SQLALCHEMY_DATABASE_URI = 'sqlite:///:memory:'
+    PRECOMPILE_TEMPLATES = False
+    CHANNEL_SYNC_URL = None # Set in main()
+
+
+class ChannelManager(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    latency = 0.0
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers['Content-Length']))
+        time.sleep(self.latency)
+        self.send_response(200)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+def report(label, db, since, opened, elapsed):
+    """Prints the pushes made since `since`; returns their total payload bytes."""
+    from app.channel_sync import channel_sync_stats
+    from app.models import ChannelPush
+    stats = channel_sync_stats(since=since)
+    total = db.session.query(db.func.count(ChannelPush.id)).filter(ChannelPush.pushed_at >= since).scalar()
+    print(f"{label:<12} {stats['cells']:>7} cells  {total:>4} requests  {stats['payload_bytes']['total']:>10,} bytes  "
+          f"{opened:>2} new connections  p50 {stats['latency_ms']['p50']:.1f} ms  p95 {stats['latency_ms']['p95']:.1f} ms  "
+          f"{elapsed:.2f} s")
+    return stats['payload_bytes']['total']
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--rooms', type=int, default=300)
+    parser.add_argument('--room-types', type=int, default=6)
+    parser.add_argument('--changes', type=int, default=200, help='Reservations created in the burst.')
+    parser.add_argument('--latency-ms', type=float, default=2.0, help="The stub channel manager's response time.")
+    args = parser.parse_args()
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), ChannelManager)
+    ChannelManager.latency = args.latency_ms / 1000
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    BenchConfig.CHANNEL_SYNC_URL = f"http://127.0.0.1:{server.server_port}/availability"
+
+    from app import create_app, db
+    from app.channel_sync import sync_availability, mark_all, get_channel_client
+    from app.models import Room, Guest, Booking
+    from app.services import group_check_out
+    app = create_app(BenchConfig)
+    with app.app_context():
+        db.create_all()
+        guest = Guest(name='Bench Guest', email='bench@example.com')
+        rooms = [Room(room_number=str(1000 + i), room_type=f"Type {i % args.room_types}", rate_per_night=120.0)
+                 for i in range(args.rooms)]
+        db.session.add_all([guest, *rooms])
+        db.session.commit()
+        sync_availability(force=True) # The initial publication
+
+        # The burst: reservations spread over the next months, in-house guests leaving together
+        today = datetime.utcnow().replace(hour=14, minute=0, second=0, microsecond=0)
+        random.seed(7)
+        in_house = [Booking(guest_id=guest.id, room_id=room.id, check_in_date=today - timedelta(days=1),
+                            check_out_date=today + timedelta(days=2)) for room in rooms[:args.changes // 10]]
+        db.session.add_all(in_house)
+        db.session.commit()
+        sync_availability(force=True)
+        for _ in range(args.changes):
+            first = random.randrange(1, 120)
+            db.session.add(Booking(guest_id=guest.id, room_id=random.choice(rooms).id, is_active=False,
+                                   is_reservation=True, check_in_date=today + timedelta(days=first),
+                                   check_out_date=today + timedelta(days=first + random.randint(1, 5))))
+            db.session.commit()
+        group_check_out([b.id for b in in_house])
+
+        events = args.changes + 1
+        client = get_channel_client()
+        sent = {}
+        for label, prepare in (('delta', lambda: None), ('full resync', mark_all)):
+            prepare()
+            since, opened = datetime.utcnow(), client.opened
+            start = time.perf_counter()
+            sync_availability(force=True)
+            sent[label] = report(label, db, since, client.opened - opened, time.perf_counter() - start)
+        print(f"{events} events pushed one full inventory each: {events * sent['full resync']:,} bytes, "
+              f"{events * sent['full resync'] / max(sent['delta'], 1):,.0f}x the coalesced delta")
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
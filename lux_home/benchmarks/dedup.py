@@ -0,0 +1,102 @@
+"""
+Guest deduplication at scale: seeds a SQLite file with unique guests plus a
+share of near-duplicates (case and +tag email variants, email typos, phone-only
+matches), then times candidate search (find_duplicates) and the merge
+(dedup_guests: bulk repointing of stays and deleting duplicates).
+
+    python -m benchmarks.dedup --guests 500000 --duplicates 0.1
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+from datetime import datetime
+
+from sqlalchemy import insert
+
+from config import Config
+
+SYLLABLES = ['an', 'be', 'ca', 'do', 'el', 'fa', 'gi', 'ho', 'in', 'jo', 'ka', 'lu', 'ma', 'ne', 'or',
+             'pa', 'ri', 'sa', 'to', 'va', 'wi', 'ya', 'ze', 'mi', 'ro', 'ta', 'li', 'no', 'ki', 'su']
+
+
+class BenchConfig(Config):
+    SQLALCHEMY_DATABASE_URI = None # Set in main()
+    PRECOMPILE_TEMPLATES = False
+
+
+def word(syllables):
+    return ''.join(random.choice(SYLLABLES) for _ in range(syllables)).capitalize()
+
+
+def variant(name, email, phone):
+    """A second record for the same person, as a front desk would type it."""
+    local, domain = email.split('@')
+    kind = random.randrange(3)
+    if kind == 0:
+        return name.lower(), f"{local.capitalize()}+{random.choice(['spa', 'vip'])}@{domain.upper()}", None
+    if kind == 1: # Two letters swapped
+        i = random.randrange(len(local) - 1)
+        return name, f"{local[:i]}{local[i + 1]}{local[i]}{local[i + 2:]}@{domain}", phone
+    return f"{name.split()[0]}e {name.split()[1]}", f"{local}.{random.randrange(99)}@other.test", f"+1 {phone}"
+
+
+def seed(db, guests, duplicate_share, batch=20000):
+    from app.models import Guest, Room, Booking
+    db.session.execute(insert(Room), [{'room_number': str(100 + i), 'room_type': 'Standard',
+                                       'rate_per_night_cents': 10000} for i in range(50)])
+    rows, originals, emails = [], [], set()
+    for i in range(guests):
+        if originals and random.random() < duplicate_share:
+            name, email, phone = variant(*random.choice(originals))
+        else:
+            name = f"{word(2)} {word(3)}"
+            email = f"{name.replace(' ', '.').lower()}{i}@example.com"
+            phone = f"{random.randint(200, 999)} {random.randint(200, 999)} {random.randint(0, 9999):04d}"
+            originals.append((name, email, phone))
+        if email.lower() in emails: # Guest.email is unique
+            email = f"{i}.{email}"
+        emails.add(email.lower())
+        rows.append({'id': i + 1, 'name': name, 'email': email, 'phone': phone})
+        if len(rows) == batch:
+            db.session.execute(insert(Guest), rows)
+            rows = []
+    if rows:
+        db.session.execute(insert(Guest), rows)
+    db.session.execute(insert(Booking), [{'guest_id': random.randint(1, guests), 'room_id': random.randint(1, 50),
+                                          'check_in_date': datetime(2024, 1, 1), 'is_active': False,
+                                          'updated_at': datetime(2024, 1, 1)} for _ in range(guests // 2)])
+    db.session.commit()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--guests', type=int, default=500000)
+    parser.add_argument('--duplicates', type=float, default=0.1, help='Share of guests that are near-duplicates.')
+    args = parser.parse_args()
+
+    from app import create_app, db
+    with tempfile.TemporaryDirectory() as tmp:
+        BenchConfig.SQLALCHEMY_DATABASE_URI = f"sqlite:///{os.path.join(tmp, 'dedup.db')}"
+        app = create_app(BenchConfig)
+        from app.dedup import find_duplicates, dedup_guests
+        with app.app_context():
+            db.create_all()
+            start = time.perf_counter()
+            seed(db, args.guests, args.duplicates)
+            print(f"Seeded {args.guests} guests ({args.duplicates:.0%} near-duplicates) in {time.perf_counter() - start:.1f} s")
+
+            start = time.perf_counter()
+            clusters = find_duplicates()
+            print(f"find_duplicates: {sum(len(d) for _, d in clusters)} duplicates in {len(clusters)} clusters, "
+                  f"{time.perf_counter() - start:.1f} s")
+
+            start = time.perf_counter()
+            stats, _ = dedup_guests()
+            print(f"dedup_guests: merged {stats['merged']} guests, repointed {stats['bookings']} stays, "
+                  f"{time.perf_counter() - start:.1f} s")
+
+
+if __name__ == '__main__':
+    main()
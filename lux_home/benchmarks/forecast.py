@@ -0,0 +1,89 @@
+"""
+Forecast latency over years of history: a hotel with `--rooms` rooms and
+`--years` of stays (about 75% occupancy, 1-5 nights, booked 0-90 days ahead)
+plus on-the-books reservations. Times `forecast()` cold (stays queried and
+the columnar cache written), from the on-disk cache (a fresh worker) and with
+the day's series already built, against counting each forecast date's stays
+in a Python loop over every booking.
+
+    python -m benchmarks.forecast --rooms 200 --years 5
+"""
+import argparse
+import random
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import insert
+
+from config import Config
+
+
+class BenchConfig(Config):
+    SQLALCHEMY_DATABASE_URI = 'sqlite:///:memory:'
+    PRECOMPILE_TEMPLATES = False
+    FORECAST_CACHE_DIR = None # Set in main()
+
+
+def generate_stays(rooms, years, today):
+    random.seed(11)
+    start = today - timedelta(days=365 * years)
+    for room_id in range(1, rooms + 1):
+        day = start + timedelta(days=random.randrange(4))
+        while day < today + timedelta(days=90):
+            nights = random.randint(1, 5)
+            booked = day - timedelta(days=random.randrange(91))
+            if booked < today:
+                check_out = day + timedelta(days=nights)
+                yield {'guest_id': 1, 'room_id': room_id, 'check_in_date': day + timedelta(hours=14),
+                       'check_out_date': check_out + timedelta(hours=11), 'created_at': booked, 'updated_at': booked,
+                       'total_amount_cents': nights * 12000, 'is_active': False, 'is_reservation': day >= today}
+            day += timedelta(days=nights + random.choice((0, 0, 1, 2, 4)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--rooms', type=int, default=200)
+    parser.add_argument('--years', type=int, default=5)
+    parser.add_argument('--days', type=int, default=90)
+    args = parser.parse_args()
+
+    from app import create_app, db
+    from app.models import Room, Guest, Booking
+    from app.forecast import forecast, stay_columns
+    with tempfile.TemporaryDirectory() as tmp:
+        BenchConfig.FORECAST_CACHE_DIR = tmp
+        app = create_app(BenchConfig)
+        with app.app_context():
+            db.create_all()
+            today = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+            db.session.add(Guest(name='Bench Guest', email='bench@example.com'))
+            db.session.add_all(Room(room_number=str(1000 + i), room_type='Standard', rate_per_night=120.0)
+                               for i in range(args.rooms))
+            db.session.flush()
+            stays = list(generate_stays(args.rooms, args.years, today))
+            db.session.execute(insert(Booking), stays)
+            db.session.commit()
+            print(f"{args.rooms} rooms, {len(stays)} stays over {args.years} years")
+
+            for label, reset in (('cold (query + cache write)', True), ('on-disk cache', True), ('series built', False)):
+                if reset:
+                    app.extensions.pop('forecast_columns', None)
+                    app.extensions.pop('forecast_series', None)
+                start = time.perf_counter()
+                result = forecast(args.days)
+                print(f"  {label:<28} {(time.perf_counter() - start) * 1000:8.1f} ms")
+            print(f"  next 7 days occupancy: {[d['occupancy'] for d in result['days'][:7]]}")
+
+            # Baseline: each forecast date (and its same weekday in earlier years) counted over every stay
+            columns = stay_columns()
+            pairs = list(zip(columns['arrive'], columns['depart']))
+            dates = [today.toordinal() + i - 364 * k for i in range(args.days) for k in range(args.years + 1)]
+            start = time.perf_counter()
+            [sum(1 for a, d in pairs if a <= day < d) for day in dates]
+            print(f"  per-date loop over stays     {(time.perf_counter() - start) * 1000:8.1f} ms "
+                  f"(occupancy counts only)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,81 @@
+"""
+Guest profile and "top guests" latency against the size of the stay history:
+aggregating every completed booking per request (the old way) against the
+indexed guest_stats reads, plus the cost the stats add to a check-out.
+
+    python -m benchmarks.guest_stats --guests 20000 --stays 200000
+"""
+import argparse
+import random
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import insert, select, func
+
+from app import create_app, db, read_api
+from app.models import Guest, Room, Booking
+from app.guest_stats import record_stays, rebuild_guest_stats
+
+
+def timed(fn, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) / repeat * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--guests', type=int, default=20000)
+    parser.add_argument('--stays', type=int, default=200000)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    app = create_app('test_config.TestConfig')
+    with app.app_context():
+        db.create_all()
+        random.seed(5)
+        db.session.execute(insert(Guest), [{'name': f"Guest {i}", 'email': f"guest{i}@example.com"}
+                                           for i in range(args.guests)])
+        db.session.add(Room(room_number='101', room_type='Standard', rate_per_night=100.0))
+        db.session.flush()
+        start = datetime(2015, 1, 1)
+        stays = []
+        for _ in range(args.stays):
+            check_in = start + timedelta(days=random.randrange(3600))
+            nights = random.randint(1, 7)
+            stays.append({'guest_id': random.randint(1, args.guests), 'room_id': 1, 'check_in_date': check_in,
+                          'check_out_date': check_in + timedelta(days=nights),
+                          'total_amount_cents': nights * 10000, 'is_active': False, 'is_reservation': False})
+        db.session.execute(insert(Booking), stays)
+        db.session.commit()
+        started = time.perf_counter()
+        rebuild_guest_stats()
+        print(f"{args.guests} guests, {args.stays} stays; rebuild {(time.perf_counter() - started) * 1000:.0f} ms")
+
+        def top_by_aggregate():
+            return db.session.execute(
+                select(Booking.guest_id, func.count(), func.sum(Booking.total_amount_cents).label('revenue'))
+                .where(Booking.is_active.is_(False), Booking.is_reservation.is_(False))
+                .group_by(Booking.guest_id).order_by(func.sum(Booking.total_amount_cents).desc()).limit(20)).all()
+
+        def profile_by_aggregate():
+            return db.session.execute(
+                select(func.count(), func.sum(Booking.total_amount_cents), func.max(Booking.check_out_date))
+                .where(Booking.guest_id == random.randint(1, args.guests), Booking.is_active.is_(False))).one()
+
+        def check_out_stats():
+            record_stays([(random.randint(1, args.guests), start, start + timedelta(days=2), 20000)])
+            db.session.rollback()
+
+        print(f"  top 20, aggregate over bookings  {timed(top_by_aggregate, args.repeat):8.2f} ms")
+        print(f"  top 20, guest_stats              "
+              f"{timed(lambda: read_api.run_sync(read_api.top_guests(20)), args.repeat):8.2f} ms")
+        print(f"  profile, aggregate over bookings {timed(profile_by_aggregate, args.repeat):8.2f} ms")
+        profile = lambda: read_api.run_sync(read_api.guest_profile(random.randint(1, args.guests)))
+        print(f"  profile, guest_stats             {timed(profile, args.repeat):8.2f} ms")
+        print(f"  stats upsert per check-out       {timed(check_out_stats, args.repeat):8.2f} ms")
+
+
+if __name__ == '__main__':
+    main()
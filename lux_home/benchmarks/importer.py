@@ -0,0 +1,106 @@
+"""
+Legacy import throughput: writes CSV exports of guests, rooms, bookings and
+invoices (one stay per guest, with an invoice each), then loads them into a
+SQLite file with `import_legacy` and, for comparison, loads a slice of the
+same rows through the ORM one db.session.add at a time. Reports rows/s.
+
+    python -m benchmarks.importer --guests 200000 --orm-sample 5000
+"""
+import argparse
+import csv
+import os
+import random
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from config import Config
+
+
+class BenchConfig(Config):
+    SQLALCHEMY_DATABASE_URI = None # Set in main()
+    PRECOMPILE_TEMPLATES = False
+
+
+def write_exports(directory, guests, rooms):
+    start = datetime(2019, 1, 1)
+    with open(os.path.join(directory, 'guests.csv'), 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['id', 'name', 'email', 'phone'])
+        writer.writerows([i, f"Guest {i}", f"guest{i}@example.com", f"555 {i:07d}"] for i in range(1, guests + 1))
+    with open(os.path.join(directory, 'rooms.csv'), 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['id', 'room_number', 'room_type', 'rate_per_night'])
+        writer.writerows([i, str(1000 + i), 'Standard', '120.00'] for i in range(1, rooms + 1))
+    with open(os.path.join(directory, 'bookings.csv'), 'w', newline='') as f, \
+            open(os.path.join(directory, 'invoices.csv'), 'w', newline='') as g:
+        bookings, invoices = csv.writer(f), csv.writer(g)
+        bookings.writerow(['id', 'guest_id', 'room_id', 'check_in_date', 'check_out_date', 'total_amount'])
+        invoices.writerow(['id', 'booking_id', 'issue_date', 'amount_paid'])
+        for i in range(1, guests + 1):
+            check_in = start + timedelta(days=i // rooms, hours=random.randrange(24))
+            nights = random.randint(1, 5)
+            check_out = check_in + timedelta(days=nights)
+            bookings.writerow([i, i, i % rooms + 1, check_in.isoformat(' '), check_out.isoformat(' '),
+                               f"{nights * 120}.00"])
+            invoices.writerow([i, i, check_out.date().isoformat(), f"{nights * 120}.00"])
+
+
+def orm_load(db, sample, rooms):
+    """The per-row baseline: one ORM object per row, committed once."""
+    from app.models import Guest, Room, Booking, Invoice
+    start = datetime(2030, 1, 1)
+    room_ids = []
+    for i in range(rooms):
+        room = Room(room_number=f"orm-{i}", room_type='Standard', rate_per_night=120.0)
+        db.session.add(room)
+        db.session.flush()
+        room_ids.append(room.id)
+    for i in range(sample):
+        guest = Guest(name=f"Orm Guest {i}", email=f"orm{i}@example.com")
+        db.session.add(guest)
+        db.session.flush()
+        booking = Booking(guest_id=guest.id, room_id=room_ids[i % rooms], check_in_date=start + timedelta(days=i),
+                          check_out_date=start + timedelta(days=i + 1), total_amount=120.0, is_active=False)
+        db.session.add(booking)
+        db.session.flush()
+        db.session.add(Invoice(booking_id=booking.id, amount_paid=120.0, payment_status='paid'))
+    db.session.commit()
+    return rooms + 3 * sample
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--guests', type=int, default=200000)
+    parser.add_argument('--rooms', type=int, default=300)
+    parser.add_argument('--chunk-size', type=int, default=None)
+    parser.add_argument('--orm-sample', type=int, default=5000, help='Guests (with a stay and invoice) loaded via the ORM.')
+    args = parser.parse_args()
+
+    from app import create_app, db
+    with tempfile.TemporaryDirectory() as tmp:
+        BenchConfig.SQLALCHEMY_DATABASE_URI = f"sqlite:///{os.path.join(tmp, 'import.db')}"
+        app = create_app(BenchConfig)
+        from app.importer import TABLES, import_legacy
+        with app.app_context():
+            db.create_all()
+            write_exports(tmp, args.guests, args.rooms)
+
+            start = time.perf_counter()
+            run = import_legacy(tmp, args.chunk_size)
+            elapsed = time.perf_counter() - start
+            for table in TABLES:
+                stats, seconds = run.stats[table], run.elapsed[table]
+                print(f"{table:<9} {stats['inserted']:>9} rows  {seconds:6.2f} s  {stats['inserted'] / seconds:>9,.0f} rows/s")
+            rows = sum(stats['inserted'] for stats in run.stats.values()) + run.stats['invoices']['payments']
+            print(f"import_legacy: {rows} rows (payments included) in {elapsed:.2f} s, {rows / elapsed:,.0f} rows/s "
+                  f"with index rebuild and search documents")
+
+            start = time.perf_counter()
+            rows = orm_load(db, args.orm_sample, args.rooms)
+            elapsed = time.perf_counter() - start
+            print(f"ORM add per row: {rows} rows in {elapsed:.2f} s, {rows / elapsed:,.0f} rows/s")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,89 @@
+"""
+Invoice PDF rendering: per-invoice render time and memory of each backend
+(WeasyPrint and the native writer, optionally with an embedded TrueType font)
+for the same invoice with a handful of payments. The first render of each
+backend is timed separately, since it pays for loading fonts and building the
+static layout; memory is the tracemalloc peak of one warm render.
+
+    python -m benchmarks.invoice_pdf --renders 200 --font /path/to/DejaVuSans.ttf
+"""
+import argparse
+import os
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+from config import Config
+
+
+class BenchConfig(Config):
+    SQLALCHEMY_DATABASE_URI = None # Set in main()
+    PRECOMPILE_TEMPLATES = False
+
+
+def seed(db):
+    from app.models import Guest, Room, Booking, Invoice, Payment
+    guest = Guest(name='Benchmark Guest', email='bench@example.com', phone='555 010 1234')
+    room = Room(room_number='101', room_type='Deluxe', rate_per_night=180.0)
+    db.session.add_all([guest, room])
+    db.session.flush()
+    booking = Booking(guest_id=guest.id, room_id=room.id, check_in_date=datetime(2024, 5, 1, 14),
+                      check_out_date=datetime(2024, 5, 4, 11), is_active=False, total_amount=540.0)
+    db.session.add(booking)
+    db.session.flush()
+    invoice = Invoice(booking_id=booking.id, issue_date=datetime(2024, 5, 4), due_date=datetime(2024, 5, 19))
+    db.session.add(invoice)
+    db.session.flush()
+    for i in range(5):
+        db.session.add(Payment(invoice_id=invoice.id, amount=50.0, method='card', reference=f"TX{i}",
+                               posted_at=datetime(2024, 5, 4) + timedelta(minutes=i)))
+    db.session.commit()
+    return dict(booking=booking, invoice=invoice, guest=guest, room=room, duration_days=3, balance_due=290.0)
+
+
+def measure(renderer, context, renders):
+    start = time.perf_counter()
+    pdf = renderer.render(context)
+    first = time.perf_counter() - start
+    start = time.perf_counter()
+    for _ in range(renders):
+        renderer.render(context)
+    warm = (time.perf_counter() - start) / renders
+    tracemalloc.start()
+    renderer.render(context)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return first, warm, peak, len(pdf)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--renders', type=int, default=200)
+    parser.add_argument('--font', help='TrueType font for the embedded-font run of the native backend.')
+    args = parser.parse_args()
+
+    from app import create_app, db
+    with tempfile.TemporaryDirectory() as tmp:
+        BenchConfig.SQLALCHEMY_DATABASE_URI = f"sqlite:///{os.path.join(tmp, 'invoices.db')}"
+        app = create_app(BenchConfig)
+        from app.invoice_pdf import NativePdfRenderer, WeasyPrintRenderer
+        backends = [('native (Helvetica)', lambda: NativePdfRenderer())]
+        if args.font:
+            backends.append((f"native ({os.path.basename(args.font)})", lambda: NativePdfRenderer(args.font)))
+        backends.append(('weasyprint', WeasyPrintRenderer))
+        with app.test_request_context():
+            db.create_all()
+            context = seed(db)
+            for name, make in backends:
+                try:
+                    first, warm, peak, size = measure(make(), context, args.renders)
+                except (ImportError, OSError) as e: # WeasyPrint missing, or its Pango/Cairo libraries
+                    print(f"{name:<28} unavailable: {str(e).splitlines()[0]}")
+                    continue
+                print(f"{name:<28} first {first * 1000:8.1f} ms   warm {warm * 1000:7.2f} ms/invoice   "
+                      f"peak {peak / 1024:8.0f} KiB   {size / 1024:6.1f} KiB PDF")
+
+
+if __name__ == '__main__':
+    main()
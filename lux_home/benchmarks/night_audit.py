@@ -0,0 +1,72 @@
+"""
+Night audit at scale: seeds a SQLite file with rooms, one in-house stay per
+occupied room and a history of completed stays, then times closing a business
+date (one INSERT ... SELECT plus the summary queries) and re-running it.
+
+    python -m benchmarks.night_audit --rooms 5000 --occupancy 0.85 --history 200000
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import insert
+
+from config import Config
+
+
+class BenchConfig(Config):
+    SQLALCHEMY_DATABASE_URI = None # Set in main()
+    PRECOMPILE_TEMPLATES = False
+
+
+def seed(db, rooms, occupancy, history, batch=20000):
+    from app.models import Guest, Room, Booking
+    db.session.execute(insert(Guest), [{'id': i + 1, 'name': f"Guest {i}", 'email': f"guest{i}@example.com"}
+                                       for i in range(rooms)])
+    db.session.execute(insert(Room), [{'room_number': str(1000 + i), 'room_type': 'Standard',
+                                       'rate_per_night_cents': random.choice([9000, 12000, 18000])}
+                                      for i in range(rooms)])
+    today = datetime.utcnow().replace(hour=15, minute=0, second=0, microsecond=0)
+    db.session.execute(insert(Booking), [
+        {'guest_id': random.randint(1, rooms), 'room_id': room_id, 'is_active': True, 'updated_at': today,
+         'check_in_date': today - timedelta(days=random.randrange(7))}
+        for room_id in random.sample(range(1, rooms + 1), int(rooms * occupancy))])
+    for start in range(0, history, batch):
+        rows = []
+        for _ in range(min(batch, history - start)):
+            check_in = today - timedelta(days=random.randrange(8, 700))
+            rows.append({'guest_id': random.randint(1, rooms), 'room_id': random.randint(1, rooms), 'is_active': False,
+                         'check_in_date': check_in, 'check_out_date': check_in + timedelta(days=random.randint(1, 6)),
+                         'updated_at': today})
+        db.session.execute(insert(Booking), rows)
+    db.session.commit()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--rooms', type=int, default=5000)
+    parser.add_argument('--occupancy', type=float, default=0.85)
+    parser.add_argument('--history', type=int, default=200000, help='Completed stays in the booking table.')
+    args = parser.parse_args()
+
+    from app import create_app, db
+    with tempfile.TemporaryDirectory() as tmp:
+        BenchConfig.SQLALCHEMY_DATABASE_URI = f"sqlite:///{os.path.join(tmp, 'audit.db')}"
+        app = create_app(BenchConfig)
+        from app.night_audit import run_night_audit, audit_summary
+        with app.app_context():
+            db.create_all()
+            seed(db, args.rooms, args.occupancy, args.history)
+            business_date = datetime.utcnow().date()
+            for label in ('close', 're-run'):
+                start = time.perf_counter()
+                summary = audit_summary(run_night_audit(business_date))
+                print(f"{label:<7} {business_date}: {summary['charges_posted']} charges posted, "
+                      f"{summary['in_house']}/{summary['rooms']} in house in {(time.perf_counter() - start) * 1000:.0f} ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,64 @@
+"""
+Dashboard room grid cost as the property grows: every room loaded and rendered
+as a card (the old dashboard) against one page of `room_grid` with its floors
+rendered through the fragment cache, cold and warm.
+
+    python -m benchmarks.room_grid --sizes 300 1200 4800 --repeat 50
+"""
+import argparse
+import time
+
+from app import create_app, db
+from app.models import Room, Booking
+from app.room_grid import FragmentCache, room_grid, floor_fragment
+from flask import render_template
+
+
+def timed(fn, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) / repeat * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[300, 1200, 4800])
+    parser.add_argument('--rooms-per-floor', type=int, default=40)
+    parser.add_argument('--repeat', type=int, default=50)
+    args = parser.parse_args()
+
+    app = create_app('test_config.TestConfig')
+    with app.app_context(), app.test_request_context('/'):
+        db.create_all()
+        created = 0
+        print(f"{'rooms':>6}  {'all cards':>10}  {'grid, cold':>10}  {'grid, warm':>10}  (ms per page)")
+        for size in args.sizes:
+            db.session.add_all([Room(room_number=f"{1 + i // args.rooms_per_floor}{i % args.rooms_per_floor:02d}",
+                                     room_type=('Standard', 'Deluxe', 'Suite')[i % 3], rate_per_night=100.0,
+                                     status=('available', 'occupied', 'needs_cleaning')[i % 3])
+                                for i in range(created, size)])
+            db.session.commit()
+            created = size
+
+            def all_cards():
+                rooms = Room.query.all()
+                active = {b.room_id: b.id for b in Booking.query.filter_by(is_active=True).all()}
+                html = render_template('_room_floor.html', rooms=rooms, active_bookings_map=active)
+                db.session.expunge_all()
+                return html
+
+            def grid_page():
+                grid = room_grid()
+                return [floor_fragment(floor, rooms, grid['active_bookings_map']) for floor, rooms in grid['floors']]
+
+            app.extensions.pop('room_fragments', None)
+            cold = timed(grid_page, args.repeat)
+            app.extensions['room_fragments'] = FragmentCache(512)
+            grid_page()
+            warm = timed(grid_page, args.repeat)
+            print(f"{size:>6}  {timed(all_cards, args.repeat):>10.2f}  {cold:>10.2f}  {warm:>10.2f}")
+
+
+if __name__ == '__main__':
+    main()
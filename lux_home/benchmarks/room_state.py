@@ -0,0 +1,61 @@
+"""
+Compares the dashboard's room listing through the ORM (Room.query.all()) with
+the in-process RoomStateStore: per-call latency and memory held by the result.
+
+    python -m benchmarks.room_state --rooms 1200 --repeat 200
+"""
+import argparse
+import time
+import tracemalloc
+
+from app import create_app, db
+from app.models import Room
+from app.room_state import RoomStateStore
+
+
+def timed(fn, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) / repeat * 1000
+
+
+def retained_kib(fn):
+    tracemalloc.start()
+    result = fn()
+    current, _peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del result
+    return current / 1024
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--rooms', type=int, default=1200)
+    parser.add_argument('--repeat', type=int, default=200)
+    args = parser.parse_args()
+
+    app = create_app('test_config.TestConfig')
+    with app.app_context():
+        db.create_all()
+        db.session.add_all([Room(room_number=f'{1000 + i}', room_type='Standard', rate_per_night=100.0 + i % 7)
+                            for i in range(args.rooms)])
+        db.session.commit()
+        store = RoomStateStore()
+        store.rooms() # Warm the store, as the first request of a worker would
+
+        def orm_path():
+            rooms = Room.query.all()
+            db.session.expunge_all() # Each request starts with an empty identity map
+            return rooms
+
+        print(f"{args.rooms} rooms, {args.repeat} iterations")
+        print(f"  Room.query.all()   {timed(orm_path, args.repeat):8.3f} ms/call  {retained_kib(Room.query.all):9.1f} KiB")
+        db.session.expunge_all()
+        print(f"  RoomStateStore     {timed(store.rooms, args.repeat):8.3f} ms/call  {retained_kib(store.rooms):9.1f} KiB")
+        store.rooms_changed()
+        print(f"  store (cold load)  {retained_kib(store.rooms):9.1f} KiB held by records")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,95 @@
+"""
+Search latency as the index grows: the ranked full-text query behind
+/api/search (read_api.search on an FTS5 search_index) versus the LIKE scan the
+guest lookup used before, over the same synthetic guest documents in a SQLite file.
+
+    python -m benchmarks.search --sizes 10000 100000 1000000
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+
+from sqlalchemy import create_engine, insert, text
+
+from app import read_api
+from app.search import search_index, create_search_index, doc_id, document_text
+
+SYLLABLES = ['an', 'be', 'ca', 'do', 'el', 'fa', 'gi', 'ho', 'in', 'jo', 'ka', 'lu', 'ma', 'ne', 'or',
+             'pa', 'ri', 'sa', 'to', 'va', 'wi', 'ya', 'ze', 'mi', 'ro', 'ta', 'li', 'no', 'ki', 'su']
+
+
+def word(syllables):
+    return ''.join(random.choice(SYLLABLES) for _ in range(syllables)).capitalize()
+
+
+def phone():
+    return f"+1 {random.randint(200, 999)}-{random.randint(200, 999)}-{random.randint(0, 9999):04d}"
+
+
+def queries():
+    # What front-desk staff type: a surname prefix, a full name, an email, a phone number, a miss
+    last = [word(3) for _ in range(3)]
+    return [last[0][:3], f"{word(2)} {last[1]}", f"{last[2].lower()}@", phone()[3:], 'qqqq']
+
+
+def seed(conn, count, batch=20000):
+    conn.exec_driver_sql('CREATE TABLE guest_plain (id INTEGER PRIMARY KEY, name TEXT, email TEXT, phone TEXT)')
+    for start in range(0, count, batch):
+        guests = []
+        for i in range(start, min(start + batch, count)):
+            name = f"{word(2)} {word(3)}"
+            guests.append((i, name, f"{name.replace(' ', '.').lower()}{i}@example.com", phone()))
+        conn.execute(text('INSERT INTO guest_plain VALUES (:id, :name, :email, :phone)'),
+                     [dict(zip(('id', 'name', 'email', 'phone'), guest)) for guest in guests])
+        conn.execute(insert(search_index), [{'rowid': doc_id('guest', i), 'kind': 'guest', 'ref_id': i,
+                                             'property_id': None, 'label': name, 'body': document_text(name, email, phone)}
+                                            for i, name, email, phone in guests])
+
+
+def run(conn, endpoint):
+    try:
+        database, statement = next(endpoint)
+        while True:
+            database, statement = endpoint.send(conn.execute(statement).all())
+    except StopIteration as done:
+        return done.value
+
+
+def like_scan(conn, query):
+    pattern = f"%{query}%"
+    return conn.execute(text('SELECT id, name FROM guest_plain WHERE name LIKE :p OR email LIKE :p ORDER BY name LIMIT 20'),
+                        {'p': pattern}).all()
+
+
+def per_query_ms(fn, batch):
+    begin = time.perf_counter()
+    for query in batch:
+        fn(query)
+    return (time.perf_counter() - begin) / len(batch) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 100000, 1000000])
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    print(f"{'guests':>10} {'fts search':>12} {'like scan':>12}")
+    for size in args.sizes:
+        with tempfile.TemporaryDirectory() as tmp:
+            engine = create_engine(f"sqlite:///{os.path.join(tmp, 'search.db')}")
+            with engine.begin() as conn:
+                create_search_index(conn)
+                seed(conn, size)
+            with engine.connect() as conn:
+                batch = [query for _ in range(args.repeat) for query in queries()]
+                fts = per_query_ms(lambda q: run(conn, read_api.search(q)), batch)
+                like = per_query_ms(lambda q: like_scan(conn, q), batch[:max(5, len(batch) // 10)])
+            engine.dispose()
+        print(f"{size:>10} {fts:>9.2f} ms {like:>9.2f} ms")
+
+
+if __name__ == '__main__':
+    main()
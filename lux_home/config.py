@@ -6,6 +6,109 @@ class Config:
     SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL') or \
         'sqlite:///' + os.path.join(basedir, 'app.db')
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+    # Per-property shards: map a Property.bind_key to its own database, e.g.
+    # SQLALCHEMY_BINDS = {'downtown': 'postgresql://.../downtown'}
+    SQLALCHEMY_BINDS = {}
+    PROPERTY_REPORT_WORKERS = 8 # Max parallel shards queried by cross-property reports
+    ARCHIVE_AFTER_MONTHS = 18 # `flask archive-bookings` moves older completed stays to cold storage
+    ARCHIVE_BATCH_SIZE = 500
+    # Serve the check-in form's room list from the in-process RoomStateStore. The store is per process and
+    # only sees its own commits, so it is for single-process deployments (serve.py refuses it with more workers).
+    ROOM_STATE_STORE = False
+    ROOM_GRID_PAGE_SIZE = 120 # Rooms per dashboard page
+    ROOM_GRID_FRAGMENT_CACHE = 512 # Rendered floor fragments kept per process; 0 renders every time
+    # Per-room interval index for availability searches. Per process like ROOM_STATE_STORE, so off unless one
+    # process serves everything (serve.py refuses it with more workers); bookings are always checked against the
+    # database either way.
+    AVAILABILITY_INDEX = False
+    # Jinja bytecode cache shared by all workers; templates are compiled into it at startup.
+    # `flask build-assets` fingerprints and precompresses static/ into static/build/.
+    TEMPLATE_BYTECODE_CACHE = os.path.join(basedir, '.jinja_cache')
+    PRECOMPILE_TEMPLATES = True
+    COMPRESS_RESPONSES = True # gzip/brotli HTML and JSON responses of at least COMPRESS_MIN_SIZE bytes
+    COMPRESS_MIN_SIZE = 500
+    ASYNC_POOL_SIZE = 10 # Async engine pool per database for the ASGI read endpoints (asgi.py)
+    # Production WSGI server (serve.py). Workers/threads default to a size derived from the core count.
+    SERVER_BIND = os.environ.get('SERVER_BIND') or '0.0.0.0:8000'
+    SERVER_WORKERS = int(os.environ.get('SERVER_WORKERS') or 0)
+    SERVER_THREADS = int(os.environ.get('SERVER_THREADS') or 0)
+    SERVER_MAX_REQUESTS = 1000 # Recycle a worker after this many requests (plus up to the jitter) to bound memory growth
+    SERVER_MAX_REQUESTS_JITTER = 100
+    SERVER_TIMEOUT = 60
+    SERVER_GRACEFUL_TIMEOUT = 30 # Seconds a worker gets to finish in-flight requests on reload/shutdown
+    # Background jobs run by worker.py (or in the web process when SCHEDULER_IN_PROCESS is set)
+    SCHEDULER_IN_PROCESS = False
+    OVERDUE_SWEEP_INTERVAL = 300 # Seconds between overdue invoice sweeps
+    REMINDER_RENDER_INTERVAL = 60
+    REMINDER_BATCH_SIZE = 100
+    BALANCE_SNAPSHOT_LAG = 300 # Seconds a payment must be old before a balance snapshot absorbs it
+    # Outgoing mail. For local testing run a debugging SMTP server, e.g.
+    # `python -m aiosmtpd -n -l localhost:1025`, and leave these defaults.
+    MAIL_SERVER = os.environ.get('MAIL_SERVER') or 'localhost'
+    MAIL_PORT = int(os.environ.get('MAIL_PORT') or 1025)
+    MAIL_USE_TLS = os.environ.get('MAIL_USE_TLS') == '1'
+    MAIL_USERNAME = os.environ.get('MAIL_USERNAME')
+    MAIL_PASSWORD = os.environ.get('MAIL_PASSWORD')
+    MAIL_DEFAULT_SENDER = 'billing@luxhome.xyz'
+    MAIL_POOL_SIZE = 2 # Idle SMTP connections kept open by the outbox worker
+    EMAIL_INVOICE_ON_CHECKOUT = True # Queue the invoice email in the checkout transaction
+    OUTBOX_INTERVAL = 10 # Seconds between outbox drains
+    OUTBOX_BATCH_SIZE = 50
+    OUTBOX_MAX_ATTEMPTS = 6
+    OUTBOX_RETRY_BASE = 30 # Backoff doubles from here per failed attempt...
+    OUTBOX_RETRY_MAX = 3600 # ...up to this many seconds
+    # Invoice PDFs: 'native' draws the standard invoice directly (fast, no system libraries);
+    # 'weasyprint' renders INVOICE_PDF_TEMPLATE through HTML/CSS, for customised templates.
+    # Unset, it is 'native' when INVOICE_PDF_FONT is configured and 'weasyprint' otherwise.
+    INVOICE_PDF_BACKEND = os.environ.get('INVOICE_PDF_BACKEND')
+    INVOICE_PDF_TEMPLATE = 'invoice_template.html'
+    # Unicode TrueType font embedded (subset) by the native backend. Without one it falls back
+    # to the standard Helvetica, which only covers Western European text (no Vietnamese names).
+    INVOICE_PDF_FONT = os.environ.get('INVOICE_PDF_FONT')
+    INVOICE_PDF_FONT_BOLD = os.environ.get('INVOICE_PDF_FONT_BOLD')
+    # Admin-only profiling endpoints under /admin/profiling (app.profiling). Off by default:
+    # when disabled no hooks or routes are registered at all.
+    PROFILING_ENABLED = os.environ.get('PROFILING_ENABLED') == '1'
+    PROFILING_SAMPLE_INTERVAL = 0.005 # Seconds between stack samples of the sampling profiler
+    PROFILING_MAX_SECONDS = 300 # The sampler stops by itself after this long
+    PROFILING_HEADER = 'X-Profile' # Admin requests carrying this header are profiled with cProfile
+    PROFILING_KEEP_REQUESTS = 20
+    SQLITE_WAL = True # Write-ahead log for SQLite files: reads and online backups never block check-in/out commits
+    # Online snapshots of every database (`flask backup`, or the worker every BACKUP_INTERVAL seconds)
+    BACKUP_DIR = os.environ.get('BACKUP_DIR') or os.path.join(basedir, 'backups')
+    BACKUP_INTERVAL = 6 * 3600 # 0 disables the scheduled backup
+    BACKUP_KEEP = 28 # Newest snapshots kept per database
+    BACKUP_PAGES_PER_STEP = 256 # SQLite pages copied per backup step...
+    BACKUP_STEP_SLEEP = 0.01 # ...with this many seconds between steps, leaving the database to writers
+    BACKUP_MAX_RESTARTS = 5 # After this many restarts (caused by writes) the copy finishes in one step
+    DEDUP_MATCH_THRESHOLD = 0.8 # Minimum score for `flask dedup-guests` to treat two guests as the same person
+    # Availability push to the channel manager (app.channel_sync); nothing is tracked or sent without a URL
+    CHANNEL_SYNC_URL = os.environ.get('CHANNEL_SYNC_URL')
+    CHANNEL_SYNC_TOKEN = os.environ.get('CHANNEL_SYNC_TOKEN') # Sent as a Bearer token
+    CHANNEL_SYNC_INTERVAL = 2 # Seconds between the worker's checks for changed availability
+    CHANNEL_SYNC_WINDOW = 5 # Changes are pushed once the oldest is this many seconds old, so bursts go out together
+    CHANNEL_SYNC_HORIZON_DAYS = 365 # How far ahead availability is published
+    CHANNEL_SYNC_BATCH_SIZE = 200 # Date ranges per request
+    CHANNEL_SYNC_TIMEOUT = 10
+    CHANNEL_SYNC_POOL_SIZE = 2 # Idle keep-alive connections kept open
+    CHANNEL_SYNC_RETRY_MAX = 300 # Longest pause (seconds) after failed pushes
+    IMPORT_CHUNK_SIZE = 5000 # Rows per chunk read, validated and written by `flask import-legacy`
+    # Occupancy/ADR/RevPAR forecasts (app.forecast, /reports/forecast)
+    FORECAST_CACHE_DIR = os.path.join(basedir, '.forecast_cache') # Columnar stay cache, keyed by data version
+    FORECAST_HORIZON_DAYS = 90
+    FORECAST_PICKUP_WINDOW_DAYS = 365 # Past nights the pickup curve is learned from
+    FORECAST_PICKUP_LEAD_DAYS = 120 # Nights booked further ahead than this count as booked this far ahead
+    # Write-behind audit trail of room/booking/invoice/guest changes (app.audit, /admin/audit)
+    AUDIT_ENABLED = True
+    AUDIT_SINK = 'table' # 'table' (audit_event, queryable) or 'file' (JSON lines at AUDIT_LOG_PATH)
+    AUDIT_LOG_PATH = os.environ.get('AUDIT_LOG_PATH') or os.path.join(basedir, 'audit.log')
+    AUDIT_QUEUE_SIZE = 10000 # Events waiting for the writer thread, per process
+    AUDIT_BATCH_SIZE = 500 # Events per INSERT (or file append)
+    AUDIT_FLUSH_INTERVAL = 1.0 # Seconds between the writer's batches (sooner when a full batch is waiting)
+    # When the queue is full: 'block' waits AUDIT_BLOCK_TIMEOUT seconds for room and then drops the event,
+    # 'drop' drops it at once, 'sync' writes the backlog in the committing request
+    AUDIT_OVERFLOW = 'block'
+    AUDIT_BLOCK_TIMEOUT = 0.05
     # Add other common configurations here
 
 class DevelopmentConfig(Config):
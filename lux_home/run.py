@@ -6,5 +6,9 @@ config_name = os.getenv('FLASK_CONFIG', 'config.DevelopmentConfig')
 app = create_app(config_name)
 
 if __name__ == '__main__':
+    # Run background jobs in this process only when asked to, and only in the reloader's child
+    if app.config.get('SCHEDULER_IN_PROCESS') and (not app.debug or os.environ.get('WERKZEUG_RUN_MAIN') == 'true'):
+        from app.scheduler import build_scheduler
+        build_scheduler(app).start()
     # Debug mode should be controlled by the config now
     app.run(debug=app.config.get('DEBUG', True))
@@ -0,0 +1,71 @@
+from app import create_app
+from app.server import gunicorn_options, dispose_engines, process_memory, memory_report, format_memory_report
+import gc
+import os
+import sys
+import time
+
+# Production WSGI server: gunicorn with the app preloaded in the master, so
+# workers fork with templates compiled and modules imported and share those
+# pages copy-on-write. Sizing, request recycling and timeouts come from the
+# SERVER_* settings in config.py.
+#
+#   python serve.py                  start the server (FLASK_CONFIG defaults to ProductionConfig)
+#   python serve.py report <pid>     RSS/PSS of a running master and its workers
+#
+# Graceful reloads: `kill -HUP <master>` starts fresh workers and lets the old
+# ones finish their requests. HUP does not re-import the preloaded app, so to
+# deploy new code start a second master next to the old one with `kill -USR2
+# <master>`, then retire the old workers with `kill -WINCH <old master>` and
+# the old master itself with `kill -QUIT <old master>`.
+config_name = os.getenv('FLASK_CONFIG', 'config.ProductionConfig')
+
+
+def post_fork(server, worker):
+    dispose_engines(server.app.application)
+
+
+def post_worker_init(worker):
+    memory = process_memory(os.getpid())
+    if memory:
+        worker.log.info(f"Worker {os.getpid()} ready: RSS {memory['rss'] / 1024:.1f} MiB, "
+                        f"shared {memory['shared'] / 1024:.1f} MiB, private {memory['private'] / 1024:.1f} MiB")
+
+
+def when_ready(server):
+    app = server.app
+    server.log.info(f"App preloaded in {app.load_seconds * 1000:.0f} ms; server ready "
+                    f"{time.perf_counter() - app.started:.2f} s after start with "
+                    f"{server.cfg.workers} workers x {server.cfg.threads} threads")
+
+
+def main():
+    from gunicorn.app.base import BaseApplication
+
+    class Server(BaseApplication):
+        def __init__(self):
+            self.started = time.perf_counter()
+            self.application = create_app(config_name)
+            # Move everything allocated so far out of the collector's reach, so
+            # collections in the workers do not write to (and un-share) these pages
+            gc.freeze()
+            self.load_seconds = time.perf_counter() - self.started
+            super().__init__()
+
+        def load_config(self):
+            options = gunicorn_options(self.application.config)
+            options.update(post_fork=post_fork, post_worker_init=post_worker_init, when_ready=when_ready)
+            for key, value in options.items():
+                self.cfg.set(key, value)
+
+        def load(self):
+            return self.application
+
+    Server().run()
+
+
+if __name__ == '__main__':
+    if sys.argv[1:2] == ['report']:
+        print(format_memory_report(memory_report(int(sys.argv[2]))))
+    else:
+        main()
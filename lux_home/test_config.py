@@ -14,3 +14,8 @@ class TestConfig:
     # SERVER_NAME = 'localhost.localdomain' # Can be needed for url_for in some test contexts without live server
     # APPLICATION_ROOT = '/'
     # PREFERRED_URL_SCHEME = 'http'
+
+
+class ShardTestConfig(TestConfig):
+    """TestConfig plus one extra shard database bound under the 'east' key."""
+    SQLALCHEMY_BINDS = {'east': 'sqlite:///:memory:'}
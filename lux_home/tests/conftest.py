@@ -1,5 +1,6 @@
 import pytest
 from app import create_app, db as _db # Renamed to _db to avoid conflict
+from app.sharding import create_property_schema
 
 @pytest.fixture(scope='session')
 def app():
@@ -23,3 +24,15 @@ def db_instance(app): # Renamed from 'db' to avoid fixture name conflict if 'db'
         yield _db
         _db.session.remove()
         _db.drop_all()
+
+@pytest.fixture(scope='function')
+def shard_app():
+    """An app with one extra shard database bound under the 'east' key."""
+    _app = create_app(config_class_name='test_config.ShardTestConfig')
+    with _app.app_context():
+        _db.create_all()
+        create_property_schema('east')
+        yield _app
+        _db.session.remove()
+        _db.drop_all()
+    _db.metadatas.pop('east', None) # init_app registered it; the other apps have no 'east' engine
@@ -0,0 +1,106 @@
+import pytest
+from sqlalchemy import event
+from app import db as _db
+from app.sharding import property_scope
+from app.archive import archive_completed_bookings, archive_bookings, load_archived_invoice, months_before
+from app.models import Property, JobRun, Booking, Room, Guest, Invoice, Service, BookingService, RoomCharge, ArchivedBooking, ArchivedInvoice, ArchivedBookingService, ArchivedRoomCharge
+from datetime import datetime, timedelta
+
+def create_stay(db_session, room_number, check_out_date, is_active=False):
+    guest = Guest(name=f'Archive Guest {room_number}', email=f'archive.{room_number}@example.com')
+    room = Room(room_number=room_number, room_type='Standard', rate_per_night=100.0)
+    db_session.add_all([guest, room])
+    db_session.commit()
+    booking = Booking(guest_id=guest.id, room_id=room.id,
+                      check_in_date=check_out_date - timedelta(days=2),
+                      check_out_date=check_out_date, total_amount=200.0, is_active=is_active)
+    db_session.add(booking)
+    db_session.commit()
+    return booking
+
+def test_months_before_clamps_to_month_end():
+    assert months_before(datetime(2024, 3, 31), 1) == datetime(2024, 2, 29)
+    assert months_before(datetime(2024, 1, 15), 13) == datetime(2022, 12, 15)
+
+def test_archive_moves_old_stays_only(db_instance):
+    now = datetime(2024, 6, 1)
+    old = create_stay(db_instance.session, 'A1', datetime(2022, 11, 20))
+    recent = create_stay(db_instance.session, 'A2', datetime(2024, 5, 1))
+    service = Service(name='Breakfast', price=15.0)
+    db_instance.session.add(service)
+    db_instance.session.commit()
+    db_instance.session.add_all([
+        Invoice(booking_id=old.id, issue_date=old.check_out_date),
+        BookingService(booking_id=old.id, service_id=service.id, quantity=2),
+        RoomCharge(booking_id=old.id, business_date=old.check_in_date.date(), amount=100.0),
+    ])
+    db_instance.session.commit()
+    old_id, recent_id = old.id, recent.id
+
+    counts = archive_completed_bookings(months=12, batch_size=1, now=now)
+
+    assert counts == {'bookings': 1, 'invoices': 1, 'payments': 0, 'booking_services': 1, 'room_charges': 1}
+    assert Booking.query.get(old_id) is None
+    assert Booking.query.get(recent_id) is not None
+    assert Invoice.query.count() == 0
+    archived = ArchivedBooking.query.get(old_id)
+    assert archived.archive_month == 202211
+    assert archived.total_amount == 200.0
+    assert ArchivedBookingService.query.filter_by(booking_id=old_id).one().quantity == 2
+    assert RoomCharge.query.count() == 0
+    assert ArchivedRoomCharge.query.filter_by(booking_id=old_id).one().archive_month == 202211
+
+    # Re-running finds nothing new to move
+    assert archive_completed_bookings(months=12, now=now)['bookings'] == 0
+
+def test_active_bookings_are_never_archived(db_instance):
+    booking = create_stay(db_instance.session, 'A3', datetime(2020, 1, 1), is_active=True)
+    archive_completed_bookings(months=1, now=datetime(2024, 1, 1))
+    assert Booking.query.get(booking.id) is not None
+
+def test_archive_runs_in_every_job_scope(db_instance):
+    booking_id = create_stay(db_instance.session, 'A5', datetime(2021, 3, 3)).id
+    counts = archive_bookings(months=6, now=datetime(2024, 1, 1))
+    assert counts['bookings'] == 1 and Booking.query.get(booking_id) is None
+    run = JobRun.query.filter_by(job='archive-bookings').one()
+    assert run.rows == 1 and run.error is None
+
+def test_sharded_archive_commits_only_on_the_shard(shard_app):
+    east = Property(code='EAST', name='East Wing', bind_key='east')
+    service = Service(name='Late Checkout', price=25.0)
+    _db.session.add_all([east, service])
+    _db.session.commit()
+    east_id = east.id
+    with property_scope(east_id):
+        booking = create_stay(_db.session, 'E1', datetime(2021, 3, 3))
+        _db.session.add_all([Invoice(booking_id=booking.id, issue_date=booking.check_out_date),
+                             BookingService(booking_id=booking.id, service_id=service.id)])
+        _db.session.commit()
+
+    writes = []
+    listener = lambda conn, cursor, statement, *args: writes.append(statement.split()[0])
+    event.listen(_db.engines[None], 'before_cursor_execute', listener)
+    try:
+        with property_scope(east_id):
+            counts = archive_completed_bookings(months=6, now=datetime(2024, 1, 1))
+    finally:
+        event.remove(_db.engines[None], 'before_cursor_execute', listener)
+    assert (counts['bookings'], counts['booking_services']) == (1, 1)
+    assert not {'INSERT', 'UPDATE', 'DELETE'} & set(writes) # One transaction, on the shard only
+    shard_rows = _db.session.execute(_db.text('SELECT property_id FROM booking_service_archive'),
+                                     bind_arguments={'bind': _db.engines['east']}).scalars().all()
+    assert shard_rows == [east_id]
+
+def test_archived_invoice_lookup(db_instance):
+    booking = create_stay(db_instance.session, 'A4', datetime(2021, 3, 3))
+    db_instance.session.add(Invoice(booking_id=booking.id, issue_date=booking.check_out_date))
+    db_instance.session.commit()
+    booking_id = booking.id
+    archive_completed_bookings(months=6, now=datetime(2024, 1, 1))
+
+    archived_booking, invoice, guest, room = load_archived_invoice(booking_id)
+    assert isinstance(invoice, ArchivedInvoice)
+    assert archived_booking.id == booking_id
+    assert guest.name == 'Archive Guest A4'
+    assert room.room_number == 'A4'
+    assert load_archived_invoice(999999) is None
@@ -0,0 +1,62 @@
+import gzip
+import os
+import pytest
+from jinja2 import FileSystemBytecodeCache
+from app.assets import build_assets, fingerprint, precompile_templates, static_url, inline_asset
+
+@pytest.fixture
+def static_dir(app, tmp_path):
+    css = tmp_path / 'css'
+    css.mkdir()
+    (css / 'style.css').write_text('body { color: #555; }\n' * 50)
+    (tmp_path / 'logo.png').write_bytes(b'\x89PNG fake')
+    original = app.static_folder
+    app.static_folder = str(tmp_path)
+    yield tmp_path
+    app.static_folder = original
+    app.extensions['asset_manifest'] = {}
+
+def test_build_fingerprints_and_precompresses(static_dir):
+    manifest = build_assets(str(static_dir))
+    data = (static_dir / 'css' / 'style.css').read_bytes()
+    assert manifest['css/style.css'] == f"build/css/style.{fingerprint(data)}.css"
+    built = static_dir / manifest['css/style.css']
+    assert built.read_bytes() == data
+    assert gzip.decompress((static_dir / (manifest['css/style.css'] + '.gz')).read_bytes()) == data
+    # Binary assets are fingerprinted but not compressed
+    assert not os.path.exists(static_dir / (manifest['logo.png'] + '.gz'))
+    # Rebuilding skips the previous build output
+    assert build_assets(str(static_dir)) == manifest
+
+def test_fingerprinted_assets_are_immutable_and_precompressed(app, static_dir):
+    app.extensions['asset_manifest'] = build_assets(str(static_dir))
+    with app.test_request_context():
+        url = static_url('css/style.css')
+        assert url.startswith('/static/build/css/style.')
+        assert static_url('js/missing.js') == '/static/js/missing.js'
+    client = app.test_client()
+    response = client.get(url, headers={'Accept-Encoding': 'gzip'})
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert response.headers['Cache-Control'] == 'public, max-age=31536000, immutable'
+    assert response.mimetype == 'text/css'
+    assert gzip.decompress(response.data) == (static_dir / 'css' / 'style.css').read_bytes()
+    response.close()
+    plain = client.get(url)
+    assert 'Content-Encoding' not in plain.headers
+    assert plain.headers['Cache-Control'] == 'public, max-age=31536000, immutable'
+    plain.close()
+
+def test_precompile_fills_bytecode_cache(app, tmp_path):
+    previous = app.jinja_env.bytecode_cache
+    app.jinja_env.bytecode_cache = FileSystemBytecodeCache(str(tmp_path))
+    app.jinja_env.cache.clear()
+    try:
+        count = precompile_templates(app)
+    finally:
+        app.jinja_env.bytecode_cache = previous
+    assert count >= 4
+    assert len(os.listdir(tmp_path)) == count
+
+def test_inline_asset_reads_static_file(app):
+    with app.app_context():
+        assert '.invoice-container' in inline_asset('css/invoice.css')
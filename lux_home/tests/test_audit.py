@@ -0,0 +1,140 @@
+import json
+import pytest
+from datetime import datetime, timedelta
+from sqlalchemy import select, func
+from app import db as _db
+from app.audit import AuditWriter, table_sink, file_sink, audit_events
+from app.models import User, Room, Guest, Booking, AuditEvent
+from app.services import group_check_out
+
+@pytest.fixture
+def writer(app, db_instance):
+    """An AuditWriter without its thread: events reach audit_event only on flush()."""
+    app.extensions['audit'] = AuditWriter(table_sink(_db.engine), background=False)
+    yield app.extensions['audit']
+    app.extensions.pop('audit', None)
+
+@pytest.fixture
+def hotel(writer):
+    guest = Guest(name='Ada Stone', email='ada@example.com')
+    rooms = [Room(room_number=str(100 + i), room_type='Standard', rate_per_night=100.0) for i in range(3)]
+    _db.session.add_all([guest] + rooms)
+    _db.session.commit()
+    return guest, rooms
+
+def events_of(entity, entity_id=None):
+    return [(e['action'], e['changes']) for e in audit_events(entity=entity, entity_id=entity_id)]
+
+def test_changes_are_written_behind_with_old_and_new_values(writer, hotel):
+    guest, rooms = hotel
+    room = _db.session.get(Room, rooms[0].id) # Loaded, as in a request: the old values are known
+    room.status = 'maintenance'
+    room.rate_per_night = 120.0
+    _db.session.commit()
+    assert _db.session.scalar(select(func.count(AuditEvent.id))) == 0 # Nothing written inside the transactions
+
+    writer.flush()
+    assert writer.status()['written'] == 5 and writer.status()['queued'] == 0
+    update, insert = events_of('room', room.id)
+    assert update == ('update', {'status': ['available', 'maintenance'], 'rate_per_night_cents': [10000, 12000]})
+    assert insert[0] == 'insert' and insert[1]['room_number'] == [None, '100']
+
+    _db.session.delete(guest)
+    _db.session.commit()
+    writer.flush()
+    assert events_of('guest', guest.id)[0] == ('delete', {'id': [guest.id, None], 'name': ['Ada Stone', None],
+                                                         'email': ['ada@example.com', None]})
+
+def test_rolled_back_changes_leave_no_trail(writer, hotel):
+    _, rooms = hotel
+    writer.flush()
+    rooms[1].status = 'occupied'
+    _db.session.flush()
+    _db.session.rollback()
+    writer.flush()
+    assert [action for action, _ in events_of('room', rooms[1].id)] == ['insert']
+
+def test_check_outs_record_the_user_and_bulk_changes(app, writer, hotel):
+    guest, rooms = hotel
+    user = User(username='auditor')
+    user.set_password('secret12')
+    bookings = [Booking(guest=guest, room=room, check_in_date=datetime(2024, 5, 1, 14),
+                        check_out_date=datetime(2024, 5, 3, 11)) for room in rooms]
+    _db.session.add_all(bookings + [user])
+    _db.session.commit()
+    client = app.test_client()
+    client.post('/login', data={'username': 'auditor', 'password': 'secret12'})
+    client.post(f'/check-out/{bookings[0].id}')
+    group_check_out([bookings[1].id, bookings[2].id])
+    writer.flush()
+
+    checked_out = audit_events(entity='booking', entity_id=bookings[0].id)[0]
+    assert (checked_out['user_id'], checked_out['username']) == (user.id, 'auditor')
+    assert checked_out['changes']['is_active'] == [True, False]
+    bulk = audit_events(entity='booking', entity_id=bookings[2].id)[0] # UPDATE by primary key: one event per row
+    assert bulk['action'] == 'update' and bulk['changes']['is_active'] == [None, False]
+    statement = audit_events(entity='room', entity_id=None)
+    assert any('UPDATE room' in e['changes'].get('statement', '') for e in statement)
+
+def test_overflow_policies():
+    batches = []
+    dropping = AuditWriter(batches.append, capacity=2, background=False, overflow='drop')
+    dropping.submit([{'n': i} for i in range(5)])
+    assert dropping.status()['dropped'] == 3 and batches == []
+    dropping.flush()
+    assert batches == [[{'n': 0}, {'n': 1}]]
+
+    batches.clear()
+    syncing = AuditWriter(batches.append, capacity=2, background=False, overflow='sync')
+    syncing.submit([{'n': i} for i in range(5)])
+    assert syncing.status()['dropped'] == 0 and syncing.status()['sync_writes'] == 1 # The backlog went out with the first overflow
+    syncing.flush()
+    assert sorted(e['n'] for batch in batches for e in batch) == [0, 1, 2, 3, 4]
+
+    blocking = AuditWriter(batches.append, capacity=1, background=False, overflow='block', block_timeout=0.01)
+    blocking.submit([{'n': 0}, {'n': 1}])
+    assert blocking.status()['dropped'] == 1
+    with pytest.raises(ValueError):
+        AuditWriter(batches.append, overflow='wait')
+
+def test_background_thread_appends_json_lines(tmp_path):
+    path = tmp_path / 'audit.log'
+    writer = AuditWriter(file_sink(str(path)), batch_size=2, interval=0.01)
+    writer.submit([{'entity': 'room', 'entity_id': i, 'occurred_at': datetime(2024, 5, 1)} for i in range(5)])
+    assert writer.running
+    writer.close()
+    lines = [json.loads(line) for line in path.read_text().splitlines()]
+    assert [line['entity_id'] for line in lines] == [0, 1, 2, 3, 4]
+    assert lines[0]['occurred_at'] == '2024-05-01T00:00:00' and writer.status()['batches'] >= 3
+
+def test_query_pages_by_time_and_is_admin_only(app, writer, hotel):
+    _, rooms = hotel
+    for rate in (110.0, 120.0, 130.0):
+        rooms[0].rate_per_night = rate
+        _db.session.commit()
+    writer.flush()
+    page = audit_events(entity='room', entity_id=rooms[0].id, limit=2)
+    assert [e['changes']['rate_per_night_cents'][1] for e in page] == [13000, 12000]
+    rest = audit_events(entity='room', entity_id=rooms[0].id, before=(datetime.fromisoformat(page[-1]['occurred_at']),
+                                                                     page[-1]['id']))
+    assert [e['action'] for e in rest] == ['update', 'insert']
+    assert audit_events(since=datetime.utcnow() + timedelta(minutes=1)) == []
+    with pytest.raises(ValueError):
+        _db.session.get(AuditEvent, page[0]['id']).action = 'delete'
+        _db.session.flush()
+    _db.session.rollback()
+
+    for name, admin in (('clerk', False), ('boss', True)):
+        user = User(username=name, is_admin=admin)
+        user.set_password('secret12')
+        _db.session.add(user)
+    _db.session.commit()
+    client = app.test_client()
+    client.post('/login', data={'username': 'clerk', 'password': 'secret12'})
+    assert client.get('/admin/audit/?entity=room').status_code == 403
+    client.get('/logout')
+    client.post('/login', data={'username': 'boss', 'password': 'secret12'})
+    response = client.get(f'/admin/audit/?entity=room&entity_id={rooms[0].id}&limit=2')
+    assert response.status_code == 200 and len(response.json['events']) == 2
+    following = client.get(f"/admin/audit/?entity=room&entity_id={rooms[0].id}&before={response.json['next']}")
+    assert [e['action'] for e in following.json['events']] == ['update', 'insert']
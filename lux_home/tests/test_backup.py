@@ -0,0 +1,84 @@
+import os
+import sqlite3
+import threading
+from datetime import datetime, timedelta
+import pytest
+from app import create_app, db as _db
+from app.backup import (run_backups, backup_database, copy_sqlite, restore_backup, verify_backup, list_backups,
+                        BackupError)
+from app.models import Guest, JobRun
+from test_config import TestConfig
+
+class FileDbTestConfig(TestConfig):
+    SQLALCHEMY_DATABASE_URI = None # Set by the fixture
+    BACKUP_KEEP = 3
+    BACKUP_STEP_SLEEP = 0
+    SQLITE_WAL = True
+
+@pytest.fixture
+def file_app(tmp_path):
+    FileDbTestConfig.SQLALCHEMY_DATABASE_URI = f"sqlite:///{tmp_path / 'live.db'}"
+    FileDbTestConfig.BACKUP_DIR = str(tmp_path / 'backups')
+    _app = create_app(config_class_name='tests.test_backup.FileDbTestConfig')
+    with _app.app_context():
+        _db.create_all()
+        yield _app
+        _db.session.remove()
+        _db.drop_all()
+
+def test_backup_and_restore_round_trip(file_app):
+    _db.session.add(Guest(name='Kept Guest', email='kept@example.com'))
+    _db.session.commit()
+    [path] = run_backups()
+    assert path.endswith('.db.gz') and os.path.exists(f"{path}.sha256")
+    assert JobRun.query.filter_by(job='backup').one().rows > 0
+
+    _db.session.add(Guest(name='Later Guest', email='later@example.com'))
+    _db.session.commit()
+    restore_backup(path)
+    assert [g.email for g in Guest.query.all()] == ['kept@example.com']
+
+def test_snapshots_are_rotated(file_app):
+    directory = file_app.config['BACKUP_DIR']
+    start = datetime(2024, 5, 1)
+    paths = [backup_database('default', _db.engine, directory, now=start + timedelta(hours=i))[0] for i in range(5)]
+    assert list_backups(directory, 'default') == paths[-3:]
+    assert sorted(os.listdir(directory)) == sorted(f for p in paths[-3:] for f in (os.path.basename(p),
+                                                                                   os.path.basename(p) + '.sha256'))
+
+def test_damaged_snapshot_is_not_restored(file_app):
+    [path] = run_backups()
+    with open(path, 'r+b') as f:
+        f.seek(40)
+        f.write(b'\x00\x01\x02')
+    with pytest.raises(BackupError):
+        verify_backup(path)
+    with pytest.raises(BackupError):
+        restore_backup(path)
+
+def test_copy_finishes_while_writers_commit(file_app, tmp_path):
+    source = file_app.config['SQLALCHEMY_DATABASE_URI'].removeprefix('sqlite:///')
+    assert _db.session.execute(_db.text('PRAGMA journal_mode')).scalar() == 'wal'
+    writer = sqlite3.connect(source, timeout=10, check_same_thread=False)
+    writer.execute('CREATE TABLE filler (id INTEGER PRIMARY KEY, data BLOB)')
+    writer.executemany('INSERT INTO filler (data) VALUES (?)', [(os.urandom(2000),) for _ in range(2000)])
+    writer.commit()
+    stop, committed = threading.Event(), []
+
+    def keep_writing():
+        while not stop.is_set():
+            writer.execute('INSERT INTO filler (data) VALUES (?)', (os.urandom(2000),))
+            writer.commit()
+            committed.append(1)
+
+    thread = threading.Thread(target=keep_writing)
+    thread.start()
+    try:
+        pages, restarts = copy_sqlite(source, str(tmp_path / 'copy.db'), pages=16, step_sleep=0.001, max_restarts=2)
+    finally:
+        stop.set()
+        thread.join()
+        writer.close()
+    assert committed # Writers were never locked out for the whole copy
+    assert pages > 1000 and restarts == 0 # The WAL snapshot keeps the copy consistent without restarting
+    assert sqlite3.connect(tmp_path / 'copy.db').execute('PRAGMA integrity_check').fetchone() == ('ok',)
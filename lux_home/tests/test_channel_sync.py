@@ -0,0 +1,180 @@
+import json
+import threading
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import pytest
+from app import create_app, db as _db, channel_sync
+from app.channel_sync import (sync_availability, channel_sync_job, channel_sync_stats, get_channel_client,
+                              date_ranges, ChannelSyncError)
+from app.models import Room, Guest, Booking, ChannelSyncMark, ChannelAvailability, ChannelPush
+from app.services import group_check_out
+from test_config import TestConfig
+
+class ChannelManagerStub(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1' # Keep-alive, like the real thing
+    status = 200
+    requests = []
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers['Content-Length']))
+        ChannelManagerStub.requests.append((self.headers.get('Authorization'), json.loads(body)))
+        self.send_response(self.status)
+        self.send_header('Content-Length', '2')
+        self.end_headers()
+        self.wfile.write(b'{}')
+
+    def log_message(self, *args):
+        pass
+
+class ChannelTestConfig(TestConfig):
+    CHANNEL_SYNC_URL = None # Set by the fixture
+    CHANNEL_SYNC_TOKEN = 'secret'
+    CHANNEL_SYNC_WINDOW = 5
+    CHANNEL_SYNC_HORIZON_DAYS = 30
+    CHANNEL_SYNC_BATCH_SIZE = 2
+
+@pytest.fixture(scope='module')
+def channel_app():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), ChannelManagerStub)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    ChannelTestConfig.CHANNEL_SYNC_URL = f"http://127.0.0.1:{server.server_port}/availability"
+    _app = create_app(config_class_name='tests.test_channel_sync.ChannelTestConfig')
+    yield _app
+    server.shutdown()
+
+@pytest.fixture
+def hotel(channel_app):
+    """Two Suites whose initial full-horizon push already went out."""
+    with channel_app.app_context():
+        _db.create_all()
+        guest = Guest(name='Channel Guest', email='channel@example.com')
+        rooms = [Room(room_number=str(101 + i), room_type='Suite', rate_per_night=200.0) for i in range(2)]
+        _db.session.add_all([guest, *rooms])
+        _db.session.commit()
+        sync_availability(force=True)
+        ChannelManagerStub.requests.clear()
+        ChannelManagerStub.status = 200
+        yield guest, rooms
+        _db.session.remove()
+        _db.drop_all()
+
+def pushed_updates():
+    return [u for _, payload in ChannelManagerStub.requests for u in payload['updates']]
+
+def book(guest, room, first_night, nights):
+    today = datetime.utcnow().replace(hour=14, minute=0, second=0, microsecond=0)
+    booking = Booking(guest_id=guest.id, room_id=room.id, check_in_date=today + timedelta(days=first_night),
+                      check_out_date=today + timedelta(days=first_night + nights), is_active=False, is_reservation=True)
+    _db.session.add(booking)
+    _db.session.commit()
+    return booking
+
+def day(offset):
+    return (datetime.utcnow().date() + timedelta(days=offset)).isoformat()
+
+def test_new_rooms_publish_the_whole_horizon_as_one_range(hotel):
+    rows = ChannelAvailability.query.order_by(ChannelAvailability.date).all()
+    assert len(rows) == 30 and {row.available for row in rows} == {2}
+    assert ChannelPush.query.one().updates == 1
+    assert ChannelSyncMark.query.count() == 0
+
+def test_only_changed_cells_are_pushed(hotel):
+    guest, rooms = hotel
+    booking = book(guest, rooms[0], 10, 3)
+    assert sync_availability(force=True) == 3
+    assert pushed_updates() == [{'room_type': 'Suite', 'from': day(10), 'to': day(12), 'available': 1}]
+    auth, payload = ChannelManagerStub.requests[0]
+    assert auth == 'Bearer secret' and payload['property'] is None
+
+    ChannelManagerStub.requests.clear()
+    assert sync_availability(force=True) == 0 # Nothing changed since
+    assert ChannelManagerStub.requests == []
+
+    booking.check_in_date += timedelta(days=1) # Moved a night later: only its first and new last night differ
+    booking.check_out_date += timedelta(days=1)
+    _db.session.commit()
+    assert sync_availability(force=True) == 2
+    assert pushed_updates() == [{'room_type': 'Suite', 'from': day(10), 'to': day(10), 'available': 2},
+                                {'room_type': 'Suite', 'from': day(13), 'to': day(13), 'available': 1}]
+
+def test_bursts_wait_for_the_window(hotel):
+    guest, rooms = hotel
+    book(guest, rooms[0], 3, 1)
+    created = ChannelSyncMark.query.one().created_at
+    assert sync_availability(now=created + timedelta(seconds=1)) == 0
+    book(guest, rooms[1], 3, 1) # Arrives within the window: goes out in the same push
+    assert sync_availability(now=created + timedelta(seconds=6)) == 1
+    assert pushed_updates() == [{'room_type': 'Suite', 'from': day(3), 'to': day(3), 'available': 0}]
+
+def test_batches_share_one_keep_alive_connection(hotel):
+    guest, rooms = hotel
+    for first_night in (2, 5, 8, 11, 14):
+        book(guest, rooms[0], first_night, 1)
+    opened = get_channel_client().opened
+    assert sync_availability(force=True) == 5
+    assert [len(payload['updates']) for _, payload in ChannelManagerStub.requests] == [2, 2, 1]
+    assert get_channel_client().opened - opened <= 1
+    assert ChannelPush.query.filter(ChannelPush.error.is_(None)).count() == 4
+
+def test_marks_committed_late_with_a_lower_id_are_kept(hotel, monkeypatch):
+    guest, rooms = hotel
+    book(guest, rooms[0], 4, 1)
+    book(guest, rooms[1], 6, 1)
+    first = ChannelSyncMark.query.order_by(ChannelSyncMark.id).first()
+    late = {column: getattr(first, column) for column in
+            ('id', 'property_id', 'room_id', 'room_type', 'start_date', 'end_date', 'created_at')}
+    _db.session.delete(first)
+    _db.session.commit()
+    push_updates = channel_sync.push_updates
+
+    def push_while_another_transaction_commits(*args):
+        pushed = push_updates(*args)
+        _db.session.add(ChannelSyncMark(**late)) # Its id was taken before the marks that were read
+        _db.session.flush()
+        return pushed
+
+    monkeypatch.setattr(channel_sync, 'push_updates', push_while_another_transaction_commits)
+    sync_availability(force=True)
+    assert [mark.id for mark in ChannelSyncMark.query.all()] == [late['id']] # Left for the next sync
+
+def test_failed_push_keeps_the_marks_and_backs_off(channel_app, hotel):
+    guest, rooms = hotel
+    book(guest, rooms[0], 4, 2)
+    ChannelManagerStub.status = 500
+    with pytest.raises(ChannelSyncError, match='500'):
+        sync_availability(force=True)
+    assert ChannelSyncMark.query.count() == 1
+    assert ChannelAvailability.query.filter_by(available=1).count() == 0
+
+    later = datetime.utcnow() + timedelta(seconds=10)
+    assert channel_sync_job(now=later) == 0 # Logged, not raised
+    failures, _ = channel_app.extensions['channel_sync_backoff'][None]
+    assert failures == 1
+    channel_app.extensions['channel_sync_backoff'].clear()
+
+    ChannelManagerStub.status = 200
+    assert channel_sync_job(now=later) == 2
+    assert ChannelSyncMark.query.count() == 0
+    stats = channel_sync_stats()
+    assert stats['failures'] == 2 and stats['pushes'] == 4 and stats['pending_marks'] == 0 # The fixture's first push counts too
+    assert stats['latency_ms']['p50'] is not None and stats['payload_bytes']['max'] > 0
+
+def test_group_check_out_releases_the_remaining_nights(hotel):
+    guest, rooms = hotel
+    booking = Booking(guest_id=guest.id, room_id=rooms[1].id, check_in_date=datetime.utcnow() - timedelta(days=2))
+    _db.session.add(booking)
+    _db.session.commit()
+    sync_availability(force=True) # Open-ended stay: held to the horizon
+    assert ChannelAvailability.query.filter_by(available=1).count() == 30
+
+    ChannelManagerStub.requests.clear()
+    group_check_out([booking.id])
+    assert sync_availability(force=True) == 30
+    assert pushed_updates() == [{'room_type': 'Suite', 'from': day(0), 'to': day(29), 'available': 2}]
+
+def test_date_ranges_fold_runs_of_equal_availability():
+    start = datetime(2024, 5, 1).date()
+    cells = {start + timedelta(days=i): (available, None) for i, available in enumerate([1, 1, 0, 0, 0, 1])}
+    del cells[start + timedelta(days=1)]
+    assert [(u['from'], u['to'], u['available']) for u in date_ranges('Suite', cells)] == [
+        ('2024-05-01', '2024-05-01', 1), ('2024-05-03', '2024-05-05', 0), ('2024-05-06', '2024-05-06', 1)]
@@ -0,0 +1,74 @@
+from datetime import datetime
+from sqlalchemy import select, update
+from app import read_api
+from app.dedup import normalize_email, phone_key, soundex, match_score, find_duplicates, dedup_guests
+from app.models import Guest, Room, Booking, ArchivedBooking
+
+def test_normalizers_and_soundex():
+    assert normalize_email('  Ann.Lee+spa@Example.COM ') == 'ann.lee@example.com'
+    assert phone_key('+1 (555) 010-1234') == phone_key('555.010.1234') == '550101234'
+    assert phone_key('123') is None
+    assert soundex('Robert') == soundex('Rupert') == 'R163'
+    assert soundex('Ashcraft') == 'A261'
+    assert soundex('Tymczak') == 'T522'
+
+def test_scores_need_contact_details():
+    same_email = ('ann lee', 'ann@example.com', None)
+    assert match_score(same_email, ('anne lee', 'ann@example.com', None)) >= 0.8
+    assert match_score(('ann lee', 'ann@example.com', '550101234'), ('ann lee', 'anm@example.com', '550101234')) >= 0.8
+    assert match_score(('ann lee', 'ann@example.com', None), ('ann lee', 'other@example.com', None)) < 0.8
+
+def seed_duplicates(session):
+    guests = [
+        Guest(name='Ann Lee', email='ann.lee@example.com', phone='555 010 1234'),
+        Guest(name='ann lee', email='Ann.Lee+spa@Example.com'),              # Case and +tag
+        Guest(name='Anne Lee', email='annlee.hotel@mail.test', phone='+1 555-010-1234'), # Phone match
+        Guest(name='Ann Lee', email='someone.else@example.com'),             # Same name only
+        Guest(name='Bob Stone', email='bob@example.com'),
+    ]
+    session.add_all(guests)
+    session.add(Room(room_number='D1', room_type='Standard', rate_per_night=100.0))
+    session.commit()
+    return guests
+
+def test_find_duplicates_clusters_into_oldest(db_instance):
+    ann, case_dup, phone_dup, namesake, bob = seed_duplicates(db_instance.session)
+    assert find_duplicates() == [(ann.id, sorted([case_dup.id, phone_dup.id]))]
+
+def test_dedup_repoints_stays_and_deletes_duplicates(db_instance):
+    ann, case_dup, phone_dup, namesake, bob = [g.id for g in seed_duplicates(db_instance.session)]
+    db_instance.session.add(Booking(guest_id=case_dup, room_id=1, check_in_date=datetime(2024, 5, 1), is_active=False))
+    db_instance.session.add(ArchivedBooking(id=900, guest_id=phone_dup, room_id=1, check_in_date=datetime(2020, 1, 1),
+                                            archive_month=202001))
+    db_instance.session.commit()
+
+    stats, clusters = dedup_guests(dry_run=True)
+    assert stats == {'clusters': 1, 'merged': 2, 'bookings': 0}
+    assert db_instance.session.get(Guest, case_dup) is not None
+
+    stats, _ = dedup_guests()
+    assert stats == {'clusters': 1, 'merged': 2, 'bookings': 2}
+    remaining = db_instance.session.scalars(select(Guest.id).order_by(Guest.id)).all()
+    assert remaining == sorted([ann, namesake, bob])
+    assert db_instance.session.get(Guest, ann).phone == '555 010 1234'
+    assert set(db_instance.session.scalars(select(Booking.guest_id))) == {ann}
+    assert set(db_instance.session.scalars(select(ArchivedBooking.guest_id))) == {ann}
+
+    results = read_api.run_sync(read_api.search('lee'))['results']
+    assert {r['id'] for r in results if r['kind'] == 'guest'} == {ann, namesake}
+    assert dedup_guests()[0]['clusters'] == 0
+
+def test_case_insensitive_email_lookup_uses_the_index(db_instance):
+    db_instance.session.add(Guest(name='Ada Stone', email='Ada.Stone@Example.com'))
+    db_instance.session.commit()
+    query = select(Guest.id).where(db_instance.func.lower(Guest.email) == 'ada.stone@example.com')
+    plan = db_instance.session.execute(db_instance.text(
+        'EXPLAIN QUERY PLAN ' + str(query.compile(compile_kwargs={'literal_binds': True})))).all()
+    assert any('ix_guest_email_lower' in row[-1] for row in plan)
+    assert db_instance.session.scalar(query) is not None
+
+def test_repointing_bookings_uses_the_guest_index(db_instance):
+    query = update(Booking).where(Booking.guest_id.in_([1, 2])).values(guest_id=3)
+    plan = db_instance.session.execute(db_instance.text(
+        'EXPLAIN QUERY PLAN ' + str(query.compile(compile_kwargs={'literal_binds': True})))).all()
+    assert any('ix_booking_guest_id' in row[-1] for row in plan)
@@ -0,0 +1,90 @@
+import os
+from datetime import datetime, date, timedelta
+import pytest
+from app import forecast as forecast_module
+from app.forecast import offsets, nightly, pickup_curve, forecast, load_stay_columns, UNKNOWN
+from app.models import Room, Guest, Booking
+
+TODAY = date(2024, 6, 3)
+
+def at(day_offset, hour=14):
+    return datetime.combine(TODAY + timedelta(days=day_offset), datetime.min.time()) + timedelta(hours=hour)
+
+@pytest.fixture
+def hotel(app, db_instance, tmp_path, monkeypatch):
+    monkeypatch.setitem(app.config, 'FORECAST_CACHE_DIR', str(tmp_path / 'forecast'))
+    app.extensions.pop('forecast_columns', None)
+    app.extensions.pop('forecast_series', None)
+    rooms = [Room(room_number=str(101 + i), room_type='Standard', rate_per_night=100.0) for i in range(4)]
+    guest = Guest(name='Forecast Guest', email='forecast@example.com')
+    db_instance.session.add_all([guest, *rooms])
+    db_instance.session.commit()
+    return guest, rooms
+
+def stay(guest, room, first, nights, booked_ahead, total=None, **kwargs):
+    return Booking(guest_id=guest.id, room_id=room.id, check_in_date=at(first), check_out_date=at(first + nights, 11),
+                   created_at=at(first - booked_ahead, 9), total_amount=total, is_active=False, **kwargs)
+
+def test_nightly_totals_match_a_loop_over_stays():
+    arrive, depart = [10, 12, 8, 15], [13, 14, 20, 16]
+    expected = [sum(1 for a, d in zip(arrive, depart) if a <= day < d) for day in range(9, 18)]
+    first, last = offsets(arrive, 9, 9), offsets(depart, 9, 9)
+    assert nightly(first, last, 9) == expected
+    assert nightly(first, last, 9, [1.0, 2.0, 0.5, 4.0])[4] == 2.0 + 0.5 # Day 13: the first stay has left
+
+def test_pickup_curve_counts_nights_by_lead_time():
+    # One 2-night stay booked 3 days ahead (leads 3 and 4), one night booked the same day; one unknown
+    curve = pickup_curve([10, 20, 30], [12, 21, 31], [7, 20, UNKNOWN], 0, 40, 10)
+    assert curve[0] == 1.0 and curve[1] == pytest.approx(2 / 3) and curve[4] == pytest.approx(1 / 3)
+    assert curve[5] == 0.0 and len(curve) == 11
+    assert pickup_curve([10], [11], [UNKNOWN], 0, 40, 10) is None
+
+def test_forecast_blends_pickup_and_seasonal_baseline(app, hotel, db_instance, monkeypatch):
+    monkeypatch.setitem(app.config, 'FORECAST_PICKUP_WINDOW_DAYS', 300)
+    guest, rooms = hotel
+    history = []
+    for week in range(1, 60): # Past Mondays: 3 of 4 rooms at 120, half booked 14 days ahead, half 3 days ahead
+        history += [stay(guest, room, -7 * week, 1, 14 if week % 2 else 3, total=120.0) for room in rooms[:3]]
+    for room in rooms[:2]: # 20 days out, a year ago (outside the pickup window): two rooms
+        history.append(stay(guest, room, 20 - 364, 1, 30))
+    db_instance.session.add_all(history)
+    db_instance.session.add(stay(guest, rooms[0], 7, 1, 10, is_reservation=True)) # On the books for next Monday
+    db_instance.session.commit()
+
+    result = forecast(days=30, today=TODAY)
+    assert result['capacity'] == 4
+    assert result['pickup'] == {'0': 1.0, '7': 0.5, '14': 0.5, '30': 0.0, '60': 0.0, '90': 0.0}
+    days = {d['date']: d for d in result['days']}
+    monday = days[(TODAY + timedelta(days=7)).isoformat()]
+    # Half of a Monday is usually booked a week out: 1 / 0.5 rooms, blended equally with last year's 3
+    assert monday['on_the_books'] == 1 and monday['rooms'] == 2.5
+    assert monday['adr'] == 100.0 and monday['revpar'] == 62.5
+    far = days[(TODAY + timedelta(days=20)).isoformat()]
+    assert far['on_the_books'] == 0 and far['rooms'] == 2.0 # Nothing is booked that far ahead: the baseline
+    assert far['occupancy'] == 0.5 and far['adr'] == 100.0
+    quiet = days[(TODAY + timedelta(days=1)).isoformat()]
+    assert quiet['rooms'] == 0 and quiet['adr'] is None
+
+def test_stay_columns_are_cached_on_disk_by_data_version(app, hotel, db_instance, monkeypatch):
+    guest, rooms = hotel
+    db_instance.session.add(stay(guest, rooms[0], 5, 3, 20, total=330.0))
+    db_instance.session.commit()
+    _, columns = load_stay_columns()
+    assert list(columns['rate']) == [11000] and list(columns['booked']) == [at(-15).toordinal()]
+    [entry] = os.listdir(app.config['FORECAST_CACHE_DIR'])
+    assert sorted(os.listdir(os.path.join(app.config['FORECAST_CACHE_DIR'], entry))) == [
+        'arrive.i', 'booked.i', 'depart.i', 'manifest.json', 'rate.q']
+
+    def no_query():
+        raise AssertionError('stays were queried again')
+    stay_columns = forecast_module.stay_columns
+    monkeypatch.setattr(forecast_module, 'stay_columns', no_query)
+    app.extensions.pop('forecast_columns') # A fresh worker: served from the files
+    assert load_stay_columns()[1]['arrive'] == columns['arrive']
+
+    monkeypatch.setattr(forecast_module, 'stay_columns', stay_columns)
+    db_instance.session.add(stay(guest, rooms[1], 6, 1, 2))
+    db_instance.session.commit()
+    assert len(load_stay_columns()[1]['arrive']) == 2
+    [newer] = os.listdir(app.config['FORECAST_CACHE_DIR']) # The old version is dropped
+    assert newer != entry
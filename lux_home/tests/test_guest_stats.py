@@ -0,0 +1,106 @@
+import pytest
+from datetime import datetime
+from sqlalchemy import select, event
+from app import db as _db, read_api
+from app.models import User, Guest, GuestStats, Room, Booking, ArchivedBooking
+from app.guest_stats import record_stays, merge_stats, rebuild_guest_stats
+from app.services import group_check_out
+
+def stats_of(guest_id):
+    row = _db.session.execute(select(GuestStats.stays, GuestStats.nights, GuestStats.revenue_cents,
+                                     GuestStats.first_stay_at, GuestStats.last_stay_at)
+                              .where(GuestStats.guest_id == guest_id)).one_or_none()
+    return tuple(row) if row else None
+
+def all_stats():
+    return {row.guest_id: (row.stays, row.nights, row.revenue_cents, row.first_stay_at, row.last_stay_at)
+            for row in _db.session.execute(select(GuestStats)).scalars()}
+
+@pytest.fixture
+def hotel(db_instance):
+    guests = [Guest(name='Ada Stone', email='ada@example.com'), Guest(name='Ben Hill', email='ben@example.com'),
+              Guest(name='Cy Moss', email='cy@example.com')]
+    rooms = [Room(room_number=str(100 + i), room_type='Standard', rate_per_night=100.0) for i in range(3)]
+    _db.session.add_all(guests + rooms)
+    _db.session.commit()
+    return guests, rooms
+
+def test_stays_are_added_up_per_guest(hotel):
+    (ada, ben, _), _ = hotel
+    record_stays([(ada.id, datetime(2024, 3, 1, 14), datetime(2024, 3, 4, 11), 30000),
+                  (ben.id, datetime(2024, 3, 2, 14), datetime(2024, 3, 2, 18), None)]) # Same-day stay: one night
+    record_stays([(ada.id, datetime(2023, 12, 30), datetime(2024, 1, 2), 45000)])
+    _db.session.commit()
+    assert stats_of(ada.id) == (2, 5, 75000, datetime(2023, 12, 30), datetime(2024, 3, 4, 11))
+    assert stats_of(ben.id) == (1, 1, 0, datetime(2024, 3, 2, 14), datetime(2024, 3, 2, 18))
+
+def test_check_outs_keep_stats_equal_to_a_rebuild(app, hotel):
+    (ada, ben, cy), rooms = hotel
+    user = User(username='stats_user')
+    user.set_password('secret12')
+    bookings = [Booking(guest=ada, room=rooms[0], check_in_date=datetime(2024, 5, 1, 14),
+                        check_out_date=datetime(2024, 5, 3, 11)),
+                Booking(guest=ben, room=rooms[1], check_in_date=datetime(2024, 5, 1, 14),
+                        check_out_date=datetime(2024, 5, 4, 11), total_amount=250.0),
+                Booking(guest=ada, room=rooms[2], check_in_date=datetime(2024, 5, 2, 14),
+                        check_out_date=datetime(2024, 5, 3, 11))]
+    _db.session.add_all(bookings + [user, ArchivedBooking(id=900, guest_id=cy.id, room_id=rooms[0].id,
+                                                          check_in_date=datetime(2020, 1, 1),
+                                                          check_out_date=datetime(2020, 1, 5),
+                                                          total_amount_cents=40000, archive_month=202001)])
+    _db.session.commit()
+
+    client = app.test_client()
+    client.post('/login', data={'username': 'stats_user', 'password': 'secret12'})
+    client.post(f'/check-out/{bookings[0].id}')
+    group_check_out([bookings[1].id, bookings[2].id])
+    _db.session.expire_all()
+    assert stats_of(ada.id) == (2, 2, 20000, datetime(2024, 5, 1, 14), datetime(2024, 5, 3, 11))
+    assert stats_of(ben.id) == (1, 2, 25000, datetime(2024, 5, 1, 14), datetime(2024, 5, 4, 11))
+    assert stats_of(cy.id) is None # Archived before stats existed; only the rebuild sees it
+
+    incremental = all_stats()
+    assert rebuild_guest_stats() == 3
+    rebuilt = all_stats()
+    assert rebuilt.pop(cy.id) == (1, 4, 40000, datetime(2020, 1, 1), datetime(2020, 1, 5))
+    assert rebuilt == incremental
+
+def test_rebuild_locks_the_stats_before_reading_stays(hotel, db_instance):
+    (ada, _, _), rooms = hotel
+    _db.session.add(Booking(guest=ada, room=rooms[0], check_in_date=datetime(2024, 5, 1, 14),
+                            check_out_date=datetime(2024, 5, 3, 11), is_active=False))
+    _db.session.commit()
+    statements = []
+    listener = lambda conn, cursor, statement, *args: statements.append(' '.join(statement.split()[:3]))
+    event.listen(db_instance.engine, 'before_cursor_execute', listener)
+    try:
+        assert rebuild_guest_stats() == 1
+    finally:
+        event.remove(db_instance.engine, 'before_cursor_execute', listener)
+    # SQLite: the DELETE takes the write lock, so a check-out's upsert waits for the rebuild to commit
+    assert statements[0] == 'DELETE FROM guest_stats'
+    assert statements.index('INSERT INTO guest_stats') > max(i for i, s in enumerate(statements) if 'booking' in s)
+
+def test_merging_duplicates_folds_their_stats(hotel):
+    (ada, ben, cy), _ = hotel
+    record_stays([(ada.id, datetime(2024, 3, 1), datetime(2024, 3, 3), 20000),
+                  (ben.id, datetime(2022, 6, 1), datetime(2022, 6, 2), 9000),
+                  (cy.id, datetime(2024, 8, 1), datetime(2024, 8, 4), 36000)])
+    merge_stats([(ada.id, [ben.id, cy.id])])
+    _db.session.commit()
+    assert all_stats() == {ada.id: (3, 6, 65000, datetime(2022, 6, 1), datetime(2024, 8, 4))}
+
+def test_top_guests_and_profile_read_the_stats(hotel):
+    (ada, ben, cy), _ = hotel
+    record_stays([(ada.id, datetime(2024, 3, 1), datetime(2024, 3, 3), 20000),
+                  (ben.id, datetime(2024, 3, 1), datetime(2024, 3, 5), 48000),
+                  (ben.id, datetime(2024, 4, 1), datetime(2024, 4, 2), 12000)])
+    _db.session.commit()
+    top = read_api.run_sync(read_api.top_guests(5))['guests']
+    assert [(g['name'], g['stays'], g['revenue']) for g in top] == [('Ben Hill', 2, 600.0), ('Ada Stone', 1, 200.0)]
+    assert read_api.run_sync(read_api.top_guests(1))['guests'][0]['id'] == ben.id
+
+    profile = read_api.run_sync(read_api.guest_profile(ben.id))
+    assert profile['nights'] == 5 and profile['last_stay_at'] == '2024-04-02T00:00:00'
+    assert read_api.run_sync(read_api.guest_profile(cy.id))['stays'] == 0 # No completed stay yet
+    assert read_api.run_sync(read_api.guest_profile(9999)) is None
@@ -0,0 +1,105 @@
+import csv
+import json
+import pytest
+from sqlalchemy import select, event
+from app import read_api
+from app.importer import COLUMNS, parse_columns, import_legacy, secondary_indexes, LegacyImportError
+from app.models import Guest, Room, Booking, Invoice, Payment
+from app.search import search_index
+
+def write_exports(directory):
+    with open(directory / 'guests.csv', 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['id', 'name', 'email', 'phone'])
+        writer.writerows([[1, 'Ann Lee', 'Ann@Example.com', '555 0100'],
+                          [2, 'Bob Stone', 'bob@example.com', ''],
+                          [3, 'Ann Lee', 'ann@example.com', ''], # Same email as guest 1
+                          [4, 'No Email', '', '']])
+    with open(directory / 'rooms.jsonl', 'w') as f:
+        for room in [{'id': 10, 'room_number': '101', 'room_type': 'Standard', 'rate_per_night': '99.50'},
+                     {'id': 11, 'room_number': '102', 'room_type': 'Suite', 'rate_per_night': 250, 'status': 'maintenance'},
+                     {'id': 12, 'room_number': '103', 'room_type': 'Suite', 'rate_per_night': 'call us'}]:
+            f.write(json.dumps(room) + '\n')
+    with open(directory / 'bookings.csv', 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['id', 'guest_id', 'guest_email', 'room_id', 'room_number', 'check_in_date', 'check_out_date',
+                         'total_amount'])
+        writer.writerows([[100, 1, '', 10, '', '2023-03-01', '2023-03-04', '298.50'],
+                          [101, 3, '', '', '102', '2023-04-01 14:00:00', '', ''], # Legacy guest 3 is guest 1
+                          [102, '', 'bob@example.com', 10, '', '2023-05-02', '2023-05-01', '10'],
+                          [103, 9, '', 10, '', '2023-06-01', '2023-06-02', '10']])
+    with open(directory / 'invoices.json', 'w') as f:
+        json.dump([{'id': 500, 'booking_id': 100, 'issue_date': '2023-03-04', 'amount_paid': '298.50'},
+                   {'id': 501, 'booking_id': 102, 'amount_paid': 10}], f)
+
+def test_columns_are_parsed_and_checked_together():
+    chunk = [{'id': '1', 'name': ' Ann ', 'email': 'ANN@example.com'},
+             {'id': 'x', 'name': 'Bob', 'email': 'bob@example.com'},
+             {'id': '3', 'name': '', 'email': 'not-an-email'}]
+    columns, errors = parse_columns(chunk, COLUMNS['guests'])
+    assert columns['id'] == [1, None, 3]
+    assert columns['name'] == ['Ann', 'Bob', None]
+    assert columns['email'][0] == 'ann@example.com'
+    assert sorted(errors) == [1, 2]
+    assert errors[1].startswith("id 'x'") and errors[2] == 'name is missing' # The first problem of a row
+
+def test_import_resolves_keys_and_reports_rejects(db_instance, tmp_path):
+    write_exports(tmp_path)
+    run = import_legacy(str(tmp_path), chunk_size=2, rejects_path=str(tmp_path / 'rejects.csv'))
+    assert run.stats['guests'] == {'read': 4, 'inserted': 2, 'matched': 1, 'rejected': 1}
+    assert run.stats['rooms']['inserted'] == 2 and run.stats['rooms']['rejected'] == 1
+    assert run.stats['bookings']['inserted'] == 2 and run.stats['bookings']['rejected'] == 2
+    assert run.stats['invoices']['inserted'] == 1 and run.stats['invoices']['payments'] == 1
+
+    ann = Guest.query.filter_by(email='ann@example.com').one()
+    first, second = Booking.query.order_by(Booking.check_in_date).all()
+    assert first.guest_id == second.guest_id == ann.id
+    assert first.room_id == Room.query.filter_by(room_number='101').one().id and first.total_amount_cents == 29850
+    assert first.is_active is False and second.is_active is True # No check-out yet: in house
+    invoice = Invoice.query.one()
+    assert (invoice.booking_id, invoice.amount_paid_cents, invoice.payment_status) == (first.id, 29850, 'paid')
+    assert Payment.query.one().amount_cents == 29850
+
+    with open(tmp_path / 'rejects.csv') as f:
+        rejects = {(row['table'], row['row']): row['reason'] for row in csv.DictReader(f)}
+    assert rejects[('guests', '4')] == 'email is missing'
+    assert rejects[('bookings', '3')] == 'check_out_date is before check_in_date'
+    assert rejects[('bookings', '4')] == 'unknown guest'
+    assert rejects[('invoices', '2')] == 'booking 102 was not imported'
+
+    # Indexes are back, and the new rows are searchable
+    names = set(db_instance.session.scalars(db_instance.text("SELECT name FROM sqlite_master WHERE type = 'index'")))
+    assert {index.name for index in secondary_indexes(Booking.__table__)} <= names
+    assert db_instance.session.execute(select(search_index.c.ref_id).where(search_index.c.kind == 'stay')).all()
+    results = read_api.run_sync(read_api.search('stone'))['results']
+    assert [(r['kind'], r['id']) for r in results] == [('guest', Guest.query.filter_by(email='bob@example.com').one().id)]
+
+def test_rerunning_an_import_matches_instead_of_duplicating(db_instance, tmp_path):
+    write_exports(tmp_path)
+    import_legacy(str(tmp_path))
+    statements = []
+    listener = lambda conn, cursor, statement, *args: statements.append(statement)
+    event.listen(db_instance.engine, 'before_cursor_execute', listener)
+    try:
+        run = import_legacy(str(tmp_path))
+    finally:
+        event.remove(db_instance.engine, 'before_cursor_execute', listener)
+    assert not any(s.startswith('DROP INDEX') for s in statements) # The tables hold rows now: indexes stay
+    assert sum(stats['inserted'] for stats in run.stats.values()) == 0
+    assert run.stats['bookings']['matched'] == 2 and run.stats['invoices']['matched'] == 1
+    assert (Guest.query.count(), Booking.query.count(), Payment.query.count()) == (2, 2, 1)
+
+def test_failed_import_leaves_nothing_behind(db_instance, tmp_path):
+    write_exports(tmp_path)
+    with open(tmp_path / 'invoices.json', 'w') as f:
+        f.write('[{"booking_id": 100}, 5]')
+    with pytest.raises(LegacyImportError, match='record 2 is not an object'):
+        import_legacy(str(tmp_path))
+    assert Guest.query.count() == 0 and Booking.query.count() == 0
+
+def test_cli_reports_rows_per_second(app, db_instance, tmp_path):
+    write_exports(tmp_path)
+    result = app.test_cli_runner().invoke(args=['import-legacy', str(tmp_path), '--dry-run'])
+    assert result.exit_code == 0, result.output
+    assert 'rows/s' in result.output and 'rolled back' in result.output and '5 rows rejected' in result.output
+    assert Guest.query.count() == 0
@@ -0,0 +1,83 @@
+import re
+import zlib
+from datetime import datetime, timedelta
+from app.invoice_pdf import NativePdfRenderer, WeasyPrintRenderer, make_renderer, get_invoice_renderer
+from app.models import Guest, Room, Booking, Invoice, Payment
+
+def streams(pdf):
+    return [zlib.decompress(data) for data in re.findall(rb'stream\n(.*?)\nendstream', pdf, re.S)]
+
+def create_invoice(db_session, payments=0):
+    guest = Guest(name='Zoë Ngô', email='zoe@example.com', phone='555 0100')
+    room = Room(room_number='P1', room_type='Suite (Sea)', rate_per_night=150.0)
+    db_session.add_all([guest, room])
+    db_session.commit()
+    booking = Booking(guest_id=guest.id, room_id=room.id, check_in_date=datetime(2024, 5, 1, 14),
+                      check_out_date=datetime(2024, 5, 3, 11), is_active=False, total_amount=300.0)
+    db_session.add(booking)
+    db_session.commit()
+    invoice = Invoice(booking_id=booking.id, issue_date=datetime(2024, 5, 3), due_date=datetime(2024, 5, 18))
+    db_session.add(invoice)
+    db_session.commit()
+    for i in range(payments):
+        db_session.add(Payment(invoice_id=invoice.id, amount=10.0, method='card', posted_at=datetime(2024, 5, 3) + timedelta(minutes=i)))
+    db_session.commit()
+    return dict(booking=booking, invoice=invoice, guest=guest, room=room, duration_days=2, balance_due=300.0)
+
+def test_native_renderer_draws_invoice_fields(db_instance):
+    context = create_invoice(db_instance.session)
+    pdf = NativePdfRenderer().render(context)
+    assert pdf.startswith(b'%PDF-1.4') and pdf.rstrip().endswith(b'%%EOF')
+    assert b'/BaseFont /Helvetica-Bold' in pdf
+    content = streams(pdf)[0]
+    for text in [b'(INVOICE)', f"(#{context['invoice'].id})".encode(), '(Zoë Ngô)'.encode('cp1252'),
+                 b'(Suite \\(Sea\\))', b'($300.00)', b'(2024-05-01 14:00)', b'(Payment Status: pending)']:
+        assert text in content
+
+def test_native_renderer_summarises_payments_beyond_one_page(db_instance):
+    context = create_invoice(db_instance.session, payments=20)
+    content = streams(NativePdfRenderer().render(context))[0]
+    assert content.count(b'(card)') == NativePdfRenderer.MAX_PAYMENT_ROWS - 1
+    assert b'(... and 7 more payment\\(s\\))' in content
+    assert b'($70.00)' in content
+
+def test_embedded_font_is_subset_and_cached(db_instance, tmp_path):
+    from fontTools.fontBuilder import FontBuilder
+    from fontTools.pens.ttGlyphPen import TTGlyphPen
+    chars = 'INVOCEZoëNgô#$0123456789.'
+    names = ['.notdef'] + [f"g{i}" for i in range(len(chars))]
+    pen = TTGlyphPen(None)
+    pen.moveTo((0, 0)); pen.lineTo((0, 500)); pen.lineTo((400, 500)); pen.closePath()
+    builder = FontBuilder(1000, isTTF=True)
+    builder.setupGlyphOrder(names)
+    builder.setupCharacterMap({ord(c): f"g{i}" for i, c in enumerate(chars)})
+    builder.setupGlyf({name: pen.glyph() for name in names})
+    builder.setupHorizontalMetrics({name: (500, 0) for name in names})
+    builder.setupHorizontalHeader(ascent=800, descent=-200)
+    builder.setupNameTable({'familyName': 'Tiny', 'styleName': 'Regular', 'psName': 'Tiny-Regular'})
+    builder.setupOS2()
+    builder.setupPost()
+    builder.save(tmp_path / 'tiny.ttf')
+
+    context = create_invoice(db_instance.session)
+    renderer = NativePdfRenderer(str(tmp_path / 'tiny.ttf'))
+    pdf = renderer.render(context)
+    assert re.search(rb'/BaseFont /[A-Z]{6}\+Tiny-Regular', pdf)
+    assert b'/FontFile2' in pdf and b'/ToUnicode' in pdf
+    assert b'2 Tr' in streams(pdf)[0] # No bold face given: bold is drawn stroked
+    assert renderer.regular.encode('Zoë') == b'<000700080009>'
+    assert renderer.render(context) == pdf # The subset is cached per process, so output is stable
+
+def test_backend_selected_by_config(app):
+    assert isinstance(make_renderer({}), WeasyPrintRenderer) # No Unicode font configured: keep HTML/CSS
+    assert isinstance(make_renderer({'INVOICE_PDF_BACKEND': 'native'}), NativePdfRenderer)
+    assert isinstance(make_renderer({'INVOICE_PDF_BACKEND': 'weasyprint'}), WeasyPrintRenderer)
+    app.config['INVOICE_PDF_BACKEND'] = 'weasyprint'
+    try:
+        with app.app_context():
+            app.extensions.pop('invoice_renderer', None)
+            assert isinstance(get_invoice_renderer(), WeasyPrintRenderer)
+            assert get_invoice_renderer() is get_invoice_renderer()
+    finally:
+        app.config.pop('INVOICE_PDF_BACKEND')
+        app.extensions.pop('invoice_renderer', None)
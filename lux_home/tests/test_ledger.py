@@ -0,0 +1,91 @@
+import pytest
+from app.ledger import post_payment, paid_to_date_cents, outstanding_balance_cents, take_balance_snapshots, receivables_aging
+from app.models import Booking, Room, Guest, Invoice, Payment, BalanceSnapshot
+from datetime import datetime, timedelta
+
+def create_invoice(db_session, total, due_date=None, suffix=''):
+    guest = Guest(name='Ledger Guest', email=f'ledger.guest{suffix}@example.com')
+    room = Room(room_number=f'L{suffix}', room_type='Standard', rate_per_night=100.0)
+    db_session.add_all([guest, room])
+    db_session.commit()
+    booking = Booking(guest_id=guest.id, room_id=room.id, check_in_date=datetime(2024, 1, 1),
+                      check_out_date=datetime(2024, 1, 3), total_amount=total, is_active=False)
+    db_session.add(booking)
+    db_session.commit()
+    invoice = Invoice(booking_id=booking.id, issue_date=datetime(2024, 1, 3), due_date=due_date)
+    db_session.add(invoice)
+    db_session.commit()
+    return invoice
+
+def test_payments_accumulate_and_settle_invoice(db_instance):
+    invoice = create_invoice(db_instance.session, 200.00)
+    post_payment(invoice.id, 120.00, method='card')
+    assert invoice.payment_status == 'pending'
+    post_payment(invoice.id, 80.00, method='cash')
+    assert invoice.amount_paid == 200.00
+    assert invoice.payment_status == 'paid'
+    assert outstanding_balance_cents(invoice.id) == 0
+
+    # A refund reopens the invoice
+    post_payment(invoice.id, -50.00, method='card', reference='refund')
+    assert invoice.payment_status == 'pending'
+    assert outstanding_balance_cents(invoice.id) == 5000
+
+def test_snapshots_stop_below_recent_payments(db_instance):
+    first = create_invoice(db_instance.session, 500.00, suffix='a')
+    second = create_invoice(db_instance.session, 500.00, suffix='b')
+    now = datetime.utcnow()
+    old = Payment(invoice_id=first.id, amount=10.00, posted_at=now - timedelta(hours=1))
+    recent = Payment(invoice_id=second.id, amount=20.00, posted_at=now)
+    late = Payment(invoice_id=first.id, amount=30.00, posted_at=now - timedelta(hours=1)) # Higher id, older stamp
+    db_instance.session.add_all([old, recent, late])
+    db_instance.session.commit()
+    assert take_balance_snapshots(now=now) == 1 # Only the payment below the first recent id
+    assert BalanceSnapshot.query.one().last_payment_id == old.id
+    assert paid_to_date_cents(first.id) == 4000 and paid_to_date_cents(second.id) == 2000
+
+def test_payment_without_a_total_leaves_status_alone(db_instance):
+    invoice = create_invoice(db_instance.session, None)
+    post_payment(invoice.id, 50.00)
+    assert invoice.payment_status == 'pending'
+
+def test_payments_are_append_only(db_instance):
+    invoice = create_invoice(db_instance.session, 100.00)
+    payment = post_payment(invoice.id, 10.00)
+    payment.amount = 20.00
+    with pytest.raises(ValueError):
+        db_instance.session.commit()
+    db_instance.session.rollback()
+    with pytest.raises(ValueError):
+        post_payment(invoice.id, 0)
+
+def test_snapshot_plus_tail_matches_full_sum(db_instance):
+    invoice = create_invoice(db_instance.session, 500.00)
+    for amount in (10.00, 20.00, 30.00):
+        post_payment(invoice.id, amount)
+    assert take_balance_snapshots() == 0 # Within BALANCE_SNAPSHOT_LAG: lower ids may still be committing
+    later = datetime.utcnow() + timedelta(minutes=10)
+    assert take_balance_snapshots(now=later) == 1
+    snapshot = BalanceSnapshot.query.filter_by(invoice_id=invoice.id).one()
+    assert snapshot.paid_cents == 6000
+
+    post_payment(invoice.id, 40.00) # Tail after the snapshot
+    assert paid_to_date_cents(invoice.id) == 10000
+    assert take_balance_snapshots(now=later) == 1
+    assert take_balance_snapshots(now=later) == 0 # Nothing new
+    assert BalanceSnapshot.query.filter_by(invoice_id=invoice.id).one().paid_cents == 10000
+
+def test_receivables_aging_buckets(db_instance):
+    as_of = datetime(2024, 6, 1)
+    current = create_invoice(db_instance.session, 100.00, due_date=as_of + timedelta(days=5), suffix='1')
+    late = create_invoice(db_instance.session, 200.00, due_date=as_of - timedelta(days=45), suffix='2')
+    ancient = create_invoice(db_instance.session, 300.00, due_date=as_of - timedelta(days=200), suffix='3')
+    settled = create_invoice(db_instance.session, 50.00, due_date=as_of - timedelta(days=10), suffix='4')
+    post_payment(late.id, 75.00)
+    post_payment(settled.id, 50.00)
+
+    report = receivables_aging(as_of=as_of)
+    assert report['current'] == {'invoices': 1, 'outstanding': 100.00}
+    assert report['31-60'] == {'invoices': 1, 'outstanding': 125.00}
+    assert report['90+'] == {'invoices': 1, 'outstanding': 300.00}
+    assert report['1-30'] == {'invoices': 0, 'outstanding': 0.0}
@@ -0,0 +1,34 @@
+import pytest
+from sqlalchemy import create_engine, text
+from app.money import to_cents, from_cents, migrate_money_columns
+from app.models import Room, Booking
+
+def test_to_cents_rounds_half_up_without_float_drift():
+    assert to_cents(0.1 + 0.2) == 30
+    assert to_cents(2.675) == 268 # round(2.675, 2) == 2.67 with floats
+    assert to_cents('19.99') == 1999
+    assert to_cents(None) is None
+    assert from_cents(1999) == 19.99
+
+def test_money_properties_store_cents(db_instance):
+    room = Room(room_number='M1', room_type='Standard', rate_per_night=99.99)
+    db_instance.session.add(room)
+    db_instance.session.commit()
+    assert room.rate_per_night_cents == 9999
+    assert room.rate_per_night == 99.99
+    # The hybrid also works inside queries
+    assert Room.query.filter(Room.rate_per_night > 99.98).count() == 1
+
+def test_migrate_money_columns_backfills_and_is_rerunnable():
+    engine = create_engine('sqlite:///:memory:')
+    with engine.begin() as conn:
+        conn.execute(text('CREATE TABLE room (id INTEGER PRIMARY KEY, room_number VARCHAR(50), rate_per_night FLOAT NOT NULL)'))
+        conn.execute(text('CREATE TABLE booking (id INTEGER PRIMARY KEY, total_amount FLOAT)'))
+        conn.execute(text("INSERT INTO room VALUES (1, '101', 120.5), (2, '102', 0.29)"))
+        conn.execute(text('INSERT INTO booking VALUES (1, 241.0), (2, NULL)'))
+
+    assert migrate_money_columns(engine) == ['room.rate_per_night', 'booking.total_amount']
+    with engine.connect() as conn:
+        assert conn.execute(text('SELECT rate_per_night_cents FROM room ORDER BY id')).scalars().all() == [12050, 29]
+        assert conn.execute(text('SELECT total_amount_cents FROM booking ORDER BY id')).scalars().all() == [24100, None]
+    assert migrate_money_columns(engine) == []
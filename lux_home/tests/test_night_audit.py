@@ -0,0 +1,76 @@
+from datetime import date, datetime
+import pytest
+from app.night_audit import run_night_audit, current_business_date, audit_summary, night_audit, in_house_balance
+from app.models import Booking, Room, Guest, RoomCharge, NightAudit, JobRun
+from app.services import group_check_out
+
+NOW = datetime(2024, 5, 3, 23, 30)
+
+def seed_house(db_session):
+    guest = Guest(name='Audit Guest', email='audit@example.com')
+    rooms = [Room(room_number=f'N{i}', room_type='Standard', rate_per_night=100.0 + i * 20) for i in range(4)]
+    db_session.add_all([guest, *rooms])
+    db_session.commit()
+    stays = [
+        Booking(guest_id=guest.id, room_id=rooms[0].id, check_in_date=datetime(2024, 5, 1, 15)),  # In house
+        Booking(guest_id=guest.id, room_id=rooms[1].id, check_in_date=datetime(2024, 5, 3, 18)),  # Arrived today
+        Booking(guest_id=guest.id, room_id=rooms[2].id, check_in_date=datetime(2024, 5, 1, 15),  # Left today
+                check_out_date=datetime(2024, 5, 3, 10), is_active=False),
+        Booking(guest_id=guest.id, room_id=rooms[3].id, check_in_date=datetime(2024, 5, 8),  # Future reservation
+                is_active=False, is_reservation=True),
+    ]
+    db_session.add_all(stays)
+    db_session.commit()
+    return stays
+
+def test_audit_posts_one_charge_per_in_house_stay(db_instance):
+    in_house, arrival, departed, reservation = seed_house(db_instance.session)
+
+    audit = run_night_audit(date(2024, 5, 3), now=NOW)
+
+    charges = {c.booking_id: c.amount_cents for c in RoomCharge.query.all()}
+    assert charges == {in_house.id: 10000, arrival.id: 12000}
+    assert audit_summary(audit) == {
+        'business_date': '2024-05-03', 'property_id': None, 'in_house': 2, 'rooms': 4, 'arrivals': 1,
+        'departures': 1, 'charges_posted': 2, 'room_revenue': 220.0, 'occupancy': 0.5, 'adr': 110.0, 'revpar': 55.0}
+    assert current_business_date() == date(2024, 5, 4)
+
+def test_rerunning_a_date_posts_nothing_twice(db_instance):
+    seed_house(db_instance.session)
+    run_night_audit(date(2024, 5, 3), now=NOW)
+
+    audit = run_night_audit(date(2024, 5, 3), now=NOW)
+
+    assert audit.charges_posted == 0
+    assert audit.in_house == 2 and audit.room_revenue == 220.0
+    assert RoomCharge.query.count() == 2
+    assert NightAudit.query.count() == 1
+
+def test_audit_rolls_business_date_and_refuses_future_dates(db_instance):
+    seed_house(db_instance.session)
+    run_night_audit(date(2024, 5, 2), now=NOW)
+    assert run_night_audit(now=NOW).business_date == date(2024, 5, 3) # The open date follows the last audit
+    with pytest.raises(ValueError):
+        run_night_audit(now=NOW)
+    assert RoomCharge.query.filter_by(business_date=date(2024, 5, 2)).count() == 1 # Arrival came on the 3rd
+
+def test_night_audit_runs_per_scope_and_records_job(db_instance):
+    seed_house(db_instance.session)
+    summaries = night_audit(date(2024, 5, 3))
+    assert [s['charges_posted'] for s in summaries] == [2]
+    assert JobRun.query.filter_by(job='night-audit').one().rows == 2
+
+def test_check_out_settles_from_posted_charges_plus_the_final_night(db_instance):
+    in_house = seed_house(db_instance.session)[0]
+    run_night_audit(date(2024, 5, 1), now=NOW)
+    run_night_audit(date(2024, 5, 2), now=NOW)
+    in_house.room.rate_per_night = 150.0 # Rate changed mid-stay: posted nights keep the old one
+    db_instance.session.commit()
+
+    folio = in_house_balance(in_house.id)
+    assert (folio['nights_posted'], folio['room_charges'], folio['balance']) == (2, 200.0, 200.0)
+
+    result = group_check_out([in_house.id], now=datetime(2024, 5, 4, 15))
+    assert result['totals'][str(in_house.id)] == 350.0 # Two posted nights plus the unposted 3rd at today's rate
+    assert in_house_balance(in_house.id)['due_at_check_out'] == 350.0
+    assert in_house_balance(999999) is None
@@ -0,0 +1,127 @@
+import email
+import email.policy
+import socketserver
+import threading
+import pytest
+from app.outbox import drain_outbox, enqueue_email, retry_delay
+from app.mailer import SMTPPool
+from app.invoice_pdf import NativePdfRenderer
+from app.services import group_check_out
+from app.models import Booking, Room, Guest, Invoice, OutboxMessage
+from datetime import datetime, timedelta
+
+class SMTPSinkHandler(socketserver.StreamRequestHandler):
+    """Just enough SMTP to accept mail; rejects recipients listed in server.reject."""
+
+    def reply(self, line):
+        self.wfile.write((line + '\r\n').encode())
+
+    def handle(self):
+        self.server.connections += 1
+        self.reply('220 sink ready')
+        recipients = []
+        while True:
+            line = self.rfile.readline().decode().strip()
+            command = line[:4].upper()
+            if not line or command == 'QUIT':
+                self.reply('221 bye')
+                return
+            if command == 'RCPT':
+                address = line.split(':', 1)[1].strip('<> ')
+                if address in self.server.reject:
+                    self.reply('550 no such user')
+                    continue
+                recipients.append(address)
+                self.reply('250 ok')
+            elif command == 'DATA':
+                self.reply('354 go ahead')
+                lines = []
+                while (data := self.rfile.readline()) not in (b'.\r\n', b''):
+                    lines.append(data[1:] if data.startswith(b'..') else data)
+                self.server.messages.append((recipients, email.message_from_bytes(b''.join(lines), policy=email.policy.default)))
+                recipients = []
+                self.reply('250 queued')
+            elif command == 'EHLO':
+                self.reply('250 sink')
+            else: # HELO, MAIL, RSET, NOOP
+                recipients = [] if command == 'RSET' else recipients
+                self.reply('250 ok')
+
+@pytest.fixture
+def smtp_sink(app):
+    server = socketserver.ThreadingTCPServer(('127.0.0.1', 0), SMTPSinkHandler)
+    server.daemon_threads = True
+    server.messages, server.reject, server.connections = [], set(), 0
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    app.extensions['smtp_pool'] = SMTPPool('127.0.0.1', server.server_address[1], timeout=5)
+    app.extensions['invoice_renderer'] = NativePdfRenderer() # Attachments without WeasyPrint's system libraries
+    yield server
+    app.extensions.pop('smtp_pool').close_all()
+    app.extensions.pop('invoice_renderer', None)
+    server.shutdown()
+    server.server_close()
+
+def create_stay(db_session, suffix):
+    guest = Guest(name=f'Outbox Guest {suffix}', email=f'outbox.{suffix}@example.com')
+    room = Room(room_number=f'E{suffix}', room_type='Standard', rate_per_night=100.0)
+    db_session.add_all([guest, room])
+    db_session.commit()
+    booking = Booking(guest_id=guest.id, room_id=room.id, check_in_date=datetime.utcnow() - timedelta(days=2),
+                      is_active=True)
+    db_session.add(booking)
+    db_session.commit()
+    return booking
+
+def test_group_checkout_queues_invoice_emails_in_same_transaction(app, db_instance):
+    bookings = [create_stay(db_instance.session, i) for i in (1, 2)]
+    app.config['EMAIL_INVOICE_ON_CHECKOUT'] = True
+    try:
+        group_check_out([b.id for b in bookings])
+    finally:
+        app.config.pop('EMAIL_INVOICE_ON_CHECKOUT')
+    messages = OutboxMessage.query.order_by(OutboxMessage.id).all()
+    assert [(m.kind, m.recipient, m.status) for m in messages] == [
+        ('invoice', 'outbox.1@example.com', 'pending'), ('invoice', 'outbox.2@example.com', 'pending')]
+
+def test_drain_sends_invoice_pdfs_over_one_connection(db_instance, smtp_sink):
+    bookings = [create_stay(db_instance.session, i) for i in (3, 4)]
+    group_check_out([b.id for b in bookings])
+    for booking in bookings:
+        enqueue_email('invoice', booking.guest.email, booking_id=booking.id)
+    db_instance.session.commit()
+
+    assert drain_outbox() == {'sent': 2, 'retried': 0, 'failed': 0}
+    assert smtp_sink.connections == 1
+    recipients, message = smtp_sink.messages[0]
+    assert recipients == ['outbox.3@example.com']
+    invoice = Invoice.query.filter_by(booking_id=bookings[0].id).one()
+    assert message['Subject'] == f"Your Lux Home invoice #{invoice.id}"
+    assert [part.get_filename() for part in message.iter_attachments()] == [f"invoice_{invoice.booking_id}.pdf"]
+    assert OutboxMessage.query.filter_by(status='sent').count() == 2
+    assert drain_outbox() == {'sent': 0, 'retried': 0, 'failed': 0}
+
+def test_rejected_message_backs_off_then_fails(app, db_instance, smtp_sink):
+    booking = create_stay(db_instance.session, 5)
+    group_check_out([booking.id])
+    message = enqueue_email('invoice', 'bounce@example.com', booking_id=booking.id)
+    db_instance.session.commit()
+    smtp_sink.reject.add('bounce@example.com')
+    now = datetime(2030, 1, 1)
+
+    assert drain_outbox(now=now) == {'sent': 0, 'retried': 1, 'failed': 0}
+    assert message.attempts == 1 and message.next_attempt_at == now + retry_delay(1)
+    assert '550' in message.last_error
+    # Not due again until the backoff has passed
+    assert drain_outbox(now=now + timedelta(seconds=1)) == {'sent': 0, 'retried': 0, 'failed': 0}
+
+    app.config['OUTBOX_MAX_ATTEMPTS'] = 2
+    try:
+        assert drain_outbox(now=now + timedelta(days=1)) == {'sent': 0, 'retried': 0, 'failed': 1}
+    finally:
+        app.config.pop('OUTBOX_MAX_ATTEMPTS')
+    assert message.status == 'failed'
+
+def test_retry_delay_doubles_up_to_cap(app):
+    with app.app_context():
+        assert [retry_delay(n).total_seconds() for n in (1, 2, 3)] == [30, 60, 120]
+        assert retry_delay(20).total_seconds() == 3600
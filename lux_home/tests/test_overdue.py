@@ -0,0 +1,114 @@
+import threading
+import pytest
+from app import db as _db
+from app.overdue import sweep_overdue_invoices, render_queued_reminders, sweep_overdue_job, render_reminders_job
+from app.scheduler import Scheduler, timed_run, job_stats
+from app.sharding import property_scope
+from app.models import Property, Booking, Room, Guest, Invoice, InvoiceReminder, JobRun, OutboxMessage
+from datetime import datetime, timedelta
+
+def create_invoice(db_session, suffix, due_date, status='pending'):
+    guest = Guest(name=f'Overdue Guest {suffix}', email=f'overdue.{suffix}@example.com')
+    room = Room(room_number=f'O{suffix}', room_type='Standard', rate_per_night=100.0)
+    db_session.add_all([guest, room])
+    db_session.commit()
+    booking = Booking(guest_id=guest.id, room_id=room.id, check_in_date=datetime(2024, 1, 1),
+                      check_out_date=datetime(2024, 1, 3), total_amount=200.0, is_active=False)
+    db_session.add(booking)
+    db_session.commit()
+    invoice = Invoice(booking_id=booking.id, issue_date=datetime(2024, 1, 3), due_date=due_date,
+                      payment_status=status, amount_paid=50.0)
+    db_session.add(invoice)
+    db_session.commit()
+    return invoice
+
+def test_sweep_flips_only_pending_past_due(db_instance):
+    now = datetime(2024, 3, 1)
+    late = create_invoice(db_instance.session, 1, now - timedelta(days=1))
+    not_due = create_invoice(db_instance.session, 2, now + timedelta(days=1))
+    paid = create_invoice(db_instance.session, 3, now - timedelta(days=30), status='paid')
+    no_due_date = create_invoice(db_instance.session, 4, None)
+    ids = [late.id, not_due.id, paid.id, no_due_date.id]
+
+    assert sweep_overdue_invoices(now=now) == 1
+    db_instance.session.expire_all()
+    statuses = [Invoice.query.get(i).payment_status for i in ids]
+    assert statuses == ['overdue', 'pending', 'paid', 'pending']
+    reminder = InvoiceReminder.query.one()
+    assert (reminder.invoice_id, reminder.status) == (late.id, 'queued')
+
+    # Already overdue invoices are not flipped or reminded again
+    assert sweep_overdue_invoices(now=now) == 0
+    assert InvoiceReminder.query.count() == 1
+
+def test_render_queued_reminders(db_instance):
+    invoice = create_invoice(db_instance.session, 5, datetime(2024, 2, 1))
+    sweep_overdue_invoices(now=datetime(2024, 3, 1))
+    assert render_queued_reminders(now=datetime(2024, 3, 1, 0, 5)) == 1
+    reminder = InvoiceReminder.query.one()
+    assert reminder.status == 'rendered'
+    assert reminder.subject == f"Payment reminder: invoice #{invoice.id} is overdue"
+    assert 'Overdue Guest 5' in reminder.body
+    assert '$150.00' in reminder.body
+    queued = OutboxMessage.query.one()
+    assert (queued.kind, queued.recipient, queued.status) == ('reminder', 'overdue.5@example.com', 'pending')
+    assert render_queued_reminders() == 0
+
+def test_reminders_render_for_a_property_on_its_own_shard(shard_app):
+    east = Property(code='EAST', name='East Wing', bind_key='east')
+    guest = Guest(name='Sharded Debtor', email='sharded.debtor@example.com')
+    _db.session.add_all([east, guest])
+    _db.session.commit()
+    with property_scope(east.id):
+        room = Room(room_number='E7', room_type='Standard', rate_per_night=100.0)
+        _db.session.add(room)
+        _db.session.flush()
+        booking = Booking(guest_id=guest.id, room_id=room.id, check_in_date=datetime(2024, 1, 1),
+                          check_out_date=datetime(2024, 1, 3), total_amount=200.0, is_active=False)
+        _db.session.add(booking)
+        _db.session.flush()
+        _db.session.add(Invoice(booking_id=booking.id, issue_date=datetime(2024, 1, 3),
+                                due_date=datetime(2024, 1, 10), payment_status='pending'))
+        _db.session.commit()
+
+    assert sweep_overdue_job() == 1
+    assert render_reminders_job() == 1 # Guest read from the default database, not joined on the shard
+    with property_scope(east.id):
+        assert 'Sharded Debtor' in InvoiceReminder.query.one().body
+        assert OutboxMessage.query.one().recipient == 'sharded.debtor@example.com'
+
+def test_sweep_job_records_metrics(db_instance):
+    create_invoice(db_instance.session, 6, datetime.utcnow() - timedelta(days=2))
+    assert sweep_overdue_job() == 1
+    run = JobRun.query.filter_by(job='overdue-sweep').one()
+    assert run.rows == 1 and run.error is None and run.duration_ms >= 0
+
+    with pytest.raises(RuntimeError):
+        with timed_run('broken-job'):
+            raise RuntimeError('boom')
+    stats = job_stats()
+    assert stats['overdue-sweep']['runs'] == 1 and stats['overdue-sweep']['rows'] == 1
+    assert stats['broken-job']['failures'] == 1
+
+def test_scheduler_runs_due_jobs_once_per_interval(app, db_instance):
+    calls = []
+    scheduler = Scheduler(app)
+    scheduler.add_job('count', lambda: calls.append(1), interval=3600)
+    scheduler.add_job('fails', lambda: 1 / 0, interval=3600)
+    scheduler.run_pending()
+    scheduler.run_pending()
+    assert calls == [1]
+
+def test_own_thread_jobs_do_not_hold_up_the_loop(app, db_instance):
+    started, release, calls = threading.Event(), threading.Event(), []
+    scheduler = Scheduler(app)
+    scheduler.add_job('slow', lambda: calls.append('slow') or started.set() or release.wait(5), interval=0,
+                      own_thread=True)
+    scheduler.add_job('quick', lambda: calls.append('quick'), interval=0)
+    scheduler.run_pending()
+    scheduler.run_pending() # The slow job is still running: not started twice
+    assert started.wait(5) and scheduler.is_running('slow')
+    assert calls.count('quick') == 2 and calls.count('slow') == 1
+    release.set()
+    scheduler.stop(timeout=5)
+    assert not scheduler.is_running('slow')
@@ -0,0 +1,89 @@
+import marshal
+import threading
+import time
+import pytest
+from app import create_app, db as _db
+from app.models import User
+from app.profiling import start_request_profile
+from test_config import TestConfig
+
+class ProfilingTestConfig(TestConfig):
+    PROFILING_ENABLED = True
+    PROFILING_SAMPLE_INTERVAL = 0.001
+
+@pytest.fixture(scope='module')
+def profiling_app():
+    _app = create_app(config_class_name='tests.test_profiling.ProfilingTestConfig')
+    with _app.app_context():
+        _db.create_all()
+        _db.session.add_all([User(username='ops', password_hash='x', is_admin=True),
+                             User(username='clerk', password_hash='x')])
+        _db.session.commit()
+    yield _app # No app context kept open, so each request loads its own current_user
+    with _app.app_context():
+        _db.drop_all()
+
+def client_for(app, username):
+    client = app.test_client()
+    with app.app_context():
+        user_id = User.query.filter_by(username=username).one().id
+    with client.session_transaction() as session:
+        session['_user_id'] = str(user_id)
+    return client
+
+def test_disabled_by_default_registers_nothing(app):
+    assert start_request_profile not in app.before_request_funcs.get(None, [])
+    assert 'profiling.status' not in app.view_functions
+
+def test_endpoints_are_admin_only(profiling_app):
+    assert client_for(profiling_app, 'clerk').get('/admin/profiling/').status_code == 403
+    response = client_for(profiling_app, 'ops').get('/admin/profiling/')
+    assert response.status_code == 200
+    assert response.json['sampler']['running'] is False
+
+def busy_wait_for_sampler(stop):
+    while not stop.is_set():
+        sum(range(1000))
+
+def test_sampler_collects_folded_stacks_from_other_threads(profiling_app):
+    client = client_for(profiling_app, 'ops')
+    stop = threading.Event()
+    worker = threading.Thread(target=busy_wait_for_sampler, args=(stop,), name='busy')
+    worker.start()
+    try:
+        assert client.post('/admin/profiling/sampler/start').json['running'] is True
+        assert client.post('/admin/profiling/sampler/start').status_code == 409
+        time.sleep(0.1)
+        folded = client.post('/admin/profiling/sampler/stop').get_data(as_text=True)
+    finally:
+        stop.set()
+        worker.join()
+    busy = [line for line in folded.splitlines() if line.startswith('busy;')]
+    assert busy and 'busy_wait_for_sampler (test_profiling.py:' in busy[0]
+    assert all(line.rsplit(' ', 1)[1].isdigit() for line in folded.splitlines())
+
+def test_profiling_header_profiles_one_request(profiling_app):
+    client = client_for(profiling_app, 'ops')
+    assert 'X-Profile-Id' not in client.get('/admin/profiling/').headers
+    profile_id = client.get('/admin/profiling/', headers={'X-Profile': '1'}).headers['X-Profile-Id']
+    assert 'X-Profile-Id' not in client_for(profiling_app, 'clerk').get('/', headers={'X-Profile': '1'}).headers
+
+    report = client.get(f'/admin/profiling/requests/{profile_id}').get_data(as_text=True)
+    assert report.startswith('GET /admin/profiling/ ') and 'profiling.py' in report and '(status)' in report
+    raw = client.get(f'/admin/profiling/requests/{profile_id}?format=pstats').data
+    assert any(name == 'status' for _, _, name in marshal.loads(raw))
+    assert client.get(f'/admin/profiling/requests/{profile_id}?sort=bogus').status_code == 400
+
+def test_tracemalloc_snapshots_and_diffs(profiling_app):
+    client = client_for(profiling_app, 'ops')
+    assert client.get('/admin/profiling/tracemalloc/snapshot').status_code == 409
+    client.post('/admin/profiling/tracemalloc/start')
+    try:
+        client.get('/admin/profiling/tracemalloc/snapshot')
+        kept = [bytearray(1000) for _ in range(1000)]
+        diff = client.get('/admin/profiling/tracemalloc/snapshot?diff=1&limit=5').json
+        assert diff['traced'] > 0
+        assert any('test_profiling.py' in top['site'][0] and top['size_diff'] >= 1000000 for top in diff['top'])
+    finally:
+        client.post('/admin/profiling/tracemalloc/stop')
+    del kept
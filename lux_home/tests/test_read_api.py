@@ -0,0 +1,107 @@
+import asyncio
+import json
+import pytest
+from app import db
+from app.models import User, Room, Guest, Booking, Invoice
+from app.ledger import post_payment
+from datetime import datetime, timedelta
+
+def seed(session):
+    user = User(username='api_user')
+    user.set_password('secret12')
+    guest = Guest(name='Api Guest', email='api.guest@example.com')
+    room = Room(room_number='API1', room_type='Suite', rate_per_night=150.0)
+    session.add_all([user, guest, room])
+    session.commit()
+    active = Booking(guest_id=guest.id, room_id=room.id, check_in_date=datetime.utcnow() - timedelta(days=1))
+    done = Booking(guest_id=guest.id, room_id=room.id, check_in_date=datetime(2024, 1, 1),
+                   check_out_date=datetime(2024, 1, 3), total_amount=300.0, is_active=False)
+    session.add_all([active, done])
+    session.commit()
+    invoice = Invoice(booking_id=done.id, issue_date=datetime(2024, 1, 3), due_date=datetime(2024, 1, 18))
+    session.add(invoice)
+    session.commit()
+    post_payment(invoice.id, 100.0, method='card')
+    return active, done
+
+@pytest.fixture
+def api_client(app, db_instance):
+    active, done = seed(db_instance.session)
+    client = app.test_client()
+    client.post('/login', data={'username': 'api_user', 'password': 'secret12'})
+    return client, active.id, done.id
+
+def test_dashboard_endpoint(api_client):
+    client, active_id, done_id = api_client
+    data = client.get('/api/dashboard').get_json()
+    assert [r['room_number'] for r in data['rooms']] == ['API1']
+    assert data['active_bookings'] == {str(data['rooms'][0]['id']): active_id}
+    assert data['completed_bookings'][0]['booking_id'] == done_id
+    assert data['completed_bookings'][0]['guest'] == 'Api Guest'
+
+def test_guest_search_and_invoice_endpoints(api_client):
+    client, active_id, done_id = api_client
+    assert [g['email'] for g in client.get('/api/guests?q=api').get_json()['guests']] == ['api.guest@example.com']
+    assert client.get('/api/guests?q=nobody').get_json()['guests'] == []
+
+    invoice = client.get(f'/api/invoices/{done_id}').get_json()
+    assert invoice['total_amount'] == 300.0 and invoice['balance_due'] == 200.0
+    assert [p['method'] for p in invoice['payments']] == ['card']
+    assert client.get(f'/api/invoices/{active_id}').status_code == 404
+
+def test_asgi_app_serves_read_endpoints(app, tmp_path):
+    pytest.importorskip('greenlet')
+    pytest.importorskip('aiosqlite')
+    pytest.importorskip('asgiref')
+    from sqlalchemy import create_engine
+    from sqlalchemy.orm import Session
+    from sqlalchemy.ext.asyncio import create_async_engine
+    from app.asgi import AsyncReadApp
+
+    # The async engine cannot share the tests' in-memory database, so seed a file
+    path = tmp_path / 'asgi.db'
+    engine = create_engine(f"sqlite:///{path}")
+    db.metadata.create_all(engine)
+    with Session(engine) as session:
+        session.add_all([User(id=1, username='async_user', password_hash='x'),
+                         Guest(id=1, name='Async Guest', email='async@example.com'),
+                         Room(id=1, room_number='AS1', room_type='Suite', rate_per_night_cents=15000)])
+        session.add(Booking(id=1, guest_id=1, room_id=1, check_in_date=datetime(2024, 1, 1),
+                            check_out_date=datetime(2024, 1, 3), total_amount_cents=30000, is_active=False))
+        session.add(Invoice(id=1, booking_id=1, issue_date=datetime(2024, 1, 3), amount_paid_cents=5000))
+        session.commit()
+    engine.dispose()
+
+    application = AsyncReadApp(app)
+    application.engines[None] = create_async_engine(f"sqlite+aiosqlite:///{path}")
+    cookie = application.session_serializer.dumps({'_user_id': '1'})
+    stale = application.session_serializer.dumps({'_user_id': '99'}) # Signed, but the user is gone
+
+    async def get(path, cookie_header=None):
+        scope = {'type': 'http', 'http_version': '1.1', 'method': 'GET', 'path': path, 'query_string': b'q=async',
+                 'headers': [(b'cookie', cookie_header.encode())] if cookie_header else []}
+        sent = []
+        async def receive():
+            return {'type': 'http.request', 'body': b'', 'more_body': False}
+        async def send(message):
+            sent.append(message)
+        await application(scope, receive, send)
+        return sent[0]['status'], b''.join(m.get('body', b'') for m in sent[1:])
+
+    async def scenario():
+        try:
+            return (await get('/api/invoices/1', f'session={cookie}'), await get('/api/guests', f'session={cookie}'),
+                    await get('/api/invoices/2', f'session={cookie}'), await get('/api/invoices/1'),
+                    await get('/api/invoices/1', f'session={stale}'))
+        finally:
+            await application.engines[None].dispose()
+
+    invoice, guests, missing, anonymous, deleted_user = asyncio.run(scenario())
+    assert invoice[0] == 200
+    data = json.loads(invoice[1])
+    assert (data['guest']['name'], data['balance_due'], data['room']['room_number']) == ('Async Guest', 250.0, 'AS1')
+    assert [g['name'] for g in json.loads(guests[1])['guests']] == ['Async Guest']
+    assert missing[0] == 404
+    # Without a session the request falls through to Flask-Login, which redirects to the login page
+    assert anonymous[0] == 302
+    assert deleted_user[0] == 302 # Flask-Login's user_loader finds no user either
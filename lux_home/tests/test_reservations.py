@@ -0,0 +1,111 @@
+import pytest
+from app.reservations import (IntervalIndex, AvailabilityIndex, ReservationConflict,
+                              create_reservation, find_conflicts, available_rooms)
+from app.models import User, Booking, Room, Guest
+from datetime import datetime, timedelta
+from sqlalchemy import event
+from app import db
+
+def day(n):
+    return datetime(2030, 1, 1) + timedelta(days=n)
+
+@pytest.fixture
+def guest_and_rooms(db_instance):
+    guest = Guest(name='Reservation Guest', email='reservation.guest@example.com')
+    rooms = [Room(room_number=f'R{i}', room_type='Standard', rate_per_night=100.0) for i in range(1, 3)]
+    db_instance.session.add_all([guest] + rooms)
+    db_instance.session.commit()
+    return guest, rooms
+
+def test_interval_index_overlaps():
+    index = IntervalIndex([(day(0), day(3), 1), (day(10), day(12), 2)])
+    assert index.overlaps(day(2), day(4))
+    assert not index.overlaps(day(3), day(10)) # Departure day is free for the next arrival
+    assert index.overlaps(day(11), day(20))
+    index.add(day(5), day(30), 3) # Long stay that swallows later intervals
+    assert index.overlaps(day(20), day(21))
+    index.remove(3)
+    assert not index.overlaps(day(20), day(21))
+    assert len(index) == 2
+
+def test_create_reservation_rejects_overlap(guest_and_rooms):
+    guest, (room, other_room) = guest_and_rooms
+    booking = create_reservation(guest.id, room.id, day(0).date(), day(3).date())
+    assert booking.is_reservation is True
+    assert booking.is_active is False
+
+    with pytest.raises(ReservationConflict) as excinfo:
+        create_reservation(guest.id, room.id, day(2).date(), day(5).date())
+    assert excinfo.value.booking_ids == [booking.id]
+
+    # Back-to-back stays and other rooms are fine
+    create_reservation(guest.id, room.id, day(3).date(), day(5).date())
+    create_reservation(guest.id, other_room.id, day(2).date(), day(5).date())
+
+def test_open_ended_in_house_stay_blocks_room(guest_and_rooms, db_instance):
+    guest, (room, _) = guest_and_rooms
+    db_instance.session.add(Booking(guest_id=guest.id, room_id=room.id, check_in_date=day(0), is_active=True))
+    db_instance.session.commit()
+    assert find_conflicts(room.id, day(50), day(52))
+
+def test_availability_index_matches_sql_and_follows_commits(app, guest_and_rooms):
+    guest, (room, other_room) = guest_and_rooms
+    app.extensions['availability_index'] = AvailabilityIndex()
+    try:
+        create_reservation(guest.id, room.id, day(0), day(3))
+        free = available_rooms(day(1), day(2))
+        assert [r.room_number for r in free] == ['R2']
+
+        # A reservation committed after the index was loaded is picked up by the hooks
+        create_reservation(guest.id, other_room.id, day(1), day(4))
+        assert available_rooms(day(1), day(2)) == []
+        assert [r.room_number for r in available_rooms(day(5), day(6))] == ['R1', 'R2']
+    finally:
+        app.extensions.pop('availability_index', None)
+
+def test_sql_availability_checks_every_room_with_one_query(guest_and_rooms, db_instance):
+    guest, (room, other_room) = guest_and_rooms
+    create_reservation(guest.id, room.id, day(0), day(3))
+    statements = []
+    listener = lambda conn, cursor, statement, *args: statements.append(statement)
+    event.listen(db_instance.engine, 'before_cursor_execute', listener)
+    try:
+        assert [r.room_number for r in available_rooms(day(1), day(2))] == ['R2']
+    finally:
+        event.remove(db_instance.engine, 'before_cursor_execute', listener)
+    assert len([s for s in statements if 'FROM booking' in s]) == 1
+
+def test_early_check_in_cannot_overlap_another_stay(app, guest_and_rooms):
+    guest, (room, _) = guest_and_rooms
+    user = User(username='front_desk')
+    user.set_password('secret12')
+    db.session.add(user)
+    db.session.commit()
+    soon = datetime.utcnow().replace(microsecond=0) + timedelta(days=1)
+    blocking = create_reservation(guest.id, room.id, soon, soon + timedelta(days=2))
+    later = create_reservation(guest.id, room.id, soon + timedelta(days=5), soon + timedelta(days=7))
+    blocking_id, later_id = blocking.id, later.id
+
+    client = app.test_client()
+    client.post('/login', data={'username': 'front_desk', 'password': 'secret12'})
+    client.post(f'/reservations/{later_id}/check-in') # Arriving now would take the nights already reserved
+    db.session.expire_all()
+    later = db.session.get(Booking, later_id)
+    assert (later.is_reservation, later.check_in_date) == (True, soon + timedelta(days=5))
+
+    client.post(f'/reservations/{blocking_id}/check-in')
+    db.session.expire_all()
+    assert db.session.get(Booking, blocking_id).is_active is True
+
+def test_reservation_locks_the_room_before_checking(guest_and_rooms, db_instance):
+    guest, (room, _) = guest_and_rooms
+    guest_id, room_id = guest.id, room.id
+    statements = []
+    listener = lambda conn, cursor, statement, *args: statements.append(statement.split()[0])
+    event.listen(db_instance.engine, 'before_cursor_execute', listener)
+    try:
+        create_reservation(guest_id, room_id, day(0).date(), day(3).date())
+    finally:
+        event.remove(db_instance.engine, 'before_cursor_execute', listener)
+    # SQLite: the write lock is taken before the conflict query, so a concurrent booking waits for this commit
+    assert statements[0] == 'UPDATE' and 'SELECT' in statements[:statements.index('INSERT')]
@@ -0,0 +1,91 @@
+import gzip
+import pytest
+from flask import make_response
+from app.responses import compress_response, data_version
+from app.services import group_check_out
+from app.ledger import post_payment
+from app.archive import archive_completed_bookings
+from app.models import User, Room, Guest, Booking, Invoice
+from datetime import datetime, timedelta
+
+@pytest.fixture
+def logged_in(app, db_instance):
+    user = User(username='etag_user')
+    user.set_password('secret12')
+    db_instance.session.add(user)
+    db_instance.session.add(Room(room_number='T1', room_type='Standard', rate_per_night=100.0))
+    db_instance.session.commit()
+    client = app.test_client()
+    client.post('/login', data={'username': 'etag_user', 'password': 'secret12'})
+    client.get('/') # Consumes the login flash message
+    return client
+
+def test_dashboard_answers_304_until_data_changes(logged_in, db_instance):
+    first = logged_in.get('/')
+    assert first.status_code == 200
+    etag = first.headers['ETag']
+    assert etag.startswith('W/')
+    assert first.headers['Cache-Control'] == 'private, no-cache'
+
+    cached = logged_in.get('/', headers={'If-None-Match': etag})
+    assert cached.status_code == 304
+    assert cached.data == b''
+
+    room = Room.query.filter_by(room_number='T1').one()
+    room.status = 'maintenance'
+    db_instance.session.commit()
+    changed = logged_in.get('/', headers={'If-None-Match': etag})
+    assert changed.status_code == 200
+    assert changed.headers['ETag'] != etag
+
+def test_bulk_writes_bump_data_version(db_instance):
+    guest = Guest(name='Version Guest', email='version@example.com')
+    room = Room(room_number='T2', room_type='Standard', rate_per_night=100.0)
+    db_instance.session.add_all([guest, room])
+    db_instance.session.commit()
+    booking = Booking(guest_id=guest.id, room_id=room.id, check_in_date=datetime.utcnow() - timedelta(days=1))
+    db_instance.session.add(booking)
+    db_instance.session.commit()
+    before = data_version(Room, Booking)
+
+    group_check_out([booking.id])
+    after_checkout = data_version(Room, Booking)
+    assert after_checkout != before
+
+    invoice = Invoice.query.filter_by(booking_id=booking.id).one()
+    stamped = invoice.updated_at
+    post_payment(invoice.id, 10.0)
+    assert invoice.updated_at > stamped
+
+def test_archiving_bumps_data_version(db_instance):
+    guest = Guest(name='Archived Guest', email='archived.version@example.com')
+    room = Room(room_number='T3', room_type='Standard', rate_per_night=100.0)
+    db_instance.session.add_all([guest, room])
+    db_instance.session.commit()
+    for check_out in (datetime(2020, 1, 5), datetime(2024, 5, 1)): # The newest stay stays hot
+        db_instance.session.add(Booking(guest_id=guest.id, room_id=room.id, check_in_date=check_out - timedelta(days=2),
+                                        check_out_date=check_out, is_active=False))
+    db_instance.session.commit()
+    before = data_version(Booking)
+
+    archive_completed_bookings(months=12, now=datetime(2024, 6, 1)) # Latest updated_at is unchanged
+    assert data_version(Booking) != before
+    assert data_version(Booking)[0][1] == 1
+
+def test_compress_response_negotiates_encoding(app):
+    body = '<html>' + 'room card ' * 200 + '</html>'
+    with app.test_request_context(headers={'Accept-Encoding': 'gzip'}):
+        response = compress_response(make_response(body))
+        assert response.headers['Content-Encoding'] == 'gzip'
+        assert 'Accept-Encoding' in response.headers['Vary']
+        assert gzip.decompress(response.get_data()).decode() == body
+    with app.test_request_context(headers={'Accept-Encoding': 'gzip, br'}):
+        response = compress_response(make_response(body))
+        assert response.headers['Content-Encoding'] in ('br', 'gzip')
+    with app.test_request_context():
+        assert 'Content-Encoding' not in compress_response(make_response(body)).headers
+    with app.test_request_context(headers={'Accept-Encoding': 'gzip'}):
+        assert 'Content-Encoding' not in compress_response(make_response('short')).headers
+        pdf = make_response(b'%PDF' * 500)
+        pdf.mimetype = 'application/pdf'
+        assert 'Content-Encoding' not in compress_response(pdf).headers
@@ -0,0 +1,103 @@
+import pytest
+from datetime import datetime
+from sqlalchemy import event
+from app import db as _db
+from app.models import User, Room, Guest, Booking, floor_of
+from app.room_grid import FragmentCache, room_grid
+
+@pytest.fixture
+def rooms(app, db_instance, monkeypatch):
+    """Floors 1-3 with three Standard rooms and a Suite each (102 under maintenance), plus a penthouse."""
+    monkeypatch.setitem(app.config, 'ROOM_GRID_PAGE_SIZE', 5)
+    _db.session.add_all(Room(room_number=f"{floor}0{i}", room_type='Suite' if i == 4 else 'Standard',
+                             rate_per_night=100.0, status='maintenance' if (floor, i) == (1, 2) else 'available')
+                        for floor in (1, 2, 3) for i in range(1, 5))
+    _db.session.add(Room(room_number='PH', room_type='Suite', rate_per_night=900.0))
+    _db.session.commit()
+
+@pytest.fixture
+def fragment_cache(app):
+    app.extensions['room_fragments'] = FragmentCache(16)
+    yield app.extensions['room_fragments']
+    app.extensions.pop('room_fragments', None)
+
+@pytest.fixture
+def client(app, rooms):
+    user = User(username='grid_user')
+    user.set_password('secret12')
+    _db.session.add(user)
+    _db.session.commit()
+    client = app.test_client()
+    client.post('/login', data={'username': 'grid_user', 'password': 'secret12'})
+    client.get('/') # Consumes the login flash message
+    return client
+
+def test_floor_comes_from_the_room_number(rooms):
+    assert [floor_of(n) for n in ('101', '1205', '12', 'PH', '7B')] == [1, 12, 0, None, 0]
+    assert {r.floor for r in Room.query.all()} == {1, 2, 3, None}
+
+def test_filters_pagination_and_counts(rooms):
+    grid = room_grid(page=1)
+    assert grid['total'] == 13 and grid['pages'] == 3
+    assert [(floor, [r.room_number for r in rooms]) for floor, rooms in grid['floors']] == [
+        (1, ['101', '102', '103', '104']), (2, ['201'])]
+    assert grid['facets']['floors'] == [1, 2, 3] and grid['facets']['room_types'] == ['Standard', 'Suite']
+    assert grid['facets']['status_counts'] == {'available': 12, 'maintenance': 1}
+    assert [floor for floor, _ in room_grid(page=3)['floors']] == [3, None] # Rooms without a floor come last
+
+    suites = room_grid(room_type='Suite', status='available')
+    assert [r.room_number for _, rooms in suites['floors'] for r in rooms] == ['104', '204', '304', 'PH']
+    first_floor = room_grid(floor=1)
+    assert first_floor['facets']['status_counts'] == {'available': 3, 'maintenance': 1}
+    assert room_grid(floor=1, page=99)['page'] == 1 # Clamped to the last page
+
+def test_grid_queries_do_not_grow_with_the_property(rooms):
+    statements = []
+    listener = lambda conn, cursor, statement, *args: statements.append(statement)
+    event.listen(_db.engine, 'before_cursor_execute', listener)
+    try:
+        room_grid()
+        small = len(statements)
+        _db.session.add_all(Room(room_number=f"{floor}{i:02d}", room_type='Standard', rate_per_night=100.0)
+                            for floor in range(4, 30) for i in range(1, 41))
+        _db.session.commit()
+        statements.clear()
+        grid = room_grid()
+    finally:
+        event.remove(_db.engine, 'before_cursor_execute', listener)
+    assert len(statements) == small
+    assert sum(len(rooms) for _, rooms in grid['floors']) == 5 and grid['total'] == 13 + 26 * 40
+
+def test_only_the_changed_floor_is_rendered_again(client, fragment_cache):
+    cache = fragment_cache
+    response = client.get('/?room_type=Standard')
+    assert response.status_code == 200 and b'Room 101' in response.data and b'Room 104' not in response.data
+    hits, misses = cache.hits, cache.misses
+    client.get('/?room_type=Standard')
+    assert (cache.hits - hits, cache.misses - misses) == (2, 0)
+
+    guest = Guest(name='Grid Guest', email='grid@example.com')
+    room = Room.query.filter_by(room_number='201').one()
+    room.status = 'occupied'
+    _db.session.add_all([guest, Booking(guest=guest, room=room, check_in_date=datetime.utcnow())])
+    _db.session.commit()
+    hits, misses = cache.hits, cache.misses
+    response = client.get('/?room_type=Standard')
+    assert (cache.hits - hits, cache.misses - misses) == (1, 1) # Floor 1 reused, floor 2 re-rendered
+    assert b'Check-out' in response.data
+
+def test_single_floor_fragment_has_its_own_etag(client):
+    response = client.get('/rooms/floor/2')
+    assert response.status_code == 200 and b'Room 201' in response.data and b'Room 101' not in response.data
+    assert b'<html' not in response.data.lower()
+    cached = client.get('/rooms/floor/2', headers={'If-None-Match': response.headers['ETag']})
+    assert cached.status_code == 304
+
+    room = Room.query.filter_by(room_number='101').one()
+    room.status = 'maintenance' # Another floor: floor 2 stays cached
+    _db.session.commit()
+    assert client.get('/rooms/floor/2', headers={'If-None-Match': response.headers['ETag']}).status_code == 304
+    room = Room.query.filter_by(room_number='203').one()
+    room.status = 'maintenance'
+    _db.session.commit()
+    assert client.get('/rooms/floor/2', headers={'If-None-Match': response.headers['ETag']}).status_code == 200
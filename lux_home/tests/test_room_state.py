@@ -0,0 +1,61 @@
+import pytest
+from app.room_state import RoomStateStore, RoomRecord
+from app.models import Room
+
+@pytest.fixture
+def store(app, db_instance):
+    """Enables the room state store for one test (TestConfig leaves it off)."""
+    app.extensions['room_state'] = RoomStateStore()
+    yield app.extensions['room_state']
+    app.extensions.pop('room_state', None)
+
+def test_records_are_slotted():
+    record = RoomRecord(1, None, '101', 'Standard', 10000, 'available')
+    assert not hasattr(record, '__dict__')
+    assert record.rate_per_night == 100.0
+
+def test_store_loads_once_ordered_by_room_number(store, db_instance):
+    db_instance.session.add_all([
+        Room(room_number='102', room_type='Deluxe', rate_per_night=150.0),
+        Room(room_number='101', room_type='Standard', rate_per_night=100.0, status='occupied'),
+    ])
+    db_instance.session.commit()
+
+    rooms = store.rooms()
+    assert [r.room_number for r in rooms] == ['101', '102']
+    assert all(isinstance(r, RoomRecord) for r in rooms)
+    assert [r.room_number for r in store.rooms(status='available')] == ['102']
+
+def test_store_follows_committed_changes(store, db_instance):
+    room = Room(room_number='201', room_type='Standard', rate_per_night=100.0)
+    db_instance.session.add(room)
+    db_instance.session.commit()
+    assert store.rooms()[0].status == 'available'
+
+    # Updates and inserts committed through the session are applied in place
+    room.status = 'occupied'
+    db_instance.session.add(Room(room_number='200', room_type='Suite', rate_per_night=300.0))
+    db_instance.session.commit()
+    assert [(r.room_number, r.status) for r in store.rooms()] == [('200', 'available'), ('201', 'occupied')]
+
+    # Rolled back changes never reach the store
+    room.status = 'maintenance'
+    db_instance.session.flush()
+    db_instance.session.rollback()
+    assert store.rooms()[1].status == 'occupied'
+
+    db_instance.session.delete(room)
+    db_instance.session.commit()
+    assert [r.room_number for r in store.rooms()] == ['200']
+
+def test_rooms_changed_rereads_bulk_updates(store, db_instance):
+    room = Room(room_number='301', room_type='Standard', rate_per_night=100.0)
+    db_instance.session.add(room)
+    db_instance.session.commit()
+    store.rooms()
+
+    db_instance.session.execute(db_instance.update(Room).where(Room.id == room.id).values(status='needs_cleaning'))
+    db_instance.session.commit()
+    assert store.rooms()[0].status == 'available' # Bulk UPDATE bypasses the unit of work
+    store.rooms_changed([room.id])
+    assert store.rooms()[0].status == 'needs_cleaning'
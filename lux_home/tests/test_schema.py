@@ -0,0 +1,57 @@
+from datetime import datetime
+from sqlalchemy import text
+from app import create_app, db as _db
+from app.models import User, Room, Booking, Invoice, Service
+from app.schema import upgrade_schema
+from test_config import TestConfig
+
+# The schema the app shipped with before properties, cents and the rest
+BASELINE = [
+    'CREATE TABLE user (id INTEGER PRIMARY KEY, username VARCHAR(80) NOT NULL UNIQUE, password_hash VARCHAR(128) NOT NULL)',
+    'CREATE TABLE room (id INTEGER PRIMARY KEY, room_number VARCHAR(50) NOT NULL UNIQUE, room_type VARCHAR(100) NOT NULL, '
+    'rate_per_night FLOAT NOT NULL, status VARCHAR(50) NOT NULL)',
+    'CREATE TABLE guest (id INTEGER PRIMARY KEY, name VARCHAR(100) NOT NULL, email VARCHAR(120) NOT NULL UNIQUE, '
+    'phone VARCHAR(20))',
+    'CREATE TABLE booking (id INTEGER PRIMARY KEY, guest_id INTEGER NOT NULL REFERENCES guest (id), '
+    'room_id INTEGER NOT NULL REFERENCES room (id), check_in_date DATETIME NOT NULL, check_out_date DATETIME, '
+    'total_amount FLOAT, is_active BOOLEAN NOT NULL)',
+    'CREATE TABLE invoice (id INTEGER PRIMARY KEY, booking_id INTEGER NOT NULL UNIQUE REFERENCES booking (id), '
+    'issue_date DATETIME NOT NULL, due_date DATETIME, amount_paid FLOAT NOT NULL, payment_status VARCHAR(50) NOT NULL)',
+    'CREATE TABLE service (id INTEGER PRIMARY KEY, name VARCHAR(100) NOT NULL UNIQUE, price FLOAT NOT NULL)',
+    'CREATE TABLE booking_service (id INTEGER PRIMARY KEY, booking_id INTEGER NOT NULL REFERENCES booking (id), '
+    'service_id INTEGER NOT NULL REFERENCES service (id), quantity INTEGER NOT NULL)',
+    "INSERT INTO user VALUES (1, 'front', 'x')",
+    "INSERT INTO room VALUES (1, '1205', 'Suite', 250.5, 'occupied')",
+    "INSERT INTO guest VALUES (1, 'Old Guest', 'old.guest@example.com', NULL)",
+    "INSERT INTO booking VALUES (1, 1, 1, '2023-04-01 14:00:00', '2023-04-03 11:00:00', 501.0, 0)",
+    "INSERT INTO invoice VALUES (1, 1, '2023-04-03 11:00:00', NULL, 100.0, 'pending')",
+    "INSERT INTO service VALUES (1, 'Breakfast', 15.0)",
+]
+
+def test_upgrade_brings_a_baseline_database_up_to_the_models(tmp_path):
+    class UpgradeConfig(TestConfig):
+        SQLALCHEMY_DATABASE_URI = f"sqlite:///{tmp_path / 'app.db'}"
+    app = create_app(UpgradeConfig)
+    with app.app_context():
+        with _db.engine.begin() as conn:
+            for statement in BASELINE:
+                conn.execute(text(statement))
+
+        changes = upgrade_schema(_db.engine, _db.metadata, now=datetime(2026, 1, 1))
+        assert {'room.rate_per_night (money to cents)', 'room.property_id', 'room.floor', 'booking.is_reservation',
+                'user.is_admin', 'property (created)', 'room: uq_room_property_number',
+                'booking: ix_booking_room_dates', 'booking: ix_booking_guest_id'} <= set(changes)
+
+        # The models query the upgraded tables, and existing rows got safe defaults
+        room = Room.query.one()
+        assert (room.rate_per_night, room.floor, room.property_id) == (250.5, 12, None)
+        booking = Booking.query.one()
+        assert (booking.is_reservation, booking.total_amount, booking.updated_at) == (False, 501.0, datetime(2026, 1, 1))
+        assert Invoice.query.one().amount_paid == 100.0 and Service.query.one().price == 15.0
+        assert User.query.one().is_admin is False
+        indexes = _db.session.execute(text("SELECT name FROM sqlite_master WHERE tbl_name = 'guest'")).scalars().all()
+        assert 'ix_guest_email_lower' in indexes
+
+        _db.session.remove()
+        assert upgrade_schema(_db.engine, _db.metadata) == [] # Re-running changes nothing
+        _db.engine.dispose()
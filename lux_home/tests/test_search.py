@@ -0,0 +1,83 @@
+import pytest
+from datetime import datetime
+from sqlalchemy import select, func
+from app import read_api
+from app.models import User, Room, Guest, Booking, Invoice
+from app.search import search_index, rebuild_search_index
+
+def search(query, **kwargs):
+    return read_api.run_sync(read_api.search(query, **kwargs))
+
+@pytest.fixture
+def stay(db_instance):
+    guest = Guest(name='Margaret Smithson', email='maggie@example.com', phone='+1 555-0101')
+    room = Room(room_number='204', room_type='Deluxe', rate_per_night=150.0)
+    db_instance.session.add_all([guest, room])
+    db_instance.session.commit()
+    booking = Booking(guest_id=guest.id, room_id=room.id, check_in_date=datetime(2024, 3, 1),
+                      check_out_date=datetime(2024, 3, 4), total_amount=450.0, is_active=False)
+    db_instance.session.add(booking)
+    db_instance.session.commit()
+    invoice = Invoice(booking_id=booking.id, issue_date=datetime(2024, 3, 4))
+    db_instance.session.add(invoice)
+    db_instance.session.commit()
+    return guest, room, booking, invoice
+
+def test_guest_and_stay_found_by_prefix_email_and_phone(stay):
+    guest, room, booking, invoice = stay
+    results = search('smi')['results']
+    assert {(r['kind'], r['id']) for r in results} == {('guest', guest.id), ('stay', booking.id)}
+    assert search('maggie@example.com')['results'][0]['id'] in (guest.id, booking.id)
+    assert {r['kind'] for r in search('5550101')['results']} == {'guest', 'stay'}
+
+    stay_result = search('smithson 204')['results']
+    assert [(r['kind'], r['id']) for r in stay_result] == [('stay', booking.id)]
+    assert f"Invoice #{invoice.id}" in stay_result[0]['label']
+    assert search('smithson 999')['results'] == []
+
+def test_hooks_follow_updates_and_deletes(stay, db_instance):
+    guest, room, booking, invoice = stay
+    room.room_number = '310'
+    guest.name = 'Margaret Jones'
+    db_instance.session.commit()
+    assert search('smithson')['results'] == []
+    assert [r['kind'] for r in search('jones 310')['results']] == ['stay']
+
+    db_instance.session.delete(invoice)
+    db_instance.session.delete(booking)
+    db_instance.session.commit()
+    assert [r['kind'] for r in search('jones')['results']] == ['guest']
+
+def test_rollback_leaves_index_untouched(stay, db_instance):
+    guest = stay[0]
+    guest.name = 'Someone Else'
+    db_instance.session.flush()
+    db_instance.session.rollback()
+    assert search('smithson')['results']
+    assert search('someone')['results'] == []
+
+def test_pagination_is_ranked_and_bounded(db_instance):
+    db_instance.session.add_all([Guest(name=f'Parker {i:02d}', email=f'parker{i}@example.com') for i in range(25)])
+    db_instance.session.commit()
+    first = search('parker', per_page=10)
+    last = search('parker', page=3, per_page=10)
+    assert len(first['results']) == 10 and first['has_more']
+    assert len(last['results']) == 5 and not last['has_more']
+    assert search('', page=2) == {'query': '', 'page': 2, 'results': [], 'has_more': False}
+
+def test_rebuild_matches_incremental_index(stay, db_instance):
+    count = lambda: db_instance.session.execute(select(func.count()).select_from(search_index)).scalar()
+    before = count()
+    assert rebuild_search_index() == before == 2
+    assert count() == before
+    assert [r['kind'] for r in search('smithson 204')['results']] == ['stay']
+
+def test_search_endpoint(app, stay, db_instance):
+    user = User(username='search_user')
+    user.set_password('secret12')
+    db_instance.session.add(user)
+    db_instance.session.commit()
+    client = app.test_client()
+    client.post('/login', data={'username': 'search_user', 'password': 'secret12'})
+    data = client.get('/api/search?q=smith&page=1').get_json()
+    assert {r['kind'] for r in data['results']} == {'guest', 'stay'}
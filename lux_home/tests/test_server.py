@@ -0,0 +1,36 @@
+import os
+import pytest
+from app.server import gunicorn_options, default_workers, dispose_engines, process_memory, memory_report
+
+def test_worker_sizing_follows_core_count():
+    assert default_workers(cores=1) == 3
+    assert default_workers(cores=4) == 9
+
+def test_gunicorn_options_preload_and_recycle():
+    options = gunicorn_options({'SERVER_WORKERS': 0, 'SERVER_THREADS': 0, 'SERVER_MAX_REQUESTS': 500})
+    assert options['preload_app'] is True
+    assert options['workers'] == default_workers()
+    assert options['max_requests'] == 500
+    assert options['max_requests_jitter'] == 100
+
+    single = gunicorn_options({'SERVER_WORKERS': 2, 'SERVER_THREADS': 1})
+    assert (single['workers'], single['worker_class']) == (2, 'sync')
+    assert gunicorn_options({'SERVER_THREADS': 4})['worker_class'] == 'gthread'
+
+def test_process_local_caches_need_a_single_worker():
+    with pytest.raises(ValueError, match='AVAILABILITY_INDEX'):
+        gunicorn_options({'SERVER_WORKERS': 3, 'AVAILABILITY_INDEX': True})
+    with pytest.raises(ValueError, match='ROOM_STATE_STORE'):
+        gunicorn_options({'ROOM_STATE_STORE': True}) # Derived worker count is always above one
+    assert gunicorn_options({'SERVER_WORKERS': 1, 'ROOM_STATE_STORE': True, 'AVAILABILITY_INDEX': True})['workers'] == 1
+
+def test_dispose_engines_keeps_app_usable(app, db_instance):
+    dispose_engines(app)
+    assert db_instance.session.execute(db_instance.text('SELECT 1')).scalar() == 1
+
+def test_memory_report_lists_own_process():
+    if process_memory(os.getpid()) is None:
+        pytest.skip('No /proc/<pid>/smaps_rollup on this platform')
+    rows = memory_report(os.getpid())
+    assert rows[0][:2] == ('master', os.getpid())
+    assert rows[0][2]['rss'] > 0
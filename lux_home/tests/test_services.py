@@ -1,6 +1,6 @@
 import pytest
-from app.services import calculate_booking_total
-from app.models import Booking, Room, Guest
+from app.services import calculate_booking_total, group_check_out, service_charges_cents
+from app.models import Booking, Room, Guest, Invoice, Service, BookingService
 from app import db as _db # Use the db instance from app
 from datetime import datetime, timedelta
 
@@ -107,3 +107,61 @@ def test_calculate_booking_total_booking_not_found(db_instance):
     """Test with a non-existent booking ID."""
     total = calculate_booking_total(99999) # Non-existent ID
     assert total is None
+
+# Test group_check_out service
+def test_group_check_out_closes_all_bookings(db_instance):
+    bookings = [create_booking_for_test(db_instance.session, room_rate=100.00, check_in_delta_days=-2) for _ in range(3)]
+    ids = [b.id for b in bookings]
+
+    result = group_check_out(ids + [999999], idempotency_key='tour-42')
+
+    assert sorted(result['checked_out']) == sorted(ids)
+    assert result['not_found'] == [999999]
+    assert all(total == 200.00 for total in result['totals'].values())
+    for booking_id in ids:
+        booking = Booking.query.get(booking_id)
+        assert booking.is_active is False
+        assert booking.total_amount == 200.00
+        assert booking.room.status == 'needs_cleaning'
+        assert Invoice.query.filter_by(booking_id=booking_id).count() == 1
+
+def test_group_check_out_replay_with_same_key_is_noop(db_instance):
+    booking = create_booking_for_test(db_instance.session, room_rate=100.00, check_in_delta_days=-1)
+    first = group_check_out([booking.id], idempotency_key='retry-me')
+
+    # A retry returns the recorded result instead of reporting "already checked out"
+    second = group_check_out([booking.id], idempotency_key='retry-me')
+    assert second == first
+    assert Invoice.query.filter_by(booking_id=booking.id).count() == 1
+
+    # Without the key the booking is simply reported as already closed
+    third = group_check_out([booking.id])
+    assert third['already_checked_out'] == [booking.id]
+    assert third['checked_out'] == []
+
+def test_idempotency_keys_are_per_property(db_instance):
+    from app.models import Property
+    from app.sharding import property_scope
+    properties = [Property(code=f'IK{i}', name=f'Key Inn {i}') for i in range(2)]
+    db_instance.session.add_all(properties)
+    db_instance.session.commit()
+    results = []
+    for prop in properties:
+        with property_scope(prop.id):
+            booking = create_booking_for_test(db_instance.session, room_rate=100.00, check_in_delta_days=-1)
+            results.append(group_check_out([booking.id], idempotency_key='same-key'))
+    # Each property's check-out ran; neither collided with nor replayed the other's
+    assert all(len(r['checked_out']) == 1 for r in results)
+    assert results[0]['checked_out'] != results[1]['checked_out']
+
+def test_calculate_booking_total_includes_services_in_cents(db_instance):
+    """Service charges are summed in SQL; 3 x $0.10 must be exactly $0.30."""
+    booking = create_booking_for_test(db_instance.session, room_rate=100.10, check_in_delta_days=0, duration_days=3)
+    tea = Service(name='Tea', price=0.10)
+    db_instance.session.add(tea)
+    db_instance.session.commit()
+    db_instance.session.add(BookingService(booking_id=booking.id, service_id=tea.id, quantity=3))
+    db_instance.session.commit()
+
+    assert service_charges_cents([booking.id]) == {booking.id: 30}
+    assert calculate_booking_total(booking.id) == 300.60 # 3 * 100.10 + 0.30
@@ -0,0 +1,161 @@
+import pytest
+from sqlalchemy import select, inspect
+from sqlalchemy.exc import IntegrityError
+from app import read_api, db as _db
+from app.models import Property, Room, Booking, Guest, Service, BookingService
+from app.sharding import property_scope, cross_property_room_status_report
+from app.search import search_index
+from app.night_audit import night_audit
+from app.importer import import_legacy
+from app.services import service_charges_cents
+from datetime import datetime
+
+def test_queries_are_scoped_to_active_property(db_instance):
+    main = Property(code='MAIN', name='Main Street')
+    beach = Property(code='BCH', name='Beach House')
+    db_instance.session.add_all([main, beach])
+    db_instance.session.commit()
+
+    # The same room number can exist once per property
+    db_instance.session.add_all([
+        Room(property_id=main.id, room_number='101', room_type='Standard', rate_per_night=100.0),
+        Room(property_id=beach.id, room_number='101', room_type='Suite', rate_per_night=300.0),
+    ])
+    db_instance.session.commit()
+
+    with property_scope(beach.id):
+        rooms = Room.query.all()
+        assert [r.room_type for r in rooms] == ['Suite']
+    assert Room.query.count() == 2 # Unscoped again
+
+def test_room_numbers_are_unique_outside_properties_too(db_instance):
+    db_instance.session.add(Room(room_number='301', room_type='Standard', rate_per_night=100.0))
+    db_instance.session.commit()
+    db_instance.session.add(Room(room_number='301', room_type='Suite', rate_per_night=300.0))
+    with pytest.raises(IntegrityError):
+        db_instance.session.commit()
+    db_instance.session.rollback()
+
+def test_new_rows_inherit_property_id(db_instance):
+    prop = Property(code='INH', name='Inherit Inn')
+    guest = Guest(name='Scoped Guest', email='scoped.guest@example.com')
+    db_instance.session.add_all([prop, guest])
+    db_instance.session.commit()
+
+    with property_scope(prop.id):
+        room = Room(room_number='201', room_type='Standard', rate_per_night=90.0)
+        db_instance.session.add(room)
+        db_instance.session.flush()
+        booking = Booking(guest_id=guest.id, room_id=room.id, check_in_date=datetime.utcnow())
+        db_instance.session.add(booking)
+        db_instance.session.commit()
+        assert room.property_id == prop.id
+        assert booking.property_id == prop.id
+
+def test_shard_schema_keeps_only_foreign_keys_within_the_shard(shard_app):
+    shard = inspect(_db.engines['east'])
+    assert {fk['referred_table'] for fk in shard.get_foreign_keys('booking')} == {'room'} # Not guest or property
+    assert shard.get_foreign_keys('room') == []
+    assert {fk['referred_table'] for fk in shard.get_foreign_keys('booking_service')} == {'booking'} # Not service
+    assert 'search_index' in shard.get_table_names()
+
+def test_property_with_bind_key_routes_to_its_shard(shard_app):
+    east = Property(code='EAST', name='East Wing', bind_key='east')
+    west = Property(code='WEST', name='West Wing')
+    _db.session.add_all([east, west])
+    _db.session.commit()
+
+    with property_scope(east.id):
+        _db.session.add(Room(room_number='E1', room_type='Standard', rate_per_night=80.0))
+        _db.session.commit()
+    with property_scope(west.id):
+        _db.session.add(Room(room_number='W1', room_type='Standard', rate_per_night=80.0, status='occupied'))
+        _db.session.commit()
+
+    # Rows physically live in different databases
+    shard_rows = _db.session.execute(_db.text('SELECT room_number FROM room'), bind_arguments={'bind': _db.engines['east']}).all()
+    default_rows = _db.session.execute(_db.text('SELECT room_number FROM room')).all()
+    assert [r[0] for r in shard_rows] == ['E1']
+    assert [r[0] for r in default_rows] == ['W1']
+
+    report = cross_property_room_status_report(max_workers=2)
+    assert report['by_property'] == {east.id: {'available': 1}, west.id: {'occupied': 1}}
+    assert report['total'] == {'available': 1, 'occupied': 1}
+
+def test_booked_services_live_with_their_booking(shard_app):
+    east = Property(code='EAST', name='East Wing', bind_key='east')
+    guest = Guest(name='Spa Guest', email='spa.guest@example.com')
+    massage, dinner = Service(name='Massage', price=80.0), Service(name='Dinner', price=45.5)
+    _db.session.add_all([east, guest, massage, dinner])
+    _db.session.commit()
+    with property_scope(east.id):
+        room = Room(room_number='E20', room_type='Standard', rate_per_night=90.0)
+        _db.session.add(room)
+        _db.session.flush()
+        booking = Booking(guest_id=guest.id, room_id=room.id, check_in_date=datetime(2024, 5, 1))
+        _db.session.add(booking)
+        _db.session.flush()
+        _db.session.add_all([BookingService(booking_id=booking.id, service_id=massage.id, quantity=2),
+                             BookingService(booking_id=booking.id, service_id=dinner.id)])
+        _db.session.commit()
+        assert service_charges_cents([booking.id]) == {booking.id: 20550} # Priced from the default database
+
+    rows = lambda bind: _db.session.execute(_db.text('SELECT count(*) FROM booking_service'),
+                                            bind_arguments={'bind': _db.engines[bind]}).scalar()
+    assert (rows('east'), rows(None)) == (2, 0)
+
+def test_search_documents_live_next_to_their_rows(shard_app):
+    east = Property.query.filter_by(code='EAST').first() or Property(code='EAST', name='East Wing', bind_key='east')
+    guest = Guest(name='Sharded Searcher', email='sharded.searcher@example.com')
+    _db.session.add_all([east, guest])
+    _db.session.commit()
+    with property_scope(east.id):
+        room = Room(room_number='E12', room_type='Standard', rate_per_night=90.0)
+        _db.session.add(room)
+        _db.session.flush()
+        _db.session.add(Booking(guest_id=guest.id, room_id=room.id, check_in_date=datetime.utcnow()))
+        _db.session.commit()
+        results = read_api.run_sync(read_api.search('searcher e12', property_id=east.id))['results']
+        assert [r['kind'] for r in results] == ['stay']
+
+    kinds = lambda bind: {row.kind for row in _db.session.execute(select(search_index.c.kind),
+                                                                 bind_arguments={'bind': _db.engines[bind]})}
+    assert kinds('east') == {'stay'}
+    assert kinds(None) == {'guest'}
+
+def test_night_audit_posts_charges_on_each_shard(shard_app):
+    east = Property.query.filter_by(code='EAST').first() or Property(code='EAST', name='East Wing', bind_key='east')
+    guest = Guest(name='Audited Guest', email='audited.guest@example.com')
+    _db.session.add_all([east, guest])
+    _db.session.commit()
+    with property_scope(east.id):
+        room = Room(room_number='E30', room_type='Standard', rate_per_night=70.0)
+        _db.session.add(room)
+        _db.session.flush()
+        _db.session.add(Booking(guest_id=guest.id, room_id=room.id, check_in_date=datetime(2024, 5, 1)))
+        _db.session.commit()
+
+    summaries = night_audit(datetime(2024, 5, 3).date())
+    assert [(s['property_id'], s['charges_posted']) for s in summaries] == [(None, 0), (east.id, 1)]
+    charges = lambda bind: _db.session.execute(_db.text('SELECT amount_cents FROM room_charge'),
+                                               bind_arguments={'bind': _db.engines[bind]}).scalars().all()
+    assert charges('east') == [7000]
+    assert charges(None) == []
+
+def test_import_writes_guests_to_default_and_stays_to_the_shard(shard_app, tmp_path):
+    east = Property.query.filter_by(code='EAST').first() or Property(code='EAST', name='East Wing', bind_key='east')
+    _db.session.add(east)
+    _db.session.commit()
+    (tmp_path / 'guests.jsonl').write_text('{"id": 1, "name": "Imported Guest", "email": "imported@example.com"}\n')
+    (tmp_path / 'rooms.jsonl').write_text('{"id": 1, "room_number": "E40", "room_type": "Suite", "rate_per_night": 180}\n')
+    (tmp_path / 'bookings.jsonl').write_text('{"id": 1, "guest_id": 1, "room_id": 1, "check_in_date": "2023-02-01", '
+                                             '"check_out_date": "2023-02-03"}\n')
+    with property_scope(east.id):
+        import_legacy(str(tmp_path))
+        booking = Booking.query.filter_by(check_in_date=datetime(2023, 2, 1)).one()
+        assert booking.property_id == east.id
+
+    rows = lambda bind, table: _db.session.execute(_db.text(f'SELECT count(*) FROM {table}'),
+                                                   bind_arguments={'bind': _db.engines[bind]}).scalar()
+    assert rows('east', 'booking') >= 1 and rows(None, 'booking') == 0
+    assert Guest.query.filter_by(email='imported@example.com').one().id == booking.guest_id
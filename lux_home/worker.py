@@ -0,0 +1,16 @@
+from app import create_app
+from app.scheduler import build_scheduler
+import os
+
+# Background job runner (overdue sweep, reminder rendering). Run it next to the web
+# process: `python worker.py`. Uses the same FLASK_CONFIG as run.py.
+config_name = os.getenv('FLASK_CONFIG', 'config.DevelopmentConfig')
+app = create_app(config_name)
+
+if __name__ == '__main__':
+    scheduler = build_scheduler(app)
+    app.logger.info(f"Worker started with jobs: {', '.join(job[0] for job in scheduler.jobs)}")
+    try:
+        scheduler.run_forever()
+    except KeyboardInterrupt:
+        pass